@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+Benchmark Cases: The Hot Operations of Chapters 1-9
+
+Each case is registered with @case(name, chapter, description). The decorated
+function does the setup (keys, scripts, unsigned transactions) and returns
+the operation to time, a function without arguments. Setup is never timed.
+
+A case runs in a worker process started in its chapter's directory, with
+that directory first on sys.path, the way the chapter's scripts run: every
+chapter has its own `tools` package, so the imports are inside the setup
+functions. The operations repeat what the chapter scripts do, with the
+book's keys, scripts and transactions, without the printing.
+"""
+
+import hashlib
+import importlib.util
+import os
+import struct
+from collections import namedtuple
+
+# The book's testnet keys (chapter 1 / 2 / 5 key, Alice and Bob of chapters 6-9)
+BOOK_WIF = "cPeon9fBsW2BxwJTALj3hGzh9vm8C52Uqsce7MzXGS1iFJkPF4AT"
+ALICE_WIF = "cRxebG1hY6vVgS9CSLNaEbEJaXkpZvc6nFeqqGT7v6gcW7MbzKNT"
+BOB_WIF = "cSNdLFDf3wjx1rswNL2jKykbVkC6o56o5nYZi4FUkWKjFn2Q5DSG"
+OUTPUT_ADDRESS = "tb1p060z97qusuxe7w6h8z0l9kam5kn76jur22ecel75wjlmnkpxtnls6vdgne"
+BOOK_POLICY = "or(pk(alice), sha256(H), multi_a(2, alice, bob), and(older(2), pk(bob)), pk(bob))"
+
+# setup: returns the operation to time
+Case = namedtuple("Case", ["name", "chapter", "description", "setup"])
+
+CASES = []
+
+
+def case(name, chapter, description):
+    def register(setup):
+        CASES.append(Case(name, chapter, description, setup))
+        return setup
+    return register
+
+
+def load_script(filename):
+    """A chapter script as a module (their names start with a digit), from the current chapter directory"""
+    name = "bench_" + os.path.splitext(filename)[0]
+    spec = importlib.util.spec_from_file_location(name, os.path.join(os.getcwd(), filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def four_leaf_tree(alice_pub, bob_pub):
+    """Chapter 8's tree: hash lock, 2-of-2 CHECKSIGADD, CSV + Bob, Bob"""
+    from bitcoinutils.constants import TYPE_RELATIVE_TIMELOCK
+    from bitcoinutils.script import Script
+    from bitcoinutils.transactions import Sequence
+
+    hash0 = hashlib.sha256(b"helloworld").hexdigest()
+    script0 = Script(["OP_SHA256", hash0, "OP_EQUALVERIFY", "OP_TRUE"])
+    script1 = Script(["OP_0", alice_pub.to_x_only_hex(), "OP_CHECKSIGADD",
+                      bob_pub.to_x_only_hex(), "OP_CHECKSIGADD", "OP_2", "OP_EQUAL"])
+    seq = Sequence(TYPE_RELATIVE_TIMELOCK, 2)
+    script2 = Script([seq.for_script(), "OP_CHECKSEQUENCEVERIFY", "OP_DROP",
+                      bob_pub.to_x_only_hex(), "OP_CHECKSIG"])
+    script3 = Script([bob_pub.to_x_only_hex(), "OP_CHECKSIG"])
+    return [[script0, script1], [script2, script3]]
+
+
+def taproot_spend(previous_txid, amount, vout=0):
+    """One-input, one-output transaction to the book's output address (RBF sequence)"""
+    from bitcoinutils.keys import P2trAddress
+    from bitcoinutils.transactions import Transaction, TxInput, TxOutput
+
+    txin = TxInput(previous_txid, vout)
+    txin.sequence = struct.pack("<I", 0xfffffffd)
+    txout = TxOutput(amount, P2trAddress(OUTPUT_ADDRESS).to_script_pub_key())
+    return Transaction([txin], [txout], has_segwit=True)
+
+
+# ----------------------------------------------------------------------
+# Chapter 1: keys and addresses
+# ----------------------------------------------------------------------
+
+@case("ch01.keygen", 1, "random private key, public key and x-only key")
+def keygen():
+    from bitcoinutils.keys import PrivateKey
+
+    def run():
+        public_key = PrivateKey().get_public_key()
+        return public_key.to_hex(), public_key.to_x_only_hex()
+    return run
+
+
+@case("ch01.addresses", 1, "P2PKH, P2WPKH and P2TR addresses of one public key")
+def addresses():
+    from bitcoinutils.keys import PrivateKey
+
+    public_key = PrivateKey(BOOK_WIF).get_public_key()
+
+    def run():
+        return (public_key.get_address().to_string(), public_key.get_segwit_address().to_string(),
+                public_key.get_taproot_address().to_string())
+    return run
+
+
+@case("ch01.hd_derive", 1, "BIP86 receive address m/86'/1'/0'/0/i, account node cached (tools/hd_wallet.py)")
+def hd_derive():
+    from tools.hd_wallet import HDWallet
+
+    wallet = HDWallet.from_seed(bytes(range(32)), "testnet")
+    counter = iter(range(10 ** 9))
+
+    def run():
+        return wallet.addresses(86, start=next(counter) % 1000, count=1)
+    return run
+
+
+# ----------------------------------------------------------------------
+# Chapters 2-3: legacy signing
+# ----------------------------------------------------------------------
+
+@case("ch02.p2pkh_sign", 2, "sign the chapter's P2PKH input, build the scriptSig and serialize")
+def p2pkh_sign():
+    from bitcoinutils.keys import P2pkhAddress, P2wpkhAddress, PrivateKey
+    from bitcoinutils.script import Script
+    from bitcoinutils.transactions import Transaction, TxInput, TxOutput
+
+    private_key = PrivateKey(BOOK_WIF)
+    public_key = private_key.get_public_key().to_hex()
+    p2pkh_script = P2pkhAddress("myYHJtG3cyoRseuTwvViGHgP2efAvZkYa4").to_script_pub_key()
+    txin = TxInput("34b90a15d0a9ec9ff3d7bed2536533c73278a9559391cb8c9778b7e7141806f7", 1)
+    txout = TxOutput(29400, P2wpkhAddress("tb1qckeg66a6jx3xjw5mrpmte5ujjv3cjrajtvm9r4").to_script_pub_key())
+    tx = Transaction([txin], [txout])
+
+    def run():
+        signature = private_key.sign_input(tx, 0, p2pkh_script)
+        txin.script_sig = Script([signature, public_key])
+        return tx.serialize()
+    return run
+
+
+@case("ch03.p2sh_multisig_sign", 3, "2-of-3 P2SH multisig: two signatures, scriptSig and serialize")
+def p2sh_multisig_sign():
+    from bitcoinutils.keys import P2pkhAddress, PrivateKey
+    from bitcoinutils.script import Script
+    from bitcoinutils.transactions import Transaction, TxInput, TxOutput
+
+    alice, bob = PrivateKey(BOOK_WIF), PrivateKey(BOB_WIF)
+    redeem_script = Script([
+        "OP_2",
+        "02898711e6bf63f5cbe1b38c05e89d6c391c59e9f8f695da44bf3d20ca674c8519",
+        "0284b5951609b76619a1ce7f48977b4312ebe226987166ef044bfb374ceef63af5",
+        "0317aa89b43f46a0c0cdbd9a302f2508337ba6a06d123854481b52de9c20996011",
+        "OP_3",
+        "OP_CHECKMULTISIG",
+    ])
+    txin = TxInput("4b869865bc4a156d7e0ba14590b5c8971e57b8198af64d88872558ca88a8ba5f", 0)
+    txout = TxOutput(888, P2pkhAddress("myYHJtG3cyoRseuTwvViGHgP2efAvZkYa4").to_script_pub_key())
+    tx = Transaction([txin], [txout])
+
+    def run():
+        alice_sig = alice.sign_input(tx, 0, redeem_script)
+        bob_sig = bob.sign_input(tx, 0, redeem_script)
+        txin.script_sig = Script(["OP_0", alice_sig, bob_sig, redeem_script.to_hex()])
+        return tx.serialize()
+    return run
+
+
+# ----------------------------------------------------------------------
+# Chapter 4: SegWit
+# ----------------------------------------------------------------------
+
+# The chapter's signed P2WPKH spend (271cf628...)
+SEGWIT_TX = (
+    "0200000000010148bcdd9dfa3749b74a1390d7bd272197e2588011abfb3303717d416f8e4354140000000000fdffffff019a0200"
+    "0000000000160014c5b28d6bba91a2693a9b1876bcd3929323890fb202473044022015098d26918b46ab36b0d1b50ee502b33d5c"
+    "5b5257c76bd6d00ccb31452c25ae0220256e82d4df10981f25f91e5273be39fced8fe164434616c94fa48f3549e33c03012102"
+    "898711e6bf63f5cbe1b38c05e89d6c391c59e9f8f695da44bf3d20ca674c851900000000"
+)
+
+
+@case("ch04.segwit_parse", 4, "parse_segwit_transaction() of 03_parse_segwit_transaction.py on the chapter's spend")
+def segwit_parse():
+    parse = load_script("03_parse_segwit_transaction.py").parse_segwit_transaction
+    raw = bytes.fromhex(SEGWIT_TX)
+
+    def run():
+        return parse(raw)
+    return run
+
+
+@case("ch04.p2wpkh_sign", 4, "sign the chapter's P2WPKH input (BIP143), set the witness and serialize")
+def p2wpkh_sign():
+    from bitcoinutils.keys import P2wpkhAddress, PrivateKey
+    from bitcoinutils.transactions import Transaction, TxInput, TxOutput, TxWitnessInput
+
+    from tools.tx_serializer import serialize
+
+    private_key = PrivateKey(BOOK_WIF)
+    public_key = private_key.get_public_key()
+    script_code = public_key.get_address().to_script_pub_key()
+    to_address = P2wpkhAddress("tb1qckeg66a6jx3xjw5mrpmte5ujjv3cjrajtvm9r4")
+    txin = TxInput("1454438e6f417d710333fbab118058e2972127bdd790134ab74937fa9dddbc48", 0)
+    tx = Transaction([txin], [TxOutput(666, to_address.to_script_pub_key())], has_segwit=True)
+    pubkey_hex = public_key.to_hex()
+
+    def run():
+        signature = private_key.sign_segwit_input(tx, 0, script_code, 1000)
+        tx.witnesses = [TxWitnessInput([signature, pubkey_hex])]
+        return serialize(tx)
+    return run
+
+
+# ----------------------------------------------------------------------
+# Chapter 5: key tweaking
+# ----------------------------------------------------------------------
+
+@case("ch05.key_tweak", 5, "BIP341 TapTweak, d' = d + t and the tweaked public key (01_demonstrate_key_tweaking.py)")
+def key_tweak():
+    from bitcoinutils.keys import PrivateKey
+
+    internal = PrivateKey(BOOK_WIF)
+    internal_pubkey = bytes.fromhex(internal.get_public_key().to_x_only_hex())
+    internal_int = int.from_bytes(internal.to_bytes(), "big")
+    order = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+
+    def run():
+        tag_hash = hashlib.sha256(b"TapTweak").digest()
+        tweak = int.from_bytes(hashlib.sha256(tag_hash + tag_hash + internal_pubkey).digest(), "big")
+        tweaked = PrivateKey.from_bytes(((internal_int + tweak) % order).to_bytes(32, "big"))
+        return tweaked.get_public_key().to_x_only_hex()
+    return run
+
+
+@case("ch05.key_path_sign", 5, "Taproot key path signature (tweaked key, BIP341 sighash, BIP340 Schnorr)")
+def key_path_sign():
+    from bitcoinutils.keys import PrivateKey
+
+    private_key = PrivateKey(BOOK_WIF)
+    script_pubkey = private_key.get_public_key().get_taproot_address().to_script_pub_key()
+    tx = taproot_spend("b0f49d2f30f80678c6053af09f0611420aacf20105598330cb3f0ccb8ac7d7f0", 29000)
+
+    def run():
+        return private_key.sign_taproot_input(tx, 0, [script_pubkey], [29200])
+    return run
+
+
+# ----------------------------------------------------------------------
+# Chapters 6-8: script trees, control blocks and script path signing
+# ----------------------------------------------------------------------
+
+@case("ch06.hashlock_commitment", 6, "single-leaf hash lock tree: TapLeaf, TapTweak and the P2TR address")
+def hashlock_commitment():
+    from bitcoinutils.keys import PrivateKey
+    from bitcoinutils.script import Script
+
+    alice_pub = PrivateKey(ALICE_WIF).get_public_key()
+    preimage_hash = hashlib.sha256(b"helloworld").hexdigest()
+
+    def run():
+        script = Script(["OP_SHA256", preimage_hash, "OP_EQUALVERIFY", "OP_TRUE"])
+        return alice_pub.get_taproot_address([[script]]).to_string()
+    return run
+
+
+@case("ch06.script_verify", 6, "execute the hash lock reveal witness (tools/script_interpreter.py)")
+def script_verify():
+    from tools.script_interpreter import SIGVERSION_TAPSCRIPT, ExecData, execute_witness_script
+
+    script = bytes.fromhex("a820936a185caaa266bb9cbe981e9e05cb78cd732b0b3280eb944412bb6f8f8f07af8851")
+
+    def run():
+        return execute_witness_script(script, [b"helloworld"], None, SIGVERSION_TAPSCRIPT,
+                                      ExecData(validation_weight_left=50))
+    return run
+
+
+@case("ch07.control_block_verify", 7, "parse both control blocks, rebuild the Merkle root and the tweak (04_verify_control_block.py)")
+def control_block_verify():
+    def tagged_hash(tag, data):
+        tag_hash = hashlib.sha256(tag.encode()).digest()
+        return hashlib.sha256(tag_hash + tag_hash + data).digest()
+
+    spends = [
+        (bytes.fromhex("c050be5fc44ec580c387bf45df275aaa8b27e2d7716af31f10eeed357d126bb4d32faaa677cb6ad6a74bf7025e"
+                       "4cd03d2a82c7fb8e3c277916d7751078105cf9df"),
+         bytes.fromhex("a820936a185caaa266bb9cbe981e9e05cb78cd732b0b3280eb944412bb6f8f8f07af8851")),
+        (bytes.fromhex("c050be5fc44ec580c387bf45df275aaa8b27e2d7716af31f10eeed357d126bb4d3fe78d8523ce9603014b28739"
+                       "a51ef826f791aa17511e617af6dc96a8f10f659e"),
+         bytes.fromhex("2084b5951609b76619a1ce7f48977b4312ebe226987166ef044bfb374ceef63af5ac")),
+    ]
+
+    def run():
+        tweaks = []
+        for control_block, script in spends:
+            leaf = tagged_hash("TapLeaf", bytes([control_block[0] & 0xfe, len(script)]) + script)
+            sibling = control_block[33:65]
+            root = tagged_hash("TapBranch", min(leaf, sibling) + max(leaf, sibling))
+            tweaks.append(tagged_hash("TapTweak", control_block[1:33] + root))
+        return tweaks
+    return run
+
+
+@case("ch07.script_path_sign", 7, "Bob's script path signature over the dual-leaf tree, witness and serialize")
+def dual_leaf_sign():
+    from bitcoinutils.keys import PrivateKey
+    from bitcoinutils.script import Script
+    from bitcoinutils.transactions import TxWitnessInput
+    from bitcoinutils.utils import ControlBlock
+
+    alice_pub = PrivateKey(ALICE_WIF).get_public_key()
+    bob = PrivateKey(BOB_WIF)
+    hash_script = Script(["OP_SHA256", hashlib.sha256(b"helloworld").hexdigest(), "OP_EQUALVERIFY", "OP_TRUE"])
+    bob_script = Script([bob.get_public_key().to_x_only_hex(), "OP_CHECKSIG"])
+    tree = [hash_script, bob_script]
+    address = alice_pub.get_taproot_address(tree)
+    tx = taproot_spend("8caddfad76a5b3a8595a522e24305dc20580ca868ef733493e308ada084a050c", 900, vout=1)
+    script_pubkey = address.to_script_pub_key()
+
+    def run():
+        signature = bob.sign_taproot_input(tx, 0, [script_pubkey], [1111], script_path=True,
+                                           tapleaf_script=bob_script, tweak=False)
+        control_block = ControlBlock(alice_pub, tree, 1, is_odd=address.is_odd())
+        tx.witnesses = [TxWitnessInput([signature, bob_script.to_hex(), control_block.to_hex()])]
+        return tx.serialize()
+    return run
+
+
+@case("ch08.four_leaf_address", 8, "build the four-leaf tree's scripts and its P2TR address")
+def four_leaf_address():
+    from bitcoinutils.keys import PrivateKey
+
+    alice_pub = PrivateKey(ALICE_WIF).get_public_key()
+    bob_pub = PrivateKey(BOB_WIF).get_public_key()
+
+    def run():
+        return alice_pub.get_taproot_address(four_leaf_tree(alice_pub, bob_pub)).to_string()
+    return run
+
+
+@case("ch08.control_blocks", 8, "control blocks of all four leaves")
+def control_blocks():
+    from bitcoinutils.keys import PrivateKey
+    from bitcoinutils.utils import ControlBlock
+
+    alice_pub = PrivateKey(ALICE_WIF).get_public_key()
+    tree = four_leaf_tree(alice_pub, PrivateKey(BOB_WIF).get_public_key())
+    is_odd = alice_pub.get_taproot_address(tree).is_odd()
+
+    def run():
+        return [ControlBlock(alice_pub, tree, index, is_odd=is_odd).to_hex() for index in range(4)]
+    return run
+
+
+@case("ch08.script_path_sign", 8, "Bob's signature for leaf 3 of the four-leaf tree, witness and serialize (05_simple_sig_path_spending.py)")
+def four_leaf_sign():
+    from bitcoinutils.keys import PrivateKey
+    from bitcoinutils.transactions import TxWitnessInput
+    from bitcoinutils.utils import ControlBlock
+
+    alice_pub = PrivateKey(ALICE_WIF).get_public_key()
+    bob = PrivateKey(BOB_WIF)
+    tree = four_leaf_tree(alice_pub, bob.get_public_key())
+    script3 = tree[1][1]
+    address = alice_pub.get_taproot_address(tree)
+    script_pubkey = address.to_script_pub_key()
+    tx = taproot_spend("632743eb43aa68fb1c486bff48e8b27c436ac1f0d674265431ba8c1598e2aeea", 866)
+
+    def run():
+        signature = bob.sign_taproot_input(tx, 0, [script_pubkey], [1800], script_path=True,
+                                           tapleaf_script=script3, tweak=False)
+        control_block = ControlBlock(alice_pub, tree, 3, is_odd=address.is_odd())
+        tx.witnesses = [TxWitnessInput([signature, script3.to_hex(), control_block.to_hex()])]
+        return tx.serialize()
+    return run
+
+
+@case("ch08.compile_policy", 8, "compile the book's five-branch policy into a script tree (tools/policy_compiler.py)")
+def compile_book_policy():
+    from bitcoinutils.keys import PrivateKey
+
+    from tools.policy_compiler import compile_policy
+
+    names = {
+        "alice": PrivateKey(ALICE_WIF).get_public_key().to_x_only_hex(),
+        "bob": PrivateKey(BOB_WIF).get_public_key().to_x_only_hex(),
+        "H": hashlib.sha256(b"helloworld").hexdigest(),
+    }
+
+    def run():
+        return compile_policy(BOOK_POLICY, names, allow_key_reuse=True)
+    return run
+
+
+# ----------------------------------------------------------------------
+# Chapter 9: inscriptions
+# ----------------------------------------------------------------------
+
+@case("ch09.inscription_commit", 9, "BRC-20 mint envelope script and its temporary commit address")
+def inscription_commit():
+    from bitcoinutils.keys import PrivateKey
+    from bitcoinutils.script import Script
+
+    from tools.brc20_config import INSCRIPTION_CONFIG, PRIVATE_KEY_WIF, get_brc20_hex
+
+    public_key = PrivateKey.from_wif(PRIVATE_KEY_WIF).get_public_key()
+
+    def run():
+        script = Script([public_key.to_x_only_hex(), "OP_CHECKSIG", "OP_0", "OP_IF",
+                         INSCRIPTION_CONFIG["ord_marker"], "OP_1", INSCRIPTION_CONFIG["content_type_hex"],
+                         "OP_0", get_brc20_hex("mint"), "OP_ENDIF"])
+        return public_key.get_taproot_address([[script]]).to_string()
+    return run
+
+
+@case("ch09.inscription_reveal", 9, "sign the mint reveal: script path signature, control block and serialize")
+def inscription_reveal():
+    from bitcoinutils.keys import PrivateKey
+    from bitcoinutils.script import Script
+    from bitcoinutils.transactions import Transaction, TxInput, TxOutput, TxWitnessInput
+    from bitcoinutils.utils import ControlBlock
+
+    from tools.brc20_config import FEE_CONFIG, INSCRIPTION_CONFIG, PRIVATE_KEY_WIF, get_brc20_hex
+
+    private_key = PrivateKey.from_wif(PRIVATE_KEY_WIF)
+    public_key = private_key.get_public_key()
+    script = Script([public_key.to_x_only_hex(), "OP_CHECKSIG", "OP_0", "OP_IF",
+                     INSCRIPTION_CONFIG["ord_marker"], "OP_1", INSCRIPTION_CONFIG["content_type_hex"],
+                     "OP_0", get_brc20_hex("mint"), "OP_ENDIF"])
+    temp_address = public_key.get_taproot_address([[script]])
+    amount = FEE_CONFIG["min_output"] + FEE_CONFIG["reveal_fee"]
+    txin = TxInput(hashlib.sha256(b"mint commit").hexdigest(), 0)
+    txout = TxOutput(FEE_CONFIG["min_output"], public_key.get_taproot_address().to_script_pub_key())
+    tx = Transaction([txin], [txout], has_segwit=True)
+    script_pubkey = temp_address.to_script_pub_key()
+
+    def run():
+        signature = private_key.sign_taproot_input(tx, 0, [script_pubkey], [amount], script_path=True,
+                                                   tapleaf_script=script, tweak=False)
+        control_block = ControlBlock(public_key, [[script]], 0, is_odd=temp_address.is_odd())
+        tx.witnesses = [TxWitnessInput([signature, script.to_hex(), control_block.to_hex()])]
+        return tx.serialize()
+    return run
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Benchmark Runner for the Chapter Code
+
+Times the hot operations of chapters 1-9 (cases.py) and writes the results
+in one stable JSON format:
+
+1. Each chapter's cases run in a fresh worker process started in the
+   chapter's directory, so its `tools` package imports as in its scripts
+2. Per case: the number of loops per sample is calibrated until a sample
+   takes at least --min-time, --warmup samples are discarded, then
+   --repeat samples are kept. The garbage collector is off during a sample.
+3. Per case: min, mean, standard deviation and the 50th / 90th / 99th
+   percentiles of the time per operation, in nanoseconds
+4. Comparison with the stored baseline (baseline.json): a case has
+   regressed when its median is more than --threshold slower and even its
+   fastest sample is slower than the baseline median. The exit status is 1
+   when a case regressed.
+
+Usage: python3 run_benchmarks.py [--filter PATTERN] [--warmup N] [--repeat N] [--min-time S]
+                                 [--output FILE] [--baseline FILE] [--save-baseline] [--threshold F] [--list]
+"""
+
+import argparse
+import datetime
+import fnmatch
+import gc
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from cases import CASES
+
+FORMAT = "mastering-taproot-benchmarks/1"
+script_dir = os.path.dirname(os.path.abspath(__file__))
+CODE_DIR = os.path.dirname(script_dir)
+BASELINE_FILE = os.path.join(script_dir, "baseline.json")
+RESULTS_FILE = os.path.join(script_dir, "benchmark_results.json")
+
+
+# ----------------------------------------------------------------------
+# Measurement (worker process)
+# ----------------------------------------------------------------------
+
+def percentile(values, pct):
+    """Linear interpolation between the closest ranks of sorted `values`"""
+    rank = (len(values) - 1) * pct / 100
+    low = math.floor(rank)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+def sample(run, loops):
+    """Nanoseconds per call of run() over `loops` calls"""
+    gc.collect()
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = time.perf_counter_ns()
+        for _ in range(loops):
+            run()
+        elapsed = time.perf_counter_ns() - start
+    finally:
+        if enabled:
+            gc.enable()
+    return elapsed / loops
+
+
+def calibrate(run, min_time):
+    """Loops per sample (1, 2, 5, 10, 20, ...) so that a sample takes at least min_time seconds"""
+    loops = 1
+    while True:
+        for factor in (1, 2, 5):
+            n = loops * factor
+            if sample(run, n) * n >= min_time * 1e9:
+                return n
+        loops *= 10
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        "min": ordered[0],
+        "mean": statistics.fmean(ordered),
+        "stdev": statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+        "p50": percentile(ordered, 50),
+        "p90": percentile(ordered, 90),
+        "p99": percentile(ordered, 99),
+        "max": ordered[-1],
+    }
+
+
+def measure(case, warmup, repeat, min_time):
+    run = case.setup()
+    loops = calibrate(run, min_time)
+    for _ in range(warmup):
+        sample(run, loops)
+    samples = [sample(run, loops) for _ in range(repeat)]
+    result = {"chapter": case.chapter, "description": case.description, "unit": "ns",
+              "loops": loops, "samples": [round(s, 1) for s in samples]}
+    result.update({key: round(value, 1) for key, value in summarize(samples).items()})
+    return result
+
+
+def worker(chapter, names, warmup, repeat, min_time, output):
+    """Run the named cases of one chapter in this process; results go to `output` as JSON"""
+    chapter_dir = os.path.join(CODE_DIR, f"chapter{chapter:02d}")
+    os.chdir(chapter_dir)
+    sys.path.insert(0, chapter_dir)
+    from bitcoinutils.setup import setup
+    setup("testnet")
+    results = {}
+    for case in CASES:
+        if case.name in names:
+            try:
+                results[case.name] = measure(case, warmup, repeat, min_time)
+            except Exception as e:
+                results[case.name] = {"chapter": chapter, "description": case.description,
+                                      "error": f"{type(e).__name__}: {e}"}
+    with open(output, "w") as f:
+        json.dump(results, f)
+
+
+# ----------------------------------------------------------------------
+# Runner
+# ----------------------------------------------------------------------
+
+def environment():
+    try:
+        from importlib.metadata import version
+        bitcoinutils = version("bitcoin-utils")
+    except Exception:
+        bitcoinutils = None
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "bitcoin_utils": bitcoinutils,
+    }
+
+
+def run_chapter(chapter, names, args):
+    """Start a worker for one chapter; its results, or an error per case if it failed"""
+    fd, output = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    try:
+        command = [sys.executable, os.path.abspath(__file__), "--worker", str(chapter),
+                   "--filter", ",".join(names), "--warmup", str(args.warmup), "--repeat", str(args.repeat),
+                   "--min-time", str(args.min_time), "--output", output]
+        proc = subprocess.run(command, cwd=script_dir, capture_output=True, text=True)
+        if proc.returncode == 0:
+            with open(output) as f:
+                return json.load(f)
+        error = (proc.stderr.strip().splitlines() or [f"exit status {proc.returncode}"])[-1]
+        return {name: {"chapter": chapter, "error": error} for name in names}
+    finally:
+        os.remove(output)
+
+
+def select(patterns):
+    """Cases matching any of the comma-separated glob patterns (all when empty)"""
+    if not patterns:
+        return list(CASES)
+    globs = [p.strip() for p in patterns.split(",") if p.strip()]
+    return [case for case in CASES
+            if any(fnmatch.fnmatch(case.name, g) or case.name == g for g in globs)]
+
+
+def compare(benchmarks, baseline, threshold):
+    """(name, ratio of the medians, verdict) for every case in both result sets"""
+    rows = []
+    for name, result in benchmarks.items():
+        old = baseline.get("benchmarks", {}).get(name)
+        if "error" in result or not old or "error" in old:
+            continue
+        ratio = result["p50"] / old["p50"]
+        if ratio > 1 + threshold and result["min"] > old["p50"]:
+            verdict = "REGRESSION"
+        elif ratio < 1 / (1 + threshold) and result["max"] < old["p50"]:
+            verdict = "faster"
+        else:
+            verdict = "same"
+        rows.append((name, ratio, verdict))
+    return rows
+
+
+def format_ns(ns):
+    for unit, scale in (("s", 1e9), ("ms", 1e6), ("µs", 1e3)):
+        if ns >= scale:
+            return f"{ns / scale:.2f} {unit}"
+    return f"{ns:.0f} ns"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark runner for the chapter code")
+    parser.add_argument("--filter", default="", help="comma-separated case names or globs, e.g. 'ch08.*'")
+    parser.add_argument("--warmup", type=int, default=3, help="samples discarded per case")
+    parser.add_argument("--repeat", type=int, default=20, help="samples kept per case")
+    parser.add_argument("--min-time", type=float, default=0.05, help="minimum seconds per sample")
+    parser.add_argument("--output", default=RESULTS_FILE, help="results file")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="baseline to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.10, help="tolerated slowdown of the median")
+    parser.add_argument("--list", action="store_true", help="list the cases and exit")
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        worker(args.worker, set(args.filter.split(",")), args.warmup, args.repeat, args.min_time, args.output)
+        return 0
+
+    cases = select(args.filter)
+    if args.list:
+        for case in cases:
+            print(f"{case.name:<28}{case.description}")
+        return 0
+    if not cases:
+        parser.error(f"no case matches {args.filter!r}")
+
+    print("=" * 70)
+    print("BENCHMARKS")
+    print("=" * 70)
+    env = environment()
+    print(f"Python {env['python']} ({env['implementation']}), bitcoin-utils {env['bitcoin_utils']}, "
+          f"{env['cpu_count']} CPUs")
+    print(f"{args.warmup} warm-up + {args.repeat} samples per case, at least {args.min_time} s each\n")
+
+    chapters = {}
+    for case in cases:
+        chapters.setdefault(case.chapter, []).append(case.name)
+    benchmarks = {}
+    print(f"{'Case':<28}{'loops':>8}{'min':>12}{'p50':>12}{'p90':>12}{'p99':>12}{'stdev':>8}")
+    for chapter, names in sorted(chapters.items()):
+        results = run_chapter(chapter, names, args)
+        for name in names:
+            result = benchmarks[name] = results[name]
+            if "error" in result:
+                print(f"{name:<28}ERROR: {result['error']}")
+                continue
+            spread = result["stdev"] / result["mean"] * 100
+            print(f"{name:<28}{result['loops']:>8}{format_ns(result['min']):>12}{format_ns(result['p50']):>12}"
+                  f"{format_ns(result['p90']):>12}{format_ns(result['p99']):>12}{spread:>7.1f}%")
+
+    document = {
+        "format": FORMAT,
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "environment": env,
+        "settings": {"warmup": args.warmup, "repeat": args.repeat, "min_time": args.min_time},
+        "benchmarks": benchmarks,
+    }
+    with open(args.output, "w") as f:
+        json.dump(document, f, indent=2, sort_keys=True)
+        f.write("\n")
+    print(f"\nResults: {args.output}")
+
+    status = 0
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(document, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline saved: {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("format") != FORMAT:
+            print(f"Baseline {args.baseline} has format {baseline.get('format')!r}, expected {FORMAT!r}")
+            return 1
+        print(f"\nCompared with the baseline of {baseline['created']} (threshold {args.threshold:.0%})")
+        changed = [key for key in ("python", "machine", "cpu_count", "bitcoin_utils")
+                   if baseline["environment"].get(key) != env[key]]
+        if changed:
+            print(f"  Warning: the baseline was taken with a different {', '.join(changed)}")
+        rows = compare(benchmarks, baseline, args.threshold)
+        for name, ratio, verdict in rows:
+            print(f"  {name:<28}{ratio:>8.2f}x  {verdict}")
+        regressions = [name for name, _, verdict in rows if verdict == "REGRESSION"]
+        missing = sorted(set(benchmarks) - {name for name, _, _ in rows})
+        if missing:
+            print(f"  Not compared: {', '.join(missing)}")
+        print(f"  {len(regressions)} regression(s)" + (f": {', '.join(regressions)}" if regressions else ""))
+        status = 1 if regressions else 0
+    if any("error" in result for result in benchmarks.values()):
+        status = 1
+    print("=" * 70)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
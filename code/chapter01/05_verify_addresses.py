@@ -15,6 +15,8 @@ from bitcoinutils.script import Script
 from bitcoinutils.keys import P2shAddress, P2wpkhAddress
 import base58
 
+from tools.script_classifier import classify_script, P2WPKH, P2TR
+
 
 def verify_address(address_obj, address_str, address_type):
     """Verify address format and extract information"""
@@ -26,6 +28,8 @@ def verify_address(address_obj, address_str, address_type):
     script_pubkey = address_obj.to_script_pub_key()
     script_hex = script_pubkey.to_hex()
     script_bytes = bytes.fromhex(script_hex)
+    script_type, program = classify_script(script_bytes)
+    print(f"  Script template: {script_type}")
     
     if address_str[0] == '1' or address_str[0] == '3':
         # Base58Check encoded (P2PKH or P2SH)
@@ -46,10 +50,10 @@ def verify_address(address_obj, address_str, address_type):
         print(f"  Format: Bech32 (SegWit v0)")
         print(f"  ScriptPubKey: {script_hex} ({len(script_bytes)} bytes)")
         # P2WPKH script: OP_0 (0x00) + pushdata (0x14 = 20) + hash160 (20 bytes) = 22 bytes
-        if len(script_bytes) == 22 and script_bytes[0] == 0x00 and script_bytes[1] == 0x14:
+        if script_type == P2WPKH:
             print(f"  ✓ Correct format: OP_0 + pushdata(20) + 20-byte hash160")
             print(f"  Version: 0x00 (P2WPKH)")
-            print(f"  Hash160: {script_bytes[2:].hex()} ({len(script_bytes[2:])} bytes)")
+            print(f"  Hash160: {program.hex()} ({len(program)} bytes)")
         else:
             print(f"  ⚠ Unexpected script format")
     
@@ -58,10 +62,10 @@ def verify_address(address_obj, address_str, address_type):
         print(f"  Format: Bech32m (SegWit v1 / Taproot)")
         print(f"  ScriptPubKey: {script_hex} ({len(script_bytes)} bytes)")
         # P2TR script: OP_1 (0x51) + pushdata (0x20 = 32) + x-only pubkey (32 bytes) = 34 bytes
-        if len(script_bytes) == 34 and script_bytes[0] == 0x51 and script_bytes[1] == 0x20:
+        if script_type == P2TR:
             print(f"  ✓ Correct format: OP_1 + pushdata(32) + 32-byte x-only pubkey")
             print(f"  Version: 0x01 (P2TR)")
-            print(f"  X-only pubkey: {script_bytes[2:].hex()} ({len(script_bytes[2:])} bytes)")
+            print(f"  X-only pubkey: {program.hex()} ({len(program)} bytes)")
             print(f"  Note: Taproot addresses are longer because:")
             print(f"        - They use 32-byte x-only pubkeys (vs 20-byte hashes)")
             print(f"        - Bech32m encoding overhead")
@@ -0,0 +1,131 @@
+"""
+Chapter 1 - Example 6: Benchmark the Script Template Classifier
+
+This script measures how fast output scripts can be classified:
+- Builds a mix of outputs shaped like today's chain (mostly P2WPKH and P2TR,
+  then P2PKH, P2SH, P2WSH, OP_RETURN and a few bare multisig / odd scripts)
+- Classifies them with an if/elif chain of byte checks (the approach of
+  05_verify_addresses.py), with classify_script() and with the batch
+  classify_types()
+- Checks all three agree and reports scripts per second
+- Checks the three on edge cases with a known answer (witness versions and
+  program lengths, truncated pushes)
+
+Every output is a different script by default. --distinct draws the
+outputs from a smaller pool instead (address reuse); none of the three
+methods caches results, so reuse only changes how warm the CPU caches are.
+Each method is timed as the best of three runs.
+
+Usage: python3 06_benchmark_script_classifier.py [--outputs N] [--distinct N]
+"""
+
+import argparse
+import os
+import random
+import time
+from collections import Counter
+
+from tools.script_classifier import classify_script, classify_types
+
+# (script, expected type): outputs Core's Solver puts in a different class than a loose check would
+EDGE_CASES = [
+    (b"\x00\x14" + bytes(20), "p2wpkh"),
+    (b"\x00\x20" + bytes(32), "p2wsh"),
+    (b"\x00\x19" + bytes(25), "nonstandard"),         # v0 program of 25 bytes: invalid, not unknown
+    (b"\x00\x02" + bytes(2), "nonstandard"),          # v0 program of 2 bytes
+    (b"\x51\x20" + bytes(32), "p2tr"),
+    (b"\x51\x19" + bytes(25), "witness_unknown"),     # v1 with another length
+    (b"\x60\x02" + bytes(2), "witness_unknown"),      # v16, shortest program
+    (b"\x52\x28" + bytes(40), "witness_unknown"),     # v2, longest program
+    (b"\x52\x29" + bytes(41), "nonstandard"),         # program over 40 bytes
+    (b"\x51\x01\x00", "nonstandard"),                 # program under 2 bytes
+    (b"\x51\x20" + bytes(31), "nonstandard"),         # truncated push
+]
+
+
+def sample_scripts(count, distinct=None, seed=7):
+    """`count` scripts drawn from `distinct` (default: count) random outputs with a realistic mix"""
+    rng = random.Random(seed)
+    templates = [
+        (45, lambda: b"\x00\x14" + os.urandom(20)),                         # P2WPKH
+        (22, lambda: b"\x51\x20" + os.urandom(32)),                         # P2TR
+        (14, lambda: b"\x76\xa9\x14" + os.urandom(20) + b"\x88\xac"),       # P2PKH
+        (10, lambda: b"\xa9\x14" + os.urandom(20) + b"\x87"),               # P2SH
+        (5, lambda: b"\x00\x20" + os.urandom(32)),                          # P2WSH
+        (3, lambda: b"\x6a" + bytes([20]) + os.urandom(20)),                # OP_RETURN
+        (1, lambda: b"\x51\x21\x02" + os.urandom(32) + b"\x21\x03" + os.urandom(32) + b"\x52\xae"),
+        (0.5, lambda: b"\x21\x02" + os.urandom(32) + b"\xac"),              # P2PK
+        (0.5, lambda: os.urandom(rng.randrange(1, 60))),                    # junk
+    ]
+    weights = [w for w, _ in templates]
+    distinct = distinct or count
+    pool = [rng.choices(templates, weights)[0][1]() for _ in range(distinct)]
+    return [pool[rng.randrange(distinct)] for _ in range(count)]
+
+
+def if_chain_type(script):
+    """Byte-check chain in the style of verify_address(), one template at a time"""
+    n = len(script)
+    if n == 22 and script[0] == 0x00 and script[1] == 0x14:
+        return "p2wpkh"
+    if n == 34 and script[0] == 0x00 and script[1] == 0x20:
+        return "p2wsh"
+    if n == 34 and script[0] == 0x51 and script[1] == 0x20:
+        return "p2tr"
+    if n == 25 and script[:3] == b"\x76\xa9\x14" and script[23:] == b"\x88\xac":
+        return "p2pkh"
+    if n == 23 and script[:2] == b"\xa9\x14" and script[22] == 0x87:
+        return "p2sh"
+    if n == 35 and script[0] == 0x21 and script[34] == 0xac:
+        return "p2pk"
+    if n and script[0] == 0x6a:
+        return "op_return"
+    return classify_script(script).type  # multisig, witness_unknown, nonstandard
+
+
+def timed(label, fn, scripts, baseline=None, runs=3):
+    elapsed = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn(scripts)
+        elapsed = min(elapsed, time.perf_counter() - start)
+    rate = len(scripts) / elapsed
+    speedup = f"{rate / baseline:.1f}x" if baseline else ""
+    print(f"  {label:<34}{elapsed:>9.3f}{rate:>14,.0f}{speedup:>9}")
+    return result, rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="script classifier benchmark")
+    parser.add_argument("--outputs", type=int, default=1_000_000, help="scripts to classify")
+    parser.add_argument("--distinct", type=int, default=0, help="different scripts among them (0: all)")
+    args = parser.parse_args()
+
+    scripts = sample_scripts(args.outputs, args.distinct)
+    distinct = args.distinct or len(scripts)
+
+    print("=" * 70)
+    print(f"SCRIPT CLASSIFIER BENCHMARK ({len(scripts):,} outputs, {distinct:,} distinct)")
+    print("=" * 70)
+    print(f"  {'Method':<34}{'Time (s)':>9}{'Scripts/s':>14}{'Speedup':>9}")
+    chain, base = timed("if/elif byte checks", lambda s: [if_chain_type(x) for x in s], scripts)
+    single, _ = timed("classify_script() per output", lambda s: [classify_script(x).type for x in s],
+                      scripts, base)
+    batch, _ = timed("classify_types() batch", classify_types, scripts, base)
+
+    print(f"\n  Results agree: {chain == single == batch}")
+    edge_scripts = [script for script, _ in EDGE_CASES]
+    expected = [name for _, name in EDGE_CASES]
+    failures = [(script.hex(), name, got) for script, name, got in zip(edge_scripts, expected, classify_types(edge_scripts))
+                if got != name or classify_script(script).type != name or if_chain_type(script) != name]
+    print(f"  Edge cases as expected: {len(EDGE_CASES) - len(failures)}/{len(EDGE_CASES)}")
+    for script_hex, name, got in failures:
+        print(f"    {script_hex[:24]}...  expected {name}, got {got}")
+    print(f"\n  {'Template':<24}{'Count':>10}{'Share':>8}")
+    for name, count in Counter(batch).most_common():
+        print(f"  {name:<24}{count:>10,}{count / len(batch):>8.1%}")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
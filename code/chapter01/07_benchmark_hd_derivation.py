@@ -0,0 +1,137 @@
+"""
+Chapter 1 - Example 7: Benchmark HD Address Derivation
+
+This script derives BIP44 / BIP84 / BIP86 addresses with tools/hd_wallet.py:
+- Checks the BIP32 test vector 1 chain and the first address of the BIP44,
+  BIP84 and BIP86 test vectors ("abandon ... about" mnemonic)
+- Derives a range of BIP86 receive addresses four ways and reports
+  addresses per second:
+    bitcoin-utils HDWallet   the full path from the xprv for every address
+    full path, no cache      the same walk with tools/hd_wallet.py
+    HDWallet, LRU cache      the account branch comes from the cache, one
+                             child derivation per address
+    account xpub             watch-only, public derivation
+- Checks that all methods give the same addresses, and shows the throughput
+  per output type and for scriptPubKeys only (what a gap-limit scan needs)
+
+--naive sets how many addresses the slow bitcoin-utils walk derives.
+
+Usage: python3 07_benchmark_hd_derivation.py [--count N] [--naive N]
+"""
+
+import argparse
+import time
+
+from bitcoinutils.setup import setup
+from bitcoinutils.hdwallet import HDWallet as ReferenceWallet
+
+from tools.hd_wallet import (
+    P2PKH, P2TR, P2WPKH, PURPOSES, ExtendedKey, HDWallet, format_path, xpub_addresses,
+    xpub_script_pubkeys,
+)
+
+MNEMONIC = "abandon " * 11 + "about"
+
+BIP32_VECTOR = (
+    "000102030405060708090a0b0c0d0e0f",
+    "m/0'/1/2'/2/1000000000",
+    "xpub6H1LXWLaKsWFhvm6RVpEL9P4KfRZSW7abD2ttkWP3SSQvnyA8FSVqNTEcYFgJS2UaFcxupHiYkro49S8yGasTvXEYBVPamhGW6cFJodrTHy",
+    "xprvA41z7zogVVwxVSgdKUHDy1SKmdb533PjDz7J6N6mV6uS3ze1ai8FHa8kmHScGpWmj4WggLyQjgPie1rFSruoUihUZREPSL39UNdE3BBDu76",
+)
+
+# first receive address of the "abandon ... about" wallet (BIP44, BIP84, BIP86 test vectors)
+FIRST_ADDRESSES = {
+    44: "1LqBGSKuX5yYUonjxT5qGfpUsXKYYWeabA",
+    84: "bc1qcr8te4kr609gcawutmrza0j4xv80jy8z306fyu",
+    86: "bc1p5cyxnuxmeuwuvkwfem96lqzszd02n6xdcjrs20cac6yqjjwudpxqkedrcr",
+}
+
+
+def check_vectors(wallet):
+    seed, path, xpub, xprv = BIP32_VECTOR
+    node = ExtendedKey.from_seed(bytes.fromhex(seed)).derive(path)
+    print(f"  BIP32 vector 1 {path}: {node.xpub() == xpub and node.xprv() == xprv}")
+    for purpose, expected in FIRST_ADDRESSES.items():
+        address = wallet.addresses(purpose, 0, 1)[0]
+        print(f"  BIP{purpose} m/{purpose}'/0'/0'/0/0 {address}: {address == expected}")
+
+
+def reference_addresses(xprv, prefix, count):
+    """bitcoin-utils: derive the whole path from the root for every address"""
+    addresses = []
+    for index in range(count):
+        key = ReferenceWallet.from_xprivate_key(xprv, f"{prefix}/{index}").get_private_key()
+        addresses.append(key.get_public_key().get_taproot_address().to_string())
+    return addresses
+
+
+def full_path_addresses(root, prefix, count):
+    return [root.derive(f"{prefix}/{index}").address(P2TR) for index in range(count)]
+
+
+def timed(run):
+    start = time.perf_counter()
+    result = run()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HD address derivation benchmark")
+    parser.add_argument("--count", type=int, default=1000, help="addresses per method")
+    parser.add_argument("--naive", type=int, default=20, help="addresses for the bitcoin-utils walk")
+    args = parser.parse_args()
+
+    setup('mainnet')
+    wallet = HDWallet.from_mnemonic(MNEMONIC)
+    xprv = wallet.root.xprv()
+    prefix = "m/86'/0'/0'/0"
+
+    print("=" * 70)
+    print("HD ADDRESS DERIVATION BENCHMARK")
+    print("=" * 70)
+    print("\n1. Test vectors")
+    check_vectors(wallet)
+
+    print(f"\n2. BIP86 receive addresses {prefix}/0..{args.count - 1}")
+    naive_count = min(args.naive, args.count)
+    reference, naive_time = timed(lambda: reference_addresses(xprv, prefix, naive_count))
+    full, full_time = timed(lambda: full_path_addresses(ExtendedKey.parse(xprv), prefix, args.count))
+    wallet.cache_clear()
+    cached, cached_time = timed(lambda: wallet.addresses(86, 0, args.count))
+    derivations = wallet.derivations
+    xpub = wallet.account_xpub(86)
+    watch_only, xpub_time = timed(lambda: xpub_addresses(xpub, P2TR, 0, args.count))
+    rows = [
+        (f"bitcoin-utils HDWallet ({naive_count})", naive_count, naive_time, 5),
+        ("full path, no cache", args.count, full_time, 5),
+        ("HDWallet, LRU cache", args.count, cached_time, derivations / args.count),
+        ("account xpub (watch-only)", args.count, xpub_time, 1),
+    ]
+    print(f"  {'Method':<34}{'addr/s':>10}{'derivations/addr':>19}{'speedup':>9}")
+    base_rate = naive_count / naive_time
+    for name, count, elapsed, per_address in rows:
+        rate = count / elapsed
+        print(f"  {name:<34}{rate:>10,.0f}{per_address:>19.3f}{rate / base_rate:>8.0f}x")
+    print(f"  Same addresses: {reference == cached[:naive_count] and full == cached == watch_only}")
+    print(f"  Cache: {wallet.hits} hits, {wallet.misses} misses for {args.count} addresses")
+
+    print(f"\n3. Per output type ({args.count} receive addresses each, warm cache)")
+    print(f"  {'Path':<22}{'Type':<9}{'addresses/s':>13}{'scriptPubKeys/s':>17}{'xpub spk/s':>12}")
+    for purpose, kind in PURPOSES.items():
+        wallet.addresses(purpose, 0, 1)
+        _, address_time = timed(lambda: wallet.addresses(purpose, 0, args.count))
+        _, spk_time = timed(lambda: wallet.script_pubkeys(purpose, 0, args.count))
+        account = wallet.account_xpub(purpose)
+        xpub_script_pubkeys(account, kind, 0, 1)
+        _, xpub_spk_time = timed(lambda: xpub_script_pubkeys(account, kind, 0, args.count))
+        path = format_path(wallet.account_path(purpose)) + "/i"
+        print(f"  {path:<22}{kind:<9}{args.count / address_time:>13,.0f}"
+              f"{args.count / spk_time:>17,.0f}{args.count / xpub_spk_time:>12,.0f}")
+
+    print("\n  P2TR costs two point multiplications per address (key and BIP86 tweak),")
+    print(f"  {P2WPKH} and {P2PKH} one plus HASH160.")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,2 @@
+# Tools package for Chapter 1
+# This package contains a scriptPubKey / witness template classifier and a BIP32 HD wallet
@@ -0,0 +1,512 @@
+#!/usr/bin/env python3
+"""
+HD Wallet: BIP32 Derivation with the BIP44 / BIP84 / BIP86 Paths
+
+The book's scripts use fixed WIF keys for Alice and Bob. As chapter 12
+notes, in practice those keys come from BIP32: one seed, a tree of
+extended keys, and a standard path per output type:
+
+    BIP44   m/44'/coin'/account'/change/index   P2PKH   (1..., m/n...)
+    BIP84   m/84'/coin'/account'/change/index   P2WPKH  (bc1q..., tb1q...)
+    BIP86   m/86'/coin'/account'/change/index   P2TR    (bc1p..., tb1p...)
+
+coin is 0 on mainnet and 1 on testnet / regtest.
+
+Addresses are derived in ranges under one account and change branch. The
+first four levels are the same for every address, so HDWallet keeps derived
+nodes in an LRU cache keyed by their path prefix. Deriving index i then
+finds m/86'/0'/0'/0 in the cache and costs one child derivation: an
+HMAC-SHA512 and one point multiplication (plus the BIP86 tweak for P2TR).
+Derived without the cache, each address repeats the whole path.
+
+Watch-only wallets only have the account xpub. xpub_script_pubkeys() and
+xpub_addresses() derive ranges from it with public derivation; the change
+branch node is cached per xpub, so a gap-limit scanner asking for window
+after window pays only for the new indexes.
+
+The curve arithmetic uses Jacobian points from the `ecdsa` package (already
+pulled in by bitcoin-utils), like chapter 11's MuSig2 module.
+"""
+
+import hashlib
+import hmac
+import struct
+import unicodedata
+from collections import OrderedDict
+from functools import lru_cache
+
+import base58
+from ecdsa import SECP256k1
+from ecdsa.ellipticcurve import PointJacobi
+
+G = SECP256k1.generator
+n = SECP256k1.order
+p = SECP256k1.curve.p()
+
+HARDENED = 0x80000000
+NODE_CACHE_SIZE = 1024
+
+P2PKH = "p2pkh"
+P2WPKH = "p2wpkh"
+P2TR = "p2tr"
+
+# purpose -> output type
+PURPOSES = {44: P2PKH, 84: P2WPKH, 86: P2TR}
+
+# extended key version bytes, base58 prefix per network and key kind
+VERSIONS = {
+    ("mainnet", True): 0x0488ADE4,   # xprv
+    ("mainnet", False): 0x0488B21E,  # xpub
+    ("testnet", True): 0x04358394,   # tprv
+    ("testnet", False): 0x043587CF,  # tpub
+}
+NETWORKS = {version: key for key, version in VERSIONS.items()}
+
+# network -> (P2PKH version byte, WIF version byte, bech32 hrp, BIP44 coin type)
+NETWORK_PARAMS = {
+    "mainnet": (0x00, 0x80, "bc", 0),
+    "testnet": (0x6F, 0xEF, "tb", 1),
+    "regtest": (0x6F, 0xEF, "bcrt", 1),
+}
+
+
+class HDKeyError(Exception):
+    pass
+
+
+# ---------------------------------------------------------------------------
+# Hashes and encodings
+# ---------------------------------------------------------------------------
+
+try:
+    hashlib.new("ripemd160")
+
+    def ripemd160(data):
+        return hashlib.new("ripemd160", data).digest()
+except ValueError:  # OpenSSL 3 without the legacy provider
+    from bitcoinutils.ripemd160 import ripemd160
+
+
+def hash160(data):
+    return ripemd160(hashlib.sha256(data).digest())
+
+
+def tagged_hash(tag, data):
+    """BIP340 Tagged Hash function"""
+    tag_hash = hashlib.sha256(tag.encode()).digest()
+    return hashlib.sha256(tag_hash + tag_hash + data).digest()
+
+
+BECH32_CHARSET = "qpzry9x8gf2tvdw0s3jn54khce6mua7l"
+BECH32_CONST = 1
+BECH32M_CONST = 0x2BC830A3
+
+
+def _bech32_polymod(values):
+    chk = 1
+    for value in values:
+        top = chk >> 25
+        chk = (chk & 0x1FFFFFF) << 5 ^ value
+        for i, gen in enumerate((0x3B6A57B2, 0x26508E6D, 0x1EA119FA, 0x3D4233DD, 0x2A1462B3)):
+            if (top >> i) & 1:
+                chk ^= gen
+    return chk
+
+
+@lru_cache(maxsize=8)
+def _hrp_expand(hrp):
+    return tuple(ord(c) >> 5 for c in hrp) + (0,) + tuple(ord(c) & 31 for c in hrp)
+
+
+def segwit_address(hrp, version, program):
+    """Bech32 (v0) or bech32m (v1+) address of a witness program"""
+    data = [version]
+    acc = bits = 0
+    for byte in program:
+        acc = (acc << 8) | byte
+        bits += 8
+        while bits >= 5:
+            bits -= 5
+            data.append((acc >> bits) & 31)
+    if bits:
+        data.append((acc << (5 - bits)) & 31)
+    const = BECH32_CONST if version == 0 else BECH32M_CONST
+    polymod = _bech32_polymod(_hrp_expand(hrp) + tuple(data) + (0,) * 6) ^ const
+    data += [(polymod >> 5 * (5 - i)) & 31 for i in range(6)]
+    return hrp + "1" + "".join(BECH32_CHARSET[d] for d in data)
+
+
+def decode_segwit_address(hrp, address):
+    """(witness version, program) of a bech32 / bech32m address for hrp"""
+    if address.lower() != address and address.upper() != address:
+        raise HDKeyError("mixed-case address")
+    address = address.lower()
+    pos = address.rfind("1")
+    if address[:pos] != hrp or len(address) > 90 or pos + 7 > len(address) - 1:
+        raise HDKeyError(f"not a segwit address for {hrp!r}")
+    try:
+        data = [BECH32_CHARSET.index(c) for c in address[pos + 1:]]
+    except ValueError:
+        raise HDKeyError("invalid bech32 character") from None
+    version = data[0]
+    const = BECH32_CONST if version == 0 else BECH32M_CONST
+    if _bech32_polymod(_hrp_expand(hrp) + tuple(data)) != const:
+        raise HDKeyError("invalid address checksum")
+    program = bytearray()
+    acc = bits = 0
+    for d in data[1:-6]:
+        acc = (acc << 5) | d
+        bits += 5
+        if bits >= 8:
+            bits -= 8
+            program.append((acc >> bits) & 0xFF)
+    if bits >= 5 or acc & ((1 << bits) - 1):
+        raise HDKeyError("invalid address padding")
+    if version > 16 or not 2 <= len(program) <= 40 or (version == 0 and len(program) not in (20, 32)):
+        raise HDKeyError("invalid witness program")
+    return version, bytes(program)
+
+
+# ---------------------------------------------------------------------------
+# Points and output scripts
+# ---------------------------------------------------------------------------
+
+def ser_p(P):
+    """Compressed SEC encoding of a point"""
+    return (b"\x03" if P.y() & 1 else b"\x02") + P.x().to_bytes(32, "big")
+
+
+def parse_p(data):
+    """Point of a 33-byte compressed public key"""
+    if len(data) != 33 or data[0] not in (2, 3):
+        raise HDKeyError("invalid compressed public key")
+    x = int.from_bytes(data[1:], "big")
+    c = (pow(x, 3, p) + 7) % p
+    y = pow(c, (p + 1) // 4, p)
+    if x >= p or y * y % p != c:
+        raise HDKeyError("public key is not on the curve")
+    if y & 1 != data[0] & 1:
+        y = p - y
+    return PointJacobi(SECP256k1.curve, x, y, 1, n)
+
+
+def taproot_output_key(P):
+    """BIP86 output key: the internal key tweaked with an empty script tree"""
+    px = P.x().to_bytes(32, "big")
+    if P.y() & 1:
+        P = -P
+    Q = P + G * int.from_bytes(tagged_hash("TapTweak", px), "big")
+    return Q.x().to_bytes(32, "big")
+
+
+def script_pubkey(P, kind):
+    """scriptPubKey paying public key point P as a P2PKH, P2WPKH or P2TR output"""
+    if kind == P2TR:
+        return b"\x51\x20" + taproot_output_key(P)
+    h = hash160(ser_p(P))
+    if kind == P2WPKH:
+        return b"\x00\x14" + h
+    if kind == P2PKH:
+        return b"\x76\xa9\x14" + h + b"\x88\xac"
+    raise HDKeyError(f"unknown output type {kind!r}")
+
+
+def script_address(spk, network="mainnet"):
+    """Address of a scriptPubKey built by script_pubkey()"""
+    p2pkh_version, _, hrp, _ = NETWORK_PARAMS[network]
+    if spk[0] == 0x76:
+        return base58.b58encode_check(bytes([p2pkh_version]) + spk[3:23]).decode()
+    return segwit_address(hrp, 0 if spk[0] == 0 else spk[0] - 0x50, spk[2:])
+
+
+# ---------------------------------------------------------------------------
+# Extended keys
+# ---------------------------------------------------------------------------
+
+def parse_path(path):
+    """
+    "m/86'/0'/0'/0/5" -> (0x80000056, 0x80000000, 0x80000000, 0, 5).
+    Hardened steps may be written with ', h or H; a tuple of ints is
+    returned unchanged.
+    """
+    if not isinstance(path, str):
+        return tuple(path)
+    parts = path.strip().split("/")
+    if parts[0] in ("m", "M"):
+        parts = parts[1:]
+    steps = []
+    for part in parts:
+        if not part:
+            continue
+        hardened = part[-1] in "'hH"
+        digits = part[:-1] if hardened else part
+        if not digits.isdigit() or int(digits) >= HARDENED:
+            raise HDKeyError(f"invalid path step {part!r}")
+        steps.append(int(digits) + (HARDENED if hardened else 0))
+    return tuple(steps)
+
+
+def format_path(steps):
+    return "/".join(["m"] + [f"{s - HARDENED}'" if s >= HARDENED else str(s) for s in steps])
+
+
+class ExtendedKey:
+    """
+    A BIP32 node: a private or public key with its chain code.
+
+    The public point (in affine form) and the fingerprint are computed on
+    first use and kept, since every non-hardened child and every child's
+    parent fingerprint need them.
+    """
+
+    __slots__ = ("secret", "chain_code", "depth", "parent_fingerprint", "child_number",
+                 "network", "_point", "_fingerprint")
+
+    def __init__(self, chain_code, secret=None, point=None, depth=0,
+                 parent_fingerprint=b"\x00" * 4, child_number=0, network="mainnet"):
+        if secret is None and point is None:
+            raise HDKeyError("an extended key needs a private or a public key")
+        self.secret = secret
+        self.chain_code = chain_code
+        self.depth = depth
+        self.parent_fingerprint = parent_fingerprint
+        self.child_number = child_number
+        self.network = network
+        self._point = point
+        self._fingerprint = None
+
+    @classmethod
+    def from_seed(cls, seed, network="mainnet"):
+        """Master key of a 16-64 byte seed"""
+        if not 16 <= len(seed) <= 64:
+            raise HDKeyError("seed must be 16 to 64 bytes")
+        digest = hmac.new(b"Bitcoin seed", seed, hashlib.sha512).digest()
+        secret = int.from_bytes(digest[:32], "big")
+        if not 0 < secret < n:
+            raise HDKeyError("seed gives an invalid master key")
+        return cls(digest[32:], secret, network=network)
+
+    @classmethod
+    def parse(cls, xkey):
+        """Decode an xprv / xpub / tprv / tpub string"""
+        data = base58.b58decode_check(xkey)
+        if len(data) != 78:
+            raise HDKeyError("extended key must be 78 bytes")
+        version, depth = struct.unpack_from(">IB", data)
+        if version not in NETWORKS:
+            raise HDKeyError(f"unknown extended key version {version:08x}")
+        network, private = NETWORKS[version]
+        fingerprint, child_number = data[5:9], struct.unpack_from(">I", data, 9)[0]
+        if depth == 0 and (fingerprint != b"\x00" * 4 or child_number):
+            raise HDKeyError("master key with a parent fingerprint or child number")
+        chain_code, key = data[13:45], data[45:]
+        if private:
+            secret = int.from_bytes(key[1:], "big")
+            if key[0] != 0 or not 0 < secret < n:
+                raise HDKeyError("invalid private key")
+            return cls(chain_code, secret, None, depth, fingerprint, child_number, network)
+        return cls(chain_code, None, parse_p(key), depth, fingerprint, child_number, network)
+
+    @property
+    def is_private(self):
+        return self.secret is not None
+
+    @property
+    def point(self):
+        if self._point is None:
+            self._point = (G * self.secret).scale()
+        return self._point
+
+    @property
+    def public_key(self):
+        return ser_p(self.point)
+
+    @property
+    def fingerprint(self):
+        if self._fingerprint is None:
+            self._fingerprint = hash160(self.public_key)[:4]
+        return self._fingerprint
+
+    def child(self, index):
+        """CKDpriv / CKDpub: the child at `index` (>= HARDENED for hardened)"""
+        if index >= HARDENED:
+            if self.secret is None:
+                raise HDKeyError("hardened child of a public key")
+            data = b"\x00" + self.secret.to_bytes(32, "big")
+        else:
+            data = self.public_key
+        digest = hmac.new(self.chain_code, data + index.to_bytes(4, "big"), hashlib.sha512).digest()
+        tweak = int.from_bytes(digest[:32], "big")
+        if tweak >= n:
+            raise HDKeyError(f"invalid child {index}, use the next index")
+        if self.secret is not None:
+            secret, point = (self.secret + tweak) % n, None
+            if secret == 0:
+                raise HDKeyError(f"invalid child {index}, use the next index")
+        else:
+            secret, point = None, (G * tweak + self.point).scale()
+        return ExtendedKey(digest[32:], secret, point, self.depth + 1, self.fingerprint,
+                           index, self.network)
+
+    def derive(self, path):
+        node = self
+        for index in parse_path(path):
+            node = node.child(index)
+        return node
+
+    def neuter(self):
+        """The public extended key of this node"""
+        return ExtendedKey(self.chain_code, None, self.point, self.depth, self.parent_fingerprint,
+                           self.child_number, self.network)
+
+    def _serialize(self, private):
+        network = "mainnet" if self.network == "mainnet" else "testnet"
+        key = b"\x00" + self.secret.to_bytes(32, "big") if private else self.public_key
+        data = struct.pack(">IB", VERSIONS[network, private], self.depth) + self.parent_fingerprint
+        return base58.b58encode_check(data + struct.pack(">I", self.child_number)
+                                      + self.chain_code + key).decode()
+
+    def xprv(self):
+        if self.secret is None:
+            raise HDKeyError("public extended key has no xprv")
+        return self._serialize(True)
+
+    def xpub(self):
+        return self._serialize(False)
+
+    def wif(self):
+        """Compressed WIF of the private key, e.g. for bitcoin-utils' PrivateKey()"""
+        if self.secret is None:
+            raise HDKeyError("public extended key has no WIF")
+        version = NETWORK_PARAMS[self.network][1]
+        return base58.b58encode_check(bytes([version]) + self.secret.to_bytes(32, "big")
+                                      + b"\x01").decode()
+
+    def script_pubkey(self, kind):
+        return script_pubkey(self.point, kind)
+
+    def address(self, kind):
+        return script_address(self.script_pubkey(kind), self.network)
+
+    def __repr__(self):
+        kind = "xprv" if self.is_private else "xpub"
+        return f"ExtendedKey({kind}, depth={self.depth}, child={self.child_number:#x})"
+
+
+def seed_from_mnemonic(mnemonic, passphrase=""):
+    """BIP39 seed of a mnemonic (PBKDF2 only; the words are not checked against a wordlist)"""
+    words = unicodedata.normalize("NFKD", " ".join(mnemonic.split()))
+    salt = unicodedata.normalize("NFKD", "mnemonic" + passphrase)
+    return hashlib.pbkdf2_hmac("sha512", words.encode(), salt.encode(), 2048)
+
+
+# ---------------------------------------------------------------------------
+# Wallet with a node cache
+# ---------------------------------------------------------------------------
+
+class HDWallet:
+    """
+    Derivation from one root key, with derived nodes cached by path prefix.
+
+    Args:
+        root: master ExtendedKey, or an xprv / xpub string
+        network: "mainnet", "testnet" or "regtest" (addresses and BIP44 coin
+            type; default: the root key's)
+        cache_size: nodes kept in the LRU cache (0 disables it)
+    """
+
+    def __init__(self, root, network=None, cache_size=NODE_CACHE_SIZE):
+        if isinstance(root, str):
+            root = ExtendedKey.parse(root)
+        self.root = root
+        self.network = network or root.network
+        self.cache_size = cache_size
+        self._nodes = OrderedDict()
+        self.hits = self.misses = self.derivations = 0
+
+    @classmethod
+    def from_seed(cls, seed, network="mainnet", **kwargs):
+        return cls(ExtendedKey.from_seed(seed, network), network, **kwargs)
+
+    @classmethod
+    def from_mnemonic(cls, mnemonic, passphrase="", network="mainnet", **kwargs):
+        return cls.from_seed(seed_from_mnemonic(mnemonic, passphrase), network, **kwargs)
+
+    def node(self, path):
+        """The node at `path` (from the root); it and its parents are cached"""
+        steps = parse_path(path)
+        if not steps:
+            return self.root
+        nodes = self._nodes
+        node = nodes.get(steps)
+        if node is not None:
+            nodes.move_to_end(steps)
+            self.hits += 1
+            return node
+        self.misses += 1
+        node = self.node(steps[:-1]).child(steps[-1])
+        self.derivations += 1
+        if self.cache_size:
+            nodes[steps] = node
+            if len(nodes) > self.cache_size:
+                nodes.popitem(last=False)
+        return node
+
+    def derive_range(self, path, start, count):
+        """
+        Children start .. start+count-1 of the node at `path`, e.g. the
+        receive branch of an account. The children are not cached: each one
+        is a single child derivation.
+        """
+        parent = self.node(path)
+        self.derivations += count
+        return [parent.child(index) for index in range(start, start + count)]
+
+    def account_path(self, purpose, account=0, change=0):
+        coin = NETWORK_PARAMS[self.network][3]
+        return (purpose + HARDENED, coin + HARDENED, account + HARDENED, change)
+
+    def script_pubkeys(self, purpose, start=0, count=20, account=0, change=0):
+        """scriptPubKeys of m/purpose'/coin'/account'/change/start.. (BIP44, 84 or 86)"""
+        kind = PURPOSES[purpose]
+        children = self.derive_range(self.account_path(purpose, account, change), start, count)
+        return [script_pubkey(child.point, kind) for child in children]
+
+    def addresses(self, purpose, start=0, count=20, account=0, change=0):
+        network = self.network
+        return [script_address(spk, network)
+                for spk in self.script_pubkeys(purpose, start, count, account, change)]
+
+    def account_xpub(self, purpose, account=0):
+        """xpub of m/purpose'/coin'/account', for a watch-only wallet"""
+        return self.node(self.account_path(purpose, account)[:3]).xpub()
+
+    def cache_clear(self):
+        self._nodes.clear()
+        self.hits = self.misses = self.derivations = 0
+
+
+# ---------------------------------------------------------------------------
+# Watch-only ranges from an account xpub
+# ---------------------------------------------------------------------------
+
+@lru_cache(maxsize=256)
+def _branch(xpub, change):
+    return ExtendedKey.parse(xpub).child(change)
+
+
+def xpub_script_pubkeys(xpub, kind, start=0, count=20, change=0):
+    """
+    scriptPubKeys of indexes start .. start+count-1 under an account xpub
+    (m/purpose'/coin'/account'), receive branch by default. kind is P2PKH,
+    P2WPKH or P2TR. The branch node is cached per (xpub, change), so
+    successive windows of a gap-limit scan only derive new indexes.
+    """
+    branch = _branch(xpub, change)
+    return [script_pubkey(branch.child(index).point, kind) for index in range(start, start + count)]
+
+
+def xpub_addresses(xpub, kind, start=0, count=20, change=0, network=None):
+    network = network or _branch(xpub, change).network
+    return [script_address(spk, network)
+            for spk in xpub_script_pubkeys(xpub, kind, start, count, change)]
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+Script Template Classifier
+
+Recognizes every scriptPubKey and Taproot leaf template used in this book:
+
+    Output types         P2PK, P2PKH, P2SH, P2WPKH, P2WSH, P2TR, OP_RETURN,
+                         bare multisig, other witness versions
+    Chapter templates    hash lock (ch7-8), CSV + signature (ch3, ch8),
+                         single-key CHECKSIG leaf (ch7-8), CHECKSIGADD
+                         k-of-n (ch8), ord envelope (ch9)
+
+Classification never scans a table of patterns. Every fixed-size template
+is indexed by its length and first byte, so a lookup is one list access,
+then a compare of the second byte and of the few other constant bytes
+(none for P2WPKH, P2WSH and P2TR). Variable-length templates are indexed
+by first byte only, and just the few matchers for that byte run.
+
+classify_script() returns the template and its fields (hash, key, delay, ...).
+classify_types() is the batch path, which returns only template names.
+classify_witness() tells key-path from script-path spends and classifies
+the revealed leaf.
+"""
+
+from collections import namedtuple
+
+ScriptInfo = namedtuple("ScriptInfo", ["type", "data"])
+_new_info = tuple.__new__   # ScriptInfo without its Python-level __new__, for the fixed-size path
+
+P2PK = "p2pk"
+P2PKH = "p2pkh"
+P2SH = "p2sh"
+P2WPKH = "p2wpkh"
+P2WSH = "p2wsh"
+P2TR = "p2tr"
+WITNESS_UNKNOWN = "witness_unknown"
+NULL_DATA = "op_return"
+MULTISIG = "multisig"
+HASHLOCK = "hashlock"
+CHECKSIG = "checksig"
+CSV_CHECKSIG = "csv_checksig"
+CSV_P2PKH = "csv_p2pkh"
+CHECKSIGADD = "checksigadd_multisig"
+ORD_ENVELOPE = "ord_envelope"
+NONSTANDARD = "nonstandard"
+
+OP_0 = 0x00
+OP_PUSHDATA1, OP_PUSHDATA2, OP_PUSHDATA4 = 0x4c, 0x4d, 0x4e
+OP_1, OP_16 = 0x51, 0x60
+OP_IF, OP_ENDIF = 0x63, 0x68
+OP_DROP, OP_DUP = 0x75, 0x76
+OP_EQUAL, OP_EQUALVERIFY = 0x87, 0x88
+OP_NUMEQUAL = 0x9c
+OP_HASH160 = 0xa9
+OP_CHECKSIG, OP_CHECKMULTISIG = 0xac, 0xae
+OP_CHECKSEQUENCEVERIFY = 0xb2
+OP_CHECKSIGADD = 0xba
+OP_RETURN = 0x6a
+
+
+# ---------------------------------------------------------------------------
+# Fixed-size templates: length << 8 | first byte -> (names, tail, field)
+# ---------------------------------------------------------------------------
+# Every fixed-size template is constant prefix + data + constant suffix. The
+# list index and names (the type for each allowed second byte, else None)
+# pick the template; tail holds the (offset, byte) pairs of its other
+# constant bytes, or None. Comparing bytes one at a time beats startswith / endswith calls
+# for these few bytes. OP_RETURN outputs up to the standard 83 bytes are
+# entered once per length, so they take this path too.
+
+_FIXED_MAX_LENGTH = 83
+_NO_TEMPLATE = ((None,) * 256, None, None)
+_FIXED = [_NO_TEMPLATE] * ((_FIXED_MAX_LENGTH + 1) << 8)
+
+
+def _fixed(name, length, prefix, suffix, second_bytes=None):
+    field = slice(len(prefix), length - len(suffix))
+    tail = ([(i, b) for i, b in enumerate(prefix) if i > 1]
+            + [(length - len(suffix) + i, b) for i, b in enumerate(suffix)])
+    allowed = set([prefix[1]] if second_bytes is None else second_bytes)
+    names = tuple(name if b in allowed else None for b in range(256))
+    _FIXED[length << 8 | prefix[0]] = (names, tuple(tail) or None, field)
+
+
+_fixed(P2PKH, 25, b"\x76\xa9\x14", b"\x88\xac")
+_fixed(P2SH, 23, b"\xa9\x14", b"\x87")
+_fixed(P2WPKH, 22, b"\x00\x14", b"")
+_fixed(P2WSH, 34, b"\x00\x20", b"")
+_fixed(P2TR, 34, b"\x51\x20", b"")
+_fixed(P2PK, 35, b"\x21", b"\xac", second_bytes=(2, 3))
+_fixed(P2PK, 67, b"\x41\x04", b"\xac")
+_fixed(CHECKSIG, 34, b"\x20", b"\xac", second_bytes=range(256))
+# OP_SHA256 <32-byte hash> OP_EQUALVERIFY OP_TRUE (chapters 7-8) / ... OP_EQUAL
+_fixed(HASHLOCK, 36, b"\xa8\x20", b"\x88\x51")
+_fixed(HASHLOCK, 35, b"\xa8\x20", b"\x87")
+for _length in range(2, _FIXED_MAX_LENGTH + 1):
+    _fixed(NULL_DATA, _length, bytes([OP_RETURN]), b"", second_bytes=range(256))
+
+
+# ---------------------------------------------------------------------------
+# Variable-length templates, matched on decoded instructions
+# ---------------------------------------------------------------------------
+
+def _decode(script):
+    """[(opcode, push data or None)], or None if a push runs past the end"""
+    ops = []
+    i, end = 0, len(script)
+    while i < end:
+        op = script[i]
+        i += 1
+        if op <= OP_PUSHDATA4:
+            if op < OP_PUSHDATA1:
+                size = op
+            elif op == OP_PUSHDATA1:
+                if i + 1 > end:
+                    return None
+                size = script[i]
+                i += 1
+            elif op == OP_PUSHDATA2:
+                if i + 2 > end:
+                    return None
+                size = int.from_bytes(script[i:i + 2], "little")
+                i += 2
+            else:
+                if i + 4 > end:
+                    return None
+                size = int.from_bytes(script[i:i + 4], "little")
+                i += 4
+            if i + size > end:
+                return None
+            ops.append((op, script[i:i + size]))
+            i += size
+        else:
+            ops.append((op, None))
+    return ops
+
+
+def _small_int(op, data):
+    """Value of a number push (OP_0..OP_16 or up to 4 minimal bytes), else None"""
+    if op == OP_0:
+        return 0
+    if OP_1 <= op <= OP_16:
+        return op - 0x50
+    if data is None or not 1 <= len(data) <= 4 or data[-1] & 0x80:
+        return None
+    return int.from_bytes(data, "little")
+
+
+def _is_key(data, sizes=(32,)):
+    return data is not None and len(data) in sizes
+
+
+def _match_csv(ops):
+    # <delay> OP_CSV OP_DROP <key> OP_CHECKSIG             (chapter 8, tapscript)
+    # <delay> OP_CSV OP_DROP OP_DUP OP_HASH160 <h> ...      (chapter 3, P2SH)
+    if len(ops) < 5 or ops[1][0] != OP_CHECKSEQUENCEVERIFY or ops[2][0] != OP_DROP:
+        return None
+    delay = _small_int(*ops[0])
+    if delay is None:
+        return None
+    if len(ops) == 5 and ops[4][0] == OP_CHECKSIG and _is_key(ops[3][1], (32, 33)):
+        return ScriptInfo(CSV_CHECKSIG, (delay, ops[3][1]))
+    if ([op for op, _ in ops[3:]] == [OP_DUP, OP_HASH160, 20, OP_EQUALVERIFY, OP_CHECKSIG]
+            and _is_key(ops[5][1], (20,))):
+        return ScriptInfo(CSV_P2PKH, (delay, ops[5][1]))
+    return None
+
+
+def _match_checksigadd(ops):
+    # OP_0 <k1> OP_CHECKSIGADD ... <kn> OP_CHECKSIGADD <m> OP_EQUAL   (chapter 8)
+    # <k1> OP_CHECKSIG <k2> OP_CHECKSIGADD ... <m> OP_NUMEQUAL        (BIP342 style)
+    if len(ops) < 4 or ops[-1][0] not in (OP_EQUAL, OP_NUMEQUAL):
+        return None
+    body = ops[1:-2] if ops[0][0] == OP_0 else ops[:-2]
+    if not body or len(body) % 2:
+        return None
+    keys = []
+    for j in range(0, len(body), 2):
+        key, op = body[j][1], body[j + 1][0]
+        expected = OP_CHECKSIG if j == 0 and ops[0][0] != OP_0 else OP_CHECKSIGADD
+        if op != expected or not _is_key(key):
+            return None
+        keys.append(key)
+    k = _small_int(*ops[-2])
+    if k is None or not 1 <= k <= len(keys):
+        return None
+    return ScriptInfo(CHECKSIGADD, (k, tuple(keys)))
+
+
+def _match_envelope(ops):
+    # <key> OP_CHECKSIG OP_0 OP_IF "ord" OP_1 <content type> OP_0 <body...> OP_ENDIF
+    if (len(ops) < 6 or not _is_key(ops[0][1]) or ops[1][0] != OP_CHECKSIG
+            or ops[2][0] != OP_0 or ops[3][0] != OP_IF or ops[4][1] != b"ord" or ops[-1][0] != OP_ENDIF):
+        return None
+    content_type = None
+    if len(ops) > 7 and ops[5][0] == OP_1:
+        content_type = ops[6][1]
+    return ScriptInfo(ORD_ENVELOPE, (ops[0][1], content_type))
+
+
+def _match_multisig(ops):
+    # OP_m <key>... OP_n OP_CHECKMULTISIG
+    if len(ops) < 4 or ops[-1][0] != OP_CHECKMULTISIG:
+        return None
+    m, n = ops[0][0] - 0x50, ops[-2][0] - 0x50
+    keys = [data for _, data in ops[1:-2]]
+    if not (1 <= m <= n <= 16 and OP_1 <= ops[-2][0] <= OP_16 and len(keys) == n
+            and all(_is_key(key, (33, 65)) for key in keys)):
+        return None
+    return ScriptInfo(MULTISIG, (m, tuple(keys)))
+
+
+_VARIABLE = [()] * 256
+for _first in range(OP_1, OP_16 + 1):
+    _VARIABLE[_first] = (_match_csv, _match_multisig)
+for _first in (1, 2, 3, 4):
+    _VARIABLE[_first] = (_match_csv,)
+_VARIABLE[OP_0] = (_match_checksigadd,)
+_VARIABLE[32] = (_match_envelope, _match_checksigadd)
+
+
+def _classify_slow(script):
+    """Templates the fixed index does not cover (or that failed its byte checks)"""
+    if not script:
+        return _new_info(ScriptInfo, (NONSTANDARD, None))
+    first = script[0]
+    if first == OP_RETURN:
+        return _new_info(ScriptInfo, (NULL_DATA, script[1:]))
+    # Versions 1-16 with a 2-40 byte program. A v0 program that is not 20 or
+    # 32 bytes (those are in the fixed index) is invalid: nonstandard, as in Core
+    if OP_1 <= first <= OP_16 and 4 <= len(script) <= 42 and script[1] + 2 == len(script):
+        return ScriptInfo(WITNESS_UNKNOWN, (first - 0x50, script[2:]))
+    matchers = _VARIABLE[first]
+    if matchers:
+        ops = _decode(script)
+        if ops is not None:
+            for matcher in matchers:
+                info = matcher(ops)
+                if info is not None:
+                    return info
+    return ScriptInfo(NONSTANDARD, None)
+
+
+# ---------------------------------------------------------------------------
+# Public API
+# ---------------------------------------------------------------------------
+
+def classify_script(script):
+    """
+    Classify a scriptPubKey, redeem script, witness script or Taproot leaf.
+
+    Args:
+        script: bytes (or hex string)
+
+    Returns:
+        ScriptInfo(type, data); data is the hash / key / program for output
+        types, (m, keys) for multisig templates, (delay, key or hash160) for
+        CSV templates and (key, content type) for an ord envelope
+    """
+    try:
+        names, tail, field = _FIXED[len(script) << 8 | script[0]]
+        name = names[script[1]]
+    except IndexError:  # under 2 bytes, or longer than any fixed-size template
+        name = None
+    except TypeError:   # script[0] of a hex string is a str
+        if isinstance(script, str):
+            return classify_script(bytes.fromhex(script))
+        raise
+    if name is not None:
+        if tail is None:
+            return _new_info(ScriptInfo, (name, script[field]))
+        for i, value in tail:
+            if script[i] != value:
+                break
+        else:
+            return _new_info(ScriptInfo, (name, script[field]))
+    return _classify_slow(script)
+
+
+def classify_types(scripts):
+    """
+    Batch classification: template names only, for many scripts (bytes).
+    Same result as [classify_script(s).type for s in scripts], without the
+    per-script call and field extraction on the fixed-size path.
+    """
+    fixed = _FIXED
+    slow = _classify_slow
+    types = []
+    append = types.append
+    for script in scripts:
+        try:
+            names, tail, _ = fixed[len(script) << 8 | script[0]]
+            name = names[script[1]]
+        except IndexError:
+            name = None
+        if name is not None:
+            if tail is None:
+                append(name)
+                continue
+            for i, value in tail:
+                if script[i] != value:
+                    break
+            else:
+                append(name)
+                continue
+        append(slow(script).type)
+    return types
+
+
+def classify_witness(witness, script_pubkey, script_sig=b""):
+    """
+    Classify how an input spends its output.
+
+    Args:
+        witness: list of witness items (bytes)
+        script_pubkey: the output being spent (bytes or hex)
+        script_sig: the input's scriptSig, to find a P2SH redeem script
+
+    Returns:
+        (spend type, ScriptInfo of the revealed script or None); spend type
+        is "p2tr_key_path", "p2tr_script_path", "p2wpkh", "p2wsh", "p2sh"
+        or the output type for other spends
+    """
+    output = classify_script(script_pubkey)
+    if output.type == P2SH:
+        ops = _decode(script_sig) if script_sig else None
+        if not ops or ops[-1][1] is None:
+            return P2SH, None
+        redeem = classify_script(ops[-1][1])
+        if redeem.type in (P2WPKH, P2WSH):
+            # P2SH-wrapped segwit: classify what the witness reveals
+            return classify_witness(witness, ops[-1][1])
+        return P2SH, redeem
+    if output.type == P2TR:
+        stack = list(witness)
+        if len(stack) >= 2 and stack[-1][:1] == b"\x50":
+            stack.pop()  # annex
+        if len(stack) == 1:
+            return "p2tr_key_path", None
+        if len(stack) >= 2:
+            return "p2tr_script_path", classify_script(stack[-2])
+        return P2TR, None
+    if output.type == P2WSH and witness:
+        return P2WSH, classify_script(witness[-1])
+    return output.type, None
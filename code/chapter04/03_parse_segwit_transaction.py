@@ -32,9 +32,9 @@ def parse_varint(data, offset):
         return struct.unpack('<Q', data[offset+1:offset+9])[0], offset + 9
 
 
-def parse_segwit_transaction(tx_hex):
-    """Parse a SegWit transaction hex string into components"""
-    tx_bytes = bytes.fromhex(tx_hex)
+def parse_segwit_transaction(tx_data):
+    """Parse a SegWit transaction (hex string or raw bytes) into components"""
+    tx_bytes = bytes.fromhex(tx_data) if isinstance(tx_data, str) else tx_data
     offset = 0
     
     # Version (4 bytes, little-endian)
@@ -159,6 +159,10 @@ def parse_segwit_transaction(tx_hex):
 
 def compare_hardcoded_vs_actual():
     """Compare hardcoded transaction structure with actual parsed transaction"""
+    # Imported here: other chapters load this file by path for
+    # parse_segwit_transaction(), and there `tools` is their own package
+    from tools.tx_serializer import serialize
+
     setup('testnet')
     
     print("=" * 70)
@@ -187,8 +191,10 @@ def compare_hardcoded_vs_actual():
     print("PHASE 1: UNSIGNED TRANSACTION")
     print("=" * 70)
     
-    unsigned_tx = tx.serialize()
-    parsed_unsigned = parse_segwit_transaction(unsigned_tx)
+    # Raw bytes straight from the serializer: no hex round trip
+    unsigned_raw = serialize(tx)
+    unsigned_tx = unsigned_raw.hex()
+    parsed_unsigned = parse_segwit_transaction(unsigned_raw)
     
     print(f"\nGenerated Transaction Hex:")
     print(f"  {unsigned_tx}")
@@ -244,8 +250,9 @@ def compare_hardcoded_vs_actual():
     txin.script_sig = Script([])
     tx.witnesses.append(TxWitnessInput([signature, public_key.to_hex()]))
     
-    signed_tx = tx.serialize()
-    parsed_signed = parse_segwit_transaction(signed_tx)
+    signed_raw = serialize(tx)
+    signed_tx = signed_raw.hex()
+    parsed_signed = parse_segwit_transaction(signed_raw)
     
     print(f"\nGenerated Transaction Hex:")
     print(f"  {signed_tx[:100]}...")
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Chapter 4: Transaction Serializer Benchmark
+Serialize the same bitcoin-utils Transactions two ways and compare:
+
+- bytes.fromhex(tx.serialize()): bitcoin-utils concatenates bytes, hex
+  encodes them, and the hex is decoded again
+- tools/tx_serializer.serialize(tx): exact size first, then one
+  preallocated bytearray filled in place
+
+Transactions: the chapter's 1-input P2WPKH spend, a 100-input P2WPKH
+consolidation, a 1,000-output payout and a 200-input Taproot sweep.
+Reports transactions/s, MB/s and the peak memory one serialization
+allocates (tracemalloc), and checks that both outputs are identical.
+
+Usage: python3 04_benchmark_tx_serializer.py [--rounds N]
+"""
+
+import argparse
+import hashlib
+import time
+import tracemalloc
+
+from bitcoinutils.setup import setup
+from bitcoinutils.keys import PrivateKey, P2wpkhAddress
+from bitcoinutils.script import Script
+from bitcoinutils.transactions import Transaction, TxInput, TxOutput, TxWitnessInput
+
+from tools.tx_serializer import serialize, serialize_into, serialized_size, vsize
+
+# Placeholder witness items with the sizes of real ones
+DER_SIGNATURE = "30440220" + "11" * 32 + "0220" + "22" * 32 + "01"
+SCHNORR_SIGNATURE = "33" * 64
+
+
+def p2wpkh_spend(inputs, outputs):
+    key = PrivateKey('cPeon9fBsW2BxwJTALj3hGzh9vm8C52Uqsce7MzXGS1iFJkPF4AT')
+    pubkey = key.get_public_key().to_hex()
+    to_script = P2wpkhAddress('tb1qckeg66a6jx3xjw5mrpmte5ujjv3cjrajtvm9r4').to_script_pub_key()
+    txins = [TxInput(hashlib.sha256(f"utxo-{i}".encode()).hexdigest(), i % 2) for i in range(inputs)]
+    txouts = [TxOutput(666 + i, to_script) for i in range(outputs)]
+    witnesses = [TxWitnessInput([DER_SIGNATURE, pubkey]) for _ in txins]
+    return Transaction(txins, txouts, has_segwit=True, witnesses=witnesses)
+
+
+def payout(outputs):
+    txouts = []
+    for i in range(outputs):
+        program = hashlib.sha256(f"recipient-{i}".encode()).hexdigest()
+        txouts.append(TxOutput(10000 + i, Script(["OP_1", program])))
+    txin = TxInput(hashlib.sha256(b"treasury").hexdigest(), 0)
+    return Transaction([txin], txouts, has_segwit=True, witnesses=[TxWitnessInput([SCHNORR_SIGNATURE])])
+
+
+def taproot_sweep(inputs):
+    txins = [TxInput(hashlib.sha256(f"taproot-{i}".encode()).hexdigest(), 0) for i in range(inputs)]
+    txout = TxOutput(10 ** 7, Script(["OP_1", "44" * 32]))
+    witnesses = [TxWitnessInput([SCHNORR_SIGNATURE]) for _ in txins]
+    return Transaction(txins, [txout], has_segwit=True, witnesses=witnesses)
+
+
+def measure(run, rounds):
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        run()
+    return (time.perf_counter() - start) / rounds, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="transaction serializer benchmark")
+    parser.add_argument("--rounds", type=int, default=200, help="serializations per measurement")
+    args = parser.parse_args()
+
+    setup('testnet')
+    cases = [
+        ("P2WPKH 1-in 1-out", p2wpkh_spend(1, 1)),
+        ("P2WPKH 100-in 1-out", p2wpkh_spend(100, 1)),
+        ("Payout 1-in 1000-out", payout(1000)),
+        ("Taproot 200-in 1-out", taproot_sweep(200)),
+    ]
+
+    print("=" * 70)
+    print("TRANSACTION SERIALIZER BENCHMARK")
+    print("=" * 70)
+    print(f"\n  {'Transaction':<22}{'Method':<12}{'tx/s':>10}{'MB/s':>8}{'Peak KB':>9}{'Peak/size':>11}")
+    for label, tx in cases:
+        size = serialized_size(tx)
+        rounds = max(5, args.rounds * 200 // size)
+        reference = bytes.fromhex(tx.serialize())
+        ours = serialize(tx)
+        naive_time, naive_peak = measure(lambda: bytes.fromhex(tx.serialize()), rounds)
+        fast_time, fast_peak = measure(lambda: serialize(tx), rounds)
+        for method, elapsed, peak in [("fromhex", naive_time, naive_peak), ("prealloc", fast_time, fast_peak)]:
+            print(f"  {label:<22}{method:<12}{1 / elapsed:>10,.0f}{size / elapsed / 1e6:>8.1f}"
+                  f"{peak / 1e3:>9.1f}{peak / size:>10.1f}x")
+        print(f"  {'':<22}{size:,} bytes, {vsize(tx):,} vB, identical: {ours == reference}, "
+              f"vsize matches: {vsize(tx) == tx.get_vsize()}, {naive_time / fast_time:.1f}x faster")
+
+    print(f"\n  Many transactions into one buffer (serialize_into)")
+    txs = [p2wpkh_spend(2, 2) for _ in range(500)]
+    start = time.perf_counter()
+    sizes = [serialized_size(tx) for tx in txs]
+    block = bytearray(sum(sizes))
+    offset = 0
+    for tx in txs:
+        offset = serialize_into(tx, block, offset)
+    elapsed = time.perf_counter() - start
+    joined = b"".join(bytes.fromhex(tx.serialize()) for tx in txs)
+    print(f"  {len(txs)} transactions, {len(block):,} bytes in {elapsed * 1000:.1f} ms "
+          f"(sizes first, then one bytearray); identical: {block == joined}")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,2 @@
+# Tools package for Chapter 4
+# This package contains a preallocated transaction serializer
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Preallocated Transaction Serializer
+
+bitcoin-utils serializes a Transaction by concatenating bytes piece by piece
+(`data += ...`), then hex-encodes it; the scripts in this book often turn the
+hex back into bytes with bytes.fromhex() right away. Every step copies the
+whole transaction again, and the concatenation is quadratic in its size.
+
+This serializer takes the same Transaction objects the chapter builders
+create and does it in two passes:
+
+1. Size: the exact serialized size, from the lengths alone (witness items
+   are hex strings, so nothing needs decoding). Scripts are converted to
+   bytes through a cache, since change and payout scripts repeat.
+2. Write: one bytearray of that size is allocated and filled with
+   struct.pack_into and slice assignment. Each txid and witness item is
+   decoded straight into its place; nothing is concatenated.
+
+The output is byte-identical to Transaction.to_bytes(), including its
+conventions: the marker and flag whenever has_segwit is set, even before
+any witness is attached, and the raw coinbase scriptSig.
+
+Other chapters load this module by file path, like chapter 8 loads the
+chapter 6 interpreter.
+"""
+
+import hashlib
+import struct
+
+COINBASE_TXID = "0" * 64
+SCRIPT_CACHE_SIZE = 4096
+
+
+def compact_size_len(n):
+    return 1 if n < 0xfd else 3 if n <= 0xffff else 5 if n <= 0xffffffff else 9
+
+
+def write_compact_size(buf, offset, n):
+    """Write a CompactSize into buf at offset; returns the offset after it"""
+    if n < 0xfd:
+        buf[offset] = n
+        return offset + 1
+    if n <= 0xffff:
+        buf[offset] = 0xfd
+        struct.pack_into("<H", buf, offset + 1, n)
+        return offset + 3
+    if n <= 0xffffffff:
+        buf[offset] = 0xfe
+        struct.pack_into("<I", buf, offset + 1, n)
+        return offset + 5
+    buf[offset] = 0xff
+    struct.pack_into("<Q", buf, offset + 1, n)
+    return offset + 9
+
+
+_script_cache = {}
+
+
+def script_bytes(script):
+    """Bytes of a bitcoin-utils Script, cached by its tokens"""
+    try:
+        key = tuple(script.script)
+        cached = _script_cache.get(key)
+    except TypeError:  # unhashable token
+        return script.to_bytes()
+    if cached is None:
+        if len(_script_cache) >= SCRIPT_CACHE_SIZE:
+            _script_cache.clear()
+        cached = _script_cache[key] = script.to_bytes()
+    return cached
+
+
+# ---------------------------------------------------------------------------
+# Size pass and write pass
+# ---------------------------------------------------------------------------
+
+def _script_sig(txin):
+    if txin.txid == COINBASE_TXID:
+        return bytes.fromhex(txin.script_sig.script[0])
+    return script_bytes(txin.script_sig)
+
+
+def sizes(tx, include_witness=None, scripts=None):
+    """
+    (base size, size) of a Transaction without serializing it: the size
+    without marker, flag and witnesses, and the size serialize() writes.
+    Witness items are hex, so their length is half the string's. Pass a
+    list as `scripts` to collect the scriptSig / scriptPubKey bytes for the
+    write pass.
+    """
+    segwit = tx.has_segwit if include_witness is None else include_witness
+    if scripts is None:
+        scripts = []
+    size = 8 + compact_size_len(len(tx.inputs)) + compact_size_len(len(tx.outputs))
+    for txin in tx.inputs:
+        script = _script_sig(txin)
+        scripts.append(script)
+        size += 40 + compact_size_len(len(script)) + len(script)
+    for txout in tx.outputs:
+        script = script_bytes(txout.script_pubkey)
+        scripts.append(script)
+        size += 8 + compact_size_len(len(script)) + len(script)
+    base_size = size
+    if segwit:
+        size += 2
+        for witness in tx.witnesses:
+            size += compact_size_len(len(witness.stack))
+            for item in witness.stack:
+                item_len = len(item) >> 1
+                size += (1 if item_len < 0xfd else compact_size_len(item_len)) + item_len
+    return base_size, size
+
+
+def _write(tx, buf, offset, segwit, scripts):
+    """Write pass; `scripts` are the bytes sizes() collected, inputs first"""
+    pack_into = struct.pack_into
+    fromhex = bytes.fromhex
+    buf[offset:offset + 4] = tx.version
+    offset += 4
+    if segwit:
+        buf[offset:offset + 2] = b"\x00\x01"
+        offset += 2
+    offset = write_compact_size(buf, offset, len(tx.inputs))
+    for txin, script in zip(tx.inputs, scripts):
+        buf[offset:offset + 32] = fromhex(txin.txid)[::-1]
+        pack_into("<I", buf, offset + 32, txin.txout_index)
+        offset += 36
+        length = len(script)
+        if length < 0xfd:
+            buf[offset] = length
+            offset += 1
+        else:
+            offset = write_compact_size(buf, offset, length)
+        buf[offset:offset + length] = script
+        offset += length
+        buf[offset:offset + 4] = txin.sequence
+        offset += 4
+    offset = write_compact_size(buf, offset, len(tx.outputs))
+    for txout, script in zip(tx.outputs, scripts[len(tx.inputs):]):
+        pack_into("<q", buf, offset, txout.amount)
+        offset += 8
+        length = len(script)
+        if length < 0xfd:
+            buf[offset] = length
+            offset += 1
+        else:
+            offset = write_compact_size(buf, offset, length)
+        buf[offset:offset + length] = script
+        offset += length
+    if segwit:
+        for witness in tx.witnesses:
+            offset = write_compact_size(buf, offset, len(witness.stack))
+            for item in witness.stack:
+                length = len(item) >> 1
+                if length < 0xfd:
+                    buf[offset] = length
+                    offset += 1
+                else:
+                    offset = write_compact_size(buf, offset, length)
+                buf[offset:offset + length] = fromhex(item)
+                offset += length
+    buf[offset:offset + 4] = tx.locktime
+    return offset + 4
+
+
+# ---------------------------------------------------------------------------
+# Public API
+# ---------------------------------------------------------------------------
+
+def serialized_size(tx, include_witness=None):
+    return sizes(tx, include_witness)[1]
+
+
+def serialize_into(tx, buf, offset=0, include_witness=None):
+    """
+    Write tx into an existing buffer (bytearray or writable memoryview, e.g.
+    one sized for many transactions); returns the end offset
+    """
+    segwit = tx.has_segwit if include_witness is None else include_witness
+    scripts = []
+    sizes(tx, segwit, scripts)
+    return _write(tx, buf, offset, segwit, scripts)
+
+
+def serialize(tx, include_witness=None):
+    """
+    Raw bytes of a bitcoin-utils Transaction (witnesses follow tx.has_segwit
+    by default). Returns the bytearray it was written into, without a final
+    copy; call bytes() on it if it must be hashable.
+    """
+    segwit = tx.has_segwit if include_witness is None else include_witness
+    scripts = []
+    buf = bytearray(sizes(tx, segwit, scripts)[1])
+    _write(tx, buf, 0, segwit, scripts)
+    return buf
+
+
+def serialize_hex(tx, include_witness=None):
+    return serialize(tx, include_witness).hex()
+
+
+def txid(tx):
+    """TXID (display hex) from the serialization without witnesses"""
+    return hashlib.sha256(hashlib.sha256(serialize(tx, False)).digest()).digest()[::-1].hex()
+
+
+def vsize(tx):
+    base_size, size = sizes(tx)
+    return (3 * base_size + size + 3) // 4
@@ -0,0 +1,115 @@
+"""
+Script Interpreter Benchmark
+
+Runs the book's script shapes through the interpreter and reports scripts
+evaluated per second:
+- P2PKH and 2-of-3 multisig (legacy, chapters 2-3)
+- CSV + P2PKH (legacy, chapter 3)
+- hash lock, CHECKSIGADD 2-of-2 and CSV + CHECKSIG leaves (tapscript, chapters 6-8)
+
+Each script is timed twice: decoded on every run, and decoded once into a
+CompiledScript that is reused. Signature checks go to a stub checker that
+accepts any non-empty signature, so the numbers measure the interpreter
+itself rather than elliptic curve math.
+
+Usage: python3 05_benchmark_script_interpreter.py [--runs N]
+"""
+
+import argparse
+import hashlib
+import time
+
+from tools.script_interpreter import (
+    CompiledScript, SignatureChecker, ExecData, assemble, compile_script, eval_script,
+    execute_witness_script, ripemd160, SIGVERSION_BASE, SIGVERSION_TAPSCRIPT,
+)
+
+
+class AcceptingChecker(SignatureChecker):
+    """Stub: every non-empty signature is valid, every timelock satisfied"""
+
+    def check_ecdsa_signature(self, sig, pubkey, script_code, sigversion):
+        return True
+
+    def check_schnorr_signature(self, sig, pubkey, sigversion, execdata):
+        return True
+
+    def check_locktime(self, locktime):
+        return True
+
+    def check_sequence(self, sequence):
+        return True
+
+
+def book_scripts():
+    """(name, script bytes, witness stack, sigversion) for each script shape"""
+    pubkeys = [bytes([2]) + hashlib.sha256(bytes([i])).digest() for i in range(3)]
+    xonly = [key[1:] for key in pubkeys]
+    der = bytes.fromhex("30440220" + "11" * 32 + "0220" + "22" * 32) + b"\x01"
+    schnorr = b"\x33" * 64
+    pkh = ripemd160(hashlib.sha256(pubkeys[0]).digest()).hex()
+    preimage = b"helloworld"
+
+    p2pkh = assemble(["OP_DUP", "OP_HASH160", pkh, "OP_EQUALVERIFY", "OP_CHECKSIG"])
+    multisig = assemble([2] + [key.hex() for key in pubkeys] + [3, "OP_CHECKMULTISIG"])
+    csv_p2pkh = assemble([3, "OP_CHECKSEQUENCEVERIFY", "OP_DROP",
+                          "OP_DUP", "OP_HASH160", pkh, "OP_EQUALVERIFY", "OP_CHECKSIG"])
+    hashlock = assemble(["OP_SHA256", hashlib.sha256(preimage).hexdigest(), "OP_EQUALVERIFY", "OP_TRUE"])
+    checksigadd = assemble(["OP_0", xonly[0].hex(), "OP_CHECKSIGADD",
+                            xonly[1].hex(), "OP_CHECKSIGADD", "OP_2", "OP_EQUAL"])
+    csv_leaf = assemble([2, "OP_CHECKSEQUENCEVERIFY", "OP_DROP", xonly[1].hex(), "OP_CHECKSIG"])
+
+    return [
+        ("P2PKH (legacy)", p2pkh, [der, pubkeys[0]], SIGVERSION_BASE),
+        ("2-of-3 multisig (legacy)", multisig, [b"", der, der], SIGVERSION_BASE),
+        ("CSV + P2PKH (legacy)", csv_p2pkh, [der, pubkeys[0]], SIGVERSION_BASE),
+        ("Hash lock (tapscript)", hashlock, [preimage], SIGVERSION_TAPSCRIPT),
+        ("CHECKSIGADD 2-of-2 (tapscript)", checksigadd, [schnorr, schnorr], SIGVERSION_TAPSCRIPT),
+        ("CSV + CHECKSIG (tapscript)", csv_leaf, [schnorr], SIGVERSION_TAPSCRIPT),
+    ]
+
+
+def run(script, witness, sigversion, checker, runs, decode_each_time):
+    """Evaluate `script` `runs` times; returns scripts per second"""
+    compiled = compile_script(script)
+    start = time.perf_counter()
+    for _ in range(runs):
+        program = CompiledScript(script) if decode_each_time else compiled
+        if sigversion == SIGVERSION_TAPSCRIPT:
+            execute_witness_script(program, list(witness), checker, sigversion,
+                                   ExecData(validation_weight_left=1000))
+        else:
+            eval_script(program, list(witness), checker, sigversion)
+    return runs / (time.perf_counter() - start)
+
+
+def benchmark_script_interpreter():
+    """Benchmark the interpreter on each script shape"""
+    parser = argparse.ArgumentParser(description="script interpreter benchmark")
+    parser.add_argument("--runs", type=int, default=50000, help="evaluations per script")
+    args = parser.parse_args()
+
+    checker = AcceptingChecker()
+    print("=" * 78)
+    print(f"SCRIPT INTERPRETER BENCHMARK ({args.runs:,} runs per script)")
+    print("=" * 78)
+    print(f"{'Script':<32}{'Ops':>5}{'Decode each run':>17}{'Pre-decoded':>14}{'Speedup':>9}")
+    print(f"{'':<32}{'':>5}{'(scripts/s)':>17}{'(scripts/s)':>14}")
+
+    total_runs = 0
+    total_time = 0.0
+    for name, script, witness, sigversion in book_scripts():
+        cold = run(script, witness, sigversion, checker, args.runs, decode_each_time=True)
+        warm = run(script, witness, sigversion, checker, args.runs, decode_each_time=False)
+        total_runs += args.runs
+        total_time += args.runs / warm
+        print(f"{name:<32}{len(compile_script(script)):>5}{cold:>17,.0f}{warm:>14,.0f}{warm / cold:>8.1f}x")
+
+    print("-" * 78)
+    print(f"Mixed workload (pre-decoded): {total_runs / total_time:,.0f} scripts/s")
+    print(f"Compile cache: {compile_script.cache_info()}")
+    print("=" * 78)
+
+
+if __name__ == "__main__":
+    benchmark_script_interpreter()
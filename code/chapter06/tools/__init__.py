@@ -0,0 +1,2 @@
+# Tools package for Chapter 6
+# This package contains a Script / Tapscript interpreter
@@ -0,0 +1,934 @@
+#!/usr/bin/env python3
+"""
+Bitcoin Script / Tapscript Interpreter
+
+A stack machine for the three script dialects used in this book:
+
+- SIGVERSION_BASE: legacy scripts (P2PKH, bare and P2SH multisig, chapters 2-3)
+- SIGVERSION_WITNESS_V0: P2WPKH / P2WSH (chapter 4)
+- SIGVERSION_TAPSCRIPT: Taproot script-path leaves (chapters 6-8), with
+  OP_CHECKSIGADD, OP_SUCCESSx and the per-signature validation weight budget
+
+Scripts are decoded once by `compile_script()` into a CompiledScript (an
+instruction array plus the facts the executor needs: OP_SUCCESSx present,
+disabled opcodes, non-minimal pushes). Compiled scripts are cached by
+their bytes, so running the same leaf against many witnesses decodes it
+once. `eval_script()` walks the instruction array and dispatches through a
+256-entry table indexed by opcode byte.
+
+Signature and timelock checks are delegated to a SignatureChecker, which
+knows the spending transaction (sighash, nLockTime, nSequence). The base
+class rejects every signature, which is enough for hash locks.
+
+This module has no package-relative imports, so other chapters can load it
+by file path.
+"""
+
+import hashlib
+from functools import lru_cache
+
+try:
+    hashlib.new("ripemd160")
+
+    def ripemd160(data):
+        return hashlib.new("ripemd160", data).digest()
+except ValueError:
+    # OpenSSL 3 builds may ship without RIPEMD-160
+    from bitcoinutils.ripemd160 import ripemd160
+
+SIGVERSION_BASE = 0
+SIGVERSION_WITNESS_V0 = 1
+SIGVERSION_TAPSCRIPT = 3
+
+MAX_SCRIPT_SIZE = 10000
+MAX_SCRIPT_ELEMENT_SIZE = 520
+MAX_OPS_PER_SCRIPT = 201
+MAX_STACK_SIZE = 1000
+MAX_PUBKEYS_PER_MULTISIG = 20
+VALIDATION_WEIGHT_PER_SIGOP_PASSED = 50
+VALIDATION_WEIGHT_OFFSET = 50
+LOCKTIME_THRESHOLD = 500000000
+SEQUENCE_LOCKTIME_DISABLE_FLAG = 1 << 31
+
+# Policy flags (consensus rules are always on)
+VERIFY_NONE = 0
+VERIFY_MINIMALDATA = 1 << 0
+VERIFY_MINIMALIF = 1 << 1  # consensus in tapscript
+VERIFY_NULLFAIL = 1 << 2
+VERIFY_NULLDUMMY = 1 << 3
+VERIFY_DISCOURAGE_UPGRADABLE_NOPS = 1 << 4
+STANDARD_VERIFY_FLAGS = (VERIFY_MINIMALDATA | VERIFY_MINIMALIF | VERIFY_NULLFAIL
+                         | VERIFY_NULLDUMMY | VERIFY_DISCOURAGE_UPGRADABLE_NOPS)
+
+# ---------------------------------------------------------------------------
+# Opcodes
+# ---------------------------------------------------------------------------
+
+OPCODE_NAMES = {
+    0x00: "OP_0", 0x4c: "OP_PUSHDATA1", 0x4d: "OP_PUSHDATA2", 0x4e: "OP_PUSHDATA4",
+    0x4f: "OP_1NEGATE", 0x50: "OP_RESERVED",
+    0x61: "OP_NOP", 0x62: "OP_VER", 0x63: "OP_IF", 0x64: "OP_NOTIF", 0x65: "OP_VERIF",
+    0x66: "OP_VERNOTIF", 0x67: "OP_ELSE", 0x68: "OP_ENDIF", 0x69: "OP_VERIFY", 0x6a: "OP_RETURN",
+    0x6b: "OP_TOALTSTACK", 0x6c: "OP_FROMALTSTACK", 0x6d: "OP_2DROP", 0x6e: "OP_2DUP",
+    0x6f: "OP_3DUP", 0x70: "OP_2OVER", 0x71: "OP_2ROT", 0x72: "OP_2SWAP", 0x73: "OP_IFDUP",
+    0x74: "OP_DEPTH", 0x75: "OP_DROP", 0x76: "OP_DUP", 0x77: "OP_NIP", 0x78: "OP_OVER",
+    0x79: "OP_PICK", 0x7a: "OP_ROLL", 0x7b: "OP_ROT", 0x7c: "OP_SWAP", 0x7d: "OP_TUCK",
+    0x7e: "OP_CAT", 0x7f: "OP_SUBSTR", 0x80: "OP_LEFT", 0x81: "OP_RIGHT", 0x82: "OP_SIZE",
+    0x83: "OP_INVERT", 0x84: "OP_AND", 0x85: "OP_OR", 0x86: "OP_XOR", 0x87: "OP_EQUAL",
+    0x88: "OP_EQUALVERIFY", 0x89: "OP_RESERVED1", 0x8a: "OP_RESERVED2",
+    0x8b: "OP_1ADD", 0x8c: "OP_1SUB", 0x8d: "OP_2MUL", 0x8e: "OP_2DIV", 0x8f: "OP_NEGATE",
+    0x90: "OP_ABS", 0x91: "OP_NOT", 0x92: "OP_0NOTEQUAL", 0x93: "OP_ADD", 0x94: "OP_SUB",
+    0x95: "OP_MUL", 0x96: "OP_DIV", 0x97: "OP_MOD", 0x98: "OP_LSHIFT", 0x99: "OP_RSHIFT",
+    0x9a: "OP_BOOLAND", 0x9b: "OP_BOOLOR", 0x9c: "OP_NUMEQUAL", 0x9d: "OP_NUMEQUALVERIFY",
+    0x9e: "OP_NUMNOTEQUAL", 0x9f: "OP_LESSTHAN", 0xa0: "OP_GREATERTHAN",
+    0xa1: "OP_LESSTHANOREQUAL", 0xa2: "OP_GREATERTHANOREQUAL", 0xa3: "OP_MIN", 0xa4: "OP_MAX",
+    0xa5: "OP_WITHIN", 0xa6: "OP_RIPEMD160", 0xa7: "OP_SHA1", 0xa8: "OP_SHA256",
+    0xa9: "OP_HASH160", 0xaa: "OP_HASH256", 0xab: "OP_CODESEPARATOR", 0xac: "OP_CHECKSIG",
+    0xad: "OP_CHECKSIGVERIFY", 0xae: "OP_CHECKMULTISIG", 0xaf: "OP_CHECKMULTISIGVERIFY",
+    0xb0: "OP_NOP1", 0xb1: "OP_CHECKLOCKTIMEVERIFY", 0xb2: "OP_CHECKSEQUENCEVERIFY",
+    0xb3: "OP_NOP4", 0xb4: "OP_NOP5", 0xb5: "OP_NOP6", 0xb6: "OP_NOP7", 0xb7: "OP_NOP8",
+    0xb8: "OP_NOP9", 0xb9: "OP_NOP10", 0xba: "OP_CHECKSIGADD",
+}
+for _n in range(1, 17):
+    OPCODE_NAMES[0x50 + _n] = f"OP_{_n}"
+OPCODES = {name: op for op, name in OPCODE_NAMES.items()}
+OPCODES.update({"OP_FALSE": 0x00, "OP_TRUE": 0x51, "OP_CLTV": 0xb1, "OP_CSV": 0xb2})
+
+OP_PUSHDATA4 = 0x4e
+OP_16 = 0x60
+OP_IF, OP_NOTIF, OP_VERIF, OP_VERNOTIF, OP_ELSE, OP_ENDIF = 0x63, 0x64, 0x65, 0x66, 0x67, 0x68
+
+# Disabled since 2010 (CVE-2010-5137); fail even in an unexecuted branch
+DISABLED_OPCODES = frozenset([0x7e, 0x7f, 0x80, 0x81, 0x83, 0x84, 0x85, 0x86,
+                              0x8d, 0x8e, 0x95, 0x96, 0x97, 0x98, 0x99])
+
+
+def is_op_success(op):
+    """BIP342 OP_SUCCESSx opcodes"""
+    return (op == 80 or op == 98 or 126 <= op <= 129 or 131 <= op <= 134 or 137 <= op <= 138
+            or 141 <= op <= 142 or 149 <= op <= 153 or 187 <= op <= 254)
+
+
+class ScriptError(Exception):
+    """Raised when a script fails; `code` names the rule (as in Bitcoin Core)."""
+
+    def __init__(self, code, detail=None):
+        self.code = code
+        super().__init__(code if detail is None else f"{code}: {detail}")
+
+
+# ---------------------------------------------------------------------------
+# Numbers and booleans
+# ---------------------------------------------------------------------------
+
+def encode_num(n):
+    """CScriptNum serialization (minimal, little-endian sign-magnitude)"""
+    if n == 0:
+        return b""
+    neg = n < 0
+    value = -n if neg else n
+    out = bytearray()
+    while value:
+        out.append(value & 0xff)
+        value >>= 8
+    if out[-1] & 0x80:
+        out.append(0x80 if neg else 0x00)
+    elif neg:
+        out[-1] |= 0x80
+    return bytes(out)
+
+
+def decode_num(data, max_size=4, minimal=True):
+    """CScriptNum deserialization"""
+    size = len(data)
+    if size > max_size:
+        raise ScriptError("SCRIPT_ERR_UNKNOWN_ERROR", "script number overflow")
+    if size == 0:
+        return 0
+    if minimal and (data[-1] & 0x7f) == 0 and (size == 1 or not data[-2] & 0x80):
+        raise ScriptError("SCRIPT_ERR_UNKNOWN_ERROR", "non-minimally encoded script number")
+    value = int.from_bytes(data, "little")
+    if data[-1] & 0x80:
+        return -(value & ~(0x80 << (8 * (size - 1))))
+    return value
+
+
+def cast_to_bool(data):
+    for i, b in enumerate(data):
+        if b:
+            return not (i == len(data) - 1 and b == 0x80)
+    return False
+
+
+TRUE = b"\x01"
+FALSE = b""
+_SMALL_INTS = {op: encode_num(op - 0x50) for op in range(0x51, 0x61)}
+_SMALL_INTS[0x4f] = encode_num(-1)
+
+
+# ---------------------------------------------------------------------------
+# Decoding
+# ---------------------------------------------------------------------------
+
+def _is_minimal_push(op, data):
+    size = len(data)
+    if size == 0:
+        return op == 0x00
+    if size == 1 and 1 <= data[0] <= 16:
+        return False  # should be OP_1..OP_16
+    if size == 1 and data[0] == 0x81:
+        return False  # should be OP_1NEGATE
+    if size <= 75:
+        return op == size
+    if size <= 255:
+        return op == 0x4c
+    if size <= 65535:
+        return op == 0x4d
+    return True
+
+
+class CompiledScript:
+    """
+    A script decoded into an instruction array.
+
+    Attributes:
+        raw: script bytes
+        ops: tuple of (opcode, push data or None)
+        ends: byte offset just after each instruction (for OP_CODESEPARATOR)
+        bad_at: index of the first undecodable instruction, or None
+        has_success: an OP_SUCCESSx appears before any decode error
+        disabled_at: index of the first disabled opcode, or None
+        nonminimal: indices of pushes that are not minimally encoded
+    """
+
+    __slots__ = ("raw", "ops", "ends", "bad_at", "has_success", "disabled_at", "nonminimal")
+
+    def __init__(self, raw):
+        self.raw = raw
+        ops, ends, nonminimal = [], [], []
+        bad_at = None
+        has_success = False
+        disabled_at = None
+        i, size = 0, len(raw)
+        while i < size:
+            op = raw[i]
+            i += 1
+            data = None
+            if op <= OP_PUSHDATA4:
+                if op < 0x4c:
+                    n = op
+                else:
+                    width = (1, 2, 4)[op - 0x4c]
+                    if i + width > size:
+                        bad_at = len(ops)
+                        break
+                    n = int.from_bytes(raw[i:i + width], "little")
+                    i += width
+                if i + n > size:
+                    bad_at = len(ops)
+                    break
+                data = raw[i:i + n]
+                i += n
+                if not _is_minimal_push(op, data):
+                    nonminimal.append(len(ops))
+            else:
+                if is_op_success(op) and bad_at is None:
+                    has_success = True
+                if op in DISABLED_OPCODES and disabled_at is None:
+                    disabled_at = len(ops)
+            ops.append((op, data))
+            ends.append(i)
+        self.ops = tuple(ops)
+        self.ends = tuple(ends)
+        self.bad_at = bad_at
+        self.has_success = has_success
+        self.disabled_at = disabled_at
+        self.nonminimal = frozenset(nonminimal)
+
+    def __len__(self):
+        return len(self.ops)
+
+    def disassemble(self):
+        """Human-readable form, e.g. 'OP_SHA256 936a... OP_EQUALVERIFY OP_1'"""
+        parts = []
+        for op, data in self.ops:
+            if data is not None and op != 0x00:
+                parts.append(data.hex())
+            else:
+                parts.append(OPCODE_NAMES.get(op, f"OP_UNKNOWN_{op:#04x}"))
+        if self.bad_at is not None:
+            parts.append("[error]")
+        return " ".join(parts)
+
+
+@lru_cache(maxsize=16384)
+def compile_script(raw):
+    """Decode script bytes once; repeated calls return the cached instruction array"""
+    return CompiledScript(bytes(raw))
+
+
+# ---------------------------------------------------------------------------
+# Signature checking
+# ---------------------------------------------------------------------------
+
+class SignatureChecker:
+    """
+    Transaction context for signature and timelock opcodes.
+
+    Subclasses compute sighashes for a concrete spending transaction. This
+    base class fails every check (like Core's BaseSignatureChecker).
+    """
+
+    def check_ecdsa_signature(self, sig, pubkey, script_code, sigversion):
+        return False
+
+    def check_schnorr_signature(self, sig, pubkey, sigversion, execdata):
+        return False
+
+    def check_locktime(self, locktime):
+        return False
+
+    def check_sequence(self, sequence):
+        return False
+
+
+class ExecData:
+    """
+    Per-input execution data for tapscript.
+
+    validation_weight_left starts at (witness size + 50) and drops by 50 for
+    every signature check with a non-empty signature (BIP342).
+    """
+
+    __slots__ = ("tapleaf_hash", "codeseparator_pos", "validation_weight_left", "annex")
+
+    def __init__(self, tapleaf_hash=None, validation_weight_left=None, annex=None):
+        self.tapleaf_hash = tapleaf_hash
+        self.codeseparator_pos = 0xffffffff
+        self.validation_weight_left = validation_weight_left
+        self.annex = annex
+
+
+def is_valid_der_signature(sig):
+    """BIP66 strict DER check (signature includes the trailing hash type byte)"""
+    size = len(sig)
+    if size < 9 or size > 73 or sig[0] != 0x30 or sig[1] != size - 3:
+        return False
+    len_r = sig[3]
+    if 5 + len_r >= size:
+        return False
+    len_s = sig[5 + len_r]
+    if len_r + len_s + 7 != size:
+        return False
+    if sig[2] != 0x02 or len_r == 0 or sig[4] & 0x80:
+        return False
+    if len_r > 1 and sig[4] == 0x00 and not sig[5] & 0x80:
+        return False
+    if sig[len_r + 4] != 0x02 or len_s == 0 or sig[len_r + 6] & 0x80:
+        return False
+    if len_s > 1 and sig[len_r + 6] == 0x00 and not sig[len_r + 7] & 0x80:
+        return False
+    return True
+
+
+def _push_encoding(data):
+    n = len(data)
+    if n < 0x4c:
+        return bytes([n]) + data
+    if n <= 0xff:
+        return b"\x4c" + bytes([n]) + data
+    return b"\x4d" + n.to_bytes(2, "little") + data
+
+
+def find_and_delete(script_code, sig):
+    """Remove every push of `sig` at an instruction boundary (legacy sighash rule)"""
+    if not sig:
+        return script_code
+    pattern = _push_encoding(sig)
+    compiled = compile_script(script_code)
+    out = bytearray()
+    start = 0
+    for end in compiled.ends:
+        if script_code[start:end] != pattern:
+            out += script_code[start:end]
+        start = end
+    out += script_code[start:]
+    return bytes(out)
+
+
+# ---------------------------------------------------------------------------
+# Executor
+# ---------------------------------------------------------------------------
+
+class _State:
+    __slots__ = ("stack", "altstack", "vfexec", "false_count", "checker", "sigversion",
+                 "execdata", "script", "codesep", "flags", "opcount")
+
+
+def _pop(st):
+    try:
+        return st.stack.pop()
+    except IndexError:
+        raise ScriptError("SCRIPT_ERR_INVALID_STACK_OPERATION") from None
+
+
+def _need(st, n):
+    if len(st.stack) < n:
+        raise ScriptError("SCRIPT_ERR_INVALID_STACK_OPERATION")
+
+
+def _num(st, max_size=4):
+    return decode_num(_pop(st), max_size, bool(st.flags & VERIFY_MINIMALDATA))
+
+
+def _bad_opcode(st, op, i):
+    raise ScriptError("SCRIPT_ERR_BAD_OPCODE", OPCODE_NAMES.get(op, f"{op:#04x}"))
+
+
+def _op_small_int(st, op, i):
+    st.stack.append(_SMALL_INTS[op])
+
+
+def _op_nop(st, op, i):
+    pass
+
+
+def _op_upgradable_nop(st, op, i):
+    if st.flags & VERIFY_DISCOURAGE_UPGRADABLE_NOPS:
+        raise ScriptError("SCRIPT_ERR_DISCOURAGE_UPGRADABLE_NOPS")
+
+
+def _op_if(st, op, i):
+    value = False
+    if not st.false_count:
+        if not st.stack:
+            raise ScriptError("SCRIPT_ERR_UNBALANCED_CONDITIONAL")
+        top = st.stack.pop()
+        if st.sigversion == SIGVERSION_TAPSCRIPT or (
+                st.sigversion == SIGVERSION_WITNESS_V0 and st.flags & VERIFY_MINIMALIF):
+            if len(top) > 1 or (len(top) == 1 and top[0] != 1):
+                raise ScriptError("SCRIPT_ERR_MINIMALIF")
+        value = cast_to_bool(top)
+        if op == OP_NOTIF:
+            value = not value
+    st.vfexec.append(value)
+    if not value:
+        st.false_count += 1
+
+
+def _op_else(st, op, i):
+    if not st.vfexec:
+        raise ScriptError("SCRIPT_ERR_UNBALANCED_CONDITIONAL")
+    value = st.vfexec[-1]
+    st.false_count += 1 if value else -1
+    st.vfexec[-1] = not value
+
+
+def _op_endif(st, op, i):
+    if not st.vfexec:
+        raise ScriptError("SCRIPT_ERR_UNBALANCED_CONDITIONAL")
+    if not st.vfexec.pop():
+        st.false_count -= 1
+
+
+def _op_verify(st, op, i):
+    if not cast_to_bool(_pop(st)):
+        raise ScriptError("SCRIPT_ERR_VERIFY")
+
+
+def _op_return(st, op, i):
+    raise ScriptError("SCRIPT_ERR_OP_RETURN")
+
+
+def _op_toaltstack(st, op, i):
+    st.altstack.append(_pop(st))
+
+
+def _op_fromaltstack(st, op, i):
+    if not st.altstack:
+        raise ScriptError("SCRIPT_ERR_INVALID_ALTSTACK_OPERATION")
+    st.stack.append(st.altstack.pop())
+
+
+def _op_2drop(st, op, i):
+    _need(st, 2)
+    del st.stack[-2:]
+
+
+def _op_2dup(st, op, i):
+    _need(st, 2)
+    st.stack.extend(st.stack[-2:])
+
+
+def _op_3dup(st, op, i):
+    _need(st, 3)
+    st.stack.extend(st.stack[-3:])
+
+
+def _op_2over(st, op, i):
+    _need(st, 4)
+    st.stack.extend(st.stack[-4:-2])
+
+
+def _op_2rot(st, op, i):
+    _need(st, 6)
+    s = st.stack
+    s.extend(s[-6:-4])
+    del s[-8:-6]
+
+
+def _op_2swap(st, op, i):
+    _need(st, 4)
+    s = st.stack
+    s[-4:] = s[-2:] + s[-4:-2]
+
+
+def _op_ifdup(st, op, i):
+    _need(st, 1)
+    if cast_to_bool(st.stack[-1]):
+        st.stack.append(st.stack[-1])
+
+
+def _op_depth(st, op, i):
+    st.stack.append(encode_num(len(st.stack)))
+
+
+def _op_drop(st, op, i):
+    _pop(st)
+
+
+def _op_dup(st, op, i):
+    _need(st, 1)
+    st.stack.append(st.stack[-1])
+
+
+def _op_nip(st, op, i):
+    _need(st, 2)
+    del st.stack[-2]
+
+
+def _op_over(st, op, i):
+    _need(st, 2)
+    st.stack.append(st.stack[-2])
+
+
+def _op_pick_roll(st, op, i):
+    n = _num(st)
+    if n < 0 or n >= len(st.stack):
+        raise ScriptError("SCRIPT_ERR_INVALID_STACK_OPERATION")
+    value = st.stack[-n - 1]
+    if op == 0x7a:
+        del st.stack[-n - 1]
+    st.stack.append(value)
+
+
+def _op_rot(st, op, i):
+    _need(st, 3)
+    st.stack.append(st.stack.pop(-3))
+
+
+def _op_swap(st, op, i):
+    _need(st, 2)
+    s = st.stack
+    s[-1], s[-2] = s[-2], s[-1]
+
+
+def _op_tuck(st, op, i):
+    _need(st, 2)
+    st.stack.insert(-2, st.stack[-1])
+
+
+def _op_size(st, op, i):
+    _need(st, 1)
+    st.stack.append(encode_num(len(st.stack[-1])))
+
+
+def _op_equal(st, op, i):
+    _need(st, 2)
+    equal = st.stack.pop() == st.stack.pop()
+    if op == 0x88:
+        if not equal:
+            raise ScriptError("SCRIPT_ERR_EQUALVERIFY")
+    else:
+        st.stack.append(TRUE if equal else FALSE)
+
+
+_UNARY = {
+    0x8b: lambda a: a + 1,
+    0x8c: lambda a: a - 1,
+    0x8f: lambda a: -a,
+    0x90: abs,
+    0x91: lambda a: int(a == 0),
+    0x92: lambda a: int(a != 0),
+}
+
+
+def _op_unary(st, op, i):
+    st.stack.append(encode_num(_UNARY[op](_num(st))))
+
+
+_BINARY = {
+    0x93: lambda a, b: a + b,
+    0x94: lambda a, b: a - b,
+    0x9a: lambda a, b: int(a != 0 and b != 0),
+    0x9b: lambda a, b: int(a != 0 or b != 0),
+    0x9c: lambda a, b: int(a == b),
+    0x9d: lambda a, b: int(a == b),
+    0x9e: lambda a, b: int(a != b),
+    0x9f: lambda a, b: int(a < b),
+    0xa0: lambda a, b: int(a > b),
+    0xa1: lambda a, b: int(a <= b),
+    0xa2: lambda a, b: int(a >= b),
+    0xa3: min,
+    0xa4: max,
+}
+
+
+def _op_binary(st, op, i):
+    _need(st, 2)
+    b = _num(st)
+    a = _num(st)
+    result = _BINARY[op](a, b)
+    if op == 0x9d:
+        if not result:
+            raise ScriptError("SCRIPT_ERR_NUMEQUALVERIFY")
+    else:
+        st.stack.append(encode_num(result))
+
+
+def _op_within(st, op, i):
+    _need(st, 3)
+    upper = _num(st)
+    lower = _num(st)
+    x = _num(st)
+    st.stack.append(TRUE if lower <= x < upper else FALSE)
+
+
+_HASHES = {
+    0xa6: ripemd160,
+    0xa7: lambda d: hashlib.sha1(d).digest(),
+    0xa8: lambda d: hashlib.sha256(d).digest(),
+    0xa9: lambda d: ripemd160(hashlib.sha256(d).digest()),
+    0xaa: lambda d: hashlib.sha256(hashlib.sha256(d).digest()).digest(),
+}
+
+
+def _op_hash(st, op, i):
+    st.stack.append(_HASHES[op](_pop(st)))
+
+
+def _op_codeseparator(st, op, i):
+    if st.sigversion == SIGVERSION_TAPSCRIPT:
+        st.execdata.codeseparator_pos = i
+    else:
+        st.codesep = st.script.ends[i]
+
+
+def _check_ecdsa(st, sig, pubkey, script_code):
+    if sig and not is_valid_der_signature(sig):
+        raise ScriptError("SCRIPT_ERR_SIG_DER")
+    ok = bool(sig) and st.checker.check_ecdsa_signature(sig, pubkey, script_code, st.sigversion)
+    if not ok and sig and st.flags & VERIFY_NULLFAIL:
+        raise ScriptError("SCRIPT_ERR_SIG_NULLFAIL")
+    return ok
+
+
+def _check_schnorr(st, sig, pubkey):
+    """BIP342 EvalChecksigTapscript: returns success, raises on hard failure"""
+    if sig:
+        execdata = st.execdata
+        execdata.validation_weight_left -= VALIDATION_WEIGHT_PER_SIGOP_PASSED
+        if execdata.validation_weight_left < 0:
+            raise ScriptError("SCRIPT_ERR_TAPSCRIPT_VALIDATION_WEIGHT")
+    if not pubkey:
+        raise ScriptError("SCRIPT_ERR_PUBKEYTYPE")
+    if len(pubkey) == 32:
+        if sig and not st.checker.check_schnorr_signature(sig, pubkey, st.sigversion, st.execdata):
+            raise ScriptError("SCRIPT_ERR_SCHNORR_SIG")
+    elif st.flags & VERIFY_DISCOURAGE_UPGRADABLE_NOPS:
+        raise ScriptError("SCRIPT_ERR_DISCOURAGE_UPGRADABLE_PUBKEYTYPE")
+    return bool(sig)
+
+
+def _script_code(st, sig):
+    script_code = st.script.raw[st.codesep:]
+    if st.sigversion == SIGVERSION_BASE:
+        script_code = find_and_delete(script_code, sig)
+    return script_code
+
+
+def _op_checksig(st, op, i):
+    _need(st, 2)
+    pubkey = st.stack.pop()
+    sig = st.stack.pop()
+    if st.sigversion == SIGVERSION_TAPSCRIPT:
+        ok = _check_schnorr(st, sig, pubkey)
+    else:
+        ok = _check_ecdsa(st, sig, pubkey, _script_code(st, sig))
+    if op == 0xad:
+        if not ok:
+            raise ScriptError("SCRIPT_ERR_CHECKSIGVERIFY")
+    else:
+        st.stack.append(TRUE if ok else FALSE)
+
+
+def _op_checksigadd(st, op, i):
+    if st.sigversion != SIGVERSION_TAPSCRIPT:
+        raise ScriptError("SCRIPT_ERR_BAD_OPCODE", "OP_CHECKSIGADD")
+    _need(st, 3)
+    pubkey = st.stack.pop()
+    n = _num(st)
+    sig = st.stack.pop()
+    st.stack.append(encode_num(n + (1 if _check_schnorr(st, sig, pubkey) else 0)))
+
+
+def _op_checkmultisig(st, op, i):
+    if st.sigversion == SIGVERSION_TAPSCRIPT:
+        raise ScriptError("SCRIPT_ERR_TAPSCRIPT_CHECKMULTISIG")
+    stack = st.stack
+    n_keys = _num(st)
+    if n_keys < 0 or n_keys > MAX_PUBKEYS_PER_MULTISIG:
+        raise ScriptError("SCRIPT_ERR_PUBKEY_COUNT")
+    st.opcount += n_keys
+    if st.opcount > MAX_OPS_PER_SCRIPT:
+        raise ScriptError("SCRIPT_ERR_OP_COUNT")
+    _need(st, n_keys)
+    # Slices are bottom-first: the first key (and signature) pushed is checked first
+    pubkeys = stack[len(stack) - n_keys:]
+    del stack[len(stack) - n_keys:]
+    n_sigs = _num(st)
+    if n_sigs < 0 or n_sigs > n_keys:
+        raise ScriptError("SCRIPT_ERR_SIG_COUNT")
+    _need(st, n_sigs)
+    sigs = stack[len(stack) - n_sigs:]
+    del stack[len(stack) - n_sigs:]
+    dummy = _pop(st)  # the historical off-by-one element
+    if dummy and st.flags & VERIFY_NULLDUMMY:
+        raise ScriptError("SCRIPT_ERR_SIG_NULLDUMMY")
+
+    script_code = st.script.raw[st.codesep:]
+    if st.sigversion == SIGVERSION_BASE:
+        for sig in sigs:
+            script_code = find_and_delete(script_code, sig)
+
+    ok = True
+    k = s = 0
+    while ok and s < n_sigs:
+        sig = sigs[s]
+        if sig and not is_valid_der_signature(sig):
+            raise ScriptError("SCRIPT_ERR_SIG_DER")
+        if sig and st.checker.check_ecdsa_signature(sig, pubkeys[k], script_code, st.sigversion):
+            s += 1
+        k += 1
+        if n_sigs - s > n_keys - k:
+            ok = False
+    if not ok and st.flags & VERIFY_NULLFAIL and any(sigs):
+        raise ScriptError("SCRIPT_ERR_SIG_NULLFAIL")
+    if op == 0xaf:
+        if not ok:
+            raise ScriptError("SCRIPT_ERR_CHECKMULTISIGVERIFY")
+    else:
+        stack.append(TRUE if ok else FALSE)
+
+
+def _op_checklocktimeverify(st, op, i):
+    _need(st, 1)
+    locktime = decode_num(st.stack[-1], 5, bool(st.flags & VERIFY_MINIMALDATA))
+    if locktime < 0:
+        raise ScriptError("SCRIPT_ERR_NEGATIVE_LOCKTIME")
+    if not st.checker.check_locktime(locktime):
+        raise ScriptError("SCRIPT_ERR_UNSATISFIED_LOCKTIME")
+
+
+def _op_checksequenceverify(st, op, i):
+    _need(st, 1)
+    sequence = decode_num(st.stack[-1], 5, bool(st.flags & VERIFY_MINIMALDATA))
+    if sequence < 0:
+        raise ScriptError("SCRIPT_ERR_NEGATIVE_LOCKTIME")
+    if sequence & SEQUENCE_LOCKTIME_DISABLE_FLAG:
+        return
+    if not st.checker.check_sequence(sequence):
+        raise ScriptError("SCRIPT_ERR_UNSATISFIED_LOCKTIME")
+
+
+def _build_dispatch_table():
+    table = [_bad_opcode] * 256
+    for op in range(0x4f, 0x61):
+        if op != 0x50:
+            table[op] = _op_small_int
+    table[0x61] = _op_nop
+    table[OP_IF] = table[OP_NOTIF] = _op_if
+    table[OP_ELSE] = _op_else
+    table[OP_ENDIF] = _op_endif
+    table[0x69] = _op_verify
+    table[0x6a] = _op_return
+    table[0x6b] = _op_toaltstack
+    table[0x6c] = _op_fromaltstack
+    table[0x6d] = _op_2drop
+    table[0x6e] = _op_2dup
+    table[0x6f] = _op_3dup
+    table[0x70] = _op_2over
+    table[0x71] = _op_2rot
+    table[0x72] = _op_2swap
+    table[0x73] = _op_ifdup
+    table[0x74] = _op_depth
+    table[0x75] = _op_drop
+    table[0x76] = _op_dup
+    table[0x77] = _op_nip
+    table[0x78] = _op_over
+    table[0x79] = table[0x7a] = _op_pick_roll
+    table[0x7b] = _op_rot
+    table[0x7c] = _op_swap
+    table[0x7d] = _op_tuck
+    table[0x82] = _op_size
+    table[0x87] = table[0x88] = _op_equal
+    for op in _UNARY:
+        table[op] = _op_unary
+    for op in _BINARY:
+        table[op] = _op_binary
+    table[0xa5] = _op_within
+    for op in _HASHES:
+        table[op] = _op_hash
+    table[0xab] = _op_codeseparator
+    table[0xac] = table[0xad] = _op_checksig
+    table[0xae] = table[0xaf] = _op_checkmultisig
+    table[0xb0] = _op_upgradable_nop
+    table[0xb1] = _op_checklocktimeverify
+    table[0xb2] = _op_checksequenceverify
+    for op in range(0xb3, 0xba):
+        table[op] = _op_upgradable_nop
+    table[0xba] = _op_checksigadd
+    return tuple(table)
+
+
+DISPATCH = _build_dispatch_table()
+
+
+def eval_script(script, stack, checker=None, sigversion=SIGVERSION_BASE, execdata=None,
+                flags=STANDARD_VERIFY_FLAGS, trace=None):
+    """
+    Execute a script on `stack` (modified in place).
+
+    Args:
+        script: bytes or a CompiledScript
+        stack: list of bytes, bottom first
+        checker: SignatureChecker for signature / timelock opcodes
+        sigversion: SIGVERSION_BASE, SIGVERSION_WITNESS_V0 or SIGVERSION_TAPSCRIPT
+        execdata: ExecData (required for tapscript signature checks)
+        flags: policy flags (VERIFY_*)
+        trace: optional callable(index, opcode, data, stack) after each instruction
+
+    Raises:
+        ScriptError: if the script fails
+    """
+    compiled = script if isinstance(script, CompiledScript) else compile_script(bytes(script))
+    tapscript = sigversion == SIGVERSION_TAPSCRIPT
+    if not tapscript and len(compiled.raw) > MAX_SCRIPT_SIZE:
+        raise ScriptError("SCRIPT_ERR_SCRIPT_SIZE")
+    if not tapscript and compiled.disabled_at is not None:
+        raise ScriptError("SCRIPT_ERR_DISABLED_OPCODE",
+                          OPCODE_NAMES[compiled.ops[compiled.disabled_at][0]])
+
+    st = _State()
+    st.stack = stack
+    st.altstack = []
+    st.vfexec = []
+    st.false_count = 0
+    st.checker = checker if checker is not None else SignatureChecker()
+    st.sigversion = sigversion
+    st.execdata = execdata
+    st.script = compiled
+    st.codesep = 0
+    st.flags = flags
+    st.opcount = 0
+    minimaldata = flags & VERIFY_MINIMALDATA
+    nonminimal = compiled.nonminimal
+    dispatch = DISPATCH
+    altstack = st.altstack
+
+    for i, (op, data) in enumerate(compiled.ops):
+        if data is not None:
+            if len(data) > MAX_SCRIPT_ELEMENT_SIZE:
+                raise ScriptError("SCRIPT_ERR_PUSH_SIZE")
+            if not st.false_count:
+                if minimaldata and i in nonminimal:
+                    raise ScriptError("SCRIPT_ERR_MINIMALDATA")
+                stack.append(data)
+        else:
+            if not tapscript and op > OP_16:
+                st.opcount += 1
+                if st.opcount > MAX_OPS_PER_SCRIPT:
+                    raise ScriptError("SCRIPT_ERR_OP_COUNT")
+            if op == OP_VERIF or op == OP_VERNOTIF:
+                raise ScriptError("SCRIPT_ERR_BAD_OPCODE", OPCODE_NAMES[op])
+            if not st.false_count or OP_IF <= op <= OP_ENDIF:
+                dispatch[op](st, op, i)
+        if len(stack) + len(altstack) > MAX_STACK_SIZE:
+            raise ScriptError("SCRIPT_ERR_STACK_SIZE")
+        if trace is not None:
+            trace(i, op, data, stack)
+
+    if compiled.bad_at is not None:
+        raise ScriptError("SCRIPT_ERR_BAD_OPCODE", "truncated push")
+    if st.vfexec:
+        raise ScriptError("SCRIPT_ERR_UNBALANCED_CONDITIONAL")
+    return stack
+
+
+# ---------------------------------------------------------------------------
+# Witness script execution (clean stack)
+# ---------------------------------------------------------------------------
+
+def execute_witness_script(script, stack, checker, sigversion, execdata=None,
+                           flags=STANDARD_VERIFY_FLAGS):
+    """
+    Run a P2WSH witness script or a tapscript leaf on its witness stack.
+
+    Applies the rules around the script: OP_SUCCESSx short-circuits a
+    tapscript, initial stack items are limited to 520 bytes, and the script
+    must leave exactly one true element.
+
+    Raises:
+        ScriptError: if the spend is invalid
+    """
+    compiled = script if isinstance(script, CompiledScript) else compile_script(bytes(script))
+    if sigversion == SIGVERSION_TAPSCRIPT:
+        if compiled.has_success:
+            if flags & VERIFY_DISCOURAGE_UPGRADABLE_NOPS:
+                raise ScriptError("SCRIPT_ERR_DISCOURAGE_OP_SUCCESS")
+            return True
+        if compiled.bad_at is not None:
+            raise ScriptError("SCRIPT_ERR_BAD_OPCODE", "truncated push")
+        if len(stack) > MAX_STACK_SIZE:
+            raise ScriptError("SCRIPT_ERR_STACK_SIZE")
+    for item in stack:
+        if len(item) > MAX_SCRIPT_ELEMENT_SIZE:
+            raise ScriptError("SCRIPT_ERR_PUSH_SIZE")
+    eval_script(compiled, stack, checker, sigversion, execdata, flags)
+    if len(stack) != 1:
+        raise ScriptError("SCRIPT_ERR_CLEANSTACK")
+    if not cast_to_bool(stack[-1]):
+        raise ScriptError("SCRIPT_ERR_EVAL_FALSE")
+    return True
+
+
+def assemble(tokens):
+    """
+    Build script bytes from chapter-style tokens, e.g.
+    ['OP_SHA256', '936a...', 'OP_EQUALVERIFY', 'OP_TRUE'].
+    Integers are pushed as script numbers; other strings are hex data.
+    """
+    out = bytearray()
+    for token in tokens:
+        if isinstance(token, int):
+            if token == 0:
+                out.append(0x00)
+            elif token == -1 or 1 <= token <= 16:
+                out.append(0x50 + token if token > 0 else 0x4f)
+            else:
+                out += _push_encoding(encode_num(token))
+        elif token in OPCODES:
+            out.append(OPCODES[token])
+        else:
+            out += _push_encoding(bytes.fromhex(token))
+    return bytes(out)
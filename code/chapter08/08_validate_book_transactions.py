@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Chapter 8: Full Transaction Validation
+Verify that every spend in the book actually satisfies the script it
+unlocks, not just that its TXID matches (07_verify_control_blocks.py).
+
+Transactions checked (fixtures/book_transactions.json):
+- Chapter 2: P2PKH
+- Chapter 3: P2SH 2-of-3 multisig and P2SH CSV
+- Chapter 4: P2WPKH
+- Chapter 5: Taproot key path
+- Chapter 7: hash lock and Bob's signature leaves (dual-leaf tree)
+- Chapter 8: all four leaves and the key path of the four-leaf tree
+
+Each transaction is validated with the outputs it spends (amount and
+scriptPubKey), the inputs spread over a process pool. Then every
+transaction's first output is changed by one satoshi, which must break
+every signature. Rebuild the fixtures from the chapters' scripts with
+--regenerate.
+
+Usage: python3 08_validate_book_transactions.py [--regenerate] [--workers N]
+"""
+
+import argparse
+import io
+import json
+import os
+import struct
+import sys
+import time
+import importlib.util
+from contextlib import redirect_stdout
+
+from tools.tx_validator import Transaction, serialize_output, validate_transactions
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+FIXTURE = os.path.join(script_dir, "fixtures", "book_transactions.json")
+
+
+def import_module_from_file(filepath, module_name):
+    """Import a module from a file path"""
+    spec = importlib.util.spec_from_file_location(module_name, filepath)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def chapter_module(chapter, filename):
+    path = os.path.join(script_dir, "..", chapter, filename)
+    return import_module_from_file(path, f"{chapter}_{filename[:-3]}")
+
+
+def regenerate_fixtures():
+    """Run the chapters' spending scripts and record each tx with the outputs it spends"""
+    from bitcoinutils.setup import setup
+    from bitcoinutils.keys import PrivateKey, P2pkhAddress, P2wpkhAddress, P2trAddress
+
+    setup('testnet')
+    entries = []
+
+    def add(name, chapter, tx_hex, amount, script_pubkey):
+        entries.append({
+            "name": name, "chapter": chapter, "tx": tx_hex,
+            "spent_outputs": [[amount, script_pubkey.to_hex()]],
+        })
+
+    with redirect_stdout(io.StringIO()) as out:
+        chapter_module("chapter02", "01_build_p2pkh_transaction.py").main()
+    signed = next(line.split(": ")[1] for line in out.getvalue().splitlines()
+                  if line.startswith("Signed transaction"))
+    add("P2PKH", 2, signed, 29606, P2pkhAddress("myYHJtG3cyoRseuTwvViGHgP2efAvZkYa4").to_script_pub_key())
+
+    with redirect_stdout(io.StringIO()):
+        multisig = chapter_module("chapter03", "01_create_multisig_p2sh.py").create_multisig_p2sh()[0]
+        csv = chapter_module("chapter03", "03_create_csv_script.py").create_csv_script()[0]
+        multisig_tx = chapter_module("chapter03", "02_spend_multisig_p2sh.py").spend_multisig_p2sh()
+        csv_tx = chapter_module("chapter03", "04_spend_csv_script.py").spend_csv_script()
+    add("P2SH 2-of-3 multisig", 3, multisig_tx, 1600, multisig.to_script_pub_key())
+    # The CSV funding amount is not in the chapter; legacy sighashes do not commit to it
+    add("P2SH CSV", 3, csv_tx, 0, csv.to_script_pub_key())
+
+    with redirect_stdout(io.StringIO()):
+        _, _, segwit_tx = chapter_module("chapter04", "02_create_segwit_transaction.py").create_segwit_transaction()
+        taproot_tx, _ = chapter_module(
+            "chapter05", "02_create_simple_taproot_transaction.py").create_simple_taproot_transaction()
+    add("P2WPKH", 4, segwit_tx, 1000,
+        P2wpkhAddress("tb1qckeg66a6jx3xjw5mrpmte5ujjv3cjrajtvm9r4").to_script_pub_key())
+    sender = PrivateKey("cPeon9fBsW2BxwJTALj3hGzh9vm8C52Uqsce7MzXGS1iFJkPF4AT").get_public_key()
+    add("Taproot key path", 5, taproot_tx.serialize(), 29200, sender.get_taproot_address().to_script_pub_key())
+
+    dual_leaf = P2trAddress("tb1p93c4wxsr87p88jau7vru83zpk6xl0shf5ynmutd9x0gxwau3tngq9a4w3z").to_script_pub_key()
+    with redirect_stdout(io.StringIO()):
+        hash_tx = chapter_module("chapter07", "02_hash_script_path_spending.py").hash_script_path_spending()
+        bob_tx = chapter_module("chapter07", "03_bob_script_path_spending.py").bob_script_path_spending()
+    add("Hash lock leaf (dual-leaf)", 7, hash_tx.serialize(), 1234, dual_leaf)
+    add("Bob's signature leaf (dual-leaf)", 7, bob_tx.serialize(), 1111, dual_leaf)
+
+    four_leaf = P2trAddress("tb1pjfdm902y2adr08qnn4tahxjvp6x5selgmvzx63yfqk2hdey02yvqjcr29q").to_script_pub_key()
+    spends = [
+        ("Hash lock leaf", "02_hashlock_path_spending.py", "hashlock_path_spending", 1200),
+        ("2-of-2 CHECKSIGADD leaf", "03_multisig_path_spending.py", "multisig_path_spending", 1400),
+        ("CSV timelock leaf", "04_csv_timelock_path_spending.py", "csv_timelock_path_spending", 1600),
+        ("Simple signature leaf", "05_simple_sig_path_spending.py", "simple_sig_path_spending", 1800),
+        ("Key path", "06_key_path_spending.py", "key_path_spending", 2000),
+    ]
+    for name, filename, function, amount in spends:
+        module = import_module_from_file(os.path.join(script_dir, filename), function)
+        with redirect_stdout(io.StringIO()):
+            tx = getattr(module, function)()
+        add(f"{name} (four-leaf)", 8, tx.serialize(), amount, four_leaf)
+
+    os.makedirs(os.path.dirname(FIXTURE), exist_ok=True)
+    with open(FIXTURE, "w") as f:
+        json.dump(entries, f, indent=2)
+        f.write("\n")
+    print(f"Wrote fixtures/{os.path.basename(FIXTURE)} ({len(entries)} transactions)")
+
+
+def with_first_output_changed(tx_hex):
+    """Same transaction with one satoshi moved out of the first output"""
+    raw = bytes.fromhex(tx_hex)
+    first = Transaction(raw).outputs[0]
+    old = serialize_output(first)
+    new = struct.pack("<Q", first.amount - 1) + old[8:]
+    return raw.replace(old, new, 1).hex()
+
+
+def validate_book_transactions():
+    """Validate every book transaction, then tampered copies"""
+    parser = argparse.ArgumentParser(description="validate every spend in the book")
+    parser.add_argument("--regenerate", action="store_true", help="rebuild the fixture first")
+    parser.add_argument("--workers", type=int, default=None, help="process pool size (default: CPU count)")
+    args = parser.parse_args()
+    if args.regenerate:
+        regenerate_fixtures()
+
+    with open(FIXTURE) as f:
+        entries = json.load(f)
+    jobs = [(entry["tx"], entry["spent_outputs"]) for entry in entries]
+    inputs = sum(len(Transaction(tx).inputs) for tx, _ in jobs)
+
+    print("=" * 70)
+    print("FULL TRANSACTION VALIDATION")
+    print("=" * 70)
+
+    start = time.perf_counter()
+    results = validate_transactions(jobs, workers=args.workers)
+    elapsed = time.perf_counter() - start
+
+    print(f"\n{'Ch':<4}{'Spend':<36}{'TXID':<20}{'Result'}")
+    for entry, (txid, errors) in zip(entries, results):
+        status = "✅ VALID" if not any(errors) else f"❌ {next(e for e in errors if e)}"
+        print(f"{entry['chapter']:<4}{entry['name']:<36}{txid[:16]}... {status}")
+    valid = sum(not any(errors) for _, errors in results)
+    print(f"\n{valid}/{len(results)} transactions valid, {inputs} inputs in {elapsed * 1000:.0f} ms "
+          f"({inputs / elapsed:,.0f} inputs/s)")
+
+    # ===== Tampered copies =====
+    tampered = [(with_first_output_changed(tx), spent) for tx, spent in jobs]
+    print(f"\nFirst output reduced by 1 sat:")
+    for entry, (_, errors) in zip(entries, validate_transactions(tampered, workers=args.workers)):
+        status = "REJECTED (" + next(e for e in errors if e) + ")" if any(errors) else "ACCEPTED"
+        print(f"  {entry['name']:<36}{status}")
+    print("\nThe hash lock leaves have no signature, so nothing commits to the outputs:")
+    print("anyone who sees the preimage in the mempool can redirect the coins.")
+    print("\n" + "=" * 70)
+
+    return results
+
+
+if __name__ == "__main__":
+    validate_book_transactions()
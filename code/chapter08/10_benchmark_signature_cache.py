@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Chapter 8: Signature Cache Benchmark
+Validate the same transactions several times, the way a node and our own
+audits do, and measure what the signature cache saves.
+
+Runs over the book transactions (fixtures/book_transactions.json):
+1. Mempool acceptance: cold cache, every valid signature is stored
+2. Audit re-run of the chapter 8 spends (the expected_txids of
+   07_verify_control_blocks.py): all signatures from the cache
+3. Block connection: hits are erased, nothing new stored
+4. Audit re-run after the block: the cache no longer has them
+
+Then a synthetic stream of signatures shows how the hit rate of a bounded
+cache depends on its size: random eviction keeps memory fixed.
+
+Usage: python3 10_benchmark_signature_cache.py [--entries N]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+
+from tools.sigcache import SignatureCache, ECDSA, SCHNORR
+from tools.tx_validator import Transaction, validate_transaction
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+FIXTURE = os.path.join(script_dir, "fixtures", "book_transactions.json")
+
+EXPECTED_TXIDS = {
+    '1ba4835fca1c94e7eb0016ce37c6de2545d07d84a97436f8db999f33a6fd6845',
+    '1951a3be0f05df377b1789223f6da66ed39c781aaf39ace0bf98c3beb7e604a1',
+    '98361ab2c19aa0063f7572cfd0f66cb890b403d2dd12029426613b40d17f41ee',
+    '1af46d4c71e121783c3c7195f4b45025a1f38b73fc8898d2546fc33b4c6c71b9',
+    '1e518aa540bc770df549ec9836d89783ca19fc79b84e7407a882cbe9e95600da',
+}
+
+
+def run(label, jobs, cache, erase=False):
+    """Validate `jobs` through `cache`; print one table row"""
+    cache.reset_stats()
+    start = time.perf_counter()
+    for raw, spent in jobs:
+        ctx, errors = validate_transaction(raw, spent, sigcache=cache, erase_cached=erase)
+        assert not any(errors), errors
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<30}{cache.lookups:>8}{cache.hits:>6}{cache.hit_rate:>9.0%}"
+          f"{elapsed * 1000:>10.1f}{cache.time_saved * 1000:>12.1f}")
+
+
+def eviction_stream(sizes, signatures=10000, window=2000):
+    """
+    Every signature is checked twice, `window` signatures apart: seen in the
+    mempool, then again in a block, which erases it. Returns the hit rate and
+    evictions per cache size.
+    """
+    always_valid = lambda sighash, pubkey, sig: True
+    stream = [hashlib.sha256(i.to_bytes(4, "little")).digest() for i in range(signatures)]
+    rates = {}
+    for size in sizes:
+        cache = SignatureCache(size, seed=1)
+        for i in range(signatures + window):
+            if i < signatures:
+                cache.verify(SCHNORR, stream[i], b"", b"", always_valid)
+            if i >= window:
+                cache.verify(SCHNORR, stream[i - window], b"", b"", always_valid, erase=True)
+        # Only the second check of each signature can hit
+        rates[size] = (cache.hits / signatures, cache.evictions)
+    return rates
+
+
+def main():
+    parser = argparse.ArgumentParser(description="signature cache benchmark")
+    parser.add_argument("--entries", type=int, default=1 << 16, help="cache size for the book runs")
+    args = parser.parse_args()
+
+    with open(FIXTURE) as f:
+        entries = json.load(f)
+    jobs = [(entry["tx"], entry["spent_outputs"]) for entry in entries]
+    chapter8 = [job for job in jobs if Transaction(job[0]).txid in EXPECTED_TXIDS]
+    cache = SignatureCache(args.entries)
+
+    print("=" * 70)
+    print(f"SIGNATURE CACHE BENCHMARK ({cache.size:,} entries)")
+    print("=" * 70)
+    print(f"\n  {'Run':<30}{'Lookups':>8}{'Hits':>6}{'Hit rate':>9}{'Time (ms)':>10}{'Saved (ms)':>12}")
+    run("1. mempool acceptance", jobs, cache)
+    run("2. audit: chapter 8 TXIDs", chapter8, cache)
+    run("3. block connection (erase)", jobs, cache, erase=True)
+    run("4. audit after the block", chapter8, cache)
+    for kind, name in ((ECDSA, "ECDSA"), (SCHNORR, "Schnorr")):
+        if cache.verifications[kind]:
+            print(f"\n  Average {name} check: "
+                  f"{cache.verify_seconds[kind] / cache.verifications[kind] * 1000:.2f} ms", end="")
+    print(f"\n  Entries now cached: {len(cache)}")
+
+    sizes = [1 << k for k in range(7, 14)]
+    print(f"\nBounded cache, 10,000 signatures each re-checked 2,000 signatures later:")
+    print(f"  {'Entries':>8}{'Hit rate':>10}{'Evicted':>10}")
+    for size, (rate, evicted) in eviction_stream(sizes).items():
+        print(f"  {size:>8,}{rate:>10.0%}{evicted:>10,}")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Chapter 8: Wide k-of-n Multisig
+Scale Script 1 (2-of-2 OP_CHECKSIGADD) up to treasury-sized policies.
+
+1. Layout choice: one k-of-n CHECKSIGADD leaf vs a MAST of C(n, k) k-of-k
+   leaves, priced by expected witness vbytes for several policies
+2. Tree building: leaves generated lazily, only hashes kept
+3. Spend check: a 3-of-15 is committed in both layouts. The same three
+   signers spend each one, and the transaction validator checks the spend.
+   The measured witness sizes are compared with the model. A fourth
+   signature is then offered as well: both layouts must keep only three.
+
+The internal key is the BIP341 NUMS point, so the key path is disabled.
+
+Usage: python3 11_wide_multisig_tree.py
+"""
+
+import hashlib
+import time
+
+from bitcoinutils.setup import setup
+from bitcoinutils.keys import PrivateKey, P2trAddress
+from bitcoinutils.script import Script
+from bitcoinutils.transactions import Transaction, TxInput, TxOutput, TxWitnessInput
+
+from tools.multisig_tree import MAST, SINGLE_LEAF, MultisigTree, multisig_layout
+from tools.tx_validator import compact_size, validate_transaction
+
+NUMS_KEY = bytes.fromhex("50929b74c1a04954b78b4b6035e97a5e078a5a0f28ec96d547bfee9ace803ac0")
+POLICIES = [(2, 2), (2, 3), (3, 5), (3, 15), (5, 15), (11, 15), (3, 20), (5, 20), (10, 20), (15, 20)]
+
+
+def signer_keys(n):
+    return [PrivateKey(secret_exponent=int.from_bytes(hashlib.sha256(f"signer-{i}".encode()).digest(), "big"))
+            for i in range(n)]
+
+
+def spend(tree, keys, signers, amount=100000):
+    """Sign a script path spend of `tree` with `signers`; return (raw tx, spent outputs, witness)"""
+    spk = tree.script_pubkey()
+    output = P2trAddress('tb1p060z97qusuxe7w6h8z0l9kam5kn76jur22ecel75wjlmnkpxtnls6vdgne')
+    tx = Transaction([TxInput("ab" * 32, 0)], [TxOutput(amount - 2000, output.to_script_pub_key())],
+                     has_segwit=True)
+    leaf = Script.from_raw(tree.leaf_script(tree.leaf_index(signers[:tree.k])).hex())
+    utxo = Script.from_raw(spk.hex())
+    signatures = {
+        i: bytes.fromhex(keys[i].sign_taproot_input(tx, 0, [utxo], [amount], script_path=True,
+                                                    tapleaf_script=leaf, tweak=False))
+        for i in signers
+    }
+    witness = tree.witness(signatures)
+    tx.witnesses.append(TxWitnessInput([item.hex() for item in witness]))
+    return tx.serialize(), [(amount, spk.hex())], witness
+
+
+def main():
+    setup('testnet')
+
+    print("=" * 70)
+    print("WIDE K-OF-N MULTISIG: CHECKSIGADD LEAF VS MAST OF K-OF-K LEAVES")
+    print("=" * 70)
+
+    print(f"\n1. Expected witness vbytes (all signing sets equally likely)")
+    print(f"  {'Policy':<9}{'Leaf vB':>9}{'Leaves':>10}{'Depth':>7}{'MAST vB':>9}   Choice")
+    for k, n in POLICIES:
+        chosen, (single, mast) = multisig_layout(n, k)
+        print(f"  {f'{k}-of-{n}':<9}{single.witness_vbytes:>9.1f}{mast.leaves:>10,}"
+              f"{mast.expected_depth:>7.2f}{mast.witness_vbytes:>9.1f}   {chosen.layout}")
+
+    keys = signer_keys(20)
+    pubkeys = [bytes.fromhex(key.get_public_key().to_x_only_hex()) for key in keys]
+
+    print(f"\n2. Building MAST layouts over 20 keys")
+    print(f"  {'Policy':<9}{'Leaves':>10}{'Build (s)':>11}{'Levels':>8}")
+    for k in (3, 5, 8):
+        start = time.perf_counter()
+        tree = MultisigTree(pubkeys, k, NUMS_KEY, layout=MAST)
+        elapsed = time.perf_counter() - start
+        print(f"  {f'{k}-of-20':<9}{tree.leaf_count:>10,}{elapsed:>11.3f}{len(tree.levels):>8}")
+
+    print(f"\n3. Spending a 3-of-15 with signers 2, 7 and 11")
+    signers = [2, 7, 11]
+    print(f"  {'Layout':<13}{'Leaf':>6}{'Control':>9}{'Witness':>9}{'vB':>8}{'Model vB':>10}   Result")
+    for layout in (SINGLE_LEAF, MAST):
+        tree = MultisigTree(pubkeys[:15], 3, NUMS_KEY, layout=layout)
+        raw, spent, witness = spend(tree, keys, signers)
+        _, errors = validate_transaction(raw, spent)
+        size = len(compact_size(len(witness))) + sum(len(compact_size(len(item))) + len(item)
+                                                      for item in witness)
+        print(f"  {layout:<13}{tree.leaf_index(signers):>6}{len(witness[-1]):>9}{size:>9}"
+              f"{size / 4:>8.2f}{tree.cost.witness_vbytes:>10.2f}   {errors[0] or 'VALID'}")
+    print(f"  The MAST model is an average over all {tree.leaf_count} leaves")
+    extra = signers + [13]
+    results = []
+    for layout in (SINGLE_LEAF, MAST):
+        tree = MultisigTree(pubkeys[:15], 3, NUMS_KEY, layout=layout)
+        raw, spent, witness = spend(tree, keys, extra)
+        _, errors = validate_transaction(raw, spent)
+        results.append(f"{layout} {errors[0] or 'VALID'} ({sum(1 for item in witness[:-2] if item)} signatures)")
+    print(f"  Signed by 2, 7, 11 and 13: {', '.join(results)}")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Chapter 8: Compile Spending Policies to Taproot Trees
+Write the policy, let the compiler choose the leaves and the tree.
+
+1. The four-leaf tree of 01_create_four_leaf_taproot.py from one policy
+   string: the same leaf scripts, tree shape and address
+2. Small policies: which branches become the key path, separate leaves or
+   OP_IF branches inside one leaf
+3. A large treasury policy, compiled cold and then again with the
+   sub-policy memo warm
+
+Usage: python3 12_compile_policy.py
+"""
+
+import hashlib
+import time
+
+from bitcoinutils.setup import setup
+from bitcoinutils.keys import PrivateKey, P2trAddress
+from bitcoinutils.script import Script
+from bitcoinutils.transactions import Sequence
+from bitcoinutils.constants import TYPE_RELATIVE_TIMELOCK
+
+from tools.policy_compiler import NUMS_KEY, candidates, compile_policy, policy_to_string
+
+EXPECTED_ADDRESS = "tb1pjfdm902y2adr08qnn4tahxjvp6x5selgmvzx63yfqk2hdey02yvqjcr29q"
+BOOK_POLICY = "or(pk(alice), sha256(H), multi_a(2, alice, bob), and(older(2), pk(bob)), pk(bob))"
+SMALL_POLICIES = [
+    "or(pk(alice), and(pk(bob), older(2)))",
+    "and(pk(alice), or(pk(bob), sha256(H)))",
+    "or(9@pk(alice), 1@and(pk(bob), or(older(144), sha256(H))))",
+    "thresh(2, pk(alice), pk(bob), sha256(H))",
+]
+
+
+def book_scripts(alice_pub, bob_pub):
+    """The four leaves exactly as 01_create_four_leaf_taproot.py writes them"""
+    hash0 = hashlib.sha256("helloworld".encode('utf-8')).hexdigest()
+    seq = Sequence(TYPE_RELATIVE_TIMELOCK, 2)
+    return [
+        Script(['OP_SHA256', hash0, 'OP_EQUALVERIFY', 'OP_TRUE']),
+        Script(["OP_0", alice_pub.to_x_only_hex(), "OP_CHECKSIGADD", bob_pub.to_x_only_hex(),
+                "OP_CHECKSIGADD", "OP_2", "OP_EQUAL"]),
+        Script([seq.for_script(), "OP_CHECKSEQUENCEVERIFY", "OP_DROP", bob_pub.to_x_only_hex(), "OP_CHECKSIG"]),
+        Script([bob_pub.to_x_only_hex(), "OP_CHECKSIG"]),
+    ]
+
+
+def treasury_policy(names):
+    """Day-to-day key; 3-of-5 board after 6 blocks or with the preimage; recovery keys after longer delays"""
+    for i in range(12):
+        secret = int.from_bytes(hashlib.sha256(f"treasury-{i}".encode()).digest(), "big")
+        names[f"k{i}"] = PrivateKey(secret_exponent=secret).get_public_key().to_x_only_hex()
+    board = ", ".join(f"pk(k{i})" for i in range(1, 6))
+    recovery = ", ".join(f"1@and(pk(k{i}), older({1000 * (i - 5)}))" for i in range(6, 12))
+    return (f"or(90@pk(k0), 8@and(thresh(3, {board}), or(older(6), sha256(H))), "
+            f"{recovery})")
+
+
+def show(compiled, names):
+    key_names = {bytes.fromhex(value): name for name, value in names.items()}
+    key_names[NUMS_KEY] = "NUMS (no key path)"
+    print(f"  Key path: {key_names.get(compiled.internal_key, compiled.internal_key.hex())}"
+          f" (p={compiled.key_path_probability:.2f})")
+    for index, leaf in enumerate(compiled.leaves):
+        print(f"  Leaf {index}: depth {leaf.depth}, p={leaf.probability:.3f}, "
+              f"{leaf.witness_bytes / 4:.1f} vB  {policy_to_string(leaf.policy, names)}")
+    print(f"  Tree: {compiled.tree}")
+    print(f"  Expected witness: {compiled.expected_witness_vbytes:.2f} vB")
+
+
+def main():
+    setup('testnet')
+    alice_pub = PrivateKey("cRxebG1hY6vVgS9CSLNaEbEJaXkpZvc6nFeqqGT7v6gcW7MbzKNT").get_public_key()
+    bob_pub = PrivateKey("cSNdLFDf3wjx1rswNL2jKykbVkC6o56o5nYZi4FUkWKjFn2Q5DSG").get_public_key()
+    names = {
+        "alice": alice_pub.to_x_only_hex(),
+        "bob": bob_pub.to_x_only_hex(),
+        "H": hashlib.sha256(b"helloworld").hexdigest(),
+    }
+
+    print("=" * 70)
+    print("POLICY COMPILER")
+    print("=" * 70)
+
+    print(f"\n1. Chapter 8 tree from a policy")
+    print(f"  {BOOK_POLICY}")
+    compiled = compile_policy(BOOK_POLICY, names, allow_key_reuse=True)
+    show(compiled, names)
+    expected = book_scripts(alice_pub, bob_pub)
+    same_leaves = [leaf.script.hex() for leaf in compiled.leaves] == [script.to_hex() for script in expected]
+    address = P2trAddress(witness_program=compiled.output_key.hex()).to_string()
+    print(f"  Leaf scripts match Scripts 0-3: {same_leaves}")
+    print(f"  Tree shape is [[0, 1], [2, 3]]: {compiled.tree == ((0, 1), (2, 3))}")
+    print(f"  Address: {address}")
+    print(f"  Matches {EXPECTED_ADDRESS[:20]}...: {address == EXPECTED_ADDRESS}")
+
+    print(f"\n2. Small policies")
+    for policy in SMALL_POLICIES:
+        print(f"\n  {policy}")
+        show(compile_policy(policy, names), names)
+
+    print(f"\n3. Treasury policy")
+    policy = treasury_policy(names)
+    print(f"  {policy[:66]}...")
+    candidates.cache_clear()
+    start = time.perf_counter()
+    compiled = compile_policy(policy, names)
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    compile_policy(policy, names)
+    warm = time.perf_counter() - start
+    show(compiled, names)
+    print(f"  Compile: {cold * 1000:.1f} ms cold, {warm * 1000:.1f} ms with the memo warm")
+    print(f"  Sub-policy memo: {candidates.cache_info()}")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
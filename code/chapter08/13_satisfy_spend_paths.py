@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Chapter 8: Pick the Cheapest Spend Path Automatically
+Hand the satisfier the four-leaf tree and whatever secrets you hold; it
+finds every satisfiable path, prices it in vbytes, and builds the witness.
+
+1. The spend paths of the tree, cheapest first
+2. Which path each set of secrets ends up using
+3. The witnesses of 02_ to 06_, rebuilt by the satisfier and compared
+   byte for byte with the on-chain transactions
+   (fixtures/book_transactions.json)
+4. Batch: many UTXOs of the same tree spent in one transaction, with and
+   without the per-tree path cache, checked by the transaction validator
+
+Usage: python3 13_satisfy_spend_paths.py [--utxos N]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+
+from bitcoinutils.setup import setup
+from bitcoinutils.keys import PrivateKey, P2trAddress
+from bitcoinutils.transactions import Transaction as BuilderTransaction, TxInput, TxOutput, TxWitnessInput
+
+from tools.policy_compiler import compile_policy, policy_to_string
+from tools.satisfier import (
+    KEY_PATH, Secrets, cheapest_path, clear_path_caches, satisfy, satisfy_inputs, spend_paths,
+)
+from tools.tx_validator import TransactionContext, validate_transaction
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+FIXTURE = os.path.join(script_dir, "fixtures", "book_transactions.json")
+BOOK_POLICY = "or(pk(alice), sha256(H), multi_a(2, alice, bob), and(older(2), pk(bob)), pk(bob))"
+OUTPUT_ADDRESS = "tb1p060z97qusuxe7w6h8z0l9kam5kn76jur22ecel75wjlmnkpxtnls6vdgne"
+
+# Fixture entry -> the path its chapter 8 script spends
+BOOK_SPENDS = {
+    "Hash lock leaf (four-leaf)": 0,
+    "2-of-2 CHECKSIGADD leaf (four-leaf)": 1,
+    "CSV timelock leaf (four-leaf)": 2,
+    "Simple signature leaf (four-leaf)": 3,
+    "Key path (four-leaf)": KEY_PATH,
+}
+
+
+def describe(path, compiled, names):
+    if path is None:
+        return "none"
+    if path.leaf is KEY_PATH:
+        return "key path"
+    return f"leaf {path.leaf}: {policy_to_string(compiled.leaves[path.leaf].policy, names)}"
+
+
+def batch_spend(compiled, utxos, amount=1000):
+    """Inputs and outputs spending `utxos` outputs of the tree to one address"""
+    inputs = [TxInput(hashlib.sha256(f"utxo-{i}".encode()).hexdigest(), 0) for i in range(utxos)]
+    output = P2trAddress(OUTPUT_ADDRESS).to_script_pub_key()
+    outputs = [TxOutput(amount * utxos - 200 * utxos, output)]
+    return inputs, outputs, [(amount, compiled.script_pubkey().hex())] * utxos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="cheapest spend path satisfier")
+    parser.add_argument("--utxos", type=int, default=40, help="inputs in the batch spend")
+    args = parser.parse_args()
+
+    setup('testnet')
+    alice = PrivateKey("cRxebG1hY6vVgS9CSLNaEbEJaXkpZvc6nFeqqGT7v6gcW7MbzKNT")
+    bob = PrivateKey("cSNdLFDf3wjx1rswNL2jKykbVkC6o56o5nYZi4FUkWKjFn2Q5DSG")
+    alice_secret, bob_secret = alice.key.to_string(), bob.key.to_string()
+    preimage = b"helloworld"
+    names = {
+        "alice": alice.get_public_key().to_x_only_hex(),
+        "bob": bob.get_public_key().to_x_only_hex(),
+        "H": hashlib.sha256(preimage).hexdigest(),
+    }
+    compiled = compile_policy(BOOK_POLICY, names, allow_key_reuse=True)
+
+    print("=" * 70)
+    print("SATISFIER: CHEAPEST SPEND PATH")
+    print("=" * 70)
+
+    print(f"\n1. Spend paths of the four-leaf tree, cheapest first")
+    for path in spend_paths(compiled):
+        print(f"  {path.witness_bytes / 4:>7.2f} vB  {describe(path, compiled, names)}")
+
+    print(f"\n2. Chosen path per set of secrets")
+    cases = [
+        ("alice, bob, preimage", Secrets([alice_secret, bob_secret], [preimage]), 0xfffffffd),
+        ("bob", Secrets([bob_secret]), 0xfffffffd),
+        ("bob, nSequence = 2 blocks", Secrets([bob_secret]), 2),
+        ("preimage", Secrets(preimages=[preimage]), 0xfffffffd),
+        ("wrong preimage", Secrets(preimages=[b"hello"]), 0xfffffffd),
+    ]
+    for label, secrets, sequence in cases:
+        path = cheapest_path(compiled, secrets, sequence)
+        size = f"{path.witness_bytes / 4:.2f} vB" if path else ""
+        print(f"  {label:<28}{size:>10}  {describe(path, compiled, names)}")
+
+    print(f"\n3. Rebuilding the chapter 8 witnesses")
+    everything = Secrets([alice_secret, bob_secret], [preimage])
+    with open(FIXTURE) as f:
+        entries = {entry["name"]: entry for entry in json.load(f)}
+    for name, leaf in BOOK_SPENDS.items():
+        ctx = TransactionContext(entries[name]["tx"], entries[name]["spent_outputs"])
+        book_path = [path for path in spend_paths(compiled) if path.leaf == leaf]
+        _, witness = satisfy(compiled, ctx, 0, everything, paths=book_path)
+        automatic, _ = satisfy(compiled, ctx, 0, everything)
+        print(f"  {name:<38}identical: {witness == ctx.tx.witnesses[0]}   "
+              f"cheapest: {describe(automatic, compiled, names)[:8]}")
+
+    print(f"\n4. Bob spends {args.utxos} UTXOs of the tree in one transaction")
+    bob_only = Secrets([bob_secret])
+    inputs, outputs, spent = batch_spend(compiled, args.utxos)
+    ctx = TransactionContext(BuilderTransaction(inputs, outputs).serialize(), spent)
+    tx_sequence = ctx.tx.inputs[0].sequence
+
+    start = time.perf_counter()
+    for _ in range(args.utxos):
+        clear_path_caches()
+        cheapest_path(compiled, bob_only, tx_sequence)
+    uncached = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(args.utxos):
+        cheapest_path(compiled, bob_only, tx_sequence)
+    cached = time.perf_counter() - start
+    print(f"  Planning: {uncached * 1000:.2f} ms without the path cache, {cached * 1000:.3f} ms with it")
+
+    start = time.perf_counter()
+    results = satisfy_inputs(compiled, ctx, bob_only)
+    signing = time.perf_counter() - start
+    tx = BuilderTransaction(inputs, outputs, has_segwit=True,
+                            witnesses=[TxWitnessInput([item.hex() for item in witness]) for _, witness in results])
+    _, errors = validate_transaction(tx.serialize(), spent)
+    paths = {describe(path, compiled, names) for path, _ in results}
+    print(f"  Witnesses: {signing:.2f} s ({signing / args.utxos * 1000:.1f} ms per input, mostly signing)")
+    print(f"  Path used: {', '.join(paths)}")
+    print(f"  Transaction: {tx.get_vsize()} vB, "
+          f"{'all inputs VALID' if not any(errors) else errors}")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Chapter 8: Batched Consolidations and Payouts
+Build and sign Taproot key path transactions with hundreds of inputs or
+thousands of outputs, and compare with signing input by input through
+bitcoin-utils' sign_taproot_input().
+
+1. Consolidation: many UTXOs (one key each) swept to one output
+2. Payout: a few UTXOs paying thousands of recipients
+   For both: the naive loop, BatchBuilder in one process and over a
+   process pool; the three transactions must be byte-identical and pass
+   the transaction validator
+3. Sighash scaling: the per-input digests alone, naive vs precomputed,
+   as the input count doubles
+
+Most of the naive time is bitcoin-utils' reference EC arithmetic (affine
+coordinates, and every signature is verified after signing); the O(n²)
+sighash hashing it adds shows in part 3.
+
+Usage: python3 14_batch_consolidation_payout.py [--inputs N] [--outputs N] [--workers N]
+"""
+
+import argparse
+import hashlib
+import os
+import struct
+import time
+
+from bitcoinutils.setup import setup
+from bitcoinutils.keys import PrivateKey, P2trAddress
+from bitcoinutils.script import Script
+from bitcoinutils.transactions import Transaction, TxInput, TxOutput, TxWitnessInput
+
+from tools.batch_builder import BatchBuilder
+from tools.satisfier import signing_key, tweak_seckey
+from tools.tx_validator import validate_transactions
+
+UTXO_AMOUNT = 50000
+
+
+def wallet(count, amount=UTXO_AMOUNT):
+    """`count` keys with one UTXO each: (PrivateKey, txid, vout, amount)"""
+    utxos = []
+    for i in range(count):
+        secret = int.from_bytes(hashlib.sha256(f"wallet-key-{i}".encode()).digest(), "big")
+        txid = hashlib.sha256(f"funding-{i}".encode()).hexdigest()
+        utxos.append((PrivateKey(secret_exponent=secret), txid, i % 3, amount + i))
+    return utxos
+
+
+def recipients(count):
+    scripts = []
+    for i in range(count):
+        xonly = PrivateKey(secret_exponent=10 ** 6 + i).get_public_key().to_x_only_hex()
+        scripts.append(bytes.fromhex("5120" + xonly))
+    return scripts
+
+
+def payments(utxos, scripts, fee):
+    total = sum(amount for _, _, _, amount in utxos) - fee
+    share = total // len(scripts)
+    return [(share + (total - share * len(scripts) if i == 0 else 0), spk) for i, spk in enumerate(scripts)]
+
+
+def naive(utxos, outputs):
+    """bitcoin-utils, one sign_taproot_input() call per input"""
+    inputs = []
+    for _, txid, vout, _ in utxos:
+        txin = TxInput(txid, vout)
+        txin.sequence = struct.pack("<I", 0xfffffffd)
+        inputs.append(txin)
+    tx_outputs = [TxOutput(amount, Script.from_raw(spk.hex())) for amount, spk in outputs]
+    tx = Transaction(inputs, tx_outputs, has_segwit=True)
+    scripts = [key.get_public_key().get_taproot_address().to_script_pub_key() for key, _, _, _ in utxos]
+    amounts = [amount for _, _, _, amount in utxos]
+    for index, (key, _, _, _) in enumerate(utxos):
+        tx.witnesses.append(TxWitnessInput([key.sign_taproot_input(tx, index, scripts, amounts)]))
+    return bytes.fromhex(tx.serialize()), tx
+
+
+def batched(utxos, outputs, workers):
+    # Start without derived keys so each run pays for its tweaks
+    tweak_seckey.cache_clear()
+    signing_key.cache_clear()
+    builder = BatchBuilder()
+    for key, txid, vout, amount in utxos:
+        builder.add_input(txid, vout, amount, key.key.to_string())
+    for amount, spk in outputs:
+        builder.add_output(amount, spk)
+    return builder.sign(workers=workers), builder
+
+
+def timed(run):
+    start = time.perf_counter()
+    result = run()
+    return result, time.perf_counter() - start
+
+
+def compare(label, utxos, outputs, workers):
+    print(f"\n{label}: {len(utxos)} inputs -> {len(outputs)} outputs")
+    (reference, tx), naive_time = timed(lambda: naive(utxos, outputs))
+    (serial, builder), serial_time = timed(lambda: batched(utxos, outputs, 1))
+    (parallel, _), parallel_time = timed(lambda: batched(utxos, outputs, workers))
+    print(f"  {'Builder':<34}{'Time (s)':>10}{'ms/input':>10}")
+    for name, elapsed in [("sign_taproot_input() loop", naive_time), ("BatchBuilder, 1 process", serial_time),
+                          (f"BatchBuilder, {workers} workers", parallel_time)]:
+        print(f"  {name:<34}{elapsed:>10.3f}{elapsed / len(utxos) * 1000:>10.2f}"
+              f"   {naive_time / elapsed:.1f}x")
+    spent = builder.spent_outputs()
+    [(_, errors)] = validate_transactions([(parallel, spent)], workers=workers)
+    print(f"  Identical to the naive transaction: {serial == reference and parallel == reference}")
+    print(f"  {len(parallel):,} bytes, {builder.vsize():,} vB (bitcoin-utils: {tx.get_vsize():,}), "
+          f"fee {builder.fee():,} sat, {'all inputs VALID' if not any(errors) else errors}")
+
+
+def sighash_scaling(counts, outputs):
+    print(f"\n3. Sighash computation only ({len(outputs)} outputs)")
+    print(f"  {'Inputs':>8}{'naive (ms)':>14}{'batched (ms)':>14}{'ratio':>8}")
+    utxos = wallet(max(counts))
+    for count in counts:
+        subset = utxos[:count]
+        tx_outputs = [TxOutput(amount, Script.from_raw(spk.hex())) for amount, spk in outputs]
+        tx = Transaction([TxInput(txid, vout) for _, txid, vout, _ in subset], tx_outputs, has_segwit=True)
+        scripts = [Script(["OP_1", "00" * 32])] * count
+        amounts = [amount for _, _, _, amount in subset]
+        start = time.perf_counter()
+        for index in range(count):
+            tx.get_transaction_taproot_digest(index, scripts, amounts, 0)
+        naive_time = time.perf_counter() - start
+        builder = BatchBuilder()
+        for key, txid, vout, amount in subset:
+            builder.add_input(txid, vout, amount, key.key.to_string())
+        for amount, spk in outputs:
+            builder.add_output(amount, spk)
+        start = time.perf_counter()
+        builder.sighashes()
+        batch_time = time.perf_counter() - start
+        print(f"  {count:>8}{naive_time * 1000:>14.1f}{batch_time * 1000:>14.2f}{naive_time / batch_time:>8.0f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="batched consolidation and payout builder")
+    parser.add_argument("--inputs", type=int, default=50, help="UTXOs in the consolidation")
+    parser.add_argument("--outputs", type=int, default=1000, help="recipients of the payout")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="signing processes")
+    args = parser.parse_args()
+
+    setup('testnet')
+    sweep_to = bytes.fromhex(P2trAddress(
+        "tb1p060z97qusuxe7w6h8z0l9kam5kn76jur22ecel75wjlmnkpxtnls6vdgne").to_script_pub_key().to_hex())
+
+    print("=" * 70)
+    print("BATCHED CONSOLIDATION AND PAYOUT")
+    print("=" * 70)
+
+    utxos = wallet(args.inputs)
+    compare("1. Consolidation", utxos, payments(utxos, [sweep_to], 58 * args.inputs), args.workers)
+
+    payers = wallet(4, amount=10 ** 8)
+    scripts = recipients(args.outputs)
+    compare("2. Payout", payers, payments(payers, scripts, 43 * args.outputs), args.workers)
+    sighash_scaling([100, 200, 400, 800], [(1000, sweep_to)])
+    print(f"\n  CPUs: {os.cpu_count()}; the pool only helps with more than one")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,2 @@
+# Tools package for Chapter 8
+# This package contains a full-transaction validator
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Wide k-of-n Tapscript Multisig
+
+Script 1 of the four-leaf tree is a fixed 2-of-2 OP_CHECKSIGADD leaf. A
+k-of-n policy with more signers can be committed in two ways:
+
+- one CHECKSIGADD leaf holding all n keys:
+      <pk_1> OP_CHECKSIG <pk_2> OP_CHECKSIGADD ... <pk_n> OP_CHECKSIGADD <k> OP_NUMEQUAL
+  The witness carries n signature slots (empty for keys that do not sign)
+  and the whole n-key script, but the control block is just 33 bytes.
+- a MAST of C(n, k) k-of-k leaves, one per signing set:
+      <pk_a> OP_CHECKSIGVERIFY <pk_b> OP_CHECKSIGVERIFY ... <pk_z> OP_CHECKSIG
+  The witness carries exactly k signatures and a k-key script, but the
+  control block grows by 32 bytes per tree level.
+
+multisig_layout() prices both and picks the one with the lower expected
+witness size. Every signing set is assumed to be equally likely. The leaf
+count comes from math.comb(), so the choice itself never enumerates a
+combination.
+
+MultisigTree enumerates leaves lazily (itertools.combinations, in
+lexicographic order) and keeps only their 32-byte hashes. The tree has the
+optimal shape for equally likely leaves: every leaf is at depth
+floor(log2 m) or one deeper. Branch hashes are computed once and cached
+per level, so a control block is just a walk up the cached levels. The leaf
+of a given signing set is found by ranking the combination, without
+scanning the others.
+"""
+
+import itertools
+import math
+from collections import namedtuple
+
+from .tx_validator import (
+    TAPROOT_CONTROL_BASE_SIZE, TAPROOT_CONTROL_NODE_SIZE,
+    TAPROOT_LEAF_TAPSCRIPT, compact_size, tagged_hash, tapleaf_hash, taproot_output_key,
+)
+
+OP_NUMEQUAL = 0x9c
+OP_CHECKSIG = 0xac
+OP_CHECKSIGVERIFY = 0xad
+OP_CHECKSIGADD = 0xba
+
+SINGLE_LEAF = "checksigadd"
+MAST = "mast"
+
+SCHNORR_SIG_SIZE = 64            # SIGHASH_DEFAULT
+MAX_MAST_LEAVES = 1 << 20        # larger trees take too long to hash here
+
+# Expected witness size of one layout; bytes are witness bytes (1 WU each)
+LayoutCost = namedtuple("LayoutCost", ["layout", "leaves", "script_size", "expected_depth",
+                                       "witness_bytes", "witness_vbytes"])
+
+
+# ---------------------------------------------------------------------------
+# Leaf scripts
+# ---------------------------------------------------------------------------
+
+def _push_int(k):
+    """Minimal push of a small positive number"""
+    if k <= 16:
+        return bytes([0x50 + k])
+    data = k.to_bytes((k.bit_length() + 8) // 8, "little")  # room for the sign bit
+    return bytes([len(data)]) + data
+
+
+def checksigadd_leaf(pubkeys, k):
+    """k-of-n leaf: <pk_1> CHECKSIG <pk_2> CHECKSIGADD ... <k> NUMEQUAL"""
+    script = bytearray()
+    for i, pubkey in enumerate(pubkeys):
+        script += b"\x20" + pubkey
+        script.append(OP_CHECKSIGADD if i else OP_CHECKSIG)
+    script += _push_int(k)
+    script.append(OP_NUMEQUAL)
+    return bytes(script)
+
+
+def k_of_k_leaf(pubkeys):
+    """All of `pubkeys` must sign: <pk_a> CHECKSIGVERIFY ... <pk_z> CHECKSIG"""
+    script = bytearray()
+    for i, pubkey in enumerate(pubkeys):
+        script += b"\x20" + pubkey
+        script.append(OP_CHECKSIG if i == len(pubkeys) - 1 else OP_CHECKSIGVERIFY)
+    return bytes(script)
+
+
+# ---------------------------------------------------------------------------
+# Cost model
+# ---------------------------------------------------------------------------
+
+def _item(size):
+    return len(compact_size(size)) + size
+
+
+def _depths(leaves):
+    """(depth, count) pairs of the optimal tree shape for `leaves` equally likely leaves"""
+    d = leaves.bit_length() - 1
+    deeper = 2 * (leaves - (1 << d))
+    return [(d, leaves - deeper), (d + 1, deeper)]
+
+
+def _control_size(depth):
+    return TAPROOT_CONTROL_BASE_SIZE + TAPROOT_CONTROL_NODE_SIZE * depth
+
+
+def single_leaf_cost(n, k):
+    script_size = 34 * n + len(_push_int(k)) + 1
+    witness = (len(compact_size(n + 2)) + k * _item(SCHNORR_SIG_SIZE) + (n - k) * _item(0)
+               + _item(script_size) + _item(_control_size(0)))
+    return LayoutCost(SINGLE_LEAF, 1, script_size, 0.0, witness, witness / 4)
+
+
+def mast_cost(n, k):
+    leaves = math.comb(n, k)
+    script_size = 34 * k
+    fixed = len(compact_size(k + 2)) + k * _item(SCHNORR_SIG_SIZE) + _item(script_size)
+    witness = depth = 0.0
+    for d, count in _depths(leaves):
+        witness += count * (fixed + _item(_control_size(d)))
+        depth += count * d
+    return LayoutCost(MAST, leaves, script_size, depth / leaves, witness / leaves, witness / leaves / 4)
+
+
+def multisig_layout(n, k, max_leaves=MAX_MAST_LEAVES):
+    """
+    Cheaper of the two layouts for a k-of-n policy.
+
+    Returns:
+        (chosen LayoutCost, [single-leaf cost, MAST cost or None])
+    """
+    if not 1 <= k <= n:
+        raise ValueError(f"need 1 <= k <= n, got k={k}, n={n}")
+    single = single_leaf_cost(n, k)
+    mast = mast_cost(n, k) if math.comb(n, k) <= max_leaves else None
+    if mast is not None and mast.witness_bytes < single.witness_bytes:
+        return mast, [single, mast]
+    return single, [single, mast]
+
+
+# ---------------------------------------------------------------------------
+# Tree
+# ---------------------------------------------------------------------------
+
+def _branch(a, b):
+    return tagged_hash("TapBranch", a + b if a < b else b + a)
+
+
+def combination_rank(signers, n):
+    """Position of sorted `signers` in itertools.combinations(range(n), len(signers))"""
+    k = len(signers)
+    rank = 0
+    previous = -1
+    for i, s in enumerate(signers):
+        for v in range(previous + 1, s):
+            rank += math.comb(n - v - 1, k - i - 1)
+        previous = s
+    return rank
+
+
+class MultisigTree:
+    """
+    Taproot commitment of a k-of-n Schnorr multisig.
+
+    Args:
+        pubkeys: the n x-only public keys (32 bytes each), in script order
+        k: signatures required
+        internal_key: x-only internal key (a key nobody knows the secret of
+            disables the key path)
+        layout: SINGLE_LEAF, MAST, or None to pick the cheaper one
+    """
+
+    def __init__(self, pubkeys, k, internal_key, layout=None, max_leaves=MAX_MAST_LEAVES):
+        self.pubkeys = [bytes(pk) for pk in pubkeys]
+        self.n = len(self.pubkeys)
+        self.k = k
+        self.internal_key = internal_key
+        chosen, self.costs = multisig_layout(self.n, k, max_leaves)
+        self.layout = layout or chosen.layout
+        self.cost = self.costs[0] if self.layout == SINGLE_LEAF else self.costs[1]
+        if self.cost is None:
+            raise ValueError(f"C({self.n}, {k}) = {math.comb(self.n, k):,} leaves exceeds max_leaves")
+        self.leaf_count = self.cost.leaves
+        self._build()
+        self.output_key, self.parity = taproot_output_key(internal_key, self.merkle_root)
+
+    # ===== Leaves =====
+
+    def leaves(self):
+        """Lazily yield (signer indexes, leaf script), in tree order"""
+        if self.layout == SINGLE_LEAF:
+            yield tuple(range(self.n)), checksigadd_leaf(self.pubkeys, self.k)
+            return
+        pubkeys = self.pubkeys
+        for signers in itertools.combinations(range(self.n), self.k):
+            yield signers, k_of_k_leaf([pubkeys[i] for i in signers])
+
+    def _build(self):
+        """Hash the leaves as they are generated; cache every level of branch hashes"""
+        self.leaf_hashes = [tapleaf_hash(script) for _, script in self.leaves()]
+        m = self.leaf_count
+        depth = m.bit_length() - 1
+        # Pair the first 2 * (m - 2^depth) leaves one level deeper; the rest
+        # of the tree is perfect
+        self._paired = 2 * (m - (1 << depth))
+        hashes = self.leaf_hashes
+        level = [_branch(hashes[i], hashes[i + 1]) for i in range(0, self._paired, 2)]
+        level += hashes[self._paired:]
+        self.levels = [level]
+        while len(level) > 1:
+            level = [_branch(level[i], level[i + 1]) for i in range(0, len(level), 2)]
+            self.levels.append(level)
+        self.merkle_root = level[0]
+
+    def leaf_index(self, signers):
+        """Leaf that a signing set (indexes into pubkeys) spends with"""
+        if self.layout == SINGLE_LEAF:
+            return 0
+        signers = sorted(set(signers))
+        if len(signers) != self.k or signers[0] < 0 or signers[-1] >= self.n:
+            raise ValueError(f"a signing set is {self.k} distinct indexes below {self.n}")
+        return combination_rank(signers, self.n)
+
+    def leaf_script(self, index):
+        if self.layout == SINGLE_LEAF:
+            return checksigadd_leaf(self.pubkeys, self.k)
+        signers = self._unrank(index)
+        return k_of_k_leaf([self.pubkeys[i] for i in signers])
+
+    def _unrank(self, index):
+        n, k = self.n, self.k
+        signers = []
+        v = 0
+        for i in range(k):
+            while True:
+                below = math.comb(n - v - 1, k - i - 1)
+                if index < below:
+                    break
+                index -= below
+                v += 1
+            signers.append(v)
+            v += 1
+        return signers
+
+    # ===== Spending =====
+
+    def merkle_path(self, index):
+        """Sibling hashes from leaf `index` up to the root"""
+        path = []
+        if index < self._paired:
+            path.append(self.leaf_hashes[index ^ 1])
+            node = index // 2
+        else:
+            node = index - self._paired // 2
+        for level in self.levels[:-1]:
+            path.append(level[node ^ 1])
+            node //= 2
+        return path
+
+    def control_block(self, index):
+        return (bytes([TAPROOT_LEAF_TAPSCRIPT | self.parity]) + self.internal_key
+                + b"".join(self.merkle_path(index)))
+
+    def witness(self, signatures):
+        """
+        Script path witness stack.
+
+        Args:
+            signatures: {pubkey index: 64/65-byte Schnorr signature}. Both
+                layouts use the k lowest indexes given: the single leaf ends
+                in <k> OP_NUMEQUAL, so any extra signature would fail it.
+        """
+        if len(signatures) < self.k:
+            raise ValueError(f"{self.k} signatures required, got {len(signatures)}")
+        signers = sorted(signatures)[:self.k]
+        if self.layout == SINGLE_LEAF:
+            index = 0
+            # The first key's check consumes the top stack item: reverse order
+            stack = [signatures[i] if i in signers else b"" for i in reversed(range(self.n))]
+        else:
+            index = self.leaf_index(signers)
+            stack = [signatures[i] for i in reversed(signers)]
+        return stack + [self.leaf_script(index), self.control_block(index)]
+
+    def script_pubkey(self):
+        return b"\x51\x20" + self.output_key
@@ -0,0 +1,512 @@
+#!/usr/bin/env python3
+"""
+Policy Compiler for Taproot Trees
+
+Turns a spending policy such as
+
+    or(pk(alice), sha256(H), multi_a(2, alice, bob), and(older(2), pk(bob)), pk(bob))
+
+into an internal key and a script tree. The leaves use the script templates
+of chapters 3, 7 and 8.
+
+Policy language (Miniscript policy style):
+    pk(K)              signature of K
+    sha256(H)          preimage of H:  OP_SHA256 <H> OP_EQUALVERIFY OP_TRUE
+    older(N)           relative timelock: <N> OP_CHECKSEQUENCEVERIFY OP_DROP
+    after(N)           absolute timelock: <N> OP_CHECKLOCKTIMEVERIFY OP_DROP
+    and(X, Y, ...)     all of them, in this order in the leaf
+    or(X, Y, ...)      any of them; weight a branch with 3@X (default 1, at least 1)
+    thresh(k, X, ...)  any k of them (split into C(n, k) conjunctions)
+    multi_a(k, K, ...) k-of-n CHECKSIGADD leaf, as Script 1:
+                       OP_0 <K1> OP_CHECKSIGADD ... <k> OP_EQUAL
+K and H are hex or names looked up in the `names` dict. A key may appear
+only once: with a key reused, one signature satisfies several branches, and
+the per-branch costs below no longer hold. The book's chapter 8 tree reuses
+alice and bob, so it is compiled with allow_key_reuse=True.
+
+A sub-policy can be compiled in several ways. An or() can become separate
+leaves, or one leaf with OP_IF / OP_ELSE branches. An and() over an or()
+can be distributed into one leaf per branch. Each way is a set of
+(probability, leaf) pairs. Its cost is the expected witness size of a
+Huffman tree over those leaves. That tree is optimal for the expected
+control block size, and the rest of each leaf's cost does not depend on
+its depth. The few cheapest ways of every sub-policy are memoized, so
+shared and repeated sub-policies are compiled once. At the top, the most
+likely pk() branch becomes the internal key (a key path spend is the
+cheapest), and the cheapest way overall is kept.
+"""
+
+import heapq
+import math
+import re
+from collections import namedtuple
+from functools import lru_cache
+from itertools import combinations
+
+from .tx_validator import (
+    TAPROOT_CONTROL_BASE_SIZE, TAPROOT_CONTROL_NODE_SIZE, compact_size, tagged_hash,
+    tapleaf_hash, taproot_output_key,
+)
+
+# BIP341 "nothing up my sleeve" point: disables the key path
+NUMS_KEY = bytes.fromhex("50929b74c1a04954b78b4b6035e97a5e078a5a0f28ec96d547bfee9ace803ac0")
+
+OP_0 = 0x00
+OP_TRUE = 0x51
+OP_IF = 0x63
+OP_ELSE = 0x67
+OP_ENDIF = 0x68
+OP_VERIFY = 0x69
+OP_DROP = 0x75
+OP_EQUAL = 0x87
+OP_EQUALVERIFY = 0x88
+OP_SHA256 = 0xa8
+OP_CHECKSIG = 0xac
+OP_CHECKSIGVERIFY = 0xad
+OP_CHECKLOCKTIMEVERIFY = 0xb1
+OP_CHECKSEQUENCEVERIFY = 0xb2
+OP_CHECKSIGADD = 0xba
+
+SIG_ITEM = 65                    # 64-byte Schnorr signature (SIGHASH_DEFAULT) + length byte
+PREIMAGE_ITEM = 33
+KEY_PATH_WITNESS = 1 + SIG_ITEM
+MAX_SPLIT_LEAVES = 64            # thresh() is split into at most this many conjunctions
+CANDIDATES_KEPT = 4              # ways kept per sub-policy
+
+Leaf = namedtuple("Leaf", ["probability", "policy", "script", "depth", "witness_bytes"])
+
+
+class PolicyError(ValueError):
+    pass
+
+
+# ---------------------------------------------------------------------------
+# Parsing
+# ---------------------------------------------------------------------------
+# Policies are nested tuples, so they can be memoized:
+#   ("pk", key) ("sha256", hash) ("older", n) ("after", n)
+#   ("and", (sub, ...)) ("or", ((weight, sub), ...)) ("thresh", k, (sub, ...))
+#   ("multi_a", k, (key, ...))
+
+_TOKENS = re.compile(r"\s*([A-Za-z0-9_]+|[(),@])")
+
+
+def _tokenize(text):
+    tokens = []
+    pos = 0
+    text = text.strip()
+    while pos < len(text):
+        match = _TOKENS.match(text, pos)
+        if not match:
+            raise PolicyError(f"unexpected character at {pos}: {text[pos:pos + 10]!r}")
+        tokens.append(match.group(1))
+        pos = match.end()
+    return tokens
+
+
+def _and(subs):
+    flat = []
+    for sub in subs:
+        flat.extend(sub[1] if sub[0] == "and" else (sub,))
+    return ("and", tuple(flat))
+
+
+def parse_policy(text, names=None, allow_key_reuse=False):
+    """Parse a policy string; names maps key / hash names to hex or bytes"""
+    names = names or {}
+    tokens = _tokenize(text)
+    pos = 0
+    keys = set()
+
+    def take(expected=None):
+        nonlocal pos
+        if pos >= len(tokens):
+            raise PolicyError("unexpected end of policy")
+        token = tokens[pos]
+        if expected is not None and token != expected:
+            raise PolicyError(f"expected {expected!r}, got {token!r}")
+        pos += 1
+        return token
+
+    def value(token, size):
+        raw = names.get(token, token)
+        try:
+            raw = bytes.fromhex(raw) if isinstance(raw, str) else bytes(raw)
+        except ValueError:
+            raise PolicyError(f"unknown name {token!r}") from None
+        if size == 32 and len(raw) == 33:
+            raw = raw[1:]  # compressed key -> x-only
+        if len(raw) != size:
+            raise PolicyError(f"{token!r} is {len(raw)} bytes, expected {size}")
+        return raw
+
+    def key(token, seen):
+        raw = value(token, 32)
+        if raw in seen:
+            raise PolicyError(f"key {token!r} is used more than once")
+        seen.add(raw)
+        return raw
+
+    def number(token):
+        if not token.isdigit():
+            raise PolicyError(f"expected a number, got {token!r}")
+        return int(token)
+
+    def expression():
+        name = take()
+        take("(")
+        if name == "pk":
+            node = ("pk", key(take(), set() if allow_key_reuse else keys))
+        elif name == "sha256":
+            node = ("sha256", value(take(), 32))
+        elif name in ("older", "after"):
+            n = number(take())
+            if not 0 < n < 1 << 31:
+                raise PolicyError(f"{name}({n}) out of range")
+            node = (name, n)
+        elif name in ("and", "or", "thresh", "multi_a"):
+            k = None
+            if name in ("thresh", "multi_a"):
+                k = number(take())
+                take(",")
+            args = []
+            multi_keys = set() if allow_key_reuse else keys
+            while True:
+                weight = 1
+                if name == "or" and pos + 1 < len(tokens) and tokens[pos + 1] == "@":
+                    weight = number(take())
+                    take("@")
+                    if weight < 1:
+                        raise PolicyError(f"or() branch weight {weight}@ is below 1")
+                args.append((weight, key(take(), multi_keys) if name == "multi_a" else expression()))
+                if pos >= len(tokens) or tokens[pos] == ")":
+                    break
+                take(",")
+            subs = tuple(sub for _, sub in args)
+            if name == "multi_a":
+                if not 1 <= k <= len(subs):
+                    raise PolicyError(f"multi_a({k}) of {len(subs)} keys")
+                node = ("multi_a", k, subs)
+            elif name == "thresh":
+                if not 1 <= k <= len(subs):
+                    raise PolicyError(f"thresh({k}) of {len(subs)} sub-policies")
+                if k == 1:
+                    node = ("or", tuple((1, sub) for sub in subs))
+                elif k == len(subs):
+                    node = _and(subs)
+                else:
+                    node = ("thresh", k, subs)
+            elif len(subs) < 2:
+                raise PolicyError(f"{name}() needs at least two sub-policies")
+            elif name == "and":
+                node = _and(subs)
+            else:
+                node = ("or", tuple(args))
+        else:
+            raise PolicyError(f"unknown fragment {name!r}")
+        take(")")
+        return node
+
+    node = expression()
+    if pos != len(tokens):
+        raise PolicyError(f"trailing input: {' '.join(tokens[pos:])}")
+    return node
+
+
+def policy_to_string(node, names=None):
+    """Policy string of a node; keys / hashes shown by name where known"""
+    labels = {}
+    for name, raw in (names or {}).items():
+        raw = bytes.fromhex(raw) if isinstance(raw, str) else bytes(raw)
+        labels[raw[-32:]] = name
+    label = lambda raw: labels.get(raw, raw.hex())
+    kind = node[0]
+    if kind in ("pk", "sha256"):
+        return f"{kind}({label(node[1])})"
+    if kind in ("older", "after"):
+        return f"{kind}({node[1]})"
+    if kind == "and":
+        return f"and({', '.join(policy_to_string(sub, names) for sub in node[1])})"
+    if kind == "or":
+        return "or(" + ", ".join((f"{w}@" if w != 1 else "") + policy_to_string(sub, names)
+                                 for w, sub in node[1]) + ")"
+    if kind == "thresh":
+        return f"thresh({node[1]}, {', '.join(policy_to_string(sub, names) for sub in node[2])})"
+    return f"multi_a({node[1]}, {', '.join(label(key) for key in node[2])})"
+
+
+# ---------------------------------------------------------------------------
+# Leaf scripts and their witness cost
+# ---------------------------------------------------------------------------
+
+def _push_int(n):
+    if n <= 16:
+        return bytes([0x50 + n])
+    data = n.to_bytes((n.bit_length() + 8) // 8, "little")
+    return bytes([len(data)]) + data
+
+
+def _emit(node, verify):
+    """Script for `node`; verify=True when something follows it in the leaf"""
+    kind = node[0]
+    if kind == "pk":
+        return b"\x20" + node[1] + bytes([OP_CHECKSIGVERIFY if verify else OP_CHECKSIG])
+    if kind == "sha256":
+        return bytes([OP_SHA256, 0x20]) + node[1] + bytes([OP_EQUALVERIFY] + ([] if verify else [OP_TRUE]))
+    if kind in ("older", "after"):
+        op = OP_CHECKSEQUENCEVERIFY if kind == "older" else OP_CHECKLOCKTIMEVERIFY
+        return _push_int(node[1]) + bytes([op] + ([OP_DROP] if verify else []))
+    if kind == "and":
+        subs = node[1]
+        return b"".join(_emit(sub, True) for sub in subs[:-1]) + _emit(subs[-1], verify)
+    if kind == "or":
+        # IF s0 ELSE IF s1 ELSE s2 ENDIF ENDIF
+        subs = [sub for _, sub in node[1]]
+        script = _emit(subs[-1], False)
+        for sub in reversed(subs[:-1]):
+            script = bytes([OP_IF]) + _emit(sub, False) + bytes([OP_ELSE]) + script + bytes([OP_ENDIF])
+        return script + (bytes([OP_VERIFY]) if verify else b"")
+    if kind == "multi_a":
+        script = bytearray([OP_0])
+        for key in node[2]:
+            script += b"\x20" + key + bytes([OP_CHECKSIGADD])
+        return bytes(script + _push_int(node[1]) + bytes([OP_EQUALVERIFY if verify else OP_EQUAL]))
+    raise PolicyError(f"{kind}() cannot be put in a single leaf")
+
+
+@lru_cache(maxsize=None)
+def leaf_script(node):
+    return _emit(node, False)
+
+
+@lru_cache(maxsize=None)
+def satisfaction_size(node):
+    """Expected bytes of the stack items that satisfy `node` (script and control block excluded)"""
+    kind = node[0]
+    if kind == "pk":
+        return SIG_ITEM
+    if kind == "sha256":
+        return PREIMAGE_ITEM
+    if kind in ("older", "after"):
+        return 0
+    if kind == "and":
+        return sum(satisfaction_size(sub) for sub in node[1])
+    if kind == "or":
+        # Branch i is selected by i empty items then 0x01; the last one by i empty items
+        total = sum(w for w, _ in node[1])
+        last = len(node[1]) - 1
+        return sum(w / total * (satisfaction_size(sub) + i + (2 if i < last else 0))
+                   for i, (w, sub) in enumerate(node[1]))
+    if kind == "multi_a":
+        return node[1] * SIG_ITEM + (len(node[2]) - node[1])
+    raise PolicyError(f"{kind}() cannot be put in a single leaf")
+
+
+def _item(size):
+    return len(compact_size(size)) + size
+
+
+def leaf_witness_size(node, depth):
+    """Expected script path witness bytes for a leaf at `depth`"""
+    control = TAPROOT_CONTROL_BASE_SIZE + TAPROOT_CONTROL_NODE_SIZE * depth
+    return 1 + satisfaction_size(node) + _item(len(leaf_script(node))) + _item(control)
+
+
+# ---------------------------------------------------------------------------
+# Tree shape
+# ---------------------------------------------------------------------------
+
+def huffman_tree(probabilities):
+    """
+    Tree minimizing sum(p * depth): nested 2-tuples of leaf indexes. Ties
+    merge in input order, so equal leaves [0, 1, 2, 3] give ((0, 1), (2, 3)).
+    """
+    heap = [(p, i, i) for i, p in enumerate(probabilities)]
+    heapq.heapify(heap)
+    counter = len(heap)
+    while len(heap) > 1:
+        p1, _, a = heapq.heappop(heap)
+        p2, _, b = heapq.heappop(heap)
+        heapq.heappush(heap, (p1 + p2, counter, (a, b)))
+        counter += 1
+    return heap[0][2]
+
+
+def tree_depths(tree, depth=0, out=None):
+    out = {} if out is None else out
+    if isinstance(tree, int):
+        out[tree] = depth
+    else:
+        for child in tree:
+            tree_depths(child, depth + 1, out)
+    return out
+
+
+def _tree_cost(leaves):
+    """Expected witness bytes of script path spends over `leaves` ((probability, node) pairs)"""
+    if not leaves:
+        return 0.0
+    total = sum(p for p, _ in leaves)
+    depths = tree_depths(huffman_tree([p for p, _ in leaves]))
+    return sum(p / total * leaf_witness_size(node, depths[i]) for i, (p, node) in enumerate(leaves))
+
+
+# ---------------------------------------------------------------------------
+# Candidate arrangements
+# ---------------------------------------------------------------------------
+
+def _variations(options):
+    """Each sub-policy's best way, then every single substitution of an alternative"""
+    best = [choices[0] for choices in options]
+    yield best
+    for i, choices in enumerate(options):
+        for alternative in choices[1:]:
+            yield best[:i] + [alternative] + best[i + 1:]
+
+
+def _rank(candidates):
+    unique = list(dict.fromkeys(candidates))
+    unique.sort(key=_tree_cost)
+    return tuple(unique[:CANDIDATES_KEPT])
+
+
+@lru_cache(maxsize=None)
+def candidates(node):
+    """
+    The cheapest ways to lay `node` out over leaves, best first. A way is
+    a tuple of (probability, single-leaf node) summing to 1.
+    """
+    kind = node[0]
+    if kind == "or":
+        total = sum(w for w, _ in node[1])
+        options = [candidates(sub) for _, sub in node[1]]
+        ways = [tuple((w / total * p, leaf) for (w, _), way in zip(node[1], combo) for p, leaf in way)
+                for combo in _variations(options)]
+        try:
+            leaf_script(node)
+            ways.append(((1.0, node),))
+        except PolicyError:
+            pass  # a branch (thresh) has no single-leaf form
+        return _rank(ways)
+    if kind == "and":
+        ways = []
+        for combo in _variations([candidates(sub) for sub in node[1]]):
+            leaves = [(1.0, ())]
+            for way in combo:
+                leaves = [(p * q, parts + (leaf,)) for p, parts in leaves for q, leaf in way]
+            if len(leaves) <= MAX_SPLIT_LEAVES:
+                ways.append(tuple((p, _and(parts)) for p, parts in leaves))
+        return _rank(ways)
+    if kind == "thresh":
+        k, subs = node[1], node[2]
+        if math.comb(len(subs), k) > MAX_SPLIT_LEAVES:
+            raise PolicyError(f"thresh({k}) of {len(subs)} splits into more than {MAX_SPLIT_LEAVES} leaves")
+        return candidates(("or", tuple((1, _and(chosen)) for chosen in combinations(subs, k))))
+    return (((1.0, node),),)
+
+
+# ---------------------------------------------------------------------------
+# Compilation
+# ---------------------------------------------------------------------------
+
+def _branch(a, b):
+    return tagged_hash("TapBranch", a + b if a < b else b + a)
+
+
+class CompiledPolicy:
+    """
+    Internal key and script tree for a policy.
+
+    Attributes:
+        internal_key: x-only key of the key path (NUMS_KEY if there is none)
+        key_path_probability: share of spends expected to use the key path
+        leaves: [Leaf], in tree order
+        tree: nested 2-tuples of leaf indexes (None without leaves)
+        merkle_root, output_key, parity
+        expected_witness_bytes: key path and script paths weighted by probability
+    """
+
+    def __init__(self, policy, internal_key, key_path_probability, leaves):
+        self.policy = policy
+        self.internal_key = internal_key
+        self.key_path_probability = key_path_probability
+        total = sum(p for p, _ in leaves)
+        self.tree = huffman_tree([p for p, _ in leaves]) if leaves else None
+        depths = tree_depths(self.tree) if leaves else {}
+        share = 1 - key_path_probability
+        self.leaves = [Leaf(share * p / total, node, leaf_script(node), depths[i],
+                            leaf_witness_size(node, depths[i]))
+                       for i, (p, node) in enumerate(leaves)]
+        self._paths = {}
+        self.merkle_root = self._hash(self.tree) if leaves else b""
+        self.output_key, self.parity = taproot_output_key(internal_key, self.merkle_root)
+        self.expected_witness_bytes = key_path_probability * KEY_PATH_WITNESS + sum(
+            leaf.probability * leaf.witness_bytes for leaf in self.leaves)
+
+    def _hash(self, tree):
+        """Hash a subtree; records each leaf's path of sibling hashes"""
+        if isinstance(tree, int):
+            self._paths[tree] = []
+            return tapleaf_hash(self.leaves[tree].script)
+        left, right = tree
+        left_hash, right_hash = self._hash(left), self._hash(right)
+        for index in _indexes(left):
+            self._paths[index].append(right_hash)
+        for index in _indexes(right):
+            self._paths[index].append(left_hash)
+        return _branch(left_hash, right_hash)
+
+    @property
+    def expected_witness_vbytes(self):
+        return self.expected_witness_bytes / 4
+
+    def nested_leaves(self, tree=None):
+        """The tree as nested lists of leaf scripts (the shape bitcoin-utils takes)"""
+        tree = self.tree if tree is None else tree
+        if isinstance(tree, int):
+            return self.leaves[tree].script
+        return [self.nested_leaves(child) for child in tree]
+
+    def merkle_path(self, index):
+        return list(self._paths[index])
+
+    def control_block(self, index):
+        return bytes([0xc0 | self.parity]) + self.internal_key + b"".join(self._paths[index])
+
+    def script_pubkey(self):
+        return b"\x51\x20" + self.output_key
+
+
+def _indexes(tree):
+    if isinstance(tree, int):
+        yield tree
+    else:
+        for child in tree:
+            yield from _indexes(child)
+
+
+def compile_policy(policy, names=None, internal_key=None, allow_key_reuse=False):
+    """
+    Compile a policy (string or parsed node) to a CompiledPolicy.
+
+    Without an explicit internal_key, the most likely pk() leaf becomes the
+    key path; if there is none the NUMS point is used. allow_key_reuse is
+    passed to parse_policy().
+    """
+    node = parse_policy(policy, names, allow_key_reuse) if isinstance(policy, str) else policy
+    best = None
+    for way in candidates(node):
+        leaves = list(way)
+        key, key_probability = internal_key, 0.0
+        if key is None:
+            keys = [(p, i) for i, (p, leaf) in enumerate(leaves) if leaf[0] == "pk"]
+            if keys:
+                key_probability, i = max(keys, key=lambda item: (item[0], -item[1]))
+                key = leaves.pop(i)[1][1]
+            else:
+                key = NUMS_KEY
+        script_share = sum(p for p, _ in leaves)
+        cost = key_probability * KEY_PATH_WITNESS + script_share * _tree_cost(leaves)
+        if best is None or cost < best[0]:
+            best = (cost, key, key_probability, leaves)
+    return CompiledPolicy(node, best[1], best[2], best[3])
@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Replace-by-Fee Bump Engine
+
+The chapter 8 scripts set nSequence to 0xfffffffd, which signals BIP125
+replaceability. This module builds the replacement when such a transaction
+is stuck: the same inputs, with the extra fee taken from a change output,
+re-signed where the new outputs change what a signature commits to.
+
+The replacement satisfies the BIP125 rules as Bitcoin Core applies them:
+
+1. the original signals replaceability (an input with nSequence <= 0xfffffffd)
+2. it adds no new unconfirmed inputs (it spends exactly the original's)
+3. it pays at least the absolute fees of every transaction it replaces
+4. it pays for its own relay: the extra fee is at least
+   incremental relay feerate x its vsize
+5. it replaces at most 100 transactions (the original and its descendants)
+
+and Core's extra rule that its feerate is higher than the original's.
+Since Core 28 mempools accept full RBF by default; the engine still
+requires rule 1 so that the result replaces in any BIP125 mempool.
+
+Only Taproot inputs are re-signed (key path and tapscript). Their signing
+slots are found once per input by running the leaf script on the chapter
+6 interpreter with a checker that records every (signature, public key,
+hash type, OP_CODESEPARATOR position) instead of verifying. For each slot
+the engine compares the sighash before and after the change:
+SIGHASH_SINGLE | ANYONECANPAY signatures on untouched outputs and
+signature-less leaves (a hash lock) keep their witness as is, and only the
+rest are signed again, with keys from a Keyring.
+
+What a bump shares with the original stays cached per txid, so bumping the
+replacement again skips it too: the BIP341 prevout, amount and
+scriptPubKey hashes (TransactionContext.for_replacement) and the signing
+slots. bump_many() prepares every transaction in this process and spreads
+the signatures over a process pool, like BatchBuilder.
+"""
+
+import math
+import os
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from .batch_builder import _sign_task
+from .satisfier import _seckey_int, signing_key, tweak_seckey
+from .tx_validator import (
+    ANNEX_TAG, SIGHASH_DEFAULT, SIGVERSION_TAPSCRIPT, STANDARD_VERIFY_FLAGS, ExecData, ScriptError,
+    Transaction, TransactionChecker, TransactionContext, TxOut, _witness_program, compact_size,
+    execute_witness_script, interpreter, serialize_output, serialize_transaction, tapleaf_hash,
+)
+
+MAX_BIP125_RBF_SEQUENCE = 0xfffffffd
+INCREMENTAL_RELAY_FEERATE = 1.0     # sat/vB (-incrementalrelayfee, 1,000 sat/kvB)
+MAX_REPLACEMENT_CANDIDATES = 100
+DUST_RELAY_FEERATE = 3              # sat/vB (-dustrelayfee)
+MAX_CACHED_TXS = 4096
+
+# slots: per input, a list of (witness item index, x-only key, hash type, ExecData)
+_Prepared = namedtuple("_Prepared", ["ctx", "slots"])
+# changes: (input index, witness item index, hash type) of each signature to replace
+_Plan = namedtuple("_Plan", ["prepared", "ctx", "changes", "kept", "replaced_fees", "replaced_count"])
+
+Replacement = namedtuple("Replacement", [
+    "txid", "raw", "fee", "vsize", "feerate",
+    "replaced_txid", "replaced_fee",
+    "resigned",     # signatures made again
+    "kept",         # signatures whose sighash did not change
+])
+
+
+class RBFError(Exception):
+    pass
+
+
+# ---------------------------------------------------------------------------
+# Keys and signing slots
+# ---------------------------------------------------------------------------
+
+class Keyring:
+    """Secret keys by the x-only public key a signature is checked against"""
+
+    def __init__(self):
+        self.keys = {}
+
+    def add(self, secret, merkle_root=None):
+        """
+        A key for tapscript signatures; with merkle_root (b"" for an output
+        without a script tree), also the tweaked key of its key path
+        """
+        d = _seckey_int(secret)
+        d_even, px = signing_key(d)
+        self.keys[px] = (d_even, px)
+        if merkle_root is not None:
+            tweaked, qx = signing_key(tweak_seckey(d, merkle_root))
+            self.keys[qx] = (tweaked, qx)
+        return self
+
+    def __contains__(self, pubkey):
+        return pubkey in self.keys
+
+
+class _RecordingChecker(TransactionChecker):
+    """Records each tapscript signature check and lets it pass"""
+
+    def __init__(self, ctx, index):
+        super().__init__(ctx, index)
+        self.checks = []
+
+    def check_schnorr_signature(self, sig, pubkey, sigversion, execdata):
+        hash_type = sig[64] if len(sig) == 65 else SIGHASH_DEFAULT
+        snapshot = ExecData(tapleaf_hash=execdata.tapleaf_hash, annex=execdata.annex)
+        snapshot.codeseparator_pos = execdata.codeseparator_pos
+        self.checks.append((sig, pubkey, hash_type, snapshot))
+        return True
+
+
+def signature_slots(ctx, index):
+    """
+    Where the signatures of a Taproot input sit in its witness: a list of
+    (witness item index, x-only key, hash type, ExecData)
+
+    Raises:
+        RBFError: for inputs that are not Taproot spends
+    """
+    program = _witness_program(ctx.spent_outputs[index].script_pubkey)
+    if program is None or program[0] != 1 or len(program[1]) != 32:
+        raise RBFError(f"input {index}: only Taproot inputs can be re-signed")
+    witness = ctx.tx.witnesses[index]
+    stack = list(witness)
+    annex = None
+    if len(stack) >= 2 and stack[-1] and stack[-1][0] == ANNEX_TAG:
+        annex = stack.pop()
+    if len(stack) == 1:
+        sig = stack[0]
+        hash_type = sig[64] if len(sig) == 65 else SIGHASH_DEFAULT
+        return [(0, program[1], hash_type, ExecData(annex=annex))]
+    if len(stack) < 2:
+        raise RBFError(f"input {index}: empty witness")
+    control = stack.pop()
+    script = stack.pop()
+    execdata = ExecData(tapleaf_hash=tapleaf_hash(script, control[0] & 0xfe), annex=annex)
+    witness_size = len(compact_size(len(witness))) + sum(
+        len(compact_size(len(item))) + len(item) for item in witness)
+    execdata.validation_weight_left = witness_size + interpreter.VALIDATION_WEIGHT_OFFSET
+    checker = _RecordingChecker(ctx, index)
+    try:
+        execute_witness_script(script, stack, checker, SIGVERSION_TAPSCRIPT, execdata, STANDARD_VERIFY_FLAGS)
+    except ScriptError as e:
+        raise RBFError(f"input {index}: the original witness does not execute ({e})")
+    slots = []
+    used = set()
+    for sig, pubkey, hash_type, snapshot in checker.checks:
+        position = next(i for i, item in enumerate(witness) if item == sig and i not in used)
+        used.add(position)
+        slots.append((position, pubkey, hash_type, snapshot))
+    return slots
+
+
+# ---------------------------------------------------------------------------
+# Fees and BIP125
+# ---------------------------------------------------------------------------
+
+def tx_weight(tx):
+    stripped = serialize_transaction(tx.version, tx.inputs, tx.outputs, None, tx.locktime)
+    full = serialize_transaction(tx.version, tx.inputs, tx.outputs, tx.witnesses, tx.locktime)
+    return 3 * len(stripped) + len(full)
+
+
+def tx_fee(tx, spent_outputs):
+    return sum(spent.amount for spent in spent_outputs) - sum(txout.amount for txout in tx.outputs)
+
+
+def dust_threshold(script_pubkey, dust_feerate=DUST_RELAY_FEERATE):
+    """Core's GetDustThreshold: the output plus the input that would spend it, at the dust feerate"""
+    size = len(serialize_output(TxOut(0, script_pubkey)))
+    size += 32 + 4 + 1 + (107 // 4 if _witness_program(script_pubkey) else 107) + 4
+    return size * dust_feerate
+
+
+def signals_rbf(tx):
+    return any(txin.sequence <= MAX_BIP125_RBF_SEQUENCE for txin in tx.inputs)
+
+
+def check_replacement(original, replacement, spent_outputs, replaced_fees=0, replaced_count=0,
+                      incremental_feerate=INCREMENTAL_RELAY_FEERATE):
+    """
+    BIP125 checks of a replacement against the transaction it replaces.
+    replaced_fees / replaced_count cover the original's descendants, which
+    are evicted with it.
+
+    Raises:
+        RBFError: naming the rule that fails
+    """
+    if not signals_rbf(original):
+        raise RBFError("rule 1: the original does not signal replaceability")
+    if sorted(txin.prevout for txin in replacement.inputs) != sorted(txin.prevout for txin in original.inputs):
+        raise RBFError("rule 2: the replacement must spend the original's inputs")
+    old_fee = tx_fee(original, spent_outputs) + replaced_fees
+    new_fee = tx_fee(replacement, spent_outputs)
+    vsize = math.ceil(tx_weight(replacement) / 4)
+    if new_fee < old_fee:
+        raise RBFError(f"rule 3: fee {new_fee} is below the replaced fees {old_fee}")
+    if new_fee - old_fee < incremental_feerate * vsize:
+        raise RBFError(f"rule 4: {new_fee - old_fee} extra sats do not pay for {vsize} vB of relay")
+    if 1 + replaced_count > MAX_REPLACEMENT_CANDIDATES:
+        raise RBFError(f"rule 5: {1 + replaced_count} transactions would be replaced")
+    if new_fee / vsize <= tx_fee(original, spent_outputs) / math.ceil(tx_weight(original) / 4):
+        raise RBFError("the replacement's feerate must be higher than the original's")
+
+
+# ---------------------------------------------------------------------------
+# Engine
+# ---------------------------------------------------------------------------
+
+class BumpEngine:
+    """
+    Fee bumps of signed transactions.
+
+    Args:
+        keyring: Keyring with the keys of the inputs to re-sign
+        incremental_feerate: minimum extra sat/vB a replacement pays (rule 4)
+        max_cached: transactions whose context and slots are kept
+    """
+
+    def __init__(self, keyring, incremental_feerate=INCREMENTAL_RELAY_FEERATE, max_cached=MAX_CACHED_TXS):
+        self.keyring = keyring
+        self.incremental_feerate = incremental_feerate
+        self.max_cached = max_cached
+        self._cache = OrderedDict()     # txid -> _Prepared
+        self.cache_hits = 0
+
+    def _prepared(self, raw, spent_outputs):
+        tx = Transaction(raw)
+        prepared = self._cache.get(tx.txid)
+        if prepared is not None:
+            self._cache.move_to_end(tx.txid)
+            self.cache_hits += 1
+            return prepared
+        ctx = TransactionContext(tx, spent_outputs)
+        return self._remember(_Prepared(ctx, [signature_slots(ctx, i) for i in range(len(tx.inputs))]))
+
+    def _remember(self, prepared):
+        self._cache[prepared.ctx.tx.txid] = prepared
+        if len(self._cache) > self.max_cached:
+            self._cache.popitem(last=False)
+        return prepared
+
+    def plan(self, raw, spent_outputs, feerate, change_index=-1, replaced_fees=0, replaced_count=0):
+        """
+        Replacement outputs and the signatures it needs.
+
+        Args:
+            raw: the signed original (bytes or hex)
+            spent_outputs: (amount, script_pubkey) of each input
+            feerate: target sat/vB
+            change_index: output that pays the extra fee
+            replaced_fees / replaced_count: fees and number of the original's
+                descendants in the mempool
+
+        Returns:
+            (plan, tasks): tasks are (msg, secret, x-only key) to sign, in
+            the order finish() expects their signatures
+        """
+        prepared = self._prepared(raw, spent_outputs)
+        ctx = prepared.ctx
+        tx = ctx.tx
+        if not signals_rbf(tx):
+            raise RBFError(f"{tx.txid}: no input signals replaceability (nSequence > 0xfffffffd)")
+        if not tx.outputs:
+            raise RBFError(f"{tx.txid}: no outputs")
+        old_fee = tx_fee(tx, ctx.spent_outputs)
+        vsize = math.ceil(tx_weight(tx) / 4)   # same inputs, witnesses and output sizes
+        fee = max(math.ceil(feerate * vsize),
+                  old_fee + replaced_fees + math.ceil(self.incremental_feerate * vsize))
+        outputs = list(tx.outputs)
+        change_index %= len(outputs)
+        change = outputs[change_index]
+        amount = change.amount - (fee - old_fee)
+        if amount < dust_threshold(change.script_pubkey):
+            raise RBFError(f"{tx.txid}: output {change_index} cannot pay {fee - old_fee} more sats "
+                           f"and stay above dust")
+        outputs[change_index] = TxOut(amount, change.script_pubkey)
+
+        unsigned = serialize_transaction(tx.version, tx.inputs, outputs, tx.witnesses, tx.locktime)
+        new_ctx = ctx.for_replacement(unsigned)
+        tasks, changes = [], []
+        for index, slots in enumerate(prepared.slots):
+            for position, pubkey, hash_type, execdata in slots:
+                msg = new_ctx.taproot_sighash(index, hash_type, execdata)
+                if msg is None:
+                    raise RBFError(f"{tx.txid}: input {index} signs SIGHASH_SINGLE without an output")
+                if msg == ctx.taproot_sighash(index, hash_type, execdata):
+                    continue
+                key = self.keyring.keys.get(pubkey)
+                if key is None:
+                    raise RBFError(f"{tx.txid}: input {index} needs a signature by {pubkey.hex()}")
+                tasks.append((msg, *key))
+                changes.append((index, position, hash_type))
+        kept = sum(len(slots) for slots in prepared.slots) - len(tasks)
+        return _Plan(prepared, new_ctx, changes, kept, replaced_fees, replaced_count), tasks
+
+    def finish(self, plan, signatures):
+        """The signed Replacement, checked against BIP125"""
+        prepared = plan.prepared
+        original = prepared.ctx.tx
+        witnesses = [list(stack) for stack in original.witnesses]
+        for (index, position, hash_type), sig in zip(plan.changes, signatures):
+            witnesses[index][position] = sig + (bytes([hash_type]) if hash_type != SIGHASH_DEFAULT else b"")
+        tx = plan.ctx.tx
+        raw = serialize_transaction(tx.version, tx.inputs, tx.outputs, witnesses, tx.locktime)
+        replacement = Transaction(raw)
+        check_replacement(original, replacement, prepared.ctx.spent_outputs, plan.replaced_fees,
+                          plan.replaced_count, self.incremental_feerate)
+        # the replacement's context and slots serve its own bump later
+        signed_ctx = plan.ctx.for_replacement(replacement)
+        self._remember(_Prepared(signed_ctx, prepared.slots))
+        fee = tx_fee(replacement, prepared.ctx.spent_outputs)
+        vsize = math.ceil(tx_weight(replacement) / 4)
+        return Replacement(replacement.txid, raw, fee, vsize, fee / vsize, original.txid,
+                           tx_fee(original, prepared.ctx.spent_outputs), len(plan.changes), plan.kept)
+
+    def bump(self, raw, spent_outputs, feerate, **kwargs):
+        """Fee-bumped replacement of one transaction, signed in this process"""
+        plan, tasks = self.plan(raw, spent_outputs, feerate, **kwargs)
+        return self.finish(plan, [_sign_task(task) for task in tasks])
+
+    def bump_many(self, jobs, feerate, workers=1, chunksize=None):
+        """
+        Bump many stuck transactions to one feerate.
+
+        Args:
+            jobs: (raw, spent outputs) or (raw, spent outputs, change index) tuples
+            workers: signing processes (1 = in this process, None = CPU count)
+            chunksize: signatures per task batch (default: about 4 batches per worker)
+
+        Returns:
+            list of (Replacement, None) or (None, error message) per job
+        """
+        planned, tasks = [], []
+        for job in jobs:
+            try:
+                plan, job_tasks = self.plan(job[0], job[1], feerate, *job[2:3])
+            except RBFError as e:
+                planned.append((None, str(e)))
+                continue
+            planned.append((plan, (len(tasks), len(tasks) + len(job_tasks))))
+            tasks += job_tasks
+
+        workers = workers or os.cpu_count() or 1
+        if workers == 1 or len(tasks) < 2:
+            signatures = [_sign_task(task) for task in tasks]
+        else:
+            if chunksize is None:
+                chunksize = max(1, len(tasks) // (workers * 4))
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                signatures = list(pool.map(_sign_task, tasks, chunksize=chunksize))
+
+        results = []
+        for plan, extra in planned:
+            if plan is None:
+                results.append((None, extra))
+                continue
+            try:
+                results.append((self.finish(plan, signatures[extra[0]:extra[1]]), None))
+            except RBFError as e:
+                results.append((None, str(e)))
+        return results
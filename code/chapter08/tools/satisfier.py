@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Satisfier: Cheapest Spend Path and Witness Assembly
+
+Given a compiled policy (tools/policy_compiler.py) and the secrets at hand
+(private keys, hash preimages), finds every way to spend the output and
+assembles the witness of the cheapest one.
+
+Every spend path is listed once per tree and cached:
+
+- the key path, if the internal key is not the NUMS point
+- every leaf, once per OP_IF branch choice inside it
+
+Each path records what it needs (signatures, preimages, a relative or
+absolute timelock) and its exact witness size. That size includes the
+control block of its depth. Paths are sorted by size, so choosing one means
+walking the list until the secrets, nSequence and nLockTime satisfy a path.
+The choice is cached per (tree, secrets, nSequence, nLockTime), so spending
+many UTXOs of the same tree repeats no planning work.
+
+Signatures are BIP340 with 32 zero bytes of auxiliary randomness, like
+bitcoin-utils, so the witnesses of the chapter 8 scripts are reproduced
+byte for byte. Only SIGHASH_DEFAULT (64-byte signatures) is produced.
+"""
+
+from collections import namedtuple
+from functools import lru_cache
+
+from .policy_compiler import NUMS_KEY, PolicyError, leaf_script
+from .tx_validator import (
+    G, ExecData, SEQUENCE_FINAL, SEQUENCE_LOCKTIME_DISABLE_FLAG, SEQUENCE_LOCKTIME_MASK,
+    SEQUENCE_LOCKTIME_TYPE_FLAG, LOCKTIME_THRESHOLD, SIGHASH_DEFAULT, compact_size, n, sha256,
+    tagged_hash, tapleaf_hash,
+)
+
+KEY_PATH = None  # SpendPath.leaf of the key path
+
+# needs: frozenset of ("key", K) ("hash", H) ("older", N) ("after", N) ("multi_a", k, keys)
+SpendPath = namedtuple("SpendPath", ["leaf", "choices", "needs", "witness_bytes"])
+
+
+class SatisfactionError(Exception):
+    pass
+
+
+# ---------------------------------------------------------------------------
+# BIP340 signing
+# ---------------------------------------------------------------------------
+
+def _seckey_int(secret):
+    if isinstance(secret, int):
+        return secret
+    return int.from_bytes(secret, "big")
+
+
+@lru_cache(maxsize=1024)
+def xonly_pubkey(d):
+    return (G * d).x().to_bytes(32, "big")
+
+
+@lru_cache(maxsize=4096)
+def signing_key(d):
+    """(secret, x-only public key) with the secret negated if needed so the key has even y"""
+    P = G * d
+    return (n - d if P.y() % 2 else d), P.x().to_bytes(32, "big")
+
+
+def schnorr_sign(msg, d, aux_rand=bytes(32), px=None):
+    """
+    BIP340 signature of a 32-byte message with secret key d (an int). Pass
+    px when d and px already come from signing_key() to skip a point
+    multiplication.
+    """
+    if px is None:
+        d, px = signing_key(d)
+    t = (d ^ int.from_bytes(tagged_hash("BIP0340/aux", aux_rand), "big")).to_bytes(32, "big")
+    k = int.from_bytes(tagged_hash("BIP0340/nonce", t + px + msg), "big") % n
+    if k == 0:
+        raise SatisfactionError("nonce is zero")
+    R = G * k
+    if R.y() % 2:
+        k = n - k
+    rx = R.x().to_bytes(32, "big")
+    e = int.from_bytes(tagged_hash("BIP0340/challenge", rx + px + msg), "big") % n
+    return rx + ((k + e * d) % n).to_bytes(32, "big")
+
+
+@lru_cache(maxsize=1024)
+def tweak_seckey(d, merkle_root):
+    """Secret key of the Taproot output key: internal key d tweaked by the Merkle root"""
+    P = G * d
+    if P.y() % 2:
+        d = n - d
+    t = int.from_bytes(tagged_hash("TapTweak", P.x().to_bytes(32, "big") + merkle_root), "big")
+    return (d + t) % n
+
+
+# ---------------------------------------------------------------------------
+# Secrets
+# ---------------------------------------------------------------------------
+
+class Secrets:
+    """
+    What the spender holds.
+
+    Args:
+        keys: private keys (ints or 32-byte secrets)
+        preimages: hash preimages (bytes)
+    """
+
+    def __init__(self, keys=(), preimages=()):
+        self.keys = {}
+        for secret in keys:
+            d = _seckey_int(secret)
+            self.keys[xonly_pubkey(d)] = d
+        self.preimages = {sha256(preimage): preimage for preimage in preimages}
+        self.fingerprint = (frozenset(self.keys), frozenset(self.preimages))
+
+
+def sequence_satisfies(required, sequence, version=2):
+    """Would an input with this nSequence pass <required> OP_CHECKSEQUENCEVERIFY?"""
+    if version < 2 or sequence & SEQUENCE_LOCKTIME_DISABLE_FLAG:
+        return False
+    mask = SEQUENCE_LOCKTIME_TYPE_FLAG | SEQUENCE_LOCKTIME_MASK
+    sequence &= mask
+    required &= mask
+    if (sequence < SEQUENCE_LOCKTIME_TYPE_FLAG) != (required < SEQUENCE_LOCKTIME_TYPE_FLAG):
+        return False
+    return required <= sequence
+
+
+def locktime_satisfies(required, locktime, sequence):
+    """Would this nLockTime / nSequence pass <required> OP_CHECKLOCKTIMEVERIFY?"""
+    if (locktime < LOCKTIME_THRESHOLD) != (required < LOCKTIME_THRESHOLD):
+        return False
+    return required <= locktime and sequence != SEQUENCE_FINAL
+
+
+def _has(need, keys, hashes, sequence, locktime, version):
+    kind = need[0]
+    if kind == "key":
+        return need[1] in keys
+    if kind == "hash":
+        return need[1] in hashes
+    if kind == "older":
+        return sequence_satisfies(need[1], sequence, version)
+    if kind == "after":
+        return locktime_satisfies(need[1], locktime, sequence)
+    return sum(key in keys for key in need[2]) >= need[1]  # multi_a
+
+
+# ---------------------------------------------------------------------------
+# Witness stacks
+# ---------------------------------------------------------------------------
+# One walk over a leaf's policy builds both the size template and the real
+# stack; `sign` and `preimage` return placeholders when only sizing.
+
+def _branches(node):
+    """Yield (choices, needs) for every OP_IF branch combination of a leaf"""
+    kind = node[0]
+    if kind == "pk":
+        yield (), (("key", node[1]),)
+    elif kind == "sha256":
+        yield (), (("hash", node[1]),)
+    elif kind in ("older", "after"):
+        yield (), ((kind, node[1]),)
+    elif kind == "multi_a":
+        yield (), (("multi_a", node[1], node[2]),)
+    elif kind == "and":
+        combos = [((), ())]
+        for sub in node[1]:
+            combos = [(c + sc, nd + snd) for c, nd in combos for sc, snd in _branches(sub)]
+        yield from combos
+    elif kind == "or":
+        for i, (_, sub) in enumerate(node[1]):
+            for choices, needs in _branches(sub):
+                yield (i,) + choices, needs
+    else:
+        raise PolicyError(f"{kind}() cannot be put in a single leaf")
+
+
+def _stack(node, choices, sign, preimage, keys=None):
+    """Witness items satisfying `node`, bottom of the stack first"""
+    kind = node[0]
+    if kind == "pk":
+        return [sign(node[1])]
+    if kind == "sha256":
+        return [preimage(node[1])]
+    if kind in ("older", "after"):
+        return []
+    if kind == "multi_a":
+        # The first key's OP_CHECKSIGADD consumes the top item
+        k, pubkeys = node[1], node[2]
+        signing = [key for key in pubkeys if keys is None or key in keys][:k]
+        return [sign(key) if key in signing else b"" for key in reversed(pubkeys)]
+    if kind == "and":
+        # The first conjunct runs first, so its items go on top
+        stack = []
+        for sub in node[1]:
+            stack = _stack(sub, choices, sign, preimage, keys) + stack
+        return stack
+    # or: OP_IF s0 OP_ELSE OP_IF s1 OP_ELSE s2 OP_ENDIF OP_ENDIF
+    i = next(choices)
+    last = len(node[1]) - 1
+    selectors = ([b"\x01"] if i < last else []) + [b""] * i
+    return _stack(node[1][i][1], choices, sign, preimage, keys) + selectors
+
+
+def _witness_size(items):
+    return len(compact_size(len(items))) + sum(len(compact_size(len(item))) + len(item) for item in items)
+
+
+@lru_cache(maxsize=256)
+def spend_paths(compiled):
+    """Every spend path of a compiled policy, cheapest first"""
+    paths = []
+    if compiled.internal_key != NUMS_KEY:
+        paths.append(SpendPath(KEY_PATH, (), frozenset([("key", compiled.internal_key)]),
+                               _witness_size([bytes(64)])))
+    placeholder = lambda _: bytes(32)
+    signature = lambda _: bytes(64)
+    for index, leaf in enumerate(compiled.leaves):
+        control = compiled.control_block(index)
+        for choices, needs in _branches(leaf.policy):
+            stack = _stack(leaf.policy, iter(choices), signature, placeholder)
+            size = _witness_size(stack + [leaf.script, control])
+            paths.append(SpendPath(index, choices, frozenset(needs), size))
+    paths.sort(key=lambda path: path.witness_bytes)
+    return tuple(paths)
+
+
+def _first_satisfied(paths, fingerprint, sequence, locktime, version):
+    keys, hashes = fingerprint
+    for path in paths:
+        if all(_has(need, keys, hashes, sequence, locktime, version) for need in path.needs):
+            return path
+    return None
+
+
+@lru_cache(maxsize=4096)
+def _planned_path(compiled, fingerprint, sequence, locktime, version):
+    return _first_satisfied(spend_paths(compiled), fingerprint, sequence, locktime, version)
+
+
+def cheapest_path(compiled, secrets, sequence=0xfffffffd, locktime=0, version=2, paths=None):
+    """
+    Cheapest spend path the secrets, nSequence and nLockTime satisfy, or
+    None. Pass `paths` to choose among a subset of spend_paths(compiled).
+    """
+    if paths is not None:
+        return _first_satisfied(paths, secrets.fingerprint, sequence, locktime, version)
+    return _planned_path(compiled, secrets.fingerprint, sequence, locktime, version)
+
+
+def clear_path_caches():
+    spend_paths.cache_clear()
+    _planned_path.cache_clear()
+
+
+def satisfy(compiled, ctx, index, secrets, paths=None):
+    """
+    Witness for input `index` of a TransactionContext spending `compiled`.
+
+    nSequence, nLockTime and the version come from the transaction; all
+    signatures commit to it.
+
+    Returns:
+        (SpendPath, witness items)
+    """
+    tx = ctx.tx
+    path = cheapest_path(compiled, secrets, tx.inputs[index].sequence, tx.locktime, tx.version, paths)
+    if path is None:
+        raise SatisfactionError(f"input {index}: no spend path is satisfiable with these secrets")
+
+    if path.leaf is KEY_PATH:
+        d = tweak_seckey(secrets.keys[compiled.internal_key], compiled.merkle_root)
+        sighash = ctx.taproot_sighash(index, SIGHASH_DEFAULT, ExecData())
+        return path, [schnorr_sign(sighash, d)]
+
+    leaf = compiled.leaves[path.leaf]
+    execdata = ExecData(tapleaf_hash=tapleaf_hash(leaf.script))
+    sighash = ctx.taproot_sighash(index, SIGHASH_DEFAULT, execdata)
+    sign = lambda pubkey: schnorr_sign(sighash, secrets.keys[pubkey])
+    preimage = lambda digest: secrets.preimages[digest]
+    stack = _stack(leaf.policy, iter(path.choices), sign, preimage, secrets.keys)
+    return path, stack + [leaf_script(leaf.policy), compiled.control_block(path.leaf)]
+
+
+def satisfy_inputs(compiled, ctx, secrets, indexes=None):
+    """Witnesses for several inputs of one transaction that all spend `compiled`"""
+    indexes = range(len(ctx.tx.inputs)) if indexes is None else indexes
+    return [satisfy(compiled, ctx, index, secrets) for index in indexes]
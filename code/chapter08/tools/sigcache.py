@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Signature Cache
+
+Remembers signatures that already verified, so validating the same
+transaction again (mempool acceptance, then block connection, then an audit
+re-run) skips the elliptic curve math.
+
+Modeled on Bitcoin Core's CuckooCache-backed signature cache:
+
+- Entries are salted: an entry is SHA256(salt || kind || sighash || pubkey
+  || sig) with a random per-cache salt, so nobody can predict which slots a
+  signature lands in or craft colliding entries.
+- The table is a fixed array of 32-byte entries; every entry has 8
+  candidate slots taken from its own bytes. Lookups probe at most 8 slots.
+- Inserting into a full neighbourhood kicks a random candidate out and
+  re-places it in one of its own slots (cuckoo hashing), up to a bounded
+  depth; whatever is still homeless then is dropped. Memory never grows.
+- Only valid signatures are stored. Lookups can erase the entry on a hit
+  (what block connection does: a signature in a connected block will not
+  be seen again).
+"""
+
+import hashlib
+import os
+import random
+import struct
+import time
+
+ECDSA = b"E"
+SCHNORR = b"S"
+HASH_FUNCTIONS = 8
+_SLOT_WORDS = struct.Struct("<8I")
+
+
+class SignatureCache:
+    """
+    Bounded, salted set of verified (sighash, pubkey, signature) triples.
+
+    Args:
+        max_entries: table size (rounded up to a power of two)
+        salt: 32 bytes; random if omitted
+        seed: seed for the eviction choices (for reproducible runs)
+    """
+
+    def __init__(self, max_entries=1 << 16, salt=None, seed=None):
+        size = 1
+        while size < max_entries:
+            size <<= 1
+        self.size = size
+        self.mask = size - 1
+        self.table = [None] * size
+        self.salt = salt if salt is not None else os.urandom(32)
+        self.max_depth = max(1, size.bit_length())
+        self._rng = random.Random(seed)
+        # Cost model for time_saved: checks timed and their total seconds, per kind
+        self.verifications = {ECDSA: 0, SCHNORR: 0}
+        self.verify_seconds = {ECDSA: 0.0, SCHNORR: 0.0}
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Start a new run: zero the lookup counters (the cost model is kept)"""
+        self.lookups = 0
+        self.hits = 0
+        self.inserts = 0
+        self.evictions = 0
+        self.hits_by_kind = {ECDSA: 0, SCHNORR: 0}
+
+    def __len__(self):
+        return sum(entry is not None for entry in self.table)
+
+    # ===== Cuckoo table =====
+
+    def entry(self, kind, sighash, pubkey, sig):
+        """Salted cache entry for one signature check"""
+        return hashlib.sha256(self.salt + kind + sighash + pubkey + sig).digest()
+
+    def _slots(self, entry):
+        mask = self.mask
+        return [word & mask for word in _SLOT_WORDS.unpack_from(entry)]
+
+    def contains(self, entry, erase=False):
+        """True if `entry` is cached; with erase=True the slot is freed on a hit"""
+        table = self.table
+        for slot in self._slots(entry):
+            if table[slot] == entry:
+                if erase:
+                    table[slot] = None
+                return True
+        return False
+
+    def insert(self, entry):
+        table = self.table
+        self.inserts += 1
+        for depth in range(self.max_depth):
+            slots = self._slots(entry)
+            for slot in slots:
+                if table[slot] is None or table[slot] == entry:
+                    table[slot] = entry
+                    return
+            # Neighbourhood full: take a random slot, re-home its occupant
+            slot = slots[self._rng.randrange(HASH_FUNCTIONS)]
+            entry, table[slot] = table[slot], entry
+        self.evictions += 1  # the last one kicked out has nowhere to go
+
+    # ===== Validation hook =====
+
+    def verify(self, kind, sighash, pubkey, sig, verify_fn, erase=False):
+        """
+        Return verify_fn(sighash, pubkey, sig), consulting the cache first.
+
+        Valid signatures are added on a miss, unless erase=True (block
+        connection: hits are removed and nothing new is stored). Misses
+        are timed; their average cost times the hits gives `time_saved`.
+        """
+        entry = self.entry(kind, sighash, pubkey, sig)
+        self.lookups += 1
+        if self.contains(entry, erase):
+            self.hits += 1
+            self.hits_by_kind[kind] += 1
+            return True
+        start = time.perf_counter()
+        valid = verify_fn(sighash, pubkey, sig)
+        self.verify_seconds[kind] += time.perf_counter() - start
+        self.verifications[kind] += 1
+        if valid and not erase:
+            self.insert(entry)
+        return valid
+
+    # ===== Statistics =====
+
+    @property
+    def hit_rate(self):
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    @property
+    def time_saved(self):
+        """Seconds of EC math skipped: hits x average cost of a check of that kind"""
+        saved = 0.0
+        for kind, hits in self.hits_by_kind.items():
+            if hits and self.verifications[kind]:
+                saved += hits * self.verify_seconds[kind] / self.verifications[kind]
+        return saved
+
+    def stats(self):
+        return {
+            "lookups": self.lookups, "hits": self.hits, "hit_rate": self.hit_rate,
+            "inserts": self.inserts, "evictions": self.evictions, "entries": len(self),
+            "time_saved": self.time_saved,
+        }
@@ -0,0 +1,787 @@
+#!/usr/bin/env python3
+"""
+Full Transaction Validation
+
+Checks that every input of a transaction is authorized by the output it
+spends, for all the output types built in this book:
+
+- P2PKH (chapter 2), P2SH multisig and P2SH CSV (chapter 3)
+- P2WPKH / P2WSH (chapter 4)
+- Taproot key path (chapter 5) and script path (chapters 6-8)
+
+Scripts run on the chapter 6 interpreter (loaded by file path); this module
+adds what the interpreter leaves to its caller: VerifyScript (P2SH, witness
+programs, the Taproot commitment and control block), the three sighash
+algorithms and the ECDSA / Schnorr checks.
+
+Work shared by the inputs of one transaction lives in a TransactionContext:
+the parsed transaction, the BIP143 / BIP341 hashes over all prevouts,
+amounts, sequences and outputs (computed once, on first use), a TapSighash
+midstate and a memo of finished sighashes. Decoded scripts, public keys and
+Taproot tweaks are cached per process, and verified signatures can be kept
+in a SignatureCache (tools/sigcache.py) across transactions and runs.
+
+validate_transactions() spreads inputs over a process pool. Consecutive
+inputs of the same transaction go to the same worker, which keeps that
+transaction's context between them.
+"""
+
+import hashlib
+import importlib.util
+import os
+import struct
+import sys
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from ecdsa import SECP256k1, VerifyingKey, BadSignatureError, MalformedPointError
+from ecdsa.ellipticcurve import PointJacobi, INFINITY
+from ecdsa.util import sigdecode_der
+
+from .sigcache import ECDSA, SCHNORR
+
+
+def _load_interpreter():
+    """Load chapter 6's script interpreter by file path (once per process)"""
+    name = "chapter06_script_interpreter"
+    if name not in sys.modules:
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "..", "..", "chapter06", "tools", "script_interpreter.py")
+        spec = importlib.util.spec_from_file_location(name, os.path.normpath(path))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+    return sys.modules[name]
+
+
+interpreter = _load_interpreter()
+ScriptError = interpreter.ScriptError
+SignatureChecker = interpreter.SignatureChecker
+ExecData = interpreter.ExecData
+compile_script = interpreter.compile_script
+eval_script = interpreter.eval_script
+execute_witness_script = interpreter.execute_witness_script
+cast_to_bool = interpreter.cast_to_bool
+ripemd160 = interpreter.ripemd160
+SIGVERSION_BASE = interpreter.SIGVERSION_BASE
+SIGVERSION_WITNESS_V0 = interpreter.SIGVERSION_WITNESS_V0
+SIGVERSION_TAPSCRIPT = interpreter.SIGVERSION_TAPSCRIPT
+SIGVERSION_TAPROOT = 2  # key path; never reaches the interpreter
+STANDARD_VERIFY_FLAGS = interpreter.STANDARD_VERIFY_FLAGS
+VERIFY_DISCOURAGE_UPGRADABLE_NOPS = interpreter.VERIFY_DISCOURAGE_UPGRADABLE_NOPS
+
+G = SECP256k1.generator
+n = SECP256k1.order
+p = SECP256k1.curve.p()
+
+SIGHASH_DEFAULT = 0x00
+SIGHASH_ALL = 0x01
+SIGHASH_NONE = 0x02
+SIGHASH_SINGLE = 0x03
+SIGHASH_ANYONECANPAY = 0x80
+
+TAPROOT_LEAF_TAPSCRIPT = 0xc0
+TAPROOT_LEAF_MASK = 0xfe
+TAPROOT_CONTROL_BASE_SIZE = 33
+TAPROOT_CONTROL_NODE_SIZE = 32
+TAPROOT_CONTROL_MAX_NODES = 128
+ANNEX_TAG = 0x50
+
+SEQUENCE_FINAL = 0xffffffff
+SEQUENCE_LOCKTIME_DISABLE_FLAG = 1 << 31
+SEQUENCE_LOCKTIME_TYPE_FLAG = 1 << 22
+SEQUENCE_LOCKTIME_MASK = 0x0000ffff
+LOCKTIME_THRESHOLD = 500000000
+
+# Outputs being spent, in input order
+SpentOutput = namedtuple("SpentOutput", ["amount", "script_pubkey"])
+TxIn = namedtuple("TxIn", ["prevout", "script_sig", "sequence"])
+TxOut = namedtuple("TxOut", ["amount", "script_pubkey"])
+
+
+# ---------------------------------------------------------------------------
+# Serialization helpers
+# ---------------------------------------------------------------------------
+
+def sha256(data):
+    return hashlib.sha256(data).digest()
+
+
+def hash256(data):
+    return hashlib.sha256(hashlib.sha256(data).digest()).digest()
+
+
+def tagged_hash(tag, data):
+    """BIP340 Tagged Hash function"""
+    tag_hash = hashlib.sha256(tag.encode()).digest()
+    return hashlib.sha256(tag_hash + tag_hash + data).digest()
+
+
+def compact_size(n):
+    if n < 0xfd:
+        return bytes([n])
+    if n <= 0xffff:
+        return b"\xfd" + struct.pack("<H", n)
+    if n <= 0xffffffff:
+        return b"\xfe" + struct.pack("<I", n)
+    return b"\xff" + struct.pack("<Q", n)
+
+
+def _read_compact_size(data, offset):
+    first = data[offset]
+    if first < 0xfd:
+        return first, offset + 1
+    if first == 0xfd:
+        return struct.unpack_from("<H", data, offset + 1)[0], offset + 3
+    if first == 0xfe:
+        return struct.unpack_from("<I", data, offset + 1)[0], offset + 5
+    return struct.unpack_from("<Q", data, offset + 1)[0], offset + 9
+
+
+def serialize_output(txout):
+    return struct.pack("<Q", txout.amount) + compact_size(len(txout.script_pubkey)) + txout.script_pubkey
+
+
+def serialize_transaction(version, inputs, outputs, witnesses=None, locktime=0):
+    """
+    Raw transaction from TxIn / TxOut lists; witnesses (one stack per
+    input) select the segwit serialization unless all stacks are empty
+    """
+    parts = [struct.pack("<i", version)]
+    segwit = witnesses is not None and any(witnesses)
+    if segwit:
+        parts.append(b"\x00\x01")
+    parts.append(compact_size(len(inputs)))
+    for txin in inputs:
+        parts += [txin.prevout, compact_size(len(txin.script_sig)), txin.script_sig,
+                  struct.pack("<I", txin.sequence)]
+    parts.append(compact_size(len(outputs)))
+    parts += [serialize_output(txout) for txout in outputs]
+    if segwit:
+        for stack in witnesses:
+            parts.append(compact_size(len(stack)))
+            for item in stack:
+                parts += [compact_size(len(item)), item]
+    parts.append(struct.pack("<I", locktime))
+    return b"".join(parts)
+
+
+class Transaction:
+    """A parsed transaction: just the fields validation needs"""
+
+    __slots__ = ("version", "inputs", "outputs", "witnesses", "locktime", "txid")
+
+    def __init__(self, raw):
+        raw = bytes.fromhex(raw) if isinstance(raw, str) else bytes(raw)
+        self.version = struct.unpack_from("<i", raw, 0)[0]
+        offset = 4
+        segwit = raw[offset] == 0 and raw[offset + 1] == 1
+        if segwit:
+            offset += 2
+        start = offset
+        count, offset = _read_compact_size(raw, offset)
+        self.inputs = []
+        for _ in range(count):
+            prevout = raw[offset:offset + 36]
+            length, offset = _read_compact_size(raw, offset + 36)
+            script_sig = raw[offset:offset + length]
+            offset += length
+            sequence = struct.unpack_from("<I", raw, offset)[0]
+            offset += 4
+            self.inputs.append(TxIn(prevout, script_sig, sequence))
+        count, offset = _read_compact_size(raw, offset)
+        self.outputs = []
+        for _ in range(count):
+            amount = struct.unpack_from("<Q", raw, offset)[0]
+            length, offset = _read_compact_size(raw, offset + 8)
+            self.outputs.append(TxOut(amount, raw[offset:offset + length]))
+            offset += length
+        end = offset
+        self.witnesses = [[] for _ in self.inputs]
+        if segwit:
+            for stack in self.witnesses:
+                items, offset = _read_compact_size(raw, offset)
+                for _ in range(items):
+                    length, offset = _read_compact_size(raw, offset)
+                    stack.append(raw[offset:offset + length])
+                    offset += length
+        self.locktime = struct.unpack_from("<I", raw, offset)[0]
+        self.txid = hash256(raw[:4] + raw[start:end] + raw[offset:offset + 4])[::-1].hex()
+
+
+# ---------------------------------------------------------------------------
+# Per-transaction context: precomputed hashes and sighash memo
+# ---------------------------------------------------------------------------
+
+class TransactionContext:
+    """
+    Everything the inputs of one transaction share.
+
+    The BIP143 and BIP341 aggregate hashes are computed on first use, so a
+    legacy-only transaction never pays for them. Finished sighashes are
+    memoized: CHECKMULTISIG tries each signature against several keys, and
+    every OP_CHECKSIGADD in a leaf signs the same message.
+
+    With a SignatureCache, signature checks consult it before doing any EC
+    math; erase_cached=True removes hits from it (block connection).
+    """
+
+    def __init__(self, tx, spent_outputs, sigcache=None, erase_cached=False):
+        self.tx = tx if isinstance(tx, Transaction) else Transaction(tx)
+        if len(spent_outputs) != len(self.tx.inputs):
+            raise ValueError(f"{len(self.tx.inputs)} inputs but {len(spent_outputs)} spent outputs")
+        self.spent_outputs = [
+            SpentOutput(amount, bytes.fromhex(spk) if isinstance(spk, str) else bytes(spk))
+            for amount, spk in spent_outputs
+        ]
+        self.version = struct.pack("<i", self.tx.version)
+        self.locktime = struct.pack("<I", self.tx.locktime)
+        self.serialized_outputs = [serialize_output(o) for o in self.tx.outputs]
+        self._bip143 = None
+        self._bip341 = None
+        self.sigcache = sigcache
+        self.erase_cached = erase_cached
+        self.sighash_cache = {}
+        self.sighashes_computed = 0
+        self.sighash_cache_hits = 0
+
+    def for_replacement(self, tx):
+        """
+        Context for a transaction that spends the same outputs in the same
+        order, such as an RBF replacement. The prevout, amount and
+        scriptPubKey hashes carry over; sequences and outputs are hashed
+        again only if they changed.
+        """
+        ctx = TransactionContext(tx, self.spent_outputs, self.sigcache, self.erase_cached)
+        if [txin.prevout for txin in ctx.tx.inputs] != [txin.prevout for txin in self.tx.inputs]:
+            raise ValueError("the replacement spends other outputs")
+        sha_prevouts, sha_amounts, sha_scripts, sha_sequences, sha_outputs = (
+            self._bip341 or self._precompute_bip341())
+        if [txin.sequence for txin in ctx.tx.inputs] != [txin.sequence for txin in self.tx.inputs]:
+            sha_sequences = sha256(b"".join(struct.pack("<I", txin.sequence) for txin in ctx.tx.inputs))
+        if ctx.serialized_outputs != self.serialized_outputs:
+            sha_outputs = sha256(b"".join(ctx.serialized_outputs))
+        ctx._bip341 = (sha_prevouts, sha_amounts, sha_scripts, sha_sequences, sha_outputs)
+        ctx._tap_midstate = self._tap_midstate
+        return ctx
+
+    # ===== Precomputed data =====
+
+    def _precompute_bip341(self):
+        tx = self.tx
+        prevouts = b"".join(txin.prevout for txin in tx.inputs)
+        sequences = b"".join(struct.pack("<I", txin.sequence) for txin in tx.inputs)
+        amounts = b"".join(struct.pack("<Q", o.amount) for o in self.spent_outputs)
+        scripts = b"".join(compact_size(len(o.script_pubkey)) + o.script_pubkey for o in self.spent_outputs)
+        outputs = b"".join(self.serialized_outputs)
+        self._bip341 = (sha256(prevouts), sha256(amounts), sha256(scripts), sha256(sequences), sha256(outputs))
+        # TapSighash midstate: tag prefix + epoch + version + locktime per hash type
+        tag = sha256(b"TapSighash")
+        self._tap_midstate = hashlib.sha256(tag + tag + b"\x00")
+        return self._bip341
+
+    def _precompute_bip143(self):
+        # BIP143 hashes are the double-SHA256 of the same data BIP341 single-hashes
+        sha_prevouts, _, _, sha_sequences, sha_outputs = self._bip341 or self._precompute_bip341()
+        self._bip143 = (sha256(sha_prevouts), sha256(sha_sequences), sha256(sha_outputs))
+        return self._bip143
+
+    def _memo(self, key, compute):
+        digest = self.sighash_cache.get(key)
+        if digest is None:
+            digest = compute()
+            self.sighash_cache[key] = digest
+            self.sighashes_computed += 1
+        else:
+            self.sighash_cache_hits += 1
+        return digest
+
+    # ===== Sighash algorithms =====
+
+    def legacy_sighash(self, index, script_code, hash_type):
+        """Original (pre-segwit) signature hash"""
+        return self._memo((SIGVERSION_BASE, index, hash_type, script_code),
+                          lambda: self._legacy_sighash(index, script_code, hash_type))
+
+    def _legacy_sighash(self, index, script_code, hash_type):
+        tx = self.tx
+        base = hash_type & 0x1f
+        if base == SIGHASH_SINGLE and index >= len(tx.outputs):
+            # Historical bug: the "hash" is the number one
+            return b"\x01" + b"\x00" * 31
+        script_code = _remove_codeseparators(script_code)
+        anyone_can_pay = hash_type & SIGHASH_ANYONECANPAY
+        parts = [self.version]
+        spending = [index] if anyone_can_pay else range(len(tx.inputs))
+        parts.append(compact_size(len(spending)))
+        for i in spending:
+            txin = tx.inputs[i]
+            script = script_code if i == index else b""
+            sequence = txin.sequence
+            if i != index and base in (SIGHASH_NONE, SIGHASH_SINGLE):
+                sequence = 0
+            parts += [txin.prevout, compact_size(len(script)), script, struct.pack("<I", sequence)]
+        if base == SIGHASH_NONE:
+            parts.append(b"\x00")
+        elif base == SIGHASH_SINGLE:
+            parts.append(compact_size(index + 1))
+            parts += [b"\xff" * 8 + b"\x00"] * index
+            parts.append(self.serialized_outputs[index])
+        else:
+            parts.append(compact_size(len(tx.outputs)))
+            parts += self.serialized_outputs
+        parts += [self.locktime, struct.pack("<I", hash_type)]
+        return hash256(b"".join(parts))
+
+    def segwit_v0_sighash(self, index, script_code, hash_type):
+        """BIP143 signature hash"""
+        return self._memo((SIGVERSION_WITNESS_V0, index, hash_type, script_code),
+                          lambda: self._segwit_v0_sighash(index, script_code, hash_type))
+
+    def _segwit_v0_sighash(self, index, script_code, hash_type):
+        hash_prevouts, hash_sequence, hash_outputs = self._bip143 or self._precompute_bip143()
+        zero = b"\x00" * 32
+        base = hash_type & 0x1f
+        anyone_can_pay = hash_type & SIGHASH_ANYONECANPAY
+        if anyone_can_pay:
+            hash_prevouts = zero
+        if anyone_can_pay or base in (SIGHASH_NONE, SIGHASH_SINGLE):
+            hash_sequence = zero
+        if base == SIGHASH_SINGLE:
+            hash_outputs = hash256(self.serialized_outputs[index]) if index < len(self.tx.outputs) else zero
+        elif base == SIGHASH_NONE:
+            hash_outputs = zero
+        txin = self.tx.inputs[index]
+        return hash256(
+            self.version + hash_prevouts + hash_sequence + txin.prevout
+            + compact_size(len(script_code)) + script_code
+            + struct.pack("<Q", self.spent_outputs[index].amount) + struct.pack("<I", txin.sequence)
+            + hash_outputs + self.locktime + struct.pack("<I", hash_type)
+        )
+
+    def taproot_sighash(self, index, hash_type, execdata=None):
+        """
+        BIP341 signature hash. `execdata` carries the annex and, for script
+        path spends, the tapleaf hash and last OP_CODESEPARATOR position.
+        Returns None for SIGHASH_SINGLE without a matching output.
+        """
+        leaf = execdata.tapleaf_hash if execdata is not None else None
+        codesep = execdata.codeseparator_pos if leaf is not None else None
+        annex = execdata.annex if execdata is not None else None
+        return self._memo((SIGVERSION_TAPROOT, index, hash_type, leaf, codesep, annex),
+                          lambda: self._taproot_sighash(index, hash_type, leaf, codesep, annex))
+
+    def _taproot_sighash(self, index, hash_type, leaf, codesep, annex):
+        sha_prevouts, sha_amounts, sha_scripts, sha_sequences, sha_outputs = (
+            self._bip341 or self._precompute_bip341())
+        base = hash_type & 0x03
+        anyone_can_pay = hash_type & SIGHASH_ANYONECANPAY
+        if base == SIGHASH_SINGLE and index >= len(self.tx.outputs):
+            return None
+        h = self._tap_midstate.copy()
+        h.update(bytes([hash_type]) + self.version + self.locktime)
+        if not anyone_can_pay:
+            h.update(sha_prevouts + sha_amounts + sha_scripts + sha_sequences)
+        if base != SIGHASH_NONE and base != SIGHASH_SINGLE:
+            h.update(sha_outputs)
+        h.update(bytes([(2 if leaf is not None else 0) + (1 if annex is not None else 0)]))
+        if anyone_can_pay:
+            txin = self.tx.inputs[index]
+            spent = self.spent_outputs[index]
+            h.update(txin.prevout + struct.pack("<Q", spent.amount)
+                     + compact_size(len(spent.script_pubkey)) + spent.script_pubkey
+                     + struct.pack("<I", txin.sequence))
+        else:
+            h.update(struct.pack("<I", index))
+        if annex is not None:
+            h.update(sha256(compact_size(len(annex)) + annex))
+        if base == SIGHASH_SINGLE:
+            h.update(sha256(self.serialized_outputs[index]))
+        if leaf is not None:
+            h.update(leaf + b"\x00" + struct.pack("<I", codesep))
+        return h.digest()
+
+
+def _remove_codeseparators(script_code):
+    """Legacy sighash serializes the script code without OP_CODESEPARATOR"""
+    if b"\xab" not in script_code:
+        return script_code
+    compiled = compile_script(script_code)
+    out = bytearray()
+    start = 0
+    for (op, data), end in zip(compiled.ops, compiled.ends):
+        if not (data is None and op == 0xab):
+            out += script_code[start:end]
+        start = end
+    return bytes(out) + script_code[start:]
+
+
+# ---------------------------------------------------------------------------
+# Signature checks
+# ---------------------------------------------------------------------------
+
+@lru_cache(maxsize=4096)
+def _verifying_key(pubkey):
+    """Parsed SEC public key, or None if it is not a valid point"""
+    if not pubkey or pubkey[0] not in (2, 3, 4) or len(pubkey) != (65 if pubkey[0] == 4 else 33):
+        return None
+    try:
+        return VerifyingKey.from_string(pubkey, curve=SECP256k1)
+    except (MalformedPointError, ValueError):
+        return None
+
+
+def ecdsa_verify(digest, pubkey, der_sig):
+    vk = _verifying_key(pubkey)
+    if vk is None:
+        return False
+    try:
+        return vk.verify_digest(der_sig, digest, sigdecode=sigdecode_der)
+    except (BadSignatureError, ValueError):
+        return False
+    except Exception:  # ecdsa raises its own DER errors for malformed encodings
+        return False
+
+
+@lru_cache(maxsize=4096)
+def lift_x(x_bytes):
+    """Point with even Y for an x-only key, or None"""
+    x = int.from_bytes(x_bytes, "big")
+    if x >= p:
+        return None
+    y_sq = (pow(x, 3, p) + 7) % p
+    y = pow(y_sq, (p + 1) // 4, p)
+    if pow(y, 2, p) != y_sq:
+        return None
+    return PointJacobi(SECP256k1.curve, x, y if y % 2 == 0 else p - y, 1, n)
+
+
+def schnorr_verify(msg, pubkey, sig):
+    """BIP340 verification of a 64-byte signature against an x-only key"""
+    if len(pubkey) != 32 or len(sig) != 64:
+        return False
+    P = lift_x(pubkey)
+    r = int.from_bytes(sig[0:32], "big")
+    s = int.from_bytes(sig[32:64], "big")
+    if P is None or r >= p or s >= n:
+        return False
+    e = int.from_bytes(tagged_hash("BIP0340/challenge", sig[0:32] + pubkey + msg), "big") % n
+    R = G.mul_add(s, P, n - e)
+    if R == INFINITY or R.y() % 2 != 0:
+        return False
+    return R.x() == r
+
+
+@lru_cache(maxsize=4096)
+def taproot_output_key(internal_key, merkle_root):
+    """(x-only output key, parity) for an internal key and Merkle root, or None"""
+    P = lift_x(internal_key)
+    if P is None:
+        return None
+    t = int.from_bytes(tagged_hash("TapTweak", internal_key + merkle_root), "big")
+    if t >= n:
+        return None
+    Q = P + G * t
+    if Q == INFINITY:
+        return None
+    return Q.x().to_bytes(32, "big"), Q.y() % 2
+
+
+def tapleaf_hash(script, leaf_version=TAPROOT_LEAF_TAPSCRIPT):
+    return tagged_hash("TapLeaf", bytes([leaf_version]) + compact_size(len(script)) + script)
+
+
+def control_block_merkle_root(control, leaf_hash):
+    """Walk the control block's path from a leaf to the Merkle root"""
+    k = leaf_hash
+    for offset in range(TAPROOT_CONTROL_BASE_SIZE, len(control), TAPROOT_CONTROL_NODE_SIZE):
+        node = control[offset:offset + TAPROOT_CONTROL_NODE_SIZE]
+        k = tagged_hash("TapBranch", k + node if k < node else node + k)
+    return k
+
+
+class TransactionChecker(SignatureChecker):
+    """SignatureChecker for input `index` of a TransactionContext"""
+
+    def __init__(self, ctx, index):
+        self.ctx = ctx
+        self.index = index
+
+    def check_ecdsa_signature(self, sig, pubkey, script_code, sigversion):
+        if sigversion == SIGVERSION_WITNESS_V0 and len(pubkey) != 33:
+            raise ScriptError("SCRIPT_ERR_WITNESS_PUBKEYTYPE")
+        if not sig:
+            return False
+        hash_type = sig[-1]
+        if sigversion == SIGVERSION_WITNESS_V0:
+            digest = self.ctx.segwit_v0_sighash(self.index, script_code, hash_type)
+        else:
+            digest = self.ctx.legacy_sighash(self.index, script_code, hash_type)
+        sigcache = self.ctx.sigcache
+        if sigcache is not None:
+            return sigcache.verify(ECDSA, digest, pubkey, sig[:-1], ecdsa_verify, self.ctx.erase_cached)
+        return ecdsa_verify(digest, pubkey, sig[:-1])
+
+    def check_schnorr_signature(self, sig, pubkey, sigversion, execdata):
+        if len(sig) == 64:
+            hash_type = SIGHASH_DEFAULT
+        elif len(sig) == 65:
+            hash_type = sig[64]
+            if hash_type == SIGHASH_DEFAULT:
+                raise ScriptError("SCRIPT_ERR_SCHNORR_SIG_HASHTYPE")
+        else:
+            raise ScriptError("SCRIPT_ERR_SCHNORR_SIG_SIZE")
+        if hash_type not in (0x00, 0x01, 0x02, 0x03, 0x81, 0x82, 0x83):
+            raise ScriptError("SCRIPT_ERR_SCHNORR_SIG_HASHTYPE")
+        digest = self.ctx.taproot_sighash(self.index, hash_type, execdata)
+        if digest is None:
+            raise ScriptError("SCRIPT_ERR_SCHNORR_SIG_HASHTYPE")
+        sigcache = self.ctx.sigcache
+        if sigcache is not None:
+            return sigcache.verify(SCHNORR, digest, pubkey, sig[:64], schnorr_verify, self.ctx.erase_cached)
+        return schnorr_verify(digest, pubkey, sig[:64])
+
+    def check_locktime(self, locktime):
+        tx = self.ctx.tx
+        if (tx.locktime < LOCKTIME_THRESHOLD) != (locktime < LOCKTIME_THRESHOLD):
+            return False
+        if locktime > tx.locktime:
+            return False
+        return tx.inputs[self.index].sequence != SEQUENCE_FINAL
+
+    def check_sequence(self, sequence):
+        tx = self.ctx.tx
+        tx_sequence = tx.inputs[self.index].sequence
+        if tx.version < 2 or tx_sequence & SEQUENCE_LOCKTIME_DISABLE_FLAG:
+            return False
+        mask = SEQUENCE_LOCKTIME_TYPE_FLAG | SEQUENCE_LOCKTIME_MASK
+        tx_sequence &= mask
+        sequence &= mask
+        if (tx_sequence < SEQUENCE_LOCKTIME_TYPE_FLAG) != (sequence < SEQUENCE_LOCKTIME_TYPE_FLAG):
+            return False
+        return sequence <= tx_sequence
+
+
+# ---------------------------------------------------------------------------
+# VerifyScript
+# ---------------------------------------------------------------------------
+
+def _witness_program(script_pubkey):
+    """(version, program) if script_pubkey is a witness program, else None"""
+    if not 4 <= len(script_pubkey) <= 42:
+        return None
+    op = script_pubkey[0]
+    if op != 0 and not 0x51 <= op <= 0x60:
+        return None
+    if script_pubkey[1] + 2 != len(script_pubkey):
+        return None
+    return (0 if op == 0 else op - 0x50), script_pubkey[2:]
+
+
+def _is_p2sh(script_pubkey):
+    return (len(script_pubkey) == 23 and script_pubkey[0] == 0xa9
+            and script_pubkey[1] == 0x14 and script_pubkey[22] == 0x87)
+
+
+def _is_push_only(script):
+    return all(op <= 0x60 for op, _ in compile_script(script).ops)
+
+
+def _verify_witness_program(ctx, index, version, program, witness, is_p2sh, flags):
+    checker = TransactionChecker(ctx, index)
+    if version == 0:
+        if len(program) == 32:
+            if not witness:
+                raise ScriptError("SCRIPT_ERR_WITNESS_PROGRAM_WITNESS_EMPTY")
+            script = witness[-1]
+            if sha256(script) != program:
+                raise ScriptError("SCRIPT_ERR_WITNESS_PROGRAM_MISMATCH")
+            return execute_witness_script(script, list(witness[:-1]), checker, SIGVERSION_WITNESS_V0,
+                                          flags=flags)
+        if len(program) == 20:
+            if len(witness) != 2:
+                raise ScriptError("SCRIPT_ERR_WITNESS_PROGRAM_MISMATCH")
+            script = b"\x76\xa9\x14" + program + b"\x88\xac"
+            return execute_witness_script(script, list(witness), checker, SIGVERSION_WITNESS_V0,
+                                          flags=flags)
+        raise ScriptError("SCRIPT_ERR_WITNESS_PROGRAM_WRONG_LENGTH")
+
+    if version == 1 and len(program) == 32 and not is_p2sh:
+        if not witness:
+            raise ScriptError("SCRIPT_ERR_WITNESS_PROGRAM_WITNESS_EMPTY")
+        stack = list(witness)
+        execdata = ExecData()
+        if len(stack) >= 2 and stack[-1] and stack[-1][0] == ANNEX_TAG:
+            execdata.annex = stack.pop()
+        if len(stack) == 1:
+            # Key path
+            if not checker.check_schnorr_signature(stack[0], program, SIGVERSION_TAPROOT, execdata):
+                raise ScriptError("SCRIPT_ERR_SCHNORR_SIG")
+            return True
+        # Script path
+        control = stack.pop()
+        script = stack.pop()
+        if (len(control) < TAPROOT_CONTROL_BASE_SIZE
+                or (len(control) - TAPROOT_CONTROL_BASE_SIZE) % TAPROOT_CONTROL_NODE_SIZE
+                or len(control) > TAPROOT_CONTROL_BASE_SIZE
+                + TAPROOT_CONTROL_MAX_NODES * TAPROOT_CONTROL_NODE_SIZE):
+            raise ScriptError("SCRIPT_ERR_TAPROOT_WRONG_CONTROL_SIZE")
+        leaf_version = control[0] & TAPROOT_LEAF_MASK
+        execdata.tapleaf_hash = tapleaf_hash(script, leaf_version)
+        merkle_root = control_block_merkle_root(control, execdata.tapleaf_hash)
+        output = taproot_output_key(control[1:33], merkle_root)
+        if output is None or output != (program, control[0] & 1):
+            raise ScriptError("SCRIPT_ERR_WITNESS_PROGRAM_MISMATCH")
+        if leaf_version != TAPROOT_LEAF_TAPSCRIPT:
+            if flags & VERIFY_DISCOURAGE_UPGRADABLE_NOPS:
+                raise ScriptError("SCRIPT_ERR_DISCOURAGE_UPGRADABLE_TAPROOT_VERSION")
+            return True
+        witness_size = len(compact_size(len(witness))) + sum(
+            len(compact_size(len(item))) + len(item) for item in witness)
+        execdata.validation_weight_left = witness_size + interpreter.VALIDATION_WEIGHT_OFFSET
+        return execute_witness_script(script, stack, checker, SIGVERSION_TAPSCRIPT, execdata, flags)
+
+    # Future witness versions (and P2SH-wrapped Taproot) are anyone-can-spend
+    if flags & VERIFY_DISCOURAGE_UPGRADABLE_NOPS:
+        raise ScriptError("SCRIPT_ERR_DISCOURAGE_UPGRADABLE_WITNESS_PROGRAM")
+    return True
+
+
+def verify_input(ctx, index, flags=STANDARD_VERIFY_FLAGS):
+    """
+    Verify input `index` of a TransactionContext against the output it spends.
+
+    Raises:
+        ScriptError: if the input is not authorized
+    """
+    txin = ctx.tx.inputs[index]
+    script_sig = txin.script_sig
+    script_pubkey = ctx.spent_outputs[index].script_pubkey
+    witness = ctx.tx.witnesses[index]
+    checker = TransactionChecker(ctx, index)
+
+    if not _is_push_only(script_sig):
+        raise ScriptError("SCRIPT_ERR_SIG_PUSHONLY")
+    stack = eval_script(script_sig, [], checker, SIGVERSION_BASE, flags=flags)
+    stack_copy = list(stack)
+    eval_script(script_pubkey, stack, checker, SIGVERSION_BASE, flags=flags)
+    if not stack or not cast_to_bool(stack[-1]):
+        raise ScriptError("SCRIPT_ERR_EVAL_FALSE")
+
+    had_witness = False
+    program = _witness_program(script_pubkey)
+    if program is not None:
+        had_witness = True
+        if script_sig:
+            raise ScriptError("SCRIPT_ERR_WITNESS_MALLEATED")
+        _verify_witness_program(ctx, index, program[0], program[1], witness, False, flags)
+        stack = [b"\x01"]
+    elif _is_p2sh(script_pubkey):
+        stack = stack_copy
+        redeem_script = stack.pop()
+        eval_script(redeem_script, stack, checker, SIGVERSION_BASE, flags=flags)
+        if not stack or not cast_to_bool(stack[-1]):
+            raise ScriptError("SCRIPT_ERR_EVAL_FALSE")
+        program = _witness_program(redeem_script)
+        if program is not None:
+            had_witness = True
+            if script_sig != compact_size(len(redeem_script)) + redeem_script:
+                raise ScriptError("SCRIPT_ERR_WITNESS_MALLEATED_P2SH")
+            _verify_witness_program(ctx, index, program[0], program[1], witness, True, flags)
+            stack = [b"\x01"]
+
+    if len(stack) != 1:
+        raise ScriptError("SCRIPT_ERR_CLEANSTACK")
+    if not had_witness and witness:
+        raise ScriptError("SCRIPT_ERR_WITNESS_UNEXPECTED")
+    return True
+
+
+def validate_transaction(tx, spent_outputs, flags=STANDARD_VERIFY_FLAGS, sigcache=None,
+                         erase_cached=False):
+    """
+    Verify every input of one transaction in this process, optionally
+    through a SignatureCache.
+
+    Returns:
+        (context, errors): errors[i] is None for a valid input or the
+        ScriptError code that rejected it
+    """
+    ctx = TransactionContext(tx, spent_outputs, sigcache, erase_cached)
+    errors = []
+    for index in range(len(ctx.tx.inputs)):
+        try:
+            verify_input(ctx, index, flags)
+            errors.append(None)
+        except ScriptError as e:
+            errors.append(str(e))
+    return ctx, errors
+
+
+# ---------------------------------------------------------------------------
+# Process pool
+# ---------------------------------------------------------------------------
+
+_worker_jobs = None
+_worker_flags = STANDARD_VERIFY_FLAGS
+_worker_sigcache = None
+_worker_context = (None, None)
+
+
+def _init_worker(jobs, flags, sigcache):
+    global _worker_jobs, _worker_flags, _worker_sigcache
+    _worker_jobs = jobs
+    _worker_flags = flags
+    _worker_sigcache = sigcache
+
+
+def _verify_task(task):
+    """Verify one (job, input) pair; reuses the context of the previous task's transaction"""
+    global _worker_context
+    job, index = task
+    if _worker_context[0] != job:
+        _worker_context = (job, TransactionContext(*_worker_jobs[job], sigcache=_worker_sigcache))
+    try:
+        verify_input(_worker_context[1], index, _worker_flags)
+        return None
+    except ScriptError as e:
+        return str(e)
+
+
+def validate_transactions(jobs, workers=None, flags=STANDARD_VERIFY_FLAGS, chunksize=None,
+                          sigcache=None):
+    """
+    Verify every input of many transactions across a process pool.
+
+    Args:
+        jobs: list of (raw transaction, spent outputs) pairs; spent outputs
+              are SpentOutput or (amount, script_pubkey) pairs in input order
+        workers: pool size (None = CPU count, 1 = no pool)
+        chunksize: inputs per task batch (default: about 4 batches per worker)
+        sigcache: SignatureCache; each pool worker gets its own copy, so
+                  only an in-process run (workers=1) adds to it
+
+    Returns:
+        list of (txid, errors) per job; errors[i] is None for a valid input
+    """
+    txs = [Transaction(raw) for raw, _ in jobs]
+    if workers == 1:
+        return [(tx.txid, validate_transaction(tx, spent, flags, sigcache)[1])
+                for tx, (_, spent) in zip(txs, jobs)]
+
+    tasks = [(job, index) for job, tx in enumerate(txs) for index in range(len(tx.inputs))]
+    workers = workers or os.cpu_count() or 1
+    if chunksize is None:
+        chunksize = max(1, len(tasks) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(jobs, flags, sigcache)) as pool:
+        flat = list(pool.map(_verify_task, tasks, chunksize=chunksize))
+
+    results = []
+    position = 0
+    for tx in txs:
+        count = len(tx.inputs)
+        results.append((tx.txid, flat[position:position + count]))
+        position += count
+    return results
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Update the Fee Estimates
+
+Feeds tools/fee_estimator.py from an Esplora API (ESPLORA_URL, as for
+tools/utxo_scanner.py) and saves the statistics to FEE_ESTIMATES
+(fee_estimates.json), where get_fee_config() finds them for the commit and
+reveal fees:
+
+1. Mempool arrivals: every --interval seconds, GET /mempool/recent gives the
+   newest mempool transactions with their fee and vsize. Each one is
+   recorded at the current tip height with process_transaction().
+2. Blocks: when /blocks/tip/height moves, each new block's txids
+   (/block-height/{height}, /block/{hash}/txids) go to process_block().
+   While no arrival is tracked, a block only needs its decay step, so its
+   txids are not fetched.
+3. Departures: after the blocks, /mempool/txids lists the mempool. A tracked
+   arrival that is neither confirmed nor still there was replaced or evicted,
+   and goes to remove_transaction(), as does one that has waited
+   max_target() blocks. Otherwise it would count as waiting in every later
+   estimate.
+4. After each block the estimates are saved and the fees get_fee_config()
+   now returns are printed.
+
+/mempool/recent does not tell whether a transaction has unconfirmed parents,
+so unlike Core every sampled arrival is recorded. An existing estimates file
+is resumed; arrivals tracked before a restart are not saved.
+
+Usage: python3 10_update_fee_estimates.py [--interval S] [--blocks N] [--output FILE] [--api-url URL]
+"""
+
+import argparse
+import time
+
+import requests
+
+from tools.brc20_config import CONFIRM_TARGET, FEE_ESTIMATES_FILE, get_fee_config
+from tools.fee_estimator import FeeEstimator, FeeEstimatorError
+from tools.utxo_scanner import ESPLORA_URL
+
+
+class EsploraFeed:
+    """The few Esplora endpoints the estimator needs"""
+
+    def __init__(self, api_url):
+        self.api_url = api_url.rstrip("/")
+        self.session = requests.Session()
+
+    def _get(self, path):
+        resp = self.session.get(f"{self.api_url}{path}", timeout=10)
+        resp.raise_for_status()
+        return resp
+
+    def tip_height(self):
+        return int(self._get("/blocks/tip/height").text)
+
+    def block_txids(self, height):
+        block_hash = self._get(f"/block-height/{height}").text.strip()
+        return self._get(f"/block/{block_hash}/txids").json()
+
+    def mempool_txids(self):
+        return set(self._get("/mempool/txids").json())
+
+    def recent(self):
+        """[(txid, sat/vB)] of the newest mempool transactions"""
+        return [(tx["txid"], tx["fee"] / tx["vsize"]) for tx in self._get("/mempool/recent").json()
+                if tx.get("vsize")]
+
+
+def load_estimator(path):
+    try:
+        return FeeEstimator.load(path)
+    except FileNotFoundError:
+        return FeeEstimator()
+    except (OSError, ValueError, KeyError, TypeError, FeeEstimatorError) as e:
+        print(f"[WARN] Starting over: {path} cannot be used ({type(e).__name__}: {e})")
+        return FeeEstimator()
+
+
+def catch_up(estimator, feed, tip):
+    """process_block() for every block up to tip; returns how many arrivals they confirmed"""
+    counted = 0
+    for height in range(estimator.best_height + 1, tip + 1):
+        counted += estimator.process_block(height, feed.block_txids(height) if estimator.tracked else [])
+    return counted
+
+
+def prune(estimator, feed):
+    """remove_transaction() for arrivals that left the mempool unconfirmed or waited too long"""
+    mempool = feed.mempool_txids()
+    if feed.tip_height() != estimator.best_height:
+        mempool = None   # a newer block may have confirmed some of them: check after catching up
+    oldest = estimator.best_height - estimator.max_target()
+    gone = [txid for txid, (height, _, _) in estimator.tracked.items()
+            if height <= oldest or (mempool is not None and txid not in mempool)]
+    for txid in gone:
+        estimator.remove_transaction(txid)
+    return len(gone)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="feed the fee estimator from an Esplora API")
+    parser.add_argument("--interval", type=float, default=10.0, help="seconds between mempool polls")
+    parser.add_argument("--blocks", type=int, default=0, help="stop after N new blocks (0: run until interrupted)")
+    parser.add_argument("--output", default=FEE_ESTIMATES_FILE, help="estimates file")
+    parser.add_argument("--api-url", default=ESPLORA_URL, help="Esplora base URL")
+    args = parser.parse_args()
+
+    feed = EsploraFeed(args.api_url)
+    estimator = load_estimator(args.output)
+
+    print("=" * 70)
+    print("UPDATE THE FEE ESTIMATES")
+    print("=" * 70)
+    try:
+        tip = feed.tip_height()
+    except requests.RequestException as e:
+        print(f"[ERROR] Cannot reach {args.api_url}: {e}")
+        return
+    if not estimator.best_height or tip - estimator.best_height > estimator.max_target():
+        estimator = FeeEstimator()
+        estimator.process_block(tip, [])   # too old to catch up with: start at the tip
+    print(f"{args.api_url}, tip {tip}; estimates from block {estimator.best_height} in {args.output}")
+
+    new_blocks = 0
+    seen = 0
+    try:
+        while True:
+            try:
+                for txid, feerate in feed.recent():
+                    if txid not in estimator.tracked:
+                        estimator.process_transaction(txid, feerate)
+                        seen += 1
+                tip = feed.tip_height()
+                if tip > estimator.best_height:
+                    blocks = tip - estimator.best_height
+                    confirmed = catch_up(estimator, feed, tip)
+                    dropped = prune(estimator, feed) if estimator.tracked else 0
+                    new_blocks += blocks
+                    estimator.save(args.output)
+                    config = get_fee_config(estimator)
+                    feerate = f"{config['feerate']:.1f} sat/vB" if config["feerate"] else "no estimate yet"
+                    print(f"  block {tip}: {seen:,} arrivals sampled, {confirmed} confirmed, "
+                          f"{dropped} dropped, {len(estimator.tracked):,} waiting; {CONFIRM_TARGET} blocks: {feerate} "
+                          f"(commit {config['commit_fee']}, reveal {config['reveal_fee']} sats)")
+                    if args.blocks and new_blocks >= args.blocks:
+                        break
+            except (requests.RequestException, ValueError, KeyError) as e:
+                print(f"[ERROR] {type(e).__name__}: {e}")
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        estimator.save(args.output)
+    print(f"Saved {args.output} at block {estimator.best_height}")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
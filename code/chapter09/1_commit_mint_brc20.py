@@ -6,6 +6,9 @@ Creates a commit transaction that sends funds to a temporary Taproot address
 embedding the BRC-20 inscription script, preparing for the reveal step.
 
 Workflow: commit (this script) -> broadcast -> wait for confirmation -> reveal
+
+With INSTRUMENT=<prefix> set, the steps are timed (tools/instrumentation.py)
+and written to <prefix>.prom and <prefix>.trace.json.
 """
 
 from bitcoinutils.setup import setup
@@ -14,14 +17,16 @@ from bitcoinutils.transactions import Transaction, TxInput, TxOutput, TxWitnessI
 from bitcoinutils.keys import PrivateKey
 
 # Import project utilities
+from tools.instrumentation import span, timed
 from tools.utxo_scanner import select_best_utxo
 from tools.brc20_config import (
     PRIVATE_KEY_WIF, NETWORK, FEE_CONFIG, 
-    get_brc20_hex, calculate_inscription_amount,
+    get_brc20_hex, calculate_inscription_amount, get_fee_config,
     INSCRIPTION_CONFIG, get_brc20_json
 )
 
-def create_mint_commit_transaction():
+@timed("commit")
+def create_mint_commit_transaction(fee_config=None, api_url=None):
     """
     Create BRC-20 MINT COMMIT transaction.
     
@@ -29,6 +34,10 @@ def create_mint_commit_transaction():
     script tree contains the inscription data.  The inscription is NOT yet
     revealed on-chain — only a hash commitment exists at this stage.
     
+    Args:
+        fee_config: commit / reveal fees (default: FEE_CONFIG)
+        api_url: Esplora API for the UTXO scan (default: ESPLORA_URL)
+    
     Returns:
         tuple: (commit_tx, temp_address, key_path_address) or (None, None, None) on failure
     """
@@ -42,9 +51,10 @@ def create_mint_commit_transaction():
     print(f"MINT data: {mint_json}")
     
     # Initialise keys
-    private_key = PrivateKey.from_wif(PRIVATE_KEY_WIF)
-    public_key = private_key.get_public_key()
-    key_path_address = public_key.get_taproot_address()  # main (funding) address
+    with span("commit.keys"):
+        private_key = PrivateKey.from_wif(PRIVATE_KEY_WIF)
+        public_key = private_key.get_public_key()
+        key_path_address = public_key.get_taproot_address()  # main (funding) address
     
     print(f"Private key WIF: {PRIVATE_KEY_WIF}")
     print(f"Public key: {public_key.to_hex()}")
@@ -52,31 +62,35 @@ def create_mint_commit_transaction():
     print(f"Main address: {key_path_address.to_string()}")
     
     # Select a UTXO large enough to cover inscription output + fee + dust-limit change
-    inscription_amount = calculate_inscription_amount()
-    min_utxo_amount = inscription_amount + FEE_CONFIG["commit_fee"] + 546  # reserve for change
+    fee_config = fee_config or FEE_CONFIG
+    inscription_amount = calculate_inscription_amount(fee_config)
+    min_utxo_amount = inscription_amount + fee_config["commit_fee"] + 546  # reserve for change
     
-    selected_utxo = select_best_utxo(min_utxo_amount)
+    with span("commit.select_utxo"):
+        selected_utxo = select_best_utxo(min_utxo_amount, api_url=api_url)
     if not selected_utxo:
         print(f"[ERROR] No UTXO with at least {min_utxo_amount} sats available")
         return None, None, None
     
     # Build the inscription script (Ordinals envelope)
-    brc20_hex = get_brc20_hex("mint")
-    inscription_script = Script([
-        public_key.to_x_only_hex(),
-        "OP_CHECKSIG",
-        "OP_0",
-        "OP_IF",
-        INSCRIPTION_CONFIG["ord_marker"],
-        "OP_1", 
-        INSCRIPTION_CONFIG["content_type_hex"],
-        "OP_0",
-        brc20_hex,
-        "OP_ENDIF"
-    ])
+    with span("commit.inscription_script"):
+        brc20_hex = get_brc20_hex("mint")
+        inscription_script = Script([
+            public_key.to_x_only_hex(),
+            "OP_CHECKSIG",
+            "OP_0",
+            "OP_IF",
+            INSCRIPTION_CONFIG["ord_marker"],
+            "OP_1", 
+            INSCRIPTION_CONFIG["content_type_hex"],
+            "OP_0",
+            brc20_hex,
+            "OP_ENDIF"
+        ])
     
     # Derive the temporary address from a single-leaf script tree
-    temp_address = public_key.get_taproot_address([[inscription_script]])
+    with span("commit.taproot_tree"):
+        temp_address = public_key.get_taproot_address([[inscription_script]])
     
     print(f"\n=== Address Verification ===")
     print(f"Temporary address: {temp_address.to_string()}")
@@ -84,7 +98,7 @@ def create_mint_commit_transaction():
     
     # Calculate amounts
     utxo_amount = selected_utxo["amount"]
-    commit_fee = FEE_CONFIG["commit_fee"]
+    commit_fee = fee_config["commit_fee"]
     change_amount = utxo_amount - inscription_amount - commit_fee
     
     print(f"\n=== Amount Breakdown ===")
@@ -135,12 +149,13 @@ def create_mint_commit_transaction():
             script_pubkey_for_signing = key_path_address.to_script_pub_key()
             print(f"[WARN] UTXO has no address info — falling back to current address scriptPubKey")
         
-        signature = private_key.sign_taproot_input(
-            commit_tx,
-            0,
-            [script_pubkey_for_signing],
-            [utxo_amount]
-        )
+        with span("commit.sign"):
+            signature = private_key.sign_taproot_input(
+                commit_tx,
+                0,
+                [script_pubkey_for_signing],
+                [utxo_amount]
+            )
         
         commit_tx.witnesses.append(TxWitnessInput([signature]))
         
@@ -183,8 +198,13 @@ def broadcast_mint_commit(commit_tx):
     print(f"After broadcasting, wait for at least 1 confirmation, then run 2_reveal_mint_brc20.py")
 
 if __name__ == "__main__":
+    # Fees from the local fee estimates when available, FEE_CONFIG otherwise
+    fee_config = get_fee_config()
+    if fee_config["feerate"]:
+        print(f"Estimated feerate: {fee_config['feerate']:.1f} sat/vB")
+    
     # Create MINT COMMIT transaction
-    commit_tx, temp_address, key_path_address = create_mint_commit_transaction()
+    commit_tx, temp_address, key_path_address = create_mint_commit_transaction(fee_config)
     
     if commit_tx:
         # Persist key information for the reveal step
@@ -192,7 +212,8 @@ if __name__ == "__main__":
             "commit_txid": commit_tx.get_txid(),
             "temp_address": temp_address.to_string(),
             "key_path_address": key_path_address.to_string(),
-            "inscription_amount": calculate_inscription_amount(),
+            "inscription_amount": calculate_inscription_amount(fee_config),
+            "reveal_fee": fee_config["reveal_fee"],
             "operation": "mint"
         }
         
@@ -7,6 +7,9 @@ the inscription data on-chain via a script-path spend.
 
 Prerequisite: Run 1_commit_mint_brc20.py first and ensure the commit
 transaction is confirmed on the network.
+
+With INSTRUMENT=<prefix> set, the steps are timed (tools/instrumentation.py)
+and written to <prefix>.prom and <prefix>.trace.json.
 """
 
 from bitcoinutils.setup import setup
@@ -17,6 +20,7 @@ from bitcoinutils.keys import PrivateKey
 
 # Import project utilities
 import json
+from tools.instrumentation import span, timed
 from tools.brc20_config import (
     PRIVATE_KEY_WIF, NETWORK, FEE_CONFIG,
     get_brc20_hex, INSCRIPTION_CONFIG, get_brc20_json
@@ -32,6 +36,7 @@ def load_mint_commit_info():
         print("Please run 1_commit_mint_brc20.py first to create the MINT COMMIT transaction")
         return None
 
+@timed("reveal")
 def create_mint_reveal_transaction():
     """
     Create BRC-20 MINT REVEAL transaction.
@@ -67,9 +72,10 @@ def create_mint_reveal_transaction():
     print(f"MINT data: {mint_json}")
     
     # Initialise keys
-    private_key = PrivateKey.from_wif(PRIVATE_KEY_WIF)
-    public_key = private_key.get_public_key()
-    key_path_address = public_key.get_taproot_address()
+    with span("reveal.keys"):
+        private_key = PrivateKey.from_wif(PRIVATE_KEY_WIF)
+        public_key = private_key.get_public_key()
+        key_path_address = public_key.get_taproot_address()
     
     print(f"\n=== Address Verification ===")
     print(f"Derived main address: {key_path_address.to_string()}")
@@ -82,22 +88,24 @@ def create_mint_reveal_transaction():
     print("Address verification passed")
     
     # Rebuild the inscription script (must match commit step exactly)
-    brc20_hex = get_brc20_hex("mint")
-    inscription_script = Script([
-        public_key.to_x_only_hex(),
-        "OP_CHECKSIG", 
-        "OP_0",
-        "OP_IF",
-        INSCRIPTION_CONFIG["ord_marker"],
-        "OP_1",
-        INSCRIPTION_CONFIG["content_type_hex"],
-        "OP_0",
-        brc20_hex,
-        "OP_ENDIF"
-    ])
+    with span("reveal.inscription_script"):
+        brc20_hex = get_brc20_hex("mint")
+        inscription_script = Script([
+            public_key.to_x_only_hex(),
+            "OP_CHECKSIG", 
+            "OP_0",
+            "OP_IF",
+            INSCRIPTION_CONFIG["ord_marker"],
+            "OP_1",
+            INSCRIPTION_CONFIG["content_type_hex"],
+            "OP_0",
+            brc20_hex,
+            "OP_ENDIF"
+        ])
     
     # Verify the temporary address can be reproduced
-    temp_address = public_key.get_taproot_address([[inscription_script]])
+    with span("reveal.taproot_tree"):
+        temp_address = public_key.get_taproot_address([[inscription_script]])
     
     print(f"\n=== Script Verification ===")
     print(f"Derived temporary address: {temp_address.to_string()}")
@@ -112,7 +120,7 @@ def create_mint_reveal_transaction():
     
     # Calculate reveal output amount
     inscription_amount = commit_info['inscription_amount']
-    reveal_fee = FEE_CONFIG['reveal_fee']
+    reveal_fee = commit_info.get('reveal_fee', FEE_CONFIG['reveal_fee'])  # chosen at commit time
     output_amount = inscription_amount - reveal_fee
     
     print(f"\n=== MINT REVEAL Amount Breakdown ===")
@@ -137,26 +145,28 @@ def create_mint_reveal_transaction():
     
     # Sign using script-path spend
     try:
-        signature = private_key.sign_taproot_input(
-            reveal_tx,
-            0,
-            [temp_address.to_script_pub_key()],
-            [inscription_amount],
-            script_path=True,
-            tapleaf_script=inscription_script,
-            tweak=False
-        )
+        with span("reveal.sign"):
+            signature = private_key.sign_taproot_input(
+                reveal_tx,
+                0,
+                [temp_address.to_script_pub_key()],
+                [inscription_amount],
+                script_path=True,
+                tapleaf_script=inscription_script,
+                tweak=False
+            )
         
         print(f"Signature: {signature}")
         
         # Construct the control block
         # Second argument is the script tree; single leaf requires double-nested list
-        control_block = ControlBlock(
-            public_key,
-            [[inscription_script]],  # script tree: single leaf
-            0,                        # script index in tree (0 for single leaf)
-            is_odd=temp_address.is_odd()
-        )
+        with span("reveal.control_block"):
+            control_block = ControlBlock(
+                public_key,
+                [[inscription_script]],  # script tree: single leaf
+                0,                        # script index in tree (0 for single leaf)
+                is_odd=temp_address.is_odd()
+            )
         
         print(f"Control block: {control_block.to_hex()}")
         print(f"Parity bit: {temp_address.is_odd()}")
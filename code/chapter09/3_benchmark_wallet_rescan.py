@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Wallet Rescan Benchmark
+
+Rescans a local block store for the coins of a BIP86 wallet with
+tools/wallet_rescanner.py:
+
+1. Builds (once, then reuses) a regtest-style chain in a BlockStore: every
+   block holds random transactions, two payments to the wallet's receive
+   addresses (each index a few past the previous one, within the gap limit)
+   and one spend of a wallet coin with change to the change branch
+2. Derives --watched BIP86 scriptPubKeys from the account tpub (saved in a
+   checkpoint, so later runs load them instead of deriving again)
+3. Full rescan with all of them watched: time per block, tx/s, and the
+   same blocks checked against 1,000 watched scripts and, for a few blocks,
+   against a plain list instead of a dict
+4. Interrupted rescan: stop halfway, resume from the checkpoint in a new
+   scanner, compare with the full rescan
+5. Dynamic window: start from only gap-limit scripts per branch and let the
+   rescanner extend the windows as payments are found
+
+Every scan is checked against the wallet coins the generator created.
+
+Usage: python3 3_benchmark_wallet_rescan.py [--blocks N] [--txs N] [--watched N] [--workdir DIR]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import statistics
+import struct
+import tempfile
+import time
+
+from tools.block_store import BlockStore, compact_size, iter_block_txs, make_block, parse_tx, txid
+from tools.wallet_rescanner import GAP_LIMIT, WalletRescanner, hd_wallet
+
+MNEMONIC = "abandon " * 11 + "about"
+WITNESS = b"\x01\x40" + b"\x5a" * 64  # one 64-byte Schnorr signature
+
+
+def raw_tx(prevouts, outputs, coinbase_height=None):
+    """Serialized transaction: key path spends of prevouts, or a coinbase"""
+    parts = [struct.pack("<i", 2)]
+    if coinbase_height is None:
+        parts.append(b"\x00\x01")
+        parts.append(compact_size(len(prevouts)))
+        for prevout in prevouts:
+            parts.append(prevout + b"\x00" + b"\xfd\xff\xff\xff")
+    else:
+        height = coinbase_height.to_bytes(4, "little")
+        parts.append(b"\x01" + b"\x00" * 32 + b"\xff" * 4 + b"\x05\x04" + height + b"\xff" * 4)
+    parts.append(compact_size(len(outputs)))
+    for amount, spk in outputs:
+        parts.append(struct.pack("<q", amount) + compact_size(len(spk)) + spk)
+    if coinbase_height is None:
+        parts.append(WITNESS * len(prevouts))
+    parts.append(b"\x00" * 4)
+    return b"".join(parts)
+
+
+def random_script(rng):
+    if rng.random() < 0.6:
+        return b"\x51\x20" + rng.randbytes(32)
+    return b"\x00\x14" + rng.randbytes(20)
+
+
+class ChainGenerator:
+    """Random blocks with the wallet's payments in them; tracks the wallet's coins"""
+
+    def __init__(self, xpub, txs_per_block, gap_limit, seed=42):
+        self.xpub = xpub
+        self.txs = txs_per_block
+        self.gap_limit = gap_limit
+        self.rng = random.Random(seed)
+        self.next_index = [0, 0]
+        self.coins = {}  # prevout -> amount
+
+    def _wallet_script(self, branch):
+        index = self.next_index[branch]
+        self.next_index[branch] += self.rng.randint(1, self.gap_limit - 1)
+        return hd_wallet.xpub_script_pubkeys(self.xpub, hd_wallet.P2TR, index, 1, change=branch)[0]
+
+    def _add(self, raw):
+        tx = parse_tx(raw)
+        tx_hash = txid(tx)
+        for prevout in tx.prevouts:
+            self.coins.pop(prevout, None)
+        for vout, (amount, spk) in enumerate(tx.outputs):
+            if spk in self.ours:
+                self.coins[tx_hash + vout.to_bytes(4, "little")] = amount
+        return raw
+
+    def block(self, height, prev_hash):
+        rng = self.rng
+        self.ours = set()
+        others = []
+        for _ in range(self.txs - 3):
+            prevouts = [rng.randbytes(32) + rng.randrange(4).to_bytes(4, "little")
+                        for _ in range(rng.choice((1, 1, 1, 2, 3)))]
+            outputs = [(rng.randrange(546, 10 ** 7), random_script(rng)) for _ in range(rng.choice((1, 2, 2, 3)))]
+            others.append(raw_tx(prevouts, outputs))
+        ours = []
+        for _ in range(2):
+            spk = self._wallet_script(0)
+            self.ours.add(spk)
+            prevout = rng.randbytes(32) + b"\x00" * 4
+            ours.append((prevout, [(rng.randrange(10 ** 4, 10 ** 6), random_script(rng)),
+                                   (rng.randrange(10 ** 5, 10 ** 7), spk)]))
+        if len(self.coins) > 2:
+            prevout = rng.choice(sorted(self.coins))
+            spk = self._wallet_script(1)
+            self.ours.add(spk)
+            amount = self.coins[prevout]
+            ours.append((prevout, [(amount // 3, random_script(rng)), (amount - amount // 3 - 200, spk)]))
+        txs = [raw_tx([], [(50 * 10 ** 8, random_script(rng))], coinbase_height=height)]
+        positions = sorted(rng.sample(range(len(others) + len(ours)), len(ours)))
+        for i in range(len(others) + len(ours)):
+            if positions and positions[0] == i:
+                positions.pop(0)
+                prevout, outputs = ours.pop(0)
+                txs.append(raw_tx([prevout], outputs))
+            else:
+                txs.append(others.pop())
+        # the wallet's coins, as a scanner should find them
+        for raw in txs:
+            self._add(raw)
+        return make_block(prev_hash, txs, 1700000000 + height * 600)
+
+
+def build_chain(path, xpub, blocks, txs_per_block, gap_limit):
+    """The store at path, generated unless it already has these blocks; returns (store, coins)"""
+    marker = os.path.join(path, "generator.txt")
+    params = f"{xpub} {blocks} {txs_per_block} {gap_limit}"
+    generator = ChainGenerator(xpub, txs_per_block, gap_limit)
+    reuse = os.path.exists(marker) and open(marker).read() == params
+    if not reuse:
+        shutil.rmtree(path, ignore_errors=True)
+    store = BlockStore(path)
+    prev_hash = b"\x00" * 32
+    for height in range(blocks):
+        block = generator.block(height, prev_hash)
+        if not reuse:
+            store.append(block)
+        prev_hash = store.block_hash(height)
+    if not reuse:
+        with open(marker, "w") as f:
+            f.write(params)
+    return store, generator.coins, reuse
+
+
+def checkpoint_copy(source, target):
+    for suffix in ("", ".scripts0", ".scripts1"):
+        shutil.copyfile(source + suffix, target + suffix)
+    return target
+
+
+def found(scanner, coins):
+    ours = {prevout: utxo.amount for prevout, utxo in scanner.utxos.items()}
+    return "all coins found" if ours == coins else f"MISMATCH ({len(ours)} vs {len(coins)} coins)"
+
+
+def list_scan(block, scripts):
+    """The same check with the watched scripts in a list: one comparison per script"""
+    hits = 0
+    for tx in iter_block_txs(block):
+        for _, spk in tx.outputs:
+            if spk in scripts:
+                hits += 1
+    return hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description="gap-limit wallet rescan benchmark")
+    parser.add_argument("--blocks", type=int, default=200, help="blocks in the chain")
+    parser.add_argument("--txs", type=int, default=400, help="transactions per block")
+    parser.add_argument("--watched", type=int, default=100000, help="scriptPubKeys watched in the full rescan")
+    parser.add_argument("--gap-limit", type=int, default=GAP_LIMIT, help="BIP44 gap limit")
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "taproot-wallet-rescan"),
+                        help="block store and checkpoints (kept between runs)")
+    args = parser.parse_args()
+
+    wallet = hd_wallet.HDWallet.from_mnemonic(MNEMONIC, network="regtest")
+    xpub = wallet.account_xpub(86)
+    os.makedirs(args.workdir, exist_ok=True)
+
+    print("=" * 70)
+    print("WALLET RESCAN BENCHMARK")
+    print("=" * 70)
+    print(f"Account: m/86'/1'/0' {xpub[:24]}...")
+
+    # 1. Chain
+    start = time.perf_counter()
+    store, coins, reused = build_chain(os.path.join(args.workdir, "blocks"), xpub, args.blocks,
+                                       args.txs, args.gap_limit)
+    total_txs = args.blocks * args.txs
+    print(f"\n1. Block store: {len(store)} blocks, {total_txs:,} transactions, "
+          f"{'reused' if reused else 'generated'} in {time.perf_counter() - start:.1f} s")
+    print(f"   Wallet: {len(coins)} unspent coins, {sum(coins.values()):,} sat")
+
+    # 2. Watched scripts
+    base = os.path.join(args.workdir, f"watch-{args.watched}.json")
+    start = time.perf_counter()
+    if not os.path.exists(base):
+        scanner = WalletRescanner(xpub, args.gap_limit, lookahead=args.watched // 2, checkpoint=base)
+        scanner.save()
+        print(f"\n2. Derived {len(scanner.watched):,} BIP86 scriptPubKeys in {scanner.derive_seconds:.1f} s "
+              f"({len(scanner.watched) / scanner.derive_seconds:,.0f}/s), saved to the checkpoint")
+    else:
+        scanner = WalletRescanner(xpub, args.gap_limit, checkpoint=base)
+        print(f"\n2. Loaded {len(scanner.watched):,} watched scriptPubKeys from the checkpoint "
+              f"in {time.perf_counter() - start:.2f} s")
+
+    # 3. Full rescan
+    full = WalletRescanner(xpub, args.gap_limit, checkpoint=checkpoint_copy(base, base + ".full"))
+    watched = len(full.watched)
+    start = time.perf_counter()
+    results = full.scan(store, checkpoint_every=50)
+    elapsed = time.perf_counter() - start
+    print(f"\n3. Full rescan, {watched:,} watched scripts")
+    print(f"   {'Height':>8}{'Txs':>7}{'Received':>10}{'Spent':>7}{'ms/block':>10}{'tx/s':>10}")
+    step = max(1, len(results) // 10)
+    for result in results[::step]:
+        print(f"   {result.height:>8}{result.txs:>7}{result.received:>10}{result.spent:>7}"
+              f"{result.seconds * 1000:>10.2f}{result.txs / result.seconds:>10,.0f}")
+    times = sorted(result.seconds * 1000 for result in results)
+    print(f"   {len(results)} blocks in {elapsed:.2f} s (with reads and checkpoints): "
+          f"{len(results) / elapsed:,.1f} blocks/s, {total_txs / elapsed:,.0f} tx/s")
+    print(f"   ms/block: median {statistics.median(times):.2f}, p99 {times[int(len(times) * 0.99) - 1]:.2f}; "
+          f"{found(full, coins)}, balance {full.balance():,} sat")
+
+    small = WalletRescanner(xpub, args.gap_limit, lookahead=500)
+    small_watched = len(small.watched)
+    small_results = small.scan(store)
+    small_ms = statistics.median(result.seconds * 1000 for result in small_results)
+    print(f"   Same blocks starting with {small_watched:,} watched scripts: median {small_ms:.2f} ms/block "
+          f"({found(small, coins)})")
+    scripts = list(full.watched)
+    sample = [block for _, block in store.blocks(0, 3)]
+    start = time.perf_counter()
+    for block in sample:
+        list_scan(block, scripts)
+    list_ms = (time.perf_counter() - start) / len(sample) * 1000
+    print(f"   Watched scripts in a list instead of a dict: {list_ms:,.0f} ms/block "
+          f"({list_ms / statistics.median(times):,.0f}x slower, first {len(sample)} blocks)")
+
+    # 4. Interrupted rescan
+    resumable = checkpoint_copy(base, base + ".resume")
+    first = WalletRescanner(xpub, args.gap_limit, checkpoint=resumable)
+    first.scan(store, stop=args.blocks // 2, checkpoint_every=25)
+    start = time.perf_counter()
+    second = WalletRescanner(xpub, args.gap_limit, checkpoint=resumable)
+    resumed_at = second.height
+    second.scan(store, checkpoint_every=25)
+    resume_time = time.perf_counter() - start
+    same = second.utxos == full.utxos and second.used == full.used
+    print(f"\n4. Interrupted at block {resumed_at}, resumed from the checkpoint: "
+          f"{resume_time:.2f} s for the rest; same coins as the full rescan: {same}")
+
+    # 5. Dynamic window
+    dynamic = WalletRescanner(xpub, args.gap_limit)
+    start = time.perf_counter()
+    dynamic.scan(store)
+    elapsed = time.perf_counter() - start
+    derived = sum(len(scripts) for scripts in dynamic.scripts.values())
+    print(f"\n5. Starting from {args.gap_limit} scripts per branch: {dynamic.extensions} window extensions, "
+          f"{derived:,} scripts derived")
+    print(f"   Last used index: receive {dynamic.used[0]}, change {dynamic.used[1]}; "
+          f"{elapsed:.1f} s ({dynamic.derive_seconds:.1f} s deriving); {found(dynamic, coins)}")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+UTXO Set Benchmark
+
+Applies a generated regtest-style chain (tools/chain_generator.py) to the
+memory-mapped UTXO set of tools/utxo_set.py and to a plain dict
+{outpoint: Coin}, and compares:
+
+1. Initial sync: blocks/s and coin updates/s (inputs spent + outputs
+   added), Python heap used by each model (tracemalloc), bytes per coin
+2. Lookups: random get() of existing and missing outpoints
+3. Reorg: undo the last blocks from their (serialized) undo records and
+   apply them again; the set must match the dict afterwards
+4. Restart: reopening the set vs rebuilding the dict from the blocks
+
+Usage: python3 4_benchmark_utxo_set.py [--blocks N] [--txs N] [--reorg N] [--workdir DIR]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from tools.block_store import iter_block_txs, txid
+from tools.chain_generator import build_store
+from tools.utxo_set import Coin, UTXOSet, decode_undo, encode_undo, is_unspendable
+
+
+def apply_dict(utxos, height, block):
+    """The same block applied to a dict, input by input and output by output"""
+    for index, tx in enumerate(iter_block_txs(block)):
+        if index:
+            for prevout in tx.prevouts:
+                del utxos[prevout]
+        tx_hash = txid(tx)
+        for vout, (amount, spk) in enumerate(tx.outputs):
+            if not is_unspendable(spk):
+                utxos[tx_hash + vout.to_bytes(4, "little")] = Coin(amount, bytes(spk), height, index == 0)
+
+
+def block_updates(block):
+    updates = 0
+    for tx in iter_block_txs(block):
+        updates += len(tx.prevouts) + len(tx.outputs)
+    return updates
+
+
+def main():
+    parser = argparse.ArgumentParser(description="memory-mapped UTXO set benchmark")
+    parser.add_argument("--blocks", type=int, default=400, help="blocks in the chain")
+    parser.add_argument("--txs", type=int, default=1000, help="transactions per block")
+    parser.add_argument("--reorg", type=int, default=10, help="blocks to undo and apply again (at least 1)")
+    parser.add_argument("--lookups", type=int, default=100000, help="random lookups")
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "taproot-utxo-set"),
+                        help="block store and UTXO set")
+    args = parser.parse_args()
+    args.reorg = max(1, min(args.reorg, args.blocks - 1))
+
+    print("=" * 70)
+    print("MEMORY-MAPPED UTXO SET BENCHMARK")
+    print("=" * 70)
+    start = time.perf_counter()
+    store, reused = build_store(os.path.join(args.workdir, "blocks"), args.blocks, args.txs)
+    print(f"Chain: {len(store)} blocks of {args.txs} transactions, "
+          f"{'reused' if reused else 'generated'} in {time.perf_counter() - start:.1f} s")
+
+    # 1. Initial sync; the last --reorg blocks keep undo records on disk
+    set_path = os.path.join(args.workdir, "utxo")
+    undo_path = os.path.join(args.workdir, "undo")
+    for path in (set_path, undo_path):
+        shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(undo_path)
+    synced = args.blocks - args.reorg
+    utxo_set = UTXOSet(set_path)
+    start = time.perf_counter()
+    for height, block in store.blocks(0, synced):
+        utxo_set.apply_block(height, block)
+        if height % 100 == 99:
+            utxo_set.flush()
+    utxo_set.flush()
+    set_time = time.perf_counter() - start
+    # Python memory the set holds on to while it keeps applying blocks
+    tracemalloc.start()
+    for height, block in store.blocks(synced):
+        with open(os.path.join(undo_path, f"{height:08d}.dat"), "wb") as f:
+            f.write(encode_undo(utxo_set.apply_block(height, block)))
+    utxo_set.flush()
+    del block
+    set_heap = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    utxos = {}
+    for height, block in store.blocks(0, synced):
+        apply_dict(utxos, height, block)
+    dict_time = time.perf_counter() - start
+    for height, block in store.blocks(synced):
+        apply_dict(utxos, height, block)
+    tracemalloc.start()
+    traced = {}
+    for height, block in store.blocks():
+        apply_dict(traced, height, block)
+    dict_heap = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del traced
+
+    stats = utxo_set.stats()
+    coins = len(utxos)
+    rate_updates = sum(block_updates(block) for _, block in store.blocks(0, synced))
+    print(f"\n1. Initial sync of {synced} blocks ({rate_updates:,} updates), {coins:,} coins at the tip")
+    print(f"  {'Model':<22}{'Time (s)':>10}{'blocks/s':>10}{'updates/s':>12}")
+    for name, elapsed in [("dict", dict_time), ("mmap UTXOSet", set_time)]:
+        print(f"  {name:<22}{elapsed:>10.2f}{synced / elapsed:>10.1f}{rate_updates / elapsed:>12,.0f}")
+    print(f"  dict: {dict_heap / 1e6:.1f} MB of Python heap, {dict_heap / coins:.0f} bytes per coin")
+    print(f"  UTXOSet: {set_heap / 1e3:.1f} KB of Python heap held after {args.reorg} more blocks; "
+          f"the coins are in the files")
+    print(f"  UTXOSet files: table {stats['table_bytes'] / 1e6:.1f} MB ({stats['capacity']:,} slots, "
+          f"load {stats['load_factor']:.2f}), live scripts {stats['live_payload_bytes'] / 1e6:.1f} MB, "
+          f"{stats['bytes_per_coin']:.0f} bytes per coin")
+    print(f"  Spent payloads in the blob: {(stats['blob_bytes'] - stats['live_payload_bytes']) / 1e6:.1f} MB "
+          f"(reclaimed by compact())")
+
+    # 2. Lookups
+    rng = random.Random(3)
+    present = rng.sample(sorted(utxos), min(args.lookups, coins))
+    missing = [rng.randbytes(36) for _ in range(len(present))]
+    print(f"\n2. Lookups ({len(present):,} present, {len(missing):,} missing)")
+    for name, get in [("dict", utxos.get), ("mmap UTXOSet", utxo_set.get)]:
+        start = time.perf_counter()
+        hits = sum(1 for outpoint in present if get(outpoint) is not None)
+        present_time = time.perf_counter() - start
+        start = time.perf_counter()
+        false_hits = sum(1 for outpoint in missing if get(outpoint) is not None)
+        missing_time = time.perf_counter() - start
+        print(f"  {name:<22}{len(present) / present_time:>12,.0f} hits/s{len(missing) / missing_time:>12,.0f} misses/s"
+              f"   ({hits:,} found, {false_hits} false)")
+    same = all(utxo_set.get(outpoint) == utxos[outpoint] for outpoint in present)
+    print(f"  Coins identical to the dict (sampled): {same}")
+
+    # 3. Reorg
+    undo_files = sorted(os.listdir(undo_path))
+    start = time.perf_counter()
+    for name in reversed(undo_files):
+        with open(os.path.join(undo_path, name), "rb") as f:
+            utxo_set.undo_block(decode_undo(f.read()))
+    undo_time = time.perf_counter() - start
+    rolled_back = len(utxo_set)
+    start = time.perf_counter()
+    for height, block in store.blocks(synced):
+        utxo_set.apply_block(height, block)
+    redo_time = time.perf_counter() - start
+    same = len(utxo_set) == coins and all(utxo_set.get(outpoint) == utxos[outpoint] for outpoint in present)
+    size = sum(os.path.getsize(os.path.join(undo_path, name)) for name in undo_files)
+    print(f"\n3. Reorg of {args.reorg} blocks: undo {undo_time * 1000 / args.reorg:.1f} ms/block "
+          f"(back to {rolled_back:,} coins at height {synced - 1}), "
+          f"apply again {redo_time * 1000 / args.reorg:.1f} ms/block; matches the dict: {same}")
+    print(f"  Undo records: {size / args.reorg / 1e3:.1f} KB per block")
+
+    # 4. Restart
+    utxo_set.compact()
+    utxo_set.close()
+    start = time.perf_counter()
+    reopened = UTXOSet(set_path)
+    open_time = time.perf_counter() - start
+    same = len(reopened) == coins and all(reopened.get(outpoint) == utxos[outpoint] for outpoint in present[:1000])
+    print(f"\n4. Restart: reopen the set in {open_time * 1000:.2f} ms (rebuilding the dict: {dict_time:.1f} s); "
+          f"intact: {same}, height {reopened.height}")
+    print(f"  After compact(): {reopened.stats()['blob_bytes'] / 1e6:.1f} MB of scripts")
+    reopened.close()
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
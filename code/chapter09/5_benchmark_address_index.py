@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Address Index Benchmark
+
+Builds the address index of tools/address_index.py over a generated chain.
+A fixed set of --addresses scripts receives a share of the payments, so they
+collect a history. The index is served with tools/esplora_api.py:
+
+1. Initial sync: bulk load of all blocks but the last --follow, in rows/s.
+   For comparison, the same work through add_block() on a fresh index.
+   On-disk size vs the raw keys and values (prefix compression).
+2. In-process latency of the index queries and of the Esplora handlers
+3. HTTP under load: --clients threads with keep-alive connections request
+   /address/{addr}/utxo, /tx/{txid} and /address/{addr}/txs while a
+   follower indexes the last --follow blocks. p50 / p90 / p99 per endpoint.
+4. Correctness: the UTXOs of every address match a walk over the chain,
+   and so does utxo_scanner.get_available_utxos() pointed at the server
+5. Reorg (undo and apply again the last blocks) and reopening the index
+
+Usage: python3 5_benchmark_address_index.py [--blocks N] [--txs N] [--addresses N] [--clients N] [--workdir DIR] [--serve]
+"""
+
+import argparse
+import http.client
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+
+from tools.address_index import AddressIndex, script_hash
+from tools.block_store import iter_block_txs, txid
+from tools.chain_generator import build_store
+from tools.esplora_api import EsploraAPI, make_server, script_info
+from tools.utxo_scanner import get_available_utxos
+
+
+def address_pool(count, seed=7):
+    """P2TR and P2WPKH scripts that receive a share of the payments"""
+    rng = random.Random(seed)
+    return [b"\x51\x20" + rng.randbytes(32) if i % 2 else b"\x00\x14" + rng.randbytes(20)
+            for i in range(count)]
+
+
+def expected_utxos(store, pool, stop):
+    """{script: {(txid hex, vout): value}} of the pool scripts after block stop - 1"""
+    watched = set(pool)
+    coins = {}  # prevout -> (script, value)
+    for _, block in store.blocks(0, stop):
+        for tx in iter_block_txs(block):
+            for prevout in tx.prevouts:
+                coins.pop(prevout, None)
+            tx_hash = None
+            for vout, (amount, spk) in enumerate(tx.outputs):
+                if spk in watched:
+                    tx_hash = tx_hash or txid(tx)
+                    coins[tx_hash + vout.to_bytes(4, "little")] = (bytes(spk), amount)
+    result = {spk: {} for spk in pool}
+    for prevout, (spk, amount) in coins.items():
+        result[spk][(prevout[:32][::-1].hex(), int.from_bytes(prevout[32:], "little"))] = amount
+    return result
+
+
+def index_matches(index, pool, expected):
+    for spk in pool:
+        found = {(f.txid[::-1].hex(), f.vout): f.value for f in index.utxos(script_hash(spk))}
+        if found != expected[spk]:
+            return False
+    return True
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]  # noqa: E731
+    return pick(0.50), pick(0.90), pick(0.99), ordered[-1]
+
+
+def print_latencies(name, samples, width=34):
+    p50, p90, p99, worst = percentiles(samples)
+    print(f"  {name:<{width}}{len(samples):>8,}{p50 * 1e3:>9.2f}{p90 * 1e3:>9.2f}"
+          f"{p99 * 1e3:>9.2f}{worst * 1e3:>9.2f}")
+
+
+def latency_header(width=34):
+    print(f"  {'':<{width}}{'count':>8}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="address index / Esplora API benchmark")
+    parser.add_argument("--blocks", type=int, default=300, help="blocks in the chain")
+    parser.add_argument("--txs", type=int, default=1000, help="transactions per block")
+    parser.add_argument("--addresses", type=int, default=2000, help="addresses receiving payments")
+    parser.add_argument("--reuse", type=float, default=0.3, help="share of outputs paying those addresses")
+    parser.add_argument("--follow", type=int, default=20, help="blocks indexed incrementally under load")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent HTTP clients")
+    parser.add_argument("--requests", type=int, default=4000, help="HTTP requests in total")
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "taproot-address-index"),
+                        help="block store and index")
+    parser.add_argument("--serve", action="store_true", help="keep serving the API at the end")
+    parser.add_argument("--port", type=int, default=0, help="HTTP port (default: any free port)")
+    args = parser.parse_args()
+    args.follow = max(1, min(args.follow, args.blocks - 1))
+
+    print("=" * 70)
+    print("ADDRESS INDEX / ESPLORA API BENCHMARK")
+    print("=" * 70)
+    pool = address_pool(args.addresses)
+    addresses = [script_info(spk)[1] for spk in pool]
+    start = time.perf_counter()
+    store, reused = build_store(os.path.join(args.workdir, "blocks"), args.blocks, args.txs,
+                                seed=5, address_pool=pool, reuse=args.reuse)
+    print(f"Chain: {len(store)} blocks of {args.txs} transactions, {args.addresses:,} addresses receiving "
+          f"{args.reuse:.0%} of the outputs, {'reused' if reused else 'generated'} in "
+          f"{time.perf_counter() - start:.1f} s")
+
+    # 1. Initial sync
+    synced = args.blocks - args.follow
+    index_path = os.path.join(args.workdir, "index")
+    shutil.rmtree(index_path, ignore_errors=True)
+    index = AddressIndex(index_path)
+    start = time.perf_counter()
+    rows = index.bulk_load(store, synced)
+    bulk_time = time.perf_counter() - start
+    stats = index.stats()
+
+    sample = min(50, synced)
+    scratch_path = os.path.join(args.workdir, "scratch")
+    shutil.rmtree(scratch_path, ignore_errors=True)
+    scratch = AddressIndex(scratch_path)
+    start = time.perf_counter()
+    scratch_rows = sum(scratch.add_block(height, block) for height, block in store.blocks(0, sample))
+    scratch.flush()
+    incremental_time = time.perf_counter() - start
+    scratch.close()
+    shutil.rmtree(scratch_path)
+
+    print(f"\n1. Initial sync of {synced} blocks: {rows:,} rows")
+    print(f"  bulk_load():  {bulk_time:6.1f} s, {synced / bulk_time:7.1f} blocks/s, {rows / bulk_time:>10,.0f} rows/s")
+    print(f"  add_block():  {sample} blocks on a fresh index, {sample / incremental_time:7.1f} blocks/s, "
+          f"{scratch_rows / incremental_time:>10,.0f} rows/s")
+    print(f"  Raw keys and values: {stats['raw_bytes'] / 1e6:.1f} MB; segment file: "
+          f"{stats['file_bytes'] / 1e6:.1f} MB ({stats['bytes_per_row']:.1f} bytes per row, "
+          f"{stats['raw_bytes'] / stats['file_bytes']:.2f}x smaller)")
+    print(f"  In memory: the first key of {stats['index_blocks']:,} blocks")
+
+    # 2. In-process latency
+    rng = random.Random(11)
+    api = EsploraAPI(index, store)
+    expected = expected_utxos(store, pool, synced)
+    txids = sorted({tx for utxos in expected.values() for tx, _ in utxos})
+    queries = rng.sample(range(len(pool)), min(1000, len(pool)))
+    print(f"\n2. In-process latency ({len(queries):,} addresses, "
+          f"{statistics.mean(len(expected[pool[i]]) for i in queries):.1f} UTXOs each on average)")
+    latency_header()
+    for name, call in [
+        ("index.utxos(scripthash)", lambda i: index.utxos(script_hash(pool[i]))),
+        ("index.history(scripthash)", lambda i: index.history(script_hash(pool[i]))),
+        ("handle /address/{a}/utxo", lambda i: api.handle(f"/address/{addresses[i]}/utxo")),
+        ("handle /tx/{txid}", lambda i: api.handle(f"/tx/{txids[i % len(txids)]}")),
+    ]:
+        samples = []
+        for i in queries:
+            start = time.perf_counter()
+            call(i)
+            samples.append(time.perf_counter() - start)
+        print_latencies(name, samples)
+
+    # 3. HTTP under load, while the last blocks are indexed
+    server = make_server(api, port=args.port)
+    port = server.server_address[1]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    latencies = {"/address/{a}/utxo": [], "/tx/{txid}": [], "/address/{a}/txs": []}
+    add_times = []
+    done = threading.Event()
+
+    def follower():
+        for height, block in store.blocks(synced):
+            time.sleep(0.05)
+            start = time.perf_counter()
+            with api.lock:
+                index.add_block(height, block)
+            add_times.append(time.perf_counter() - start)
+        done.set()
+
+    def client(seed, count):
+        local = random.Random(seed)
+        connection = http.client.HTTPConnection("127.0.0.1", port)
+        for _ in range(count):
+            r = local.random()
+            if r < 0.6:
+                name, path = "/address/{a}/utxo", f"/address/{local.choice(addresses)}/utxo"
+            elif r < 0.85:
+                name, path = "/tx/{txid}", f"/tx/{local.choice(txids)}"
+            else:
+                name, path = "/address/{a}/txs", f"/address/{local.choice(addresses)}/txs"
+            start = time.perf_counter()
+            connection.request("GET", path)
+            response = connection.getresponse()
+            response.read()
+            latencies[name].append(time.perf_counter() - start)
+            if response.status != 200:
+                raise RuntimeError(f"{path}: HTTP {response.status}")
+        connection.close()
+
+    threads = [threading.Thread(target=client, args=(seed, args.requests // args.clients))
+               for seed in range(args.clients)]
+    threads.append(threading.Thread(target=follower))
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    total = sum(len(samples) for samples in latencies.values())
+    print(f"\n3. HTTP: {total:,} requests from {args.clients} clients in {elapsed:.1f} s ({total / elapsed:,.0f} req/s), "
+          f"while {len(add_times)} blocks were indexed")
+    latency_header()
+    for name, samples in latencies.items():
+        print_latencies(name, samples)
+    print_latencies("all requests", [s for samples in latencies.values() for s in samples])
+    print_latencies("add_block() (holds the lock)", add_times)
+
+    # 4. Correctness at the tip
+    expected = expected_utxos(store, pool, args.blocks)
+    same = index.height == args.blocks and index_matches(index, pool, expected)
+    print(f"\n4. UTXOs of all {len(pool):,} addresses match the chain at the tip: {same}")
+    base_url = f"http://127.0.0.1:{port}"
+    checked = 0
+    for i in rng.sample(range(len(pool)), min(5, len(pool))):
+        utxos = get_available_utxos(addresses[i], api_url=base_url)
+        found = {(u["txid"], u["vout"]): u["amount"] for u in utxos
+                 if u["scriptpubkey_address"] == addresses[i] and u["scriptpubkey"] == pool[i].hex()}
+        checked += found == expected[pool[i]]
+    print(f"  utxo_scanner.get_available_utxos(api_url={base_url}): {checked} of 5 addresses match")
+
+    # 5. Reorg and restart
+    depth = min(3, args.blocks - 1)
+    blocks = [store.read(height) for height in range(args.blocks - depth, args.blocks)]
+    start = time.perf_counter()
+    for height, block in reversed(list(enumerate(blocks, args.blocks - depth))):
+        index.undo_block(height, block)
+    undo_time = time.perf_counter() - start
+    same_undone = index_matches(index, pool, expected_utxos(store, pool, args.blocks - depth))
+    for height, block in enumerate(blocks, args.blocks - depth):
+        index.add_block(height, block)
+    same = index_matches(index, pool, expected)
+    print(f"\n5. Reorg of {depth} blocks: undo {undo_time * 1000 / depth:.1f} ms/block, "
+          f"matches the chain after undo: {same_undone}, after applying again: {same}")
+    server.shutdown()
+    index.close()
+    start = time.perf_counter()
+    index = AddressIndex(index_path)
+    open_time = time.perf_counter() - start
+    same = index.height == args.blocks and index_matches(index, pool, expected)
+    print(f"  Reopened in {open_time * 1000:.1f} ms ({len(index.segments)} segments), intact: {same}")
+    print("=" * 70)
+
+    if args.serve:
+        server = make_server(EsploraAPI(index, store), port=args.port or 3002)
+        print(f"Serving on http://127.0.0.1:{server.server_address[1]} (Ctrl-C to stop), e.g.")
+        print(f"  ESPLORA_URL=http://127.0.0.1:{server.server_address[1]} python3 -c "
+              f"\"from tools.utxo_scanner import select_best_utxo; select_best_utxo(1500, '{addresses[0]}')\"")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
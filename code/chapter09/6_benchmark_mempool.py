@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Mempool Simulator Benchmark
+
+Fills the mempool model of tools/mempool.py with --txs random transactions
+(a share of them spend unconfirmed parents), then:
+
+1. Fill: adds per second with the ancestor / descendant aggregates kept up
+   to date, and a full recomputation (check()) to verify them
+2. Block template by ancestor feerate: time, fees, and the fees of a
+   template that ignores packages (own feerate, parents first)
+3. Incremental updates: per block, a template, removing it from the pool
+   and the arrival of --arrivals new transactions
+4. Commit / reveal strategies: pairs with the sizes of this chapter's BRC-20
+   commit and reveal enter the pool with different fee splits, and the
+   simulation counts the blocks until each is mined, with new arrivals all
+   along
+
+Usage: python3 6_benchmark_mempool.py [--txs N] [--arrivals N] [--blocks N] [--seed N]
+"""
+
+import argparse
+import math
+import random
+import time
+
+from tools.brc20_config import COMMIT_VSIZE, FEE_CONFIG, reveal_vsize
+from tools.mempool import Mempool, MempoolError
+
+SIZES = (110, 141, 141, 154, 154, 200, 250, 300, 400, 700)  # vbytes, 1-in P2WPKH / P2TR up to batches
+
+
+class Arrivals:
+    """Random transactions; a share of them spend a recent unconfirmed one"""
+
+    def __init__(self, mempool, seed, parent_share=0.25):
+        self.mempool = mempool
+        self.rng = random.Random(seed)
+        self.parent_share = parent_share
+        self.recent = []
+        self.next_txid = 0
+        self.rejected = 0
+
+    def add(self, count, timings=None):
+        rng, mempool, recent = self.rng, self.mempool, self.recent
+        for _ in range(count):
+            vsize = rng.choice(SIZES)
+            fee = max(1.0, rng.lognormvariate(math.log(4), 1.0)) * vsize
+            parents = ()
+            if recent and rng.random() < self.parent_share:
+                parent = recent[rng.randrange(len(recent))]
+                if parent in mempool:
+                    parents = (parent,)
+            txid = self.next_txid
+            self.next_txid += 1
+            start = time.perf_counter()
+            try:
+                mempool.add(txid, int(fee), vsize, parents)
+            except MempoolError:
+                self.rejected += 1
+                continue
+            if timings is not None:
+                timings.append(time.perf_counter() - start)
+            recent.append(txid)
+            if len(recent) > 5000:
+                recent[rng.randrange(5000)] = recent.pop()
+
+
+def individual_template(mempool, max_vsize):
+    """Own feerate order, a transaction only after its parents: no CPFP"""
+    included = set()
+    fee = size = 0
+    for entry in sorted(mempool.entries.values(), key=lambda e: e.fee / e.vsize, reverse=True):
+        if size + entry.vsize > max_vsize or not all(p.txid in included for p in entry.parents):
+            continue
+        included.add(entry.txid)
+        fee += entry.fee
+        size += entry.vsize
+    return fee, size
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="mempool simulator benchmark")
+    parser.add_argument("--txs", type=int, default=300000, help="transactions in the pool")
+    parser.add_argument("--arrivals", type=int, default=4000, help="new transactions per block")
+    parser.add_argument("--blocks", type=int, default=30, help="blocks simulated for the strategies")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("MEMPOOL SIMULATOR BENCHMARK")
+    print("=" * 70)
+
+    # 1. Fill
+    mempool = Mempool()
+    arrivals = Arrivals(mempool, args.seed)
+    timings = []
+    start = time.perf_counter()
+    arrivals.add(args.txs, timings)
+    fill_time = time.perf_counter() - start
+    chained = sum(1 for e in mempool.entries.values() if e.parents)
+    deepest = max(e.ancestor_count for e in mempool.entries.values())
+    print(f"\n1. Fill: {len(mempool):,} transactions, {mempool.total_size / 1e6:.1f} MvB, "
+          f"{chained:,} with unconfirmed parents (up to {deepest} ancestors), "
+          f"{arrivals.rejected:,} rejected by the package limits")
+    print(f"  {len(mempool) / fill_time:,.0f} adds/s; add(): p50 {percentile(timings, 0.5) * 1e6:.1f} us, "
+          f"p99 {percentile(timings, 0.99) * 1e6:.1f} us")
+    start = time.perf_counter()
+    mempool.check()
+    print(f"  Recomputing every aggregate from scratch (check()): {time.perf_counter() - start:.1f} s, all match")
+
+    # 2. Block template
+    start = time.perf_counter()
+    template = mempool.block_template()
+    template_time = time.perf_counter() - start
+    start = time.perf_counter()
+    plain_fee, plain_size = individual_template(mempool, template.vsize)
+    plain_time = time.perf_counter() - start
+    print(f"\n2. Block template from {len(mempool):,} transactions")
+    print(f"  {'Selection':<36}{'ms':>8}{'txs':>8}{'vsize':>10}{'fees (sat)':>13}")
+    print(f"  {'ancestor feerate (heap)':<36}{template_time * 1000:>8.1f}{len(template.txids):>8,}"
+          f"{template.vsize:>10,}{template.fee:>13,}")
+    print(f"  {'own feerate, parents first':<36}{plain_time * 1000:>8.1f}{'':>8}{plain_size:>10,}{plain_fee:>13,}")
+    print(f"  Package feerates in the block: {template.package_feerates[0]:.1f} down to "
+          f"{template.package_feerates[-1]:.1f} sat/vB")
+
+    # 3. Incremental updates
+    steps = {"block_template()": [], "remove_block()": [], f"{args.arrivals:,} arrivals": []}
+    for _ in range(5):
+        start = time.perf_counter()
+        template = mempool.block_template()
+        steps["block_template()"].append(time.perf_counter() - start)
+        start = time.perf_counter()
+        mempool.remove_block(template.txids)
+        steps["remove_block()"].append(time.perf_counter() - start)
+        start = time.perf_counter()
+        arrivals.add(args.arrivals)
+        steps[f"{args.arrivals:,} arrivals"].append(time.perf_counter() - start)
+    mempool.check()
+    print(f"\n3. Incremental updates per block (5 blocks, pool stays at about {len(mempool):,} transactions)")
+    for name, samples in steps.items():
+        print(f"  {name:<24}{sum(samples) / len(samples) * 1000:>8.1f} ms")
+    print("  Aggregates still match a full recomputation")
+
+    # 4. Commit / reveal strategies
+    commit, reveal = COMMIT_VSIZE, reveal_vsize()
+    template = mempool.block_template()
+    target = math.ceil(template.package_feerates[-1] * 1.05 * 10) / 10
+    budget = math.ceil(target * (commit + reveal))
+    fixed_commit, fixed_reveal = FEE_CONFIG["commit_fee"], FEE_CONFIG["reveal_fee"]
+    strategies = [
+        ("FEE_CONFIG (fixed sats)", fixed_commit, fixed_reveal),
+        ("same feerate for both", math.ceil(target * commit), budget - math.ceil(target * commit)),
+        ("CPFP: commit at 1 sat/vB", commit, budget - commit),
+        ("reveal at 1 sat/vB", budget - reveal, reveal),
+        ("FEE_CONFIG commit + cpfp_fee()", fixed_commit, None),
+    ]
+    mined = {}
+    fees = {}
+    for name, commit_fee, reveal_fee in strategies:
+        mempool.add(("commit", name), commit_fee, commit)
+        if reveal_fee is None:
+            reveal_fee = mempool.cpfp_fee([("commit", name)], reveal, target)
+        mempool.add(("reveal", name), reveal_fee, reveal, [("commit", name)])
+        fees[name] = commit_fee, reveal_fee
+    pending = {txid for name, _, _ in strategies for txid in (("commit", name), ("reveal", name))}
+    for block in range(1, args.blocks + 1):
+        template = mempool.block_template()
+        for txid in template.txids:
+            if txid in pending:
+                mined[txid] = block
+        mempool.remove_block(template.txids)
+        arrivals.add(args.arrivals)
+        if all(txid in mined for txid in pending):
+            break
+    print(f"\n4. Commit ({commit} vB) and reveal ({reveal} vB), next-block target {target} sat/vB "
+          f"(budget {budget:,} sats), {args.arrivals:,} arrivals per block")
+    print(f"  {'Strategy':<34}{'commit':>8}{'reveal':>8}{'sat/vB':>16}{'mined in block':>18}")
+    for name, _, _ in strategies:
+        commit_fee, reveal_fee = fees[name]
+        blocks = [mined.get((kind, name)) for kind in ("commit", "reveal")]
+        shown = " / ".join(str(b) if b else f">{args.blocks}" for b in blocks)
+        rates = f"{commit_fee / commit:.1f} / {reveal_fee / reveal:.1f}"
+        print(f"  {name:<34}{commit_fee:>8,}{reveal_fee:>8,}{rates:>16}{shown:>18}")
+    print("  (a reveal can never be mined before its commit; a CPFP reveal takes the commit with it)")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Fee Estimator Benchmark
+
+Runs the mempool model of tools/mempool.py through --blocks blocks of a
+changing fee market (calm, congested, calm again; a third of them each) and
+feeds every arrival and every block to tools/fee_estimator.py:
+
+1. Ingestion cost: process_transaction() per arrival and process_block()
+   per block (decay of all three horizons included)
+2. Query cost: estimate_fee() and estimate_smart_fee() right after a block
+   (the per-block waiting counts are summed by the first query) and after
+3. Accuracy: each block, a probe transaction for every target enters the
+   pool at the estimated feerate (the estimator does not see probes); the
+   share mined within its target, per phase, next to FEE_CONFIG's fixed
+   commit feerate
+4. brc20_config.get_fee_config(): the commit / reveal fees and inscription
+   amount the scripts would use, from the saved estimates file
+
+Usage: python3 7_benchmark_fee_estimator.py [--blocks N] [--calm N] [--busy N] [--seed N]
+"""
+
+import argparse
+import math
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from tools.brc20_config import (
+    COMMIT_VSIZE, FEE_CONFIG, calculate_inscription_amount, get_fee_config, reveal_vsize,
+)
+from tools.fee_estimator import FeeEstimator, fee_buckets
+from tools.mempool import Mempool, MempoolError
+
+SIZES = (110, 141, 141, 154, 154, 200, 250, 300, 400, 700)  # vbytes, 1-in P2WPKH / P2TR up to batches
+TARGETS = (2, 3, 6, 12, 24, 48)
+MEMPOOL_LIMIT = 300_000_000     # vbytes, Core's default maxmempool
+WARMUP = 30                     # blocks before the first probe
+
+
+class Market:
+    """Random arrivals; the median feerate and the count depend on the phase"""
+
+    def __init__(self, mempool, seed, parent_share=0.2):
+        self.mempool = mempool
+        self.rng = random.Random(seed)
+        self.parent_share = parent_share
+        self.recent = []
+        self.next_txid = 0
+
+    def add(self, count, median_feerate):
+        """Adds count transactions; returns [(txid, feerate)] of those without unconfirmed parents"""
+        rng, mempool, recent = self.rng, self.mempool, self.recent
+        independent = []
+        for _ in range(count):
+            vsize = rng.choice(SIZES)
+            feerate = max(1.0, rng.lognormvariate(math.log(median_feerate), 0.8))
+            parents = ()
+            if recent and rng.random() < self.parent_share:
+                parent = recent[rng.randrange(len(recent))]
+                if parent in mempool:
+                    parents = (parent,)
+            txid = self.next_txid
+            self.next_txid += 1
+            try:
+                mempool.add(txid, int(feerate * vsize), vsize, parents)
+            except MempoolError:
+                continue
+            if not parents:
+                independent.append((txid, int(feerate * vsize) / vsize))
+            recent.append(txid)
+            if len(recent) > 5000:
+                recent[rng.randrange(5000)] = recent.pop()
+        return independent
+
+
+def main():
+    parser = argparse.ArgumentParser(description="fee estimator benchmark")
+    parser.add_argument("--blocks", type=int, default=432, help="blocks simulated (3 days)")
+    parser.add_argument("--calm", type=int, default=3000, help="arrivals per block when calm")
+    parser.add_argument("--busy", type=int, default=5000, help="arrivals per block when congested")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("FEE ESTIMATOR BENCHMARK")
+    print("=" * 70)
+    print(f"{len(fee_buckets())} feerate buckets; phases of {args.blocks // 3} blocks: "
+          f"{args.calm:,} / {args.busy:,} / {args.calm:,} arrivals per block, median 3 / 12 / 3 sat/vB")
+
+    mempool = Mempool()
+    market = Market(mempool, args.seed)
+    estimator = FeeEstimator()
+    phase_names = ("calm", "congested", "calm again")
+    fixed_rate = FEE_CONFIG["commit_fee"] / COMMIT_VSIZE
+    ingest, blocks, queries_first, queries_cached = [], [], [], []
+    probes = {}                     # txid -> (phase, target, entry block, deadline)
+    mined = {}
+    estimates = {(p, t): [] for p in range(3) for t in TARGETS}
+    tracked_seen = 0
+
+    for height in range(1, args.blocks + 1):
+        phase = min(2, (height - 1) * 3 // args.blocks)
+        count, median = (args.busy, 12) if phase == 1 else (args.calm, 3)
+        arrived = market.add(count, median)
+        start = time.perf_counter()
+        for txid, feerate in arrived:
+            estimator.process_transaction(txid, feerate)
+        ingest.append((time.perf_counter() - start) / max(1, len(arrived)))
+        tracked_seen += len(arrived)
+
+        # probes at the current estimates, and one at FEE_CONFIG's commit feerate
+        if height > WARMUP:
+            for target in TARGETS:
+                start = time.perf_counter()
+                feerate, _ = estimator.estimate_smart_fee(target)
+                (queries_first if target == TARGETS[0] else queries_cached).append(time.perf_counter() - start)
+                if feerate is None:
+                    continue
+                estimates[phase, target].append(feerate)
+                probes[("probe", target, height)] = (phase, target, height, height + target)
+                mempool.add(("probe", target, height), math.ceil(feerate * 150), 150)
+            probes[("fixed", height)] = (phase, "fixed", height, height + 2)
+            mempool.add(("fixed", height), math.ceil(fixed_rate * 150), 150)
+
+        template = mempool.block_template()
+        mempool.remove_block(template.txids)
+        for txid in template.txids:
+            if txid in probes:
+                mined[txid] = height + 1
+        start = time.perf_counter()
+        estimator.process_block(height + 1, template.txids)
+        for txid in mempool.trim_to_size(MEMPOOL_LIMIT):
+            estimator.remove_transaction(txid)
+        blocks.append(time.perf_counter() - start)
+
+    # 1 + 2. Costs
+    print(f"\n1. Ingestion: {tracked_seen:,} arrivals, {estimator.confirmed:,} confirmations recorded")
+    print(f"  process_transaction(): {statistics.mean(ingest) * 1e6:.2f} us per arrival")
+    print(f"  process_block() + evictions: {statistics.median(blocks) * 1000:.1f} ms per block (median), "
+          f"{max(blocks) * 1000:.1f} ms max")
+    print(f"\n2. Queries ({len(queries_first):,} blocks)")
+    print(f"  estimate_smart_fee(), first after a block:  {statistics.median(queries_first) * 1e6:>8.0f} us")
+    print(f"  estimate_smart_fee(), next targets:        {statistics.median(queries_cached) * 1e6:>8.0f} us")
+    start = time.perf_counter()
+    for _ in range(1000):
+        estimator.estimate_fee(6)
+    print(f"  estimate_fee(6) alone:                      {(time.perf_counter() - start) * 1000:>8.0f} us")
+
+    # 3. Accuracy
+    print(f"\n3. Probes mined within their target (median estimate, sat/vB)")
+    header = "".join(f"{name:>20}" for name in phase_names)
+    print(f"  {'target':<12}{header}")
+    for target in TARGETS + ("fixed",):
+        cells = []
+        for phase in range(3):
+            resolved = [txid for txid, (p, t, _, deadline) in probes.items()
+                        if p == phase and t == target and deadline <= args.blocks]
+            if not resolved:
+                cells.append(f"{'-':>20}")
+                continue
+            hits = sum(1 for txid in resolved if mined.get(txid, math.inf) <= probes[txid][3])
+            rate = (statistics.median(estimates[phase, target]) if target != "fixed" else fixed_rate)
+            cells.append(f"{hits / len(resolved) * 100:>11.0f}% ({rate:>5.1f})")
+        label = f"{target} blocks" if target != "fixed" else "FEE_CONFIG, 2"
+        print(f"  {label:<12}{''.join(cells)}")
+    print(f"  (estimate_smart_fee() aims at 85% within the target; the mempool ended at "
+          f"{mempool.total_size / 1e6:.1f} MvB)")
+
+    # 4. Wiring into brc20_config
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "fee_estimates.json")
+        start = time.perf_counter()
+        estimator.save(path)
+        save_time = time.perf_counter() - start
+        start = time.perf_counter()
+        loaded = FeeEstimator.load(path)
+        load_time = time.perf_counter() - start
+        size = os.path.getsize(path)
+    print(f"\n4. Estimates file: {size / 1024:.0f} KB, save {save_time * 1000:.0f} ms, load {load_time * 1000:.0f} ms, "
+          f"same estimates after load: {loaded.estimate_smart_fee(6) == estimator.estimate_smart_fee(6)}")
+    print(f"  {'fee config':<24}{'sat/vB':>8}{'commit':>8}{'reveal':>8}{'inscription amount':>20}")
+    reveal = reveal_vsize()
+    for label, config in [("FEE_CONFIG", dict(FEE_CONFIG, feerate=None))] + \
+            [(f"get_fee_config({t})", get_fee_config(loaded, t)) for t in (2, 6, 24)]:
+        rate = f"{config['feerate']:.1f}" if config["feerate"] else f"{config['commit_fee'] / COMMIT_VSIZE:.1f}"
+        print(f"  {label:<24}{rate:>8}{config['commit_fee']:>8}{config['reveal_fee']:>8}"
+              f"{calculate_inscription_amount(config):>20}")
+    print(f"  (commit {COMMIT_VSIZE} vB, reveal {reveal} vB)")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+CPFP for Stuck Reveals
+
+--reveals mint reveals paid FEE_CONFIG["reveal_fee"] and are stuck in a
+congested mempool (the mempool model of tools/mempool.py). Their 546-sat
+outputs return to key_path_address, so tools/cpfp.py can bump them all
+with a few children:
+
+1. The stuck parents: reveal-shaped transactions with this chapter's
+   inscription script, their exact vsize next to brc20_config.reveal_vsize()
+2. Children for the next-block feerate: grouping under the 25-ancestor
+   limit, fees, exact weights (compared with the signed transactions) and
+   the package feerate; the same with the commits still unconfirmed
+3. Signing all children in one process and over a process pool; the
+   signatures are checked by chapter 8's transaction validator
+4. The next block template with and without the children
+
+Usage: python3 8_cpfp_stuck_reveals.py [--reveals N] [--background N] [--workers N] [--seed N]
+"""
+
+import argparse
+import hashlib
+import importlib
+import math
+import os
+import random
+import struct
+import time
+
+from bitcoinutils.keys import PrivateKey
+from bitcoinutils.setup import setup
+
+from tools.brc20_config import (
+    COMMIT_VSIZE, FEE_CONFIG, INSCRIPTION_CONFIG, NETWORK, PRIVATE_KEY_WIF, get_brc20_json, reveal_vsize,
+)
+from tools.cpfp import CPFPBuilder, FundingUtxo, parents_from_raw
+from tools.mempool import Mempool, MempoolError
+
+SIZES = (110, 141, 141, 154, 154, 200, 250, 300, 400, 700)  # vbytes, 1-in P2WPKH / P2TR up to batches
+
+
+def push(data):
+    return bytes([len(data)]) + data if len(data) < 0x4c else b"\x4c" + bytes([len(data)]) + data
+
+
+def inscription_script(xonly):
+    """<key> OP_CHECKSIG OP_0 OP_IF "ord" OP_1 <content type> OP_0 <payload> OP_ENDIF"""
+    return (push(xonly) + b"\xac\x00\x63" + push(bytes.fromhex(INSCRIPTION_CONFIG["ord_marker"])) + b"\x51"
+            + push(bytes.fromhex(INSCRIPTION_CONFIG["content_type_hex"])) + b"\x00"
+            + push(get_brc20_json("mint").encode()) + b"\x68")
+
+
+def stuck_reveal(i, xonly, script_pubkey, amount):
+    """A reveal-shaped transaction: one script path input, `amount` back to key_path_address"""
+    commit_txid = hashlib.sha256(f"commit-{i}".encode()).digest()
+    script = inscription_script(xonly)
+    witness = [hashlib.sha512(f"sig-{i}".encode()).digest(), script, b"\xc0" + xonly]
+    parts = [struct.pack("<i", 2), b"\x00\x01", b"\x01", commit_txid, struct.pack("<I", 0), b"\x00",
+             struct.pack("<I", 0xfffffffd), b"\x01", struct.pack("<q", amount), push(script_pubkey),
+             bytes([len(witness)])]
+    for item in witness:
+        parts.append((b"\xfd" + struct.pack("<H", len(item))) if len(item) >= 0xfd else bytes([len(item)]))
+        parts.append(item)
+    parts.append(struct.pack("<I", 0))
+    return b"".join(parts), commit_txid[::-1].hex()
+
+
+def congest(mempool, count, seed):
+    rng = random.Random(seed)
+    for i in range(count):
+        vsize = rng.choice(SIZES)
+        try:
+            mempool.add(("background", i), int(max(1.0, rng.lognormvariate(math.log(12), 0.7)) * vsize), vsize)
+        except MempoolError:
+            pass
+
+
+def mined_parents(mempool, parents):
+    template = mempool.block_template()
+    included = set(template.txids)
+    return sum(1 for p in parents if p.txid in included), template
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPFP children for stuck reveals")
+    parser.add_argument("--reveals", type=int, default=60, help="stuck reveal transactions")
+    parser.add_argument("--background", type=int, default=20000, help="other transactions in the mempool")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="signing processes")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    setup(NETWORK)
+    private_key = PrivateKey(PRIVATE_KEY_WIF)
+    secret = private_key.key.to_string()
+    key_path_address = private_key.get_public_key().get_taproot_address()
+    builder = CPFPBuilder(secret)
+    xonly = bytes.fromhex(private_key.get_public_key().to_x_only_hex())
+
+    print("=" * 70)
+    print("CPFP FOR STUCK REVEALS")
+    print("=" * 70)
+
+    # 1. Stuck parents
+    reveal_fee = FEE_CONFIG["reveal_fee"]
+    parents, commits = [], {}
+    for i in range(args.reveals):
+        raw, commit_txid = stuck_reveal(i, xonly, builder.script_pubkey, FEE_CONFIG["min_output"])
+        parents += parents_from_raw(raw, reveal_fee, builder.script_pubkey)
+        commits[parents[-1].txid] = (commit_txid, FEE_CONFIG["commit_fee"], COMMIT_VSIZE)
+    print(f"\n1. {len(parents)} stuck reveals to {key_path_address.to_string()[:20]}... "
+          f"(script matches: {key_path_address.to_script_pub_key().to_hex() == builder.script_pubkey.hex()})")
+    print(f"  {parents[0].vsize} vB each (reveal_vsize(): {reveal_vsize()}), fee {reveal_fee} sats = "
+          f"{reveal_fee / parents[0].vsize:.1f} sat/vB, output {parents[0].amount} sats")
+
+    mempool = Mempool()
+    congest(mempool, args.background, args.seed)
+    for parent in parents:
+        mempool.add(parent.txid, parent.fee, parent.vsize)
+    mined, template = mined_parents(mempool, parents)
+    target = math.ceil(template.package_feerates[-1] * 1.05 * 10) / 10
+    print(f"  Mempool: {len(mempool):,} transactions, {mempool.total_size / 1e6:.1f} MvB; next block down to "
+          f"{template.package_feerates[-1]:.1f} sat/vB; reveals in it: {mined}")
+
+    # 2. Children
+    funding = [FundingUtxo(hashlib.sha256(f"funding-{i}".encode()).hexdigest(), 0, 50000) for i in range(20)]
+    start = time.perf_counter()
+    plans = builder.plan(parents, funding, target)
+    plan_time = time.perf_counter() - start
+    print(f"\n2. Children at {target} sat/vB (planned in {plan_time * 1000:.1f} ms)")
+    print(f"  {'child':<7}{'parents':>8}{'funding':>9}{'vsize':>8}{'fee':>9}{'package sat/vB':>16}")
+    for i, plan in enumerate(plans):
+        print(f"  {i:<7}{len(plan.parents):>8}{len(plan.funding):>9}{plan.vsize:>8,}{plan.fee:>9,}"
+              f"{plan.feerate:>16.2f}")
+    with_commits = [parent._replace(ancestors=(commits[parent.txid],)) for parent in parents]
+    commit_plans = builder.plan(with_commits, funding, target)
+    print(f"  With the commits unconfirmed too: {len(commit_plans)} children of up to "
+          f"{max(len(p.parents) for p in commit_plans)} reveals, {sum(p.fee for p in commit_plans):,} sats "
+          f"in total (vs {sum(p.fee for p in plans):,})")
+
+    # 3. Signing
+    timings = {}
+    for workers in sorted({1, args.workers}):
+        start = time.perf_counter()
+        signed = builder.sign(plans, workers=workers)
+        timings[workers] = time.perf_counter() - start
+    inputs = sum(len(plan.builder.inputs) for plan in plans)
+    print(f"\n3. Signing {len(plans)} children, {inputs} inputs")
+    for workers, elapsed in timings.items():
+        print(f"  {workers} worker(s): {elapsed * 1000:.0f} ms ({elapsed / inputs * 1000:.2f} ms per input)")
+    validator = importlib.import_module("chapter08_tools.tx_validator")
+    results = validator.validate_transactions([(raw, plan.builder.spent_outputs()) for raw, plan in zip(signed, plans)],
+                                              workers=1)
+    exact = all(plan.weight == 3 * len(validator.serialize_transaction(
+        tx.version, tx.inputs, tx.outputs, None, tx.locktime)) + len(raw)
+        for raw, plan, tx in ((raw, plan, validator.Transaction(raw)) for raw, plan in zip(signed, plans)))
+    print(f"  Planned weight equals the signed transactions' weight: {exact}; "
+          f"{'all inputs VALID' if not any(any(errors) for _, errors in results) else results}")
+
+    # 4. Next block
+    for plan, raw in zip(plans, signed):
+        child = validator.Transaction(raw).txid
+        mempool.add(child, plan.fee, plan.vsize, [p.txid for p in plan.parents])
+    mined, template = mined_parents(mempool, parents)
+    print(f"\n4. Next block with the children: {mined} of {len(parents)} reveals "
+          f"(block down to {template.package_feerates[-1]:.1f} sat/vB)")
+    print(f"\n  CPUs: {os.cpu_count()}; the pool only helps with more than one")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
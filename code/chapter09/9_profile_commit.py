@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Profiling the Commit
+
+Where the time of 1_commit_mint_brc20.py goes, measured with
+tools/instrumentation.py, offline: key_path_address receives a share of
+the payments of a generated testnet chain, which is indexed and served by
+tools/esplora_api.py, so the UTXO scan makes real HTTP requests.
+
+1. Cost of the instrumentation: span(), count() and a @timed function,
+   disabled and enabled, next to an empty call and a bare `with NULL_SPAN`
+   (the floor of any with statement); block_store.parse_tx over the chain
+   (decorated only when INSTRUMENT is set at import)
+2. --commits runs of create_mint_commit_transaction() with spans enabled:
+   count, total and mean time per span (keys, UTXO scan and its requests,
+   inscription script, Taproot tree, signing), and the counters
+3. The same metrics written as Prometheus text (<--out>.prom) and as a
+   Chrome trace (<--out>.trace.json, for chrome://tracing or Perfetto),
+   by default in --workdir
+
+Usage: python3 9_profile_commit.py [--commits N] [--blocks N] [--reuse F] [--out PREFIX] [--workdir DIR]
+       INSTRUMENT=1 python3 9_profile_commit.py     (parse_tx decorated too)
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from bitcoinutils.keys import PrivateKey
+from bitcoinutils.setup import setup
+
+from tools import instrumentation
+from tools.address_index import AddressIndex, script_hash
+from tools.block_store import iter_block_txs, parse_tx
+from tools.brc20_config import NETWORK, PRIVATE_KEY_WIF
+from tools.chain_generator import build_store
+from tools.esplora_api import EsploraAPI, make_server
+from tools.instrumentation import REGISTRY, count, span, timed
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_commit_script():
+    spec = importlib.util.spec_from_file_location("commit_mint", os.path.join(script_dir, "1_commit_mint_brc20.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def per_call(func, calls=200000, repeat=5):
+    """ns per call of func(): the best of `repeat` runs, the host's noise being one-sided"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        for _ in range(calls // repeat):
+            func()
+        elapsed = (time.perf_counter_ns() - start) / (calls // repeat)
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def overhead(store):
+    def empty():
+        pass
+
+    def with_null_span():
+        with instrumentation.NULL_SPAN:
+            pass
+
+    def with_span():
+        with span("overhead.span"):
+            pass
+
+    def counted():
+        count("overhead.count")
+
+    decorated = timed("overhead.timed")(empty)
+    rows = []
+    instrumentation.disable()
+    rows.append(("empty function call", per_call(empty)))
+    rows.append(("with NULL_SPAN (no span() call)", per_call(with_null_span)))
+    rows.append(("span(), disabled", per_call(with_span)))
+    rows.append(("count(), disabled", per_call(counted)))
+    rows.append((f"@timed function, {'wrapped' if decorated is not empty else 'not wrapped (off at import)'}",
+                 per_call(decorated)))
+    instrumentation.enable()
+    rows.append(("span(), enabled", per_call(with_span, 50000)))
+    rows.append(("count(), enabled", per_call(counted, 50000)))
+    rows.append(("@timed function, enabled (trace=False)",
+                 per_call(timed("overhead.timed", trace=False)(empty), 50000)))
+    REGISTRY.reset()
+
+    print(f"\n1. Instrumentation cost per call (INSTRUMENT {'set' if instrumentation.ENABLED else 'not set'})")
+    for label, ns in rows:
+        print(f"  {label:<48}{ns:>8.0f} ns")
+    blocks = [block for _, block in store.blocks()]
+    txs = 0
+    start = time.perf_counter_ns()
+    for block in blocks:
+        for _ in iter_block_txs(block):
+            txs += 1
+    elapsed = time.perf_counter_ns() - start
+    decorated = hasattr(parse_tx, "__wrapped__")
+    print(f"  block_store.parse_tx over {len(blocks)} blocks: {elapsed / txs:.0f} ns per transaction "
+          f"({'decorated' if decorated else 'not decorated'})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="profile the BRC-20 commit")
+    parser.add_argument("--commits", type=int, default=5, help="commit transactions to build")
+    parser.add_argument("--blocks", type=int, default=30, help="blocks in the chain")
+    parser.add_argument("--txs", type=int, default=200, help="transactions per block")
+    parser.add_argument("--reuse", type=float, default=0.01, help="share of outputs paying key_path_address")
+    parser.add_argument("--out", help="prefix of the .prom and .trace.json files (default: <workdir>/commit_profile)")
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "taproot-profile-commit"),
+                        help="block store and index")
+    args = parser.parse_args()
+    args.out = args.out or os.path.join(args.workdir, "commit_profile")
+
+    setup(NETWORK)
+    key_path_address = PrivateKey(PRIVATE_KEY_WIF).get_public_key().get_taproot_address()
+    spk = bytes.fromhex(key_path_address.to_script_pub_key().to_hex())
+
+    print("=" * 70)
+    print("PROFILING THE COMMIT")
+    print("=" * 70)
+    store, _ = build_store(os.path.join(args.workdir, "blocks"), args.blocks, args.txs, seed=9,
+                           address_pool=[spk], reuse=args.reuse, network="testnet")
+    index_path = os.path.join(args.workdir, "index")
+    shutil.rmtree(index_path, ignore_errors=True)
+    index = AddressIndex(index_path, network="testnet")
+    index.bulk_load(store)
+    server = make_server(EsploraAPI(index, store), port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api_url = f"http://127.0.0.1:{server.server_address[1]}"
+    print(f"Chain: {len(store)} blocks of {args.txs} transactions; {key_path_address.to_string()[:20]}... has "
+          f"{len(index.utxos(script_hash(spk)))} UTXOs, served at {api_url}")
+
+    overhead(store)
+
+    # 2. Commits
+    instrumentation.enable()
+    commit = load_commit_script()  # after enable(): @timed("commit") wraps
+    REGISTRY.reset()
+    start = time.perf_counter()
+    for _ in range(args.commits):
+        with contextlib.redirect_stdout(io.StringIO()):
+            tx, _, _ = commit.create_mint_commit_transaction(api_url=api_url)
+        if tx is None:
+            print("[ERROR] the commit failed")
+            break
+    elapsed = time.perf_counter() - start
+    histograms = REGISTRY.histograms
+    total = histograms["commit"].sum
+    print(f"\n2. {args.commits} commits in {elapsed:.2f} s")
+    print(f"  {'span':<30}{'count':>7}{'total ms':>11}{'mean ms':>10}{'p90 <=':>10}{'share':>8}")
+    for name, histogram in sorted(histograms.items(), key=lambda item: -item[1].sum):
+        p90 = histogram.quantile(0.9) / 1e6
+        print(f"  {name:<30}{histogram.count:>7}{histogram.sum / 1e6:>11.1f}"
+              f"{histogram.sum / histogram.count / 1e6:>10.2f}{p90:>10.2f}{histogram.sum / total:>8.0%}")
+    for name, value in sorted(REGISTRY.counters.items()):
+        print(f"  {name:<30}{value:>7,}")
+
+    # 3. Export
+    instrumentation.write_prometheus(args.out + ".prom")
+    instrumentation.write_chrome_trace(args.out + ".trace.json")
+    prom = instrumentation.to_prometheus()
+    print(f"\n3. {args.out}.prom: {len(prom.splitlines())} lines; {args.out}.trace.json: "
+          f"{len(REGISTRY.events)} events")
+    for line in prom.splitlines():
+        if line.startswith("commit_sign_seconds_") and "bucket" not in line:
+            print(f"  {line}")
+    server.shutdown()
+    index.close()
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
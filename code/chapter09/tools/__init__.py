@@ -1,5 +1,7 @@
 # Tools package for Chapter 9
-# This package contains utilities for BRC-20 and ARC-20 operations
+# This package contains utilities for BRC-20 and ARC-20 operations, a local block store,
+# a gap-limit wallet rescanner, a memory-mapped UTXO set, an Esplora-compatible address index,
+# a mempool simulator, a fee estimator, a CPFP child builder and timing instrumentation
 
 
 
@@ -0,0 +1,595 @@
+#!/usr/bin/env python3
+"""
+Address Index: Script Hash -> Funding / Spending Rows
+
+utxo_scanner.py finds the coins of an address through Blockstream's
+Esplora API. Esplora's backend (electrs) keeps an index from each script to
+the outputs paying it and the inputs spending them. This module builds that
+index from a local BlockStore. tools/esplora_api.py serves it with the same
+JSON.
+
+All rows live in one sorted key space, with the electrs schema:
+
+    O | scripthash (32) | height (4) | txid (32) | vout (4)  -> value (8)       funding
+    S | txid (32) | vout (4)  -> spending txid (32) | vin (4) | height (4)       spending
+    T | txid (32)             -> height (4) | offset in block (4) | size (4)   transaction
+    B | height (4)            -> block hash (32) | time (4)                     block
+
+scripthash is SHA256(scriptPubKey). Integers are big-endian, so the O rows
+of a script sort by height. Every row comes from its own block: indexing a
+block never looks up the outputs it spends, and the rows of a block can be
+recomputed to remove it again (undo_block). The UTXOs of a script are its O
+rows (one range scan) without an S row (one point lookup each).
+
+Storage is a small log-structured merge tree:
+
+- Segments are immutable files of sorted rows in blocks of about 4 KB.
+  Within a block each key stores only the bytes it does not share with the
+  previous key (prefix compression, as in LevelDB). The O rows of one
+  address share at least 33 bytes. Every 16th key is a restart point stored
+  whole. The first key of every block is kept in memory. A lookup bisects
+  those, binary-searches the restart points of one block and decodes at
+  most 16 entries.
+- Initial sync (bulk_load) collects rows in memory, sorts them and writes a
+  run every `run_rows` rows. At the end it merges the runs into one segment
+  (heapq.merge). Sorting large batches is far cheaper than keeping an
+  ordered structure up to date row by row.
+- After sync, add_block() puts the rows of each new block in a memtable.
+  Every `memtable_rows` rows the memtable is written as a new segment, and
+  segments are merged once there are more than `max_segments`. A query
+  merges the memtable and the segments, newest first; undo_block() writes
+  tombstones.
+- A manifest (JSON, replaced atomically) lists the segments, the height and
+  the tip hash. The memtable is not logged: a reopened index resumes at its
+  last flush, and sync() indexes the blocks after it again.
+"""
+
+import bisect
+import hashlib
+import heapq
+import json
+import mmap
+import os
+import struct
+from collections import namedtuple
+
+from .block_store import iter_block_txs, sha256d, txid
+from .utxo_set import is_unspendable
+
+SEGMENT_MAGIC = b"ADDRIDX1"
+FOOTER = struct.Struct("<QQQQI8s")  # index offset, rows, key bytes, value bytes, blocks, magic
+ENTRY = struct.Struct("BBB")        # shared key bytes, unshared key bytes, value length
+INDEX_ENTRY = struct.Struct("<QB")  # offset of a block, length of its first key
+TOMBSTONE = 0xFF                    # value length of a deleted row (no value bytes follow)
+BLOCK_SIZE = 4096
+RESTART_INTERVAL = 16               # every 16th key of a block is stored whole
+RUN_ROWS = 1 << 21
+MEMTABLE_ROWS = 1 << 17
+MAX_SEGMENTS = 4
+BULK_BLOCKS = 100                   # sync() bulk-loads when more blocks than this are missing
+MANIFEST_VERSION = 1
+
+FUNDING, SPENDING, TX, BLOCK = b"O", b"S", b"T", b"B"
+HEIGHT = struct.Struct(">I")
+MISSING = object()
+
+# txid in internal byte order
+Funding = namedtuple("Funding", ["height", "txid", "vout", "value"])
+
+# the input spending an outpoint
+Spend = namedtuple("Spend", ["txid", "vin", "height"])
+
+# where a transaction is: block height, offset and size within the block
+TxLocation = namedtuple("TxLocation", ["height", "offset", "size"])
+
+
+class AddressIndexError(Exception):
+    pass
+
+
+def script_hash(spk):
+    return hashlib.sha256(spk).digest()
+
+
+def block_rows(height, block):
+    """Every row of a serialized block, unsorted: [(key, value)]"""
+    h = HEIGHT.pack(height)
+    rows = [(BLOCK + h, sha256d(block[:80]) + block[68:72])]
+    sha256 = hashlib.sha256
+    pack = struct.pack
+    for index, tx in enumerate(iter_block_txs(block)):
+        tx_hash = txid(tx)
+        rows.append((TX + tx_hash, h + pack(">II", tx.start, tx.end - tx.start)))
+        if index:
+            for vin, prevout in enumerate(tx.prevouts):
+                rows.append((SPENDING + prevout[:32] + prevout[:31:-1], tx_hash + pack(">I", vin) + h))
+        for vout, (amount, spk) in enumerate(tx.outputs):
+            if not is_unspendable(spk):
+                rows.append((FUNDING + sha256(spk).digest() + h + tx_hash + pack(">I", vout), pack(">Q", amount)))
+    return rows
+
+
+def _successor(prefix):
+    """Smallest key above every key that starts with prefix"""
+    return (int.from_bytes(prefix, "big") + 1).to_bytes(len(prefix), "big")
+
+
+# ---------------------------------------------------------------------------
+# Segments
+# ---------------------------------------------------------------------------
+
+def write_segment(path, rows, block_size=BLOCK_SIZE):
+    """
+    Write sorted (key, value) rows as a segment file and open it. A value
+    of None is a tombstone.
+
+    A block is its entries, then the offsets of its restart points (u16
+    each) and their count (u16). An entry is ENTRY, the key bytes after the
+    shared prefix, then the value. At a restart point nothing is shared.
+    """
+    index = []
+    block = bytearray()
+    restarts = []
+    offset = count = entries = key_bytes = value_bytes = 0
+    prev = b""
+    pack = ENTRY.pack
+    with open(path + ".tmp", "wb") as f:
+        for key, value in rows:
+            if not block:
+                index.append((offset, key))
+                entries = 0
+            if entries % RESTART_INTERVAL == 0:
+                restarts.append(len(block))
+                shared = 0
+            else:
+                size = min(len(prev), len(key))
+                diff = int.from_bytes(prev[:size], "big") ^ int.from_bytes(key[:size], "big")
+                shared = size - (diff.bit_length() + 7) // 8
+            if value is None:
+                block += pack(shared, len(key) - shared, TOMBSTONE)
+                block += key[shared:]
+            else:
+                block += pack(shared, len(key) - shared, len(value))
+                block += key[shared:]
+                block += value
+                value_bytes += len(value)
+            prev = key
+            entries += 1
+            count += 1
+            key_bytes += len(key)
+            if len(block) >= block_size:
+                block += struct.pack(f"<{len(restarts) + 1}H", *restarts, len(restarts))
+                f.write(block)
+                offset += len(block)
+                block = bytearray()
+                restarts = []
+        if block:
+            block += struct.pack(f"<{len(restarts) + 1}H", *restarts, len(restarts))
+            f.write(block)
+            offset += len(block)
+        for block_offset, key in index:
+            f.write(INDEX_ENTRY.pack(block_offset, len(key)) + key)
+        f.write(FOOTER.pack(offset, count, key_bytes, value_bytes, len(index), SEGMENT_MAGIC))
+    os.replace(path + ".tmp", path)
+    return Segment(path)
+
+
+def _aged(rows, age):
+    for key, value in rows:
+        yield key, age, value
+
+
+def merge_rows(sources, drop_tombstones=False):
+    """
+    Merge sorted (key, value) iterables given newest first. The newest row
+    of a key wins.
+    """
+    last = None
+    for key, _, value in heapq.merge(*[_aged(rows, age) for age, rows in enumerate(sources)]):
+        if key == last:
+            continue
+        last = key
+        if value is None and drop_tombstones:
+            continue
+        yield key, value
+
+
+class Segment:
+    """A segment file written by write_segment(), memory-mapped read-only"""
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        mm = self._mm
+        self.size = len(mm)
+        if self.size < FOOTER.size:
+            raise AddressIndexError(f"{path} is not an index segment")
+        index_offset, self.rows, self.key_bytes, self.value_bytes, blocks, magic = \
+            FOOTER.unpack_from(mm, self.size - FOOTER.size)
+        if magic != SEGMENT_MAGIC:
+            raise AddressIndexError(f"{path} is not an index segment")
+        self.first_keys, self.offsets = [], []
+        pos = index_offset
+        for _ in range(blocks):
+            block_offset, length = INDEX_ENTRY.unpack_from(mm, pos)
+            pos += INDEX_ENTRY.size
+            self.offsets.append(block_offset)
+            self.first_keys.append(mm[pos:pos + length])
+            pos += length
+        self.offsets.append(index_offset)
+
+    def close(self):
+        self._mm.close()
+
+    def _block(self, i, key=b""):
+        """
+        Yield (key, value) for the entries of block i, starting at the last
+        restart point whose key is <= key (binary search)
+        """
+        mm = self._mm
+        start, end = self.offsets[i], self.offsets[i + 1]
+        restarts = mm[end - 2] | mm[end - 1] << 8
+        end -= 2 + 2 * restarts
+        data = mm[start:end]
+        pos = 0
+        if key and restarts > 1:
+            points = struct.unpack_from(f"<{restarts}H", mm, end)
+            lo, hi = 0, restarts
+            while hi - lo > 1:
+                mid = (lo + hi) // 2
+                p = points[mid]
+                if data[p + 3:p + 3 + data[p + 1]] <= key:
+                    lo = mid
+                else:
+                    hi = mid
+            pos = points[lo]
+        end = len(data)
+        current = b""
+        while pos < end:
+            shared, unshared, length = data[pos], data[pos + 1], data[pos + 2]
+            pos += 3
+            current = current[:shared] + data[pos:pos + unshared]
+            pos += unshared
+            if length == TOMBSTONE:
+                yield current, None
+            else:
+                yield current, data[pos:pos + length]
+                pos += length
+
+    def get(self, key):
+        """The value of key (None for a tombstone), or MISSING"""
+        i = bisect.bisect_right(self.first_keys, key) - 1
+        if i < 0:
+            return MISSING
+        for k, value in self._block(i, key):
+            if k >= key:
+                return value if k == key else MISSING
+        return MISSING
+
+    def scan(self, start=b"", stop=None):
+        """Yield (key, value) for start <= key < stop, tombstones included"""
+        first = max(bisect.bisect_right(self.first_keys, start) - 1, 0)
+        for i in range(first, len(self.first_keys)):
+            for key, value in self._block(i, start if i == first else b""):
+                if key < start:
+                    continue
+                if stop is not None and key >= stop:
+                    return
+                yield key, value
+
+
+# ---------------------------------------------------------------------------
+# Index
+# ---------------------------------------------------------------------------
+
+class AddressIndex:
+    """
+    Script hash -> funding / spending index of a chain.
+
+    Args:
+        path: directory of the index (created if missing)
+        network: network of the indexed chain (checked on reopen)
+        memtable_rows: rows kept in memory before add_block() writes a segment
+        max_segments: segments kept before they are merged
+        block_size: target size of a segment block
+    """
+
+    def __init__(self, path, network="regtest", memtable_rows=MEMTABLE_ROWS,
+                 max_segments=MAX_SEGMENTS, block_size=BLOCK_SIZE):
+        self.path = path
+        self.network = network
+        self.memtable_rows = memtable_rows
+        self.max_segments = max(max_segments, 1)
+        self.block_size = block_size
+        self.segments = []      # oldest first
+        self.memtable = {}      # key -> value, None for a tombstone
+        self._mem_keys = []     # memtable keys, sorted
+        self.height = 0         # next block to index
+        self.tip = None         # hash of block height - 1
+        self._next_segment = 0
+        os.makedirs(path, exist_ok=True)
+        self._manifest = os.path.join(path, "manifest.json")
+        if os.path.exists(self._manifest):
+            self._load()
+
+    # ===== Manifest =====
+
+    def _load(self):
+        with open(self._manifest) as f:
+            state = json.load(f)
+        if state.get("version") != MANIFEST_VERSION:
+            raise AddressIndexError("unknown index version")
+        if state["network"] != self.network:
+            raise AddressIndexError(f"index is for {state['network']}, not {self.network}")
+        self.height = state["height"]
+        self.tip = bytes.fromhex(state["tip"]) if state["tip"] else None
+        self._next_segment = state["next_segment"]
+        self.segments = [Segment(os.path.join(self.path, name)) for name in state["segments"]]
+        listed = set(state["segments"])
+        for name in os.listdir(self.path):
+            if name.endswith((".seg", ".tmp")) and name not in listed:
+                os.remove(os.path.join(self.path, name))  # left by an interrupted flush or merge
+
+    def _save(self):
+        state = {
+            "version": MANIFEST_VERSION,
+            "network": self.network,
+            "height": self.height,
+            "tip": self.tip.hex() if self.tip else None,
+            "next_segment": self._next_segment,
+            "segments": [segment.name for segment in self.segments],
+        }
+        with open(self._manifest + ".tmp", "w") as f:
+            json.dump(state, f)
+        os.replace(self._manifest + ".tmp", self._manifest)
+
+    def _segment_path(self):
+        self._next_segment += 1
+        return os.path.join(self.path, f"{self._next_segment:06d}.seg")
+
+    def _replace_segments(self, old, new):
+        """Swap segments for new ones in the manifest, then delete the old files"""
+        self.segments = [segment for segment in self.segments if segment not in old] + new
+        self.segments.sort(key=lambda segment: segment.name)
+        self._save()
+        for segment in old:
+            segment.close()
+            os.remove(segment.path)
+
+    # ===== Blocks =====
+
+    def _check_block(self, height, block):
+        if height != self.height:
+            raise AddressIndexError(f"expected block {self.height}, got {height}")
+        if self.tip is not None and block[4:36] != self.tip:
+            raise AddressIndexError(f"block {height} does not extend the indexed tip")
+
+    def _check_store(self, store):
+        if self.height and (self.height > len(store) or store.block_hash(self.height - 1) != self.tip):
+            raise AddressIndexError(f"block {self.height - 1} of the store is not the indexed one")
+
+    def add_block(self, height, block):
+        """Index the next block through the memtable; returns the number of rows"""
+        self._check_block(height, block)
+        rows = block_rows(height, block)
+        self._put(rows)
+        self.height = height + 1
+        self.tip = sha256d(block[:80])
+        if len(self.memtable) >= self.memtable_rows:
+            self.flush()
+        return len(rows)
+
+    def undo_block(self, height, block):
+        """Remove the tip block (e.g. in a reorg) by writing tombstones for its rows"""
+        if height != self.height - 1 or sha256d(block[:80]) != self.tip:
+            raise AddressIndexError(f"block {height} is not the indexed tip")
+        self._put([(key, None) for key, _ in block_rows(height, block)])
+        self.height = height
+        self.tip = bytes(block[4:36]) if height else None
+
+    def _put(self, rows):
+        memtable = self.memtable
+        new = [key for key, _ in rows if key not in memtable]
+        memtable.update(rows)
+        if new:
+            new.sort()
+            self._mem_keys += new
+            self._mem_keys.sort()  # two sorted runs: a linear merge
+
+    def bulk_load(self, store, stop=None, run_rows=RUN_ROWS, progress=None):
+        """
+        Index the blocks of store from self.height up to stop (default: the
+        tip) in batches. Every run_rows rows are sorted and written as a run,
+        and the runs are then merged with the existing segments into one.
+        Calls progress(height) after every block. Returns the number of rows.
+        """
+        self._check_store(store)
+        self.flush()
+        runs, rows, total = [], [], 0
+        for height, block in store.blocks(self.height, stop):
+            self._check_block(height, block)
+            rows += block_rows(height, block)
+            self.height = height + 1
+            self.tip = sha256d(block[:80])
+            if len(rows) >= run_rows:
+                rows.sort()
+                runs.append(write_segment(self._segment_path(), rows, self.block_size))
+                total += len(rows)
+                rows = []
+            if progress:
+                progress(height)
+        if rows:
+            rows.sort()
+            runs.append(write_segment(self._segment_path(), rows, self.block_size))
+            total += len(rows)
+        if len(runs) == 1 and not self.segments:
+            self._replace_segments([], runs)
+        elif runs:
+            # runs never share a key; existing segments are older than all of them
+            old = list(self.segments)
+            sources = [run.scan() for run in runs] + [segment.scan() for segment in reversed(old)]
+            merged = write_segment(self._segment_path(), merge_rows(sources, drop_tombstones=True),
+                                   self.block_size)
+            self._replace_segments(old + runs, [merged])
+        else:
+            self._save()
+        return total
+
+    def sync(self, store, stop=None, bulk_blocks=BULK_BLOCKS):
+        """
+        Index the blocks of store after self.height: bulk_load() when more
+        than bulk_blocks are missing, add_block() otherwise. Returns the
+        number of rows.
+        """
+        self._check_store(store)
+        stop = len(store) if stop is None else min(stop, len(store))
+        if stop - self.height > bulk_blocks:
+            return self.bulk_load(store, stop)
+        rows = 0
+        for height, block in store.blocks(self.height, stop):
+            rows += self.add_block(height, block)
+        return rows
+
+    # ===== Segments =====
+
+    def _memtable_rows(self, start=b"", stop=None):
+        keys, memtable = self._mem_keys, self.memtable
+        for i in range(bisect.bisect_left(keys, start), len(keys)):
+            key = keys[i]
+            if stop is not None and key >= stop:
+                return
+            yield key, memtable[key]
+
+    def flush(self):
+        """Write the memtable as a segment (merging segments if needed) and the manifest"""
+        if self.memtable:
+            segment = write_segment(self._segment_path(), self._memtable_rows(), self.block_size)
+            self.memtable, self._mem_keys = {}, []
+            self._replace_segments([], [segment])
+            if len(self.segments) > self.max_segments:
+                self._merge_segments()
+        else:
+            self._save()
+
+    def _merge_segments(self):
+        """
+        Merge the newer segments into one. The oldest (usually the bulk-loaded
+        one) joins only when they add up to half its size, so most merges stay
+        small; tombstones are dropped when it does.
+        """
+        first = 1
+        if sum(segment.rows for segment in self.segments[1:]) * 2 >= self.segments[0].rows:
+            first = 0
+        old = self.segments[first:]
+        merged = write_segment(self._segment_path(),
+                               merge_rows([segment.scan() for segment in reversed(old)],
+                                          drop_tombstones=first == 0),
+                               self.block_size)
+        self._replace_segments(old, [merged])
+
+    def compact(self):
+        """Flush, then merge every segment into one without tombstones"""
+        self.flush()
+        if self.segments:
+            old = list(self.segments)
+            merged = write_segment(self._segment_path(),
+                                   merge_rows([segment.scan() for segment in reversed(old)],
+                                              drop_tombstones=True),
+                                   self.block_size)
+            self._replace_segments(old, [merged])
+
+    def close(self):
+        self.flush()
+        for segment in self.segments:
+            segment.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ===== Queries =====
+
+    def get(self, key):
+        """Value of a row, or None"""
+        if key in self.memtable:
+            return self.memtable[key]
+        for segment in reversed(self.segments):
+            value = segment.get(key)
+            if value is not MISSING:
+                return value
+        return None
+
+    def scan(self, prefix):
+        """Yield (key, value) for every row whose key starts with prefix, in key order"""
+        stop = _successor(prefix)
+        sources = [self._memtable_rows(prefix, stop)]
+        sources += [segment.scan(prefix, stop) for segment in reversed(self.segments)]
+        if len(sources) == 1 or not self.memtable and len(self.segments) == 1:
+            rows = sources[-1]
+            return (row for row in rows if row[1] is not None)
+        return merge_rows(sources, drop_tombstones=True)
+
+    def funding(self, script_hash):
+        """Funding of a script, oldest first: [Funding]"""
+        return [Funding(int.from_bytes(key[33:37], "big"), key[37:69], int.from_bytes(key[69:73], "big"),
+                        int.from_bytes(value, "big"))
+                for key, value in self.scan(FUNDING + script_hash)]
+
+    def spender(self, tx_hash, vout):
+        """The Spend of an outpoint, or None if it is unspent"""
+        value = self.get(SPENDING + tx_hash + vout.to_bytes(4, "big"))
+        if value is None:
+            return None
+        return Spend(value[:32], int.from_bytes(value[32:36], "big"), int.from_bytes(value[36:40], "big"))
+
+    def utxos(self, script_hash):
+        """Unspent funding of a script, oldest first: [Funding]"""
+        get = self.get
+        return [f for f in self.funding(script_hash)
+                if get(SPENDING + f.txid + f.vout.to_bytes(4, "big")) is None]
+
+    def history(self, script_hash):
+        """
+        Transactions funding or spending a script, newest first:
+        [(height, txid)] (ties in a block are ordered by txid)
+        """
+        txs = set()
+        for f in self.funding(script_hash):
+            txs.add((f.height, f.txid))
+            spend = self.spender(f.txid, f.vout)
+            if spend:
+                txs.add((spend.height, spend.txid))
+        return sorted(txs, reverse=True)
+
+    def tx_location(self, tx_hash):
+        """TxLocation of a transaction, or None"""
+        value = self.get(TX + tx_hash)
+        if value is None:
+            return None
+        return TxLocation(*struct.unpack(">III", value))
+
+    def block_info(self, height):
+        """(block hash, timestamp) of an indexed block, or None"""
+        value = self.get(BLOCK + HEIGHT.pack(height))
+        if value is None:
+            return None
+        return value[:32], int.from_bytes(value[32:36], "little")
+
+    def stats(self):
+        rows = sum(segment.rows for segment in self.segments)
+        raw = sum(segment.key_bytes + segment.value_bytes for segment in self.segments)
+        size = sum(segment.size for segment in self.segments)
+        return {
+            "height": self.height,
+            "segments": len(self.segments),
+            "segment_rows": rows,
+            "memtable_rows": len(self.memtable),
+            "raw_bytes": raw,
+            "file_bytes": size,
+            "bytes_per_row": size / max(rows, 1),
+            "index_blocks": sum(len(segment.first_keys) for segment in self.segments),
+        }
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Local Block Store and Streaming Block Parser
+
+The scanner in utxo_scanner.py asks the Blockstream API about one address.
+Scanning a wallet, or indexing a chain, needs the blocks themselves. This
+store keeps them on disk the way Bitcoin Core's blocks/ directory does:
+blk00000.dat, blk00001.dat, ... files of records
+
+    network magic (4) | block size (4, little-endian) | serialized block
+
+plus an index (index.dat) of one fixed 12-byte record per height: file
+number, offset and size. Blocks are appended in chain order, so reading
+height h is one seek, and resuming a scan from a checkpoint does not read
+the blocks before it. (Bitcoin Core writes blocks in arrival order and
+obfuscates newer files, so its blk files need its LevelDB block index;
+this store is filled from a node over RPC / P2P or by a test generator.)
+
+iter_block_txs() walks a serialized block without building Transaction
+objects. Each transaction comes back as a BlockTx with its prevouts and
+outputs; the txid is only hashed when asked for (txid()), since a scanner
+looks at every output but needs the txid of very few transactions.
+
+parse_tx() is timed into a histogram (block_store.parse_tx) when
+tools/instrumentation.py is enabled at import, and left undecorated when
+it is not.
+"""
+
+import hashlib
+import os
+import struct
+from collections import namedtuple
+
+from .instrumentation import timed
+
+MAGIC = {
+    "mainnet": bytes.fromhex("f9beb4d9"),
+    "testnet": bytes.fromhex("0b110907"),
+    "signet": bytes.fromhex("0a03cf40"),
+    "regtest": bytes.fromhex("fabfb5da"),
+}
+MAX_BLOCKFILE_SIZE = 128 * 1024 * 1024  # same limit as Bitcoin Core
+INDEX_RECORD = struct.Struct("<III")   # file number, offset of the block, size
+
+NULL_PREVOUT = b"\x00" * 32 + b"\xff" * 4
+
+# data: the serialized block; start / end: the transaction within it;
+# body_start / body_end: inputs and outputs, without marker, flag and witnesses;
+# prevouts: 36-byte outpoints (txid in internal order + vout); outputs: (amount, scriptPubKey)
+BlockTx = namedtuple("BlockTx", ["data", "start", "body_start", "body_end", "end", "prevouts", "outputs"])
+
+
+class BlockStoreError(Exception):
+    pass
+
+
+def sha256d(data):
+    return hashlib.sha256(hashlib.sha256(data).digest()).digest()
+
+
+def compact_size(n):
+    if n < 0xfd:
+        return bytes([n])
+    if n <= 0xffff:
+        return b"\xfd" + struct.pack("<H", n)
+    if n <= 0xffffffff:
+        return b"\xfe" + struct.pack("<I", n)
+    return b"\xff" + struct.pack("<Q", n)
+
+
+def read_compact_size(data, offset):
+    first = data[offset]
+    if first < 0xfd:
+        return first, offset + 1
+    if first == 0xfd:
+        return struct.unpack_from("<H", data, offset + 1)[0], offset + 3
+    if first == 0xfe:
+        return struct.unpack_from("<I", data, offset + 1)[0], offset + 5
+    return struct.unpack_from("<Q", data, offset + 1)[0], offset + 9
+
+
+# ---------------------------------------------------------------------------
+# Block parsing
+# ---------------------------------------------------------------------------
+
+def block_hash(block):
+    """Block hash (internal byte order) from the 80-byte header"""
+    return sha256d(block[:80])
+
+
+def txid(tx):
+    """TXID (internal byte order) of a BlockTx: the hash of its non-witness serialization"""
+    data = tx.data
+    return sha256d(b"".join((data[tx.start:tx.start + 4], data[tx.body_start:tx.body_end],
+                             data[tx.end - 4:tx.end])))
+
+
+@timed("block_store.parse_tx", trace=False)
+def parse_tx(block, offset=0):
+    """BlockTx of the transaction serialized at `offset` in `block` (any buffer)"""
+    unpack_from = struct.unpack_from
+    start = offset
+    offset += 4
+    segwit = block[offset] == 0 and block[offset + 1] == 1
+    if segwit:
+        offset += 2
+    body_start = offset
+    n_in = block[offset]
+    offset += 1
+    if n_in >= 0xfd:
+        n_in, offset = read_compact_size(block, offset - 1)
+    prevouts = []
+    for _ in range(n_in):
+        prevouts.append(block[offset:offset + 36])
+        length = block[offset + 36]
+        offset += 37
+        if length >= 0xfd:
+            length, offset = read_compact_size(block, offset - 1)
+        offset += length + 4
+    n_out = block[offset]
+    offset += 1
+    if n_out >= 0xfd:
+        n_out, offset = read_compact_size(block, offset - 1)
+    outputs = []
+    for _ in range(n_out):
+        amount = unpack_from("<q", block, offset)[0]
+        length = block[offset + 8]
+        offset += 9
+        if length >= 0xfd:
+            length, offset = read_compact_size(block, offset - 1)
+        outputs.append((amount, block[offset:offset + length]))
+        offset += length
+    body_end = offset
+    if segwit:
+        for _ in range(n_in):
+            items, offset = read_compact_size(block, offset)
+            for _ in range(items):
+                length, offset = read_compact_size(block, offset)
+                offset += length
+    offset += 4
+    return BlockTx(block, start, body_start, body_end, offset, prevouts, outputs)
+
+
+def iter_block_txs(block):
+    """Yield a BlockTx for every transaction of a serialized block, coinbase first"""
+    count, offset = read_compact_size(block, 80)
+    for _ in range(count):
+        tx = parse_tx(block, offset)
+        offset = tx.end
+        yield tx
+
+
+def merkle_root(txids):
+    """Merkle root of a block's txids (internal byte order)"""
+    level = list(txids)
+    while len(level) > 1:
+        if len(level) % 2:
+            level.append(level[-1])
+        level = [sha256d(level[i] + level[i + 1]) for i in range(0, len(level), 2)]
+    return level[0]
+
+
+def make_block(prev_hash, raw_txs, timestamp, bits=0x207fffff, nonce=0, version=0x20000000):
+    """
+    Serialize a block from raw transactions (coinbase first). The Merkle
+    root is computed; no proof of work is done, which only regtest-style
+    test chains accept.
+    """
+    root = merkle_root([txid(parse_tx(raw)) for raw in raw_txs])
+    header = struct.pack("<i", version) + prev_hash + root + struct.pack("<III", timestamp, bits, nonce)
+    return header + compact_size(len(raw_txs)) + b"".join(raw_txs)
+
+
+# ---------------------------------------------------------------------------
+# Block store
+# ---------------------------------------------------------------------------
+
+class BlockStore:
+    """
+    Blocks in height order in blk*.dat files, with a height index.
+
+    Args:
+        path: directory of the store (created if missing)
+        network: selects the magic bytes of the records
+    """
+
+    def __init__(self, path, network="regtest"):
+        self.path = path
+        self.magic = MAGIC[network]
+        os.makedirs(path, exist_ok=True)
+        self._index_path = os.path.join(path, "index.dat")
+        with open(self._index_path, "ab+") as f:
+            f.seek(0)
+            data = f.read()
+        size = len(data) - len(data) % INDEX_RECORD.size
+        self._index = [INDEX_RECORD.unpack_from(data, i) for i in range(0, size, INDEX_RECORD.size)]
+
+    def __len__(self):
+        return len(self._index)
+
+    def _file(self, number):
+        return os.path.join(self.path, f"blk{number:05d}.dat")
+
+    def append(self, block):
+        """Append the next block; returns its height"""
+        number, offset = 0, 0
+        if self._index:
+            number, last_offset, last_size = self._index[-1]
+            offset = last_offset + last_size
+            if offset + 8 + len(block) > MAX_BLOCKFILE_SIZE:
+                number, offset = number + 1, 0
+        with open(self._file(number), "ab") as f:
+            if f.tell() != offset:
+                f.truncate(offset)  # drop a record the index never got
+            f.write(self.magic + struct.pack("<I", len(block)) + block)
+        record = (number, offset + 8, len(block))
+        with open(self._index_path, "ab") as f:
+            f.write(INDEX_RECORD.pack(*record))
+        self._index.append(record)
+        return len(self._index) - 1
+
+    def read(self, height):
+        number, offset, size = self._index[height]
+        with open(self._file(number), "rb") as f:
+            f.seek(offset)
+            return f.read(size)
+
+    def read_range(self, height, start, size):
+        """`size` bytes at offset `start` of block `height` (one transaction, say)"""
+        number, offset, block_size = self._index[height]
+        if start < 0 or start + size > block_size:
+            raise BlockStoreError(f"range {start}+{size} is outside block {height}")
+        with open(self._file(number), "rb") as f:
+            f.seek(offset + start)
+            return f.read(size)
+
+    def block_hash(self, height):
+        number, offset, _ = self._index[height]
+        with open(self._file(number), "rb") as f:
+            f.seek(offset)
+            return sha256d(f.read(80))
+
+    def blocks(self, start=0, stop=None):
+        """Yield (height, block bytes) from start up to stop (default: the tip), sequentially"""
+        stop = len(self._index) if stop is None else min(stop, len(self._index))
+        f, current = None, None
+        try:
+            for height in range(start, stop):
+                number, offset, size = self._index[height]
+                if number != current:
+                    if f:
+                        f.close()
+                    f, current = open(self._file(number), "rb"), number
+                    f.seek(offset - 8)
+                record = f.read(8 + size)
+                if record[:4] != self.magic or len(record) != 8 + size:
+                    raise BlockStoreError(f"bad record for block {height} in {self._file(number)}")
+                yield height, record[8:]
+        finally:
+            if f:
+                f.close()
@@ -4,8 +4,16 @@ BRC-20 Configuration and Constants
 
 Defines the private key, network, fee parameters, token metadata,
 and inscription helpers used by the BRC-20 commit / reveal scripts.
+
+The fees default to FEE_CONFIG. When a fee estimates file written by
+tools/fee_estimator.py exists (FEE_ESTIMATES, default fee_estimates.json),
+get_fee_config() turns its feerate for CONFIRM_TARGET blocks into commit and
+reveal fees from the sizes of the two transactions.
 """
 
+import math
+import os
+
 # Private key (testnet WIF)
 PRIVATE_KEY_WIF = "cRxebG1hY6vVgS9CSLNaEbEJaXkpZvc6nFeqqGT7v6gcW7MbzKNT"
 
@@ -19,6 +27,13 @@ FEE_CONFIG = {
     "min_output": 546,      # Minimum output value to avoid dust
 }
 
+# Fee estimates (tools/fee_estimator.py)
+FEE_ESTIMATES_FILE = os.environ.get("FEE_ESTIMATES", "fee_estimates.json")
+CONFIRM_TARGET = int(os.environ.get("CONFIRM_TARGET", "2"))     # blocks
+
+# Commit: key path P2TR input, inscription output and change (10.5 + 57.5 + 2 * 43 vB)
+COMMIT_VSIZE = 154
+
 # BRC-20 token definitions
 TOKEN_CONFIG = {
     "deploy": {
@@ -56,9 +71,51 @@ def get_brc20_hex(op_type="deploy"):
     json_str = get_brc20_json(op_type)
     return json_str.encode('utf-8').hex()
 
-def calculate_inscription_amount():
+def push_size(length):
+    """Bytes of a minimal push of `length` bytes: the opcode(s) plus the data."""
+    if length < 0x4c:
+        return 1 + length                   # direct push
+    if length <= 0xff:
+        return 2 + length                   # OP_PUSHDATA1
+    if length <= 0xffff:
+        return 3 + length                   # OP_PUSHDATA2
+    return 5 + length                       # OP_PUSHDATA4
+
+def reveal_vsize(op_type="mint"):
+    """Virtual size of the reveal: script path spend of the inscription leaf, one P2TR output."""
+    payload = len(get_brc20_json(op_type))
+    # <key> OP_CHECKSIG OP_0 OP_IF <"ord"> OP_1 <content type> OP_0 <payload> OP_ENDIF
+    script = (push_size(32) + 3 + push_size(len(INSCRIPTION_CONFIG["ord_marker"]) // 2) + 1
+              + push_size(len(INSCRIPTION_CONFIG["content_type_hex"]) // 2) + 1 + push_size(payload) + 1)
+    witness = 1 + 65 + (script + 1 + (script >= 253) * 2) + 34
+    return math.ceil((4 * (10 + 41 + 43) + 2 + witness) / 4)
+
+def get_fee_config(estimator=None, target=CONFIRM_TARGET, op_type="mint"):
+    """
+    Fee configuration for confirmation within `target` blocks.
+
+    Uses the estimator (or the FEE_ESTIMATES_FILE it saved) and falls back to
+    FEE_CONFIG when there is no estimate yet or the file cannot be read. The
+    result has the keys of FEE_CONFIG plus "feerate" (sat/vB, None for the
+    fixed fees).
+    """
+    if estimator is None and os.path.exists(FEE_ESTIMATES_FILE):
+        from .fee_estimator import FeeEstimator, FeeEstimatorError
+        try:
+            estimator = FeeEstimator.load(FEE_ESTIMATES_FILE)
+        except (OSError, ValueError, KeyError, TypeError, FeeEstimatorError) as e:
+            print(f"[WARN] Ignoring {FEE_ESTIMATES_FILE} ({type(e).__name__}: {e}); using FEE_CONFIG")
+    feerate = estimator.estimate_smart_fee(target)[0] if estimator else None
+    if feerate is None:
+        return dict(FEE_CONFIG, feerate=None)
+    return dict(FEE_CONFIG, feerate=feerate,
+                commit_fee=math.ceil(feerate * COMMIT_VSIZE),
+                reveal_fee=math.ceil(feerate * reveal_vsize(op_type)))
+
+def calculate_inscription_amount(fee_config=None):
     """Calculate the amount (sats) to send to the temporary address."""
-    return FEE_CONFIG["min_output"] + FEE_CONFIG["reveal_fee"]
+    fee_config = fee_config or FEE_CONFIG
+    return fee_config["min_output"] + fee_config["reveal_fee"]
 
 if __name__ == "__main__":
     print("=== BRC-20 Configuration ===")
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Test Chain Generator
+
+Random regtest-style chains for the indexing benchmarks. Unlike random
+bytes, every input spends an output that exists and is unspent at that
+point, so a UTXO set or an address index can apply the blocks for real.
+
+Each block has a coinbase and `txs_per_block` transactions spending one to
+three random unspent outputs (possibly created earlier in the same block)
+into one to three outputs with a mix of output types close to today's
+chain. Pass `address_pool` scripts to have a share of the outputs pay a
+fixed set of addresses, so they collect a history.
+
+No proof of work, coinbase maturity or signatures: the witnesses are
+placeholders of the right size.
+"""
+
+import os
+import random
+import shutil
+import struct
+
+from .block_store import BlockStore, block_hash, compact_size, make_block, parse_tx, txid
+
+WITNESS = b"\x01\x40" + b"\x5a" * 64  # one 64-byte Schnorr signature
+FEE_RATE = 2  # sat/vB, roughly
+
+
+def raw_tx(prevouts, outputs, coinbase_height=None):
+    """Serialized transaction: key path spends of prevouts, or a coinbase"""
+    parts = [struct.pack("<i", 2)]
+    if coinbase_height is None:
+        parts.append(b"\x00\x01")
+        parts.append(compact_size(len(prevouts)))
+        for prevout in prevouts:
+            parts.append(prevout + b"\x00" + b"\xfd\xff\xff\xff")
+    else:
+        height = coinbase_height.to_bytes(4, "little")
+        parts.append(b"\x01" + b"\x00" * 32 + b"\xff" * 4 + b"\x05\x04" + height + b"\xff" * 4)
+    parts.append(compact_size(len(outputs)))
+    for amount, spk in outputs:
+        parts.append(struct.pack("<q", amount) + compact_size(len(spk)) + spk)
+    if coinbase_height is None:
+        parts.append(WITNESS * len(prevouts))
+    parts.append(b"\x00" * 4)
+    return b"".join(parts)
+
+
+def random_script(rng):
+    """A scriptPubKey drawn from a chain-like mix of output types"""
+    r = rng.random()
+    if r < 0.40:
+        return b"\x51\x20" + rng.randbytes(32)                        # P2TR
+    if r < 0.75:
+        return b"\x00\x14" + rng.randbytes(20)                        # P2WPKH
+    if r < 0.85:
+        return b"\x76\xa9\x14" + rng.randbytes(20) + b"\x88\xac"      # P2PKH
+    if r < 0.93:
+        return b"\xa9\x14" + rng.randbytes(20) + b"\x87"              # P2SH
+    if r < 0.98:
+        return b"\x00\x20" + rng.randbytes(32)                        # P2WSH
+    return b"\x6a\x14" + rng.randbytes(20)                            # OP_RETURN
+
+
+class ChainGenerator:
+    """
+    Args:
+        seed: seed of the generator (the chain is deterministic)
+        address_pool: scriptPubKeys that receive a share of the outputs
+        reuse: probability that an output pays a script of address_pool
+    """
+
+    def __init__(self, seed=1, address_pool=(), reuse=0.2):
+        self.rng = random.Random(seed)
+        self.pool = list(address_pool)
+        self.reuse = reuse if self.pool else 0
+        self.unspent = []  # (prevout, amount), spent by swap-and-pop
+
+    def _script(self):
+        if self.reuse and self.rng.random() < self.reuse:
+            return self.rng.choice(self.pool)
+        return random_script(self.rng)
+
+    def _spend(self):
+        unspent = self.unspent
+        i = self.rng.randrange(len(unspent))
+        unspent[i], unspent[-1] = unspent[-1], unspent[i]
+        return unspent.pop()
+
+    def _add(self, raw):
+        tx = parse_tx(raw)
+        tx_hash = txid(tx)
+        for vout, (amount, spk) in enumerate(tx.outputs):
+            if spk[:1] != b"\x6a":
+                self.unspent.append((tx_hash + vout.to_bytes(4, "little"), amount))
+
+    def block(self, height, prev_hash, txs_per_block):
+        rng = self.rng
+        coinbase = raw_tx([], [(50 * 10 ** 8, self._script())], coinbase_height=height)
+        self._add(coinbase)
+        txs = [coinbase]
+        for _ in range(txs_per_block):
+            n_in = min(rng.choice((1, 1, 1, 2, 2, 3)), len(self.unspent))
+            if not n_in:
+                break
+            spent = [self._spend() for _ in range(n_in)]
+            n_out = rng.choice((1, 2, 2, 2, 3))
+            total = sum(amount for _, amount in spent) - FEE_RATE * (11 + 58 * n_in + 43 * n_out)
+            if total < 546 * n_out:
+                n_out, total = 1, max(total, 0)
+            cuts = sorted(rng.randrange(total + 1) for _ in range(n_out - 1))
+            amounts = [b - a for a, b in zip([0] + cuts, cuts + [total])]
+            raw = raw_tx([prevout for prevout, _ in spent], [(amount, self._script()) for amount in amounts])
+            self._add(raw)
+            txs.append(raw)
+        return make_block(prev_hash, txs, 1700000000 + height * 600)
+
+
+def build_store(path, blocks, txs_per_block, seed=1, address_pool=(), reuse=0.2, network="regtest"):
+    """
+    A BlockStore at path with a generated chain. The store is kept and
+    reused when it was generated with the same parameters.
+    Returns (store, reused).
+    """
+    marker = os.path.join(path, "generator.txt")
+    params = f"{blocks} {txs_per_block} {seed} {len(address_pool)} {reuse} {network}"
+    if os.path.exists(marker) and open(marker).read() == params:
+        return BlockStore(path, network), True
+    shutil.rmtree(path, ignore_errors=True)
+    store = BlockStore(path, network)
+    generator = ChainGenerator(seed, address_pool, reuse)
+    prev_hash = b"\x00" * 32
+    for height in range(blocks):
+        block = generator.block(height, prev_hash, txs_per_block)
+        store.append(block)
+        prev_hash = block_hash(block)
+    with open(marker, "w") as f:
+        f.write(params)
+    return store, False
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+CPFP Child Builder: One Child for Many Stuck Reveals
+
+A reveal pays its fee from the inscription amount the commit locked in
+(FEE_CONFIG["reveal_fee"] by default), and its output returns 546 sats to
+key_path_address. When the market moves past that fee, the reveals sit in
+the mempool. Their outputs are already ours, so a child spending them can
+pay for the whole package (child pays for parent): a miner selecting by
+ancestor feerate takes the child together with every parent.
+
+CPFPBuilder turns N stuck parents into as few children as the mempool
+package limits allow:
+
+- a child and its unconfirmed ancestors may number at most 25 and measure
+  at most 101 kvB (tools/mempool.py has the same limits), so parents are
+  grouped greedily and each group gets its own child
+- the fee of a child brings the package (child + parents + their other
+  unconfirmed ancestors, such as a commit, each counted once) to the
+  target feerate:
+
+      child fee = ceil(feerate * (package vsize + child vsize)) - package fees
+
+- each inscription stays on its own output: every parent output is passed
+  through at its value, in input order, so by first-in-first-out ordinal
+  assignment each inscribed sat lands on the matching output. The fee comes
+  from funding UTXOs (plain coins of key_path_address) spent last, and the
+  change after them. keep_outputs=False sweeps everything into one output.
+- the child's weight is exact before signing (chapter 8's BatchBuilder: a
+  key path witness is always 66 bytes), so the fee never has to be
+  re-estimated after the signatures exist
+- children are signed with BatchBuilder as well: the BIP341 hashes once per
+  child and the signatures spread over a process pool
+
+Chapter 8's tools package is loaded by file path, like chapter 1's HD
+wallet in wallet_rescanner.py.
+"""
+
+import importlib
+import importlib.util
+import math
+import os
+import sys
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from .block_store import parse_tx, txid as block_txid
+from .mempool import ANCESTOR_LIMIT, PACKAGE_SIZE_LIMIT
+
+MIN_RELAY_FEERATE = 1.0     # sat/vB
+P2TR_DUST = 330
+P2TR_OUTPUT_VBYTES = 43
+
+
+def _load_chapter08_tools():
+    """Load chapter 8's tools package by file path (once per process); returns its name"""
+    name = "chapter08_tools"
+    if name not in sys.modules:
+        path = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                             "..", "..", "chapter08", "tools"))
+        spec = importlib.util.spec_from_file_location(name, os.path.join(path, "__init__.py"),
+                                                      submodule_search_locations=[path])
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+    return name
+
+
+_chapter08 = _load_chapter08_tools()
+batch_builder = importlib.import_module(_chapter08 + ".batch_builder")
+satisfier = importlib.import_module(_chapter08 + ".satisfier")
+BatchBuilder = batch_builder.BatchBuilder
+
+# An unconfirmed output of ours: txid (display hex), vout, amount; fee and vsize of its transaction;
+# ancestors: (txid, fee, vsize) of that transaction's own unconfirmed ancestors
+StuckParent = namedtuple("StuckParent", ["txid", "vout", "amount", "fee", "vsize", "ancestors"])
+
+# A confirmed coin of key_path_address that can pay the child's fee
+FundingUtxo = namedtuple("FundingUtxo", ["txid", "vout", "amount"])
+
+# package_*: the child's ancestors (parents and theirs) without the child
+ChildPlan = namedtuple("ChildPlan", [
+    "parents", "funding", "outputs", "fee", "vsize", "weight",
+    "package_fee", "package_vsize", "feerate", "builder",
+])
+
+
+class CPFPError(Exception):
+    pass
+
+
+def parents_from_raw(raw, fee, script_pubkey, ancestors=()):
+    """
+    StuckParent for every output of a raw transaction paying script_pubkey.
+    The vsize is exact, from the serialization.
+    """
+    raw = bytes.fromhex(raw) if isinstance(raw, str) else bytes(raw)
+    tx = parse_tx(raw)
+    weight = 3 * (8 + tx.body_end - tx.body_start) + (tx.end - tx.start)
+    vsize = (weight + 3) // 4
+    txid = block_txid(tx)[::-1].hex()
+    return [StuckParent(txid, vout, amount, fee, vsize, tuple(ancestors))
+            for vout, (amount, spk) in enumerate(tx.outputs) if bytes(spk) == bytes(script_pubkey)]
+
+
+def _package(parents):
+    """(fee, vsize, count) of the unconfirmed transactions behind parents, each counted once"""
+    seen = {}
+    for parent in parents:
+        seen[parent.txid] = (parent.fee, parent.vsize)
+        for txid, fee, vsize in parent.ancestors:
+            seen[txid] = (fee, vsize)
+    return sum(f for f, _ in seen.values()), sum(v for _, v in seen.values()), len(seen)
+
+
+class CPFPBuilder:
+    """
+    Children that bump stuck parents to a package feerate.
+
+    Args:
+        secret: private key of key_path_address (int or 32 bytes); it owns
+                the parent outputs and the funding UTXOs
+        change_script: scriptPubKey of the change (default: key_path_address)
+    """
+
+    def __init__(self, secret, change_script=None, ancestor_limit=ANCESTOR_LIMIT,
+                 package_size_limit=PACKAGE_SIZE_LIMIT):
+        self.secret = secret
+        d = satisfier.tweak_seckey(satisfier._seckey_int(secret), b"")
+        self.script_pubkey = b"\x51\x20" + satisfier.signing_key(d)[1]
+        self.change_script = change_script or self.script_pubkey
+        self.ancestor_limit = ancestor_limit
+        self.package_size_limit = package_size_limit
+
+    # ===== Grouping =====
+
+    def group(self, parents):
+        """
+        Split parents into groups whose child stays within the ancestor
+        count and size limits (with room for the child itself)
+        """
+        groups, current = [], []
+        for parent in parents:
+            candidate = current + [parent]
+            if current and not self._fits(candidate):
+                groups.append(current)
+                candidate = [parent]
+            if not self._fits(candidate):
+                raise CPFPError(f"{parent.txid} is too large or has too many unconfirmed ancestors")
+            current = candidate
+        if current:
+            groups.append(current)
+        return groups
+
+    def _fits(self, parents):
+        _, vsize, count = _package(parents)
+        # the child, with two funding inputs and an output per parent plus change
+        child = 11 + 58 * (len(parents) + 2) + P2TR_OUTPUT_VBYTES * (len(parents) + 1)
+        return count + 1 <= self.ancestor_limit and vsize + child <= self.package_size_limit
+
+    # ===== Planning =====
+
+    @staticmethod
+    def _child_fee(vsize, package_fee, package_vsize, feerate):
+        return max(math.ceil(feerate * (package_vsize + vsize)) - package_fee,
+                   math.ceil(MIN_RELAY_FEERATE * vsize))
+
+    def _builder(self, parents, funding, change, keep_outputs):
+        builder = BatchBuilder()
+        for parent in parents:
+            builder.add_input(parent.txid, parent.vout, parent.amount, self.secret)
+        for utxo in funding:
+            builder.add_input(utxo.txid, utxo.vout, utxo.amount, self.secret)
+        if keep_outputs:
+            for parent in parents:
+                builder.add_output(parent.amount, self.script_pubkey)
+        if change is not None:
+            builder.add_output(change, self.change_script)
+        return builder
+
+    def plan_child(self, parents, funding, feerate, keep_outputs=True):
+        """
+        The child of one group: funding UTXOs are taken from `funding`
+        (largest first, removed from the list) until the fee and a change
+        output above dust are covered.
+        """
+        package_fee, package_vsize, _ = _package(parents)
+        parent_amounts = sum(p.amount for p in parents)
+        passed = parent_amounts if keep_outputs else 0
+        funding.sort(key=lambda u: u.amount)
+        used = []
+        while True:
+            spendable = parent_amounts + sum(u.amount for u in used) - passed
+            builder = self._builder(parents, used, 0, keep_outputs)
+            fee = self._child_fee(builder.vsize(), package_fee, package_vsize, feerate)
+            if spendable - fee >= P2TR_DUST:
+                builder.outputs[-1] = builder.outputs[-1]._replace(amount=spendable - fee)
+                break
+            # too little for a change output: without it the rest goes to the fee
+            bare = self._builder(parents, used, None, keep_outputs)
+            if bare.outputs and spendable >= self._child_fee(bare.vsize(), package_fee, package_vsize, feerate):
+                builder = bare
+                break
+            if not funding:
+                raise CPFPError(f"funding UTXOs are short of {fee + P2TR_DUST - spendable} sats")
+            used.append(funding.pop())
+        vsize = builder.vsize()
+        fee = builder.fee()
+        feerate = (package_fee + fee) / (package_vsize + vsize)
+        outputs = [(txout.amount, txout.script_pubkey) for txout in builder.outputs]
+        return ChildPlan(list(parents), used, outputs, fee, vsize, builder.weight(),
+                         package_fee, package_vsize, feerate, builder)
+
+    def plan(self, parents, funding, feerate, keep_outputs=True):
+        """ChildPlan per group of parents, all brought to `feerate` sat/vB"""
+        pool = list(funding)
+        return [self.plan_child(group, pool, feerate, keep_outputs) for group in self.group(parents)]
+
+    # ===== Signing =====
+
+    def sign(self, plans, workers=1, chunksize=None):
+        """
+        Signed children (raw bytes), one per plan, with the signatures of
+        all children spread over one process pool
+        """
+        tasks, bounds = [], []
+        for plan in plans:
+            msgs = plan.builder.sighashes()
+            bounds.append((len(tasks), len(tasks) + len(msgs)))
+            tasks += [(msg, txin.seckey, txin.output_key) for msg, txin in zip(msgs, plan.builder.inputs)]
+        workers = workers or os.cpu_count() or 1
+        if workers == 1 or len(tasks) < 2:
+            signatures = [batch_builder._sign_task(task) for task in tasks]
+        else:
+            if chunksize is None:
+                chunksize = max(1, len(tasks) // (workers * 4))
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                signatures = list(pool.map(batch_builder._sign_task, tasks, chunksize=chunksize))
+        return [plan.builder.signed_tx(signatures[start:end]) for plan, (start, end) in zip(plans, bounds)]
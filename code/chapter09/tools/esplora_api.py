@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Esplora-Compatible API over the Local Address Index
+
+Serves an AddressIndex (tools/address_index.py) and the BlockStore it
+indexes with the paths and JSON of the Esplora REST API
+(blockstream.info/api, mempool.space/api). Code written against Esplora
+only needs a different base URL. For utxo_scanner.py that is
+ESPLORA_URL=http://127.0.0.1:3002.
+
+    GET /address/{address}                    chain_stats of the address
+    GET /address/{address}/utxo               [{txid, vout, status, value}]
+    GET /address/{address}/txs                the newest 25 transactions
+    GET /address/{address}/txs/chain/{txid}   the next 25 after txid
+    GET /scripthash/{hash}/...                the same by SHA256(scriptPubKey), hex
+    GET /tx/{txid}                            transaction with prevouts, fee and status
+    GET /tx/{txid}/hex | /status | /outspend/{vout}
+    GET /blocks/tip/height | /blocks/tip/hash | /block-height/{height}
+
+The index has no mempool, so every transaction is confirmed and
+mempool_stats are zero. The *_asm fields are left out.
+
+make_server() returns a ThreadingHTTPServer that keeps connections alive
+(HTTP/1.1, Nagle disabled). A lock serializes requests with follow(),
+which indexes new blocks of the store, so no request sees half a block.
+"""
+
+import json
+import re
+import struct
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import base58
+
+from .address_index import script_hash
+from .block_store import NULL_PREVOUT, parse_tx, read_compact_size
+from .wallet_rescanner import hd_wallet
+
+DEFAULT_PORT = 3002  # electrs' Esplora HTTP port on regtest
+PAGE_SIZE = 25       # Esplora's confirmed transactions per page
+
+# network -> (P2PKH version byte, P2SH version byte, bech32 hrp)
+ADDRESS_PARAMS = {
+    "mainnet": (0x00, 0x05, "bc"),
+    "testnet": (0x6F, 0xC4, "tb"),
+    "signet": (0x6F, 0xC4, "tb"),
+    "regtest": (0x6F, 0xC4, "bcrt"),
+}
+
+JSON = "application/json"
+TEXT = "text/plain"
+
+
+class EsploraError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# ---------------------------------------------------------------------------
+# Addresses and transactions
+# ---------------------------------------------------------------------------
+
+def address_script(address, network="regtest"):
+    """scriptPubKey of an address (base58 P2PKH / P2SH or bech32 / bech32m)"""
+    p2pkh, p2sh, hrp = ADDRESS_PARAMS[network]
+    if address.lower().startswith(hrp + "1"):
+        try:
+            version, program = hd_wallet.decode_segwit_address(hrp, address)
+        except hd_wallet.HDKeyError:
+            raise EsploraError(400, "Invalid Bitcoin address") from None
+        return bytes([version + 0x50 if version else 0, len(program)]) + program
+    try:
+        data = base58.b58decode_check(address)
+    except ValueError:
+        raise EsploraError(400, "Invalid Bitcoin address") from None
+    if len(data) == 21 and data[0] == p2pkh:
+        return b"\x76\xa9\x14" + data[1:] + b"\x88\xac"
+    if len(data) == 21 and data[0] == p2sh:
+        return b"\xa9\x14" + data[1:] + b"\x87"
+    raise EsploraError(400, "Invalid Bitcoin address")
+
+
+def script_info(spk, network="regtest"):
+    """(Esplora scriptpubkey_type, address or None) of a scriptPubKey"""
+    p2pkh, p2sh, hrp = ADDRESS_PARAMS[network]
+    size = len(spk)
+    if size == 25 and spk[:3] == b"\x76\xa9\x14" and spk[23:] == b"\x88\xac":
+        return "p2pkh", base58.b58encode_check(bytes([p2pkh]) + spk[3:23]).decode()
+    if size == 23 and spk[:2] == b"\xa9\x14" and spk[22] == 0x87:
+        return "p2sh", base58.b58encode_check(bytes([p2sh]) + spk[2:22]).decode()
+    if size and spk[0] == 0x6A:
+        return "op_return", None
+    if 4 <= size <= 42 and spk[1] == size - 2 and (spk[0] == 0 or 0x51 <= spk[0] <= 0x60):
+        version = spk[0] - 0x50 if spk[0] else 0
+        kind = {(0, 22): "v0_p2wpkh", (0, 34): "v0_p2wsh", (1, 34): "v1_p2tr"}.get((version, size))
+        if kind or version:
+            return kind or "unknown", hd_wallet.segwit_address(hrp, version, bytes(spk[2:]))
+    return "unknown", None
+
+
+def decode_tx(raw):
+    """
+    (version, inputs, outputs, locktime, weight) of a serialized transaction;
+    inputs are [prevout, scriptSig, sequence, witness items], outputs
+    (amount, scriptPubKey)
+    """
+    version = struct.unpack_from("<i", raw)[0]
+    segwit = raw[4] == 0 and raw[5] == 1
+    offset = 6 if segwit else 4
+    count, offset = read_compact_size(raw, offset)
+    inputs = []
+    for _ in range(count):
+        prevout = raw[offset:offset + 36]
+        length, offset = read_compact_size(raw, offset + 36)
+        script_sig = raw[offset:offset + length]
+        offset += length
+        inputs.append([prevout, script_sig, struct.unpack_from("<I", raw, offset)[0], []])
+        offset += 4
+    count, offset = read_compact_size(raw, offset)
+    outputs = []
+    for _ in range(count):
+        amount = struct.unpack_from("<q", raw, offset)[0]
+        length, offset = read_compact_size(raw, offset + 8)
+        outputs.append((amount, raw[offset:offset + length]))
+        offset += length
+    witness_start = offset
+    if segwit:
+        for entry in inputs:
+            items, offset = read_compact_size(raw, offset)
+            for _ in range(items):
+                length, offset = read_compact_size(raw, offset)
+                entry[3].append(raw[offset:offset + length])
+                offset += length
+    locktime = struct.unpack_from("<I", raw, offset)[0]
+    base = len(raw) - (offset - witness_start + 2 if segwit else 0)
+    return version, inputs, outputs, locktime, base * 3 + len(raw)
+
+
+def _txid_bytes(txid_hex):
+    try:
+        tx_hash = bytes.fromhex(txid_hex)[::-1]
+    except ValueError:
+        tx_hash = b""
+    if len(tx_hash) != 32:
+        raise EsploraError(400, "Invalid hex string")
+    return tx_hash
+
+
+# ---------------------------------------------------------------------------
+# API
+# ---------------------------------------------------------------------------
+
+class EsploraAPI:
+    """
+    Esplora routes over an index and its block store.
+
+    Args:
+        index: AddressIndex of the store
+        store: BlockStore the transactions are read from
+        network: network of the addresses (default: the index's)
+    """
+
+    def __init__(self, index, store, network=None):
+        self.index = index
+        self.store = store
+        self.network = network or index.network
+        self.lock = threading.Lock()
+        by_hash = {"by_hash": True}
+        self.routes = [(re.compile(pattern), handler, kwargs) for pattern, handler, kwargs in [
+            (r"/address/([^/]+)", self._address_stats, {}),
+            (r"/address/([^/]+)/utxo", self._address_utxo, {}),
+            (r"/address/([^/]+)/txs(?:/chain)?(?:/([0-9a-fA-F]{64}))?", self._address_txs, {}),
+            (r"/scripthash/([^/]+)", self._address_stats, by_hash),
+            (r"/scripthash/([^/]+)/utxo", self._address_utxo, by_hash),
+            (r"/scripthash/([^/]+)/txs(?:/chain)?(?:/([0-9a-fA-F]{64}))?", self._address_txs, by_hash),
+            (r"/tx/([^/]+)", self._tx, {}),
+            (r"/tx/([^/]+)/hex", self._tx_hex, {}),
+            (r"/tx/([^/]+)/status", self._tx_status, {}),
+            (r"/tx/([^/]+)/outspend/(\d+)", self._outspend, {}),
+            (r"/blocks/tip/height", self._tip_height, {}),
+            (r"/blocks/tip/hash", self._tip_hash, {}),
+            (r"/block-height/(\d+)", self._block_height, {}),
+        ]]
+
+    def handle(self, path):
+        """(HTTP status, content type, body) of a GET request"""
+        path = path.split("?", 1)[0]
+        if path.startswith("/api/"):
+            path = path[4:]
+        for pattern, handler, kwargs in self.routes:
+            match = pattern.fullmatch(path)
+            if match:
+                try:
+                    with self.lock:
+                        result = handler(*match.groups(), **kwargs)
+                except EsploraError as e:
+                    return e.status, TEXT, str(e).encode()
+                if isinstance(result, str):
+                    return 200, TEXT, result.encode()
+                return 200, JSON, json.dumps(result).encode()
+        return 404, TEXT, b"Not Found"
+
+    def follow(self):
+        """Index the blocks added to the store since the last call; returns the rows added"""
+        with self.lock:
+            return self.index.sync(self.store)
+
+    # ===== Helpers =====
+
+    def _script_hash(self, key, by_hash):
+        if by_hash:
+            try:
+                value = bytes.fromhex(key)
+            except ValueError:
+                value = b""
+            if len(value) != 32:
+                raise EsploraError(400, "Invalid hex string")
+            return value
+        return script_hash(address_script(key, self.network))
+
+    def _status(self, height):
+        block_hash, block_time = self.index.block_info(height)
+        return {"confirmed": True, "block_height": height,
+                "block_hash": block_hash[::-1].hex(), "block_time": block_time}
+
+    def _location(self, tx_hash):
+        location = self.index.tx_location(tx_hash)
+        if location is None:
+            raise EsploraError(404, "Transaction not found")
+        return location
+
+    def _raw_tx(self, location):
+        return self.store.read_range(location.height, location.offset, location.size)
+
+    def _output(self, amount, spk):
+        kind, address = script_info(spk, self.network)
+        output = {"scriptpubkey": spk.hex(), "scriptpubkey_type": kind}
+        if address:
+            output["scriptpubkey_address"] = address
+        output["value"] = amount
+        return output
+
+    def _tx_json(self, tx_hash, location):
+        raw = self._raw_tx(location)
+        version, inputs, outputs, locktime, weight = decode_tx(raw)
+        vin = []
+        fee = -sum(amount for amount, _ in outputs)
+        for prevout, script_sig, sequence, witness in inputs:
+            coinbase = prevout == NULL_PREVOUT
+            entry = {"txid": prevout[:32][::-1].hex(), "vout": int.from_bytes(prevout[32:], "little"),
+                     "prevout": None, "scriptsig": script_sig.hex()}
+            if witness:
+                entry["witness"] = [item.hex() for item in witness]
+            entry["is_coinbase"] = coinbase
+            entry["sequence"] = sequence
+            if not coinbase:
+                funding = self.index.tx_location(prevout[:32])
+                if funding:
+                    amount, spk = parse_tx(self._raw_tx(funding)).outputs[entry["vout"]]
+                    entry["prevout"] = self._output(amount, spk)
+                    fee += amount
+            vin.append(entry)
+        if vin and vin[0]["is_coinbase"]:
+            fee = 0
+        return {"txid": tx_hash[::-1].hex(), "version": version, "locktime": locktime, "vin": vin,
+                "vout": [self._output(amount, spk) for amount, spk in outputs],
+                "size": len(raw), "weight": weight, "fee": fee, "status": self._status(location.height)}
+
+    # ===== Routes =====
+
+    def _address_stats(self, key, by_hash=False):
+        funding = self.index.funding(self._script_hash(key, by_hash))
+        txs = set()
+        spent_count = spent_sum = 0
+        for f in funding:
+            txs.add(f.txid)
+            spend = self.index.spender(f.txid, f.vout)
+            if spend:
+                txs.add(spend.txid)
+                spent_count += 1
+                spent_sum += f.value
+        zero = {"funded_txo_count": 0, "funded_txo_sum": 0, "spent_txo_count": 0, "spent_txo_sum": 0,
+                "tx_count": 0}
+        return {"scripthash" if by_hash else "address": key,
+                "chain_stats": {"funded_txo_count": len(funding), "funded_txo_sum": sum(f.value for f in funding),
+                                "spent_txo_count": spent_count, "spent_txo_sum": spent_sum,
+                                "tx_count": len(txs)},
+                "mempool_stats": zero}
+
+    def _address_utxo(self, key, by_hash=False):
+        return [{"txid": f.txid[::-1].hex(), "vout": f.vout, "status": self._status(f.height), "value": f.value}
+                for f in self.index.utxos(self._script_hash(key, by_hash))]
+
+    def _address_txs(self, key, last_seen=None, by_hash=False):
+        history = self.index.history(self._script_hash(key, by_hash))
+        start = 0
+        if last_seen:
+            seen = _txid_bytes(last_seen)
+            start = next((i + 1 for i, (_, tx_hash) in enumerate(history) if tx_hash == seen), len(history))
+        return [self._tx_json(tx_hash, self._location(tx_hash))
+                for _, tx_hash in history[start:start + PAGE_SIZE]]
+
+    def _tx(self, txid_hex):
+        tx_hash = _txid_bytes(txid_hex)
+        return self._tx_json(tx_hash, self._location(tx_hash))
+
+    def _tx_hex(self, txid_hex):
+        return self._raw_tx(self._location(_txid_bytes(txid_hex))).hex()
+
+    def _tx_status(self, txid_hex):
+        return self._status(self._location(_txid_bytes(txid_hex)).height)
+
+    def _outspend(self, txid_hex, vout):
+        tx_hash = _txid_bytes(txid_hex)
+        self._location(tx_hash)
+        spend = self.index.spender(tx_hash, int(vout))
+        if spend is None:
+            return {"spent": False}
+        return {"spent": True, "txid": spend.txid[::-1].hex(), "vin": spend.vin, "status": self._status(spend.height)}
+
+    def _tip_height(self):
+        return str(self.index.height - 1)
+
+    def _tip_hash(self):
+        return self.index.tip[::-1].hex() if self.index.tip else ""
+
+    def _block_height(self, height):
+        info = self.index.block_info(int(height))
+        if info is None:
+            raise EsploraError(404, "Block not found")
+        return info[0][::-1].hex()
+
+
+# ---------------------------------------------------------------------------
+# HTTP server
+# ---------------------------------------------------------------------------
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    api = None
+
+    def do_GET(self):
+        status, content_type, body = self.api.handle(self.path)
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(api, host="127.0.0.1", port=DEFAULT_PORT):
+    """ThreadingHTTPServer answering with api; run it with serve_forever()"""
+    handler = type("EsploraHandler", (_Handler,), {"api": api})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Fee Estimator: Bucketed Confirmation Statistics with Exponential Decay
+
+FEE_CONFIG in brc20_config.py holds fixed fees. This estimator derives a
+feerate for "confirmed within N blocks" from what the chain actually did,
+the way Bitcoin Core's CBlockPolicyEstimator does:
+
+- Feerates fall into fixed buckets spaced by 5% from 1 to 10,000 sat/vB.
+- A transaction is recorded with its bucket and the height at which it
+  entered the mempool (process_transaction). When a block confirms it
+  (process_block), it counts as confirmed within 1..periods periods in its
+  bucket. Transactions that leave the mempool unconfirmed
+  (remove_transaction) count as failures for the periods they waited.
+- Three horizons keep these statistics in fixed-size arrays
+  [period][bucket] that decay every block:
+
+      short   12 periods of 1 block    decay 0.962     (half-life ~18 blocks)
+      medium  24 periods of 2 blocks   decay 0.9952    (~144 blocks)
+      long    42 periods of 24 blocks  decay 0.99931   (~1000 blocks)
+
+  So the estimates follow a change in demand within hours and still
+  remember the last week.
+- estimate_fee(target) walks the buckets from the highest feerate down and
+  groups buckets until they hold enough transactions. It keeps the lowest
+  group in which at least 85% confirmed within the target, counting
+  unconfirmed transactions that have already waited longer as failures,
+  and returns that group's median feerate. estimate_smart_fee() combines
+  half, full and double targets across the horizons like
+  estimatesmartfee.
+
+A query is O(buckets) for each horizon it consults. The per-bucket counts
+of transactions still unconfirmed after t blocks are summed once after each
+block (O(blocks tracked x buckets)) and reused by every query until the
+next one. save() / load() keep the statistics in a JSON file, like Core's
+fee_estimates.dat.
+"""
+
+import bisect
+import json
+import math
+import os
+
+MIN_BUCKET_FEERATE = 1.0        # sat/vB
+MAX_BUCKET_FEERATE = 10000.0
+FEE_SPACING = 1.05
+
+# name -> (periods, blocks per period, decay per block)
+HORIZONS = {
+    "short": (12, 1, 0.962),
+    "medium": (24, 2, 0.9952),
+    "long": (42, 24, 0.99931),
+}
+
+SUCCESS_PCT = 0.85
+HALF_SUCCESS_PCT = 0.6
+DOUBLE_SUCCESS_PCT = 0.95
+SUFFICIENT_FEETXS = 0.1         # transactions per block a bucket range needs (medium / long)
+SUFFICIENT_TXS_SHORT = 0.5
+ESTIMATES_VERSION = 1
+
+
+class FeeEstimatorError(Exception):
+    pass
+
+
+def fee_buckets():
+    """Upper bounds of the feerate buckets, the last one infinite"""
+    buckets = []
+    feerate = MIN_BUCKET_FEERATE
+    while feerate <= MAX_BUCKET_FEERATE:
+        buckets.append(feerate)
+        feerate *= FEE_SPACING
+    buckets.append(math.inf)
+    return buckets
+
+
+class ConfirmStats:
+    """
+    Decaying confirmation statistics of one horizon (Core's TxConfirmStats).
+    Every array has one slot per bucket.
+    """
+
+    def __init__(self, buckets, periods, scale, decay):
+        n = len(buckets)
+        self.buckets = buckets
+        self.periods = periods
+        self.scale = scale
+        self.decay = decay
+        self.max_confirms = periods * scale
+        self.conf_avg = [[0.0] * n for _ in range(periods)]     # confirmed within period p+1
+        self.fail_avg = [[0.0] * n for _ in range(periods)]     # left unconfirmed after period p+1
+        self.tx_ct_avg = [0.0] * n                              # confirmed at all
+        self.feerate_avg = [0.0] * n                            # sum of their feerates
+        self.unconf_txs = [[0] * n for _ in range(self.max_confirms)]  # by entry height % max_confirms
+        self.old_unconf_txs = [0] * n                           # waiting max_confirms blocks or more
+        self._waiting = None                                    # cached by waiting_counts()
+
+    def clear_current(self, height):
+        """A new block: the ring slot of `height` now holds the oldest transactions"""
+        row = self.unconf_txs[height % self.max_confirms]
+        self.old_unconf_txs = [a + b for a, b in zip(self.old_unconf_txs, row)]
+        self.unconf_txs[height % self.max_confirms] = [0] * len(row)
+        self._waiting = None
+
+    def update_moving_averages(self):
+        decay = self.decay
+        self.conf_avg = [[v * decay for v in row] for row in self.conf_avg]
+        self.fail_avg = [[v * decay for v in row] for row in self.fail_avg]
+        self.tx_ct_avg = [v * decay for v in self.tx_ct_avg]
+        self.feerate_avg = [v * decay for v in self.feerate_avg]
+
+    def record(self, blocks_to_confirm, feerate, bucket):
+        for period in range((blocks_to_confirm + self.scale - 1) // self.scale - 1, self.periods):
+            self.conf_avg[period][bucket] += 1
+        self.tx_ct_avg[bucket] += 1
+        self.feerate_avg[bucket] += feerate
+
+    def new_tx(self, height, bucket):
+        self.unconf_txs[height % self.max_confirms][bucket] += 1
+
+    def remove_tx(self, entry_height, best_height, bucket, in_block):
+        blocks_ago = best_height - entry_height
+        if blocks_ago >= self.max_confirms:
+            if self.old_unconf_txs[bucket] > 0:
+                self.old_unconf_txs[bucket] -= 1
+        else:
+            row = self.unconf_txs[entry_height % self.max_confirms]
+            if row[bucket] > 0:
+                row[bucket] -= 1
+        if not in_block and blocks_ago >= self.scale:
+            for period in range(min(blocks_ago // self.scale, self.periods)):
+                self.fail_avg[period][bucket] += 1
+        self._waiting = None
+
+    def waiting_counts(self, best_height):
+        """
+        waiting[t][bucket]: transactions still unconfirmed after t or more
+        blocks (t = 1..max_confirms), summed once per block
+        """
+        if self._waiting is None:
+            n = len(self.buckets)
+            waiting = [None] * (self.max_confirms + 1)
+            total = waiting[self.max_confirms] = list(self.old_unconf_txs)
+            for age in range(self.max_confirms - 1, 0, -1):
+                row = self.unconf_txs[(best_height - age) % self.max_confirms]
+                if any(row):
+                    total = [a + b for a, b in zip(total, row)]
+                waiting[age] = total
+            waiting[0] = [0] * n
+            self._waiting = waiting
+        return self._waiting
+
+    def estimate_median(self, target, sufficient, success_pct, best_height):
+        """
+        Median feerate of the cheapest bucket range in which success_pct of
+        the transactions confirmed within target blocks, or None
+        """
+        period = (target + self.scale - 1) // self.scale - 1
+        conf, fail = self.conf_avg[period], self.fail_avg[period]
+        tx_ct = self.tx_ct_avg
+        extra = self.waiting_counts(best_height)[min(target, self.max_confirms)]
+        needed = sufficient / (1 - self.decay)
+        n_conf = total = failed = waiting = 0.0
+        near = far = best_near = best_far = len(tx_ct) - 1
+        new_range = True
+        found = False
+        for bucket in range(len(tx_ct) - 1, -1, -1):
+            if new_range:
+                near = bucket
+                new_range = False
+            far = bucket
+            n_conf += conf[bucket]
+            total += tx_ct[bucket]
+            failed += fail[bucket]
+            waiting += extra[bucket]
+            if total >= needed:
+                if n_conf / (total + failed + waiting) < success_pct:
+                    continue        # keep widening the failing range, as Core does
+                found = True
+                best_near, best_far = near, far
+                n_conf = total = failed = waiting = 0.0
+                new_range = True
+        if not found:
+            return None
+        low, high = min(best_near, best_far), max(best_near, best_far)
+        half = sum(tx_ct[low:high + 1]) / 2
+        if not half:
+            return None
+        for bucket in range(low, high + 1):
+            if tx_ct[bucket] < half:
+                half -= tx_ct[bucket]
+            else:
+                return self.feerate_avg[bucket] / tx_ct[bucket]
+        return None
+
+    def to_dict(self):
+        return {"conf_avg": self.conf_avg, "fail_avg": self.fail_avg,
+                "tx_ct_avg": self.tx_ct_avg, "feerate_avg": self.feerate_avg}
+
+
+class FeeEstimator:
+    """
+    Feerate estimates from mempool arrivals and the blocks that confirm them.
+    Transaction ids can be any hashable (hex strings, bytes, ints), as long
+    as arrivals and blocks use the same form.
+    """
+
+    def __init__(self):
+        self.buckets = fee_buckets()
+        self.horizons = {name: ConfirmStats(self.buckets, *params) for name, params in HORIZONS.items()}
+        self.best_height = 0
+        self.tracked = {}           # txid -> (entry height, bucket, feerate)
+        self.confirmed = 0
+
+    def bucket(self, feerate):
+        return bisect.bisect_left(self.buckets, feerate)
+
+    # ===== Ingestion =====
+
+    def process_transaction(self, txid, feerate, height=None):
+        """
+        A transaction entered the mempool at `height` (default: the best
+        height) with feerate sat/vB. Leave out transactions with unconfirmed
+        parents, as Core does: their own feerate does not decide when they
+        confirm.
+        """
+        if txid in self.tracked:
+            return
+        height = self.best_height if height is None else height
+        if feerate < MIN_BUCKET_FEERATE:
+            return
+        bucket = self.bucket(feerate)
+        self.tracked[txid] = (height, bucket, feerate)
+        for stats in self.horizons.values():
+            stats.new_tx(height, bucket)
+
+    def remove_transaction(self, txid):
+        """A tracked transaction left the mempool unconfirmed (evicted, replaced, conflicted)"""
+        entry = self.tracked.pop(txid, None)
+        if entry:
+            for stats in self.horizons.values():
+                stats.remove_tx(entry[0], self.best_height, entry[1], in_block=False)
+
+    def process_block(self, height, txids):
+        """
+        A block at `height` confirmed txids. Transactions never seen in the
+        mempool are ignored, as in Core. Returns how many were tracked.
+        """
+        if height <= self.best_height and self.best_height:
+            return 0
+        self.best_height = height
+        for stats in self.horizons.values():
+            stats.clear_current(height)
+            stats.update_moving_averages()
+        counted = 0
+        tracked = self.tracked
+        for txid in txids:
+            entry = tracked.pop(txid, None)
+            if entry is None:
+                continue
+            entry_height, bucket, feerate = entry
+            blocks = height - entry_height
+            for stats in self.horizons.values():
+                stats.remove_tx(entry_height, height, bucket, in_block=True)
+                if blocks > 0:
+                    stats.record(blocks, feerate, bucket)
+            counted += blocks > 0
+        self.confirmed += counted
+        return counted
+
+    def process_raw_block(self, height, block):
+        """process_block() for a serialized block, with txids as display hex"""
+        from .block_store import iter_block_txs, txid
+        return self.process_block(height, [txid(tx)[::-1].hex() for tx in iter_block_txs(block)])
+
+    # ===== Estimates =====
+
+    def max_target(self):
+        return self.horizons["long"].max_confirms
+
+    def estimate_fee(self, target, success_pct=SUCCESS_PCT, check_shorter=True):
+        """
+        sat/vB for confirmation within target blocks from the shortest
+        horizon that covers the target, or None without enough data
+        """
+        if not 1 <= target <= self.max_target():
+            return None
+        short, medium, long_ = (self.horizons[name] for name in HORIZONS)
+        height = self.best_height
+        if target <= short.max_confirms:
+            estimate = short.estimate_median(target, SUFFICIENT_TXS_SHORT, success_pct, height)
+        elif target <= medium.max_confirms:
+            estimate = medium.estimate_median(target, SUFFICIENT_FEETXS, success_pct, height)
+        else:
+            estimate = long_.estimate_median(target, SUFFICIENT_FEETXS, success_pct, height)
+        if check_shorter:
+            # a longer target never needs more than a shorter horizon's longest one
+            for stats, sufficient in ((medium, SUFFICIENT_FEETXS), (short, SUFFICIENT_TXS_SHORT)):
+                if target > stats.max_confirms:
+                    shorter = stats.estimate_median(stats.max_confirms, sufficient, success_pct, height)
+                    if shorter is not None and (estimate is None or shorter < estimate):
+                        estimate = shorter
+        return estimate
+
+    def estimate_smart_fee(self, target, conservative=False):
+        """
+        estimatesmartfee: the highest of the estimates for target / 2 at 60%,
+        target at 85% and 2 x target at 95%. Returns (sat/vB or None, the
+        target actually used).
+        """
+        target = max(2, min(target, self.max_target()))
+        candidates = [self.estimate_fee(target // 2, HALF_SUCCESS_PCT),
+                      self.estimate_fee(target, SUCCESS_PCT),
+                      self.estimate_fee(min(2 * target, self.max_target()), DOUBLE_SUCCESS_PCT,
+                                        check_shorter=not conservative)]
+        found = [c for c in candidates if c is not None]
+        return (max(found) if found else None), target
+
+    # ===== Persistence =====
+
+    def save(self, path):
+        state = {"version": ESTIMATES_VERSION, "best_height": self.best_height,
+                 "buckets": len(self.buckets), "confirmed": self.confirmed,
+                 "horizons": {name: stats.to_dict() for name, stats in self.horizons.items()}}
+        with open(path + ".tmp", "w") as f:
+            json.dump(state, f)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            state = json.load(f)
+        estimator = cls()
+        if (not isinstance(state, dict) or state.get("version") != ESTIMATES_VERSION
+                or state["buckets"] != len(estimator.buckets)):
+            raise FeeEstimatorError(f"{path} was written with other buckets or another version")
+        estimator.best_height = state["best_height"]
+        estimator.confirmed = state["confirmed"]
+        for name, data in state["horizons"].items():
+            stats = estimator.horizons[name]
+            n = len(estimator.buckets)
+            if (len(data["conf_avg"]) != stats.periods or len(data["fail_avg"]) != stats.periods
+                    or any(len(row) != n for row in data["conf_avg"] + data["fail_avg"])
+                    or len(data["tx_ct_avg"]) != n or len(data["feerate_avg"]) != n):
+                raise FeeEstimatorError(f"{path}: the {name} horizon does not match the buckets and periods")
+            stats.conf_avg = data["conf_avg"]
+            stats.fail_avg = data["fail_avg"]
+            stats.tx_ct_avg = data["tx_ct_avg"]
+            stats.feerate_avg = data["feerate_avg"]
+        return estimator
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Instrumentation: Spans, Counters and Histograms
+
+When 1_commit_mint_brc20.py takes seconds, the time can go to HTTP
+(utxo_scanner.py), key derivation, script and tree building or signing.
+This module measures where:
+
+- span(name, **args): a context manager timed with perf_counter_ns(). On
+  exit its duration goes to the histogram `name` and, as a complete
+  ("X") event, to the trace. Spans nest.
+- count(name, n): monotonic counters
+- observe(name, value, bounds): histograms with cumulative buckets, kept
+  in a registry by name
+- @timed(name, trace): a span around every call of a function. With
+  trace=False only the histogram is updated, for functions called too
+  often to trace each call (block_store.parse_tx).
+
+Instrumentation is off unless the INSTRUMENT environment variable is set.
+When it is off:
+- span() returns NULL_SPAN, one shared no-op context manager. What is left
+  is the `with` statement itself: two Python-level method calls, about
+  0.2 µs on CPython 3.11. That is nothing next to a signature or an HTTP
+  request, but too much for a function called per transaction.
+- @timed returns the function itself, so a decorated hot path costs
+  nothing, not even a wrapper call. Decorators are applied at import, so
+  INSTRUMENT (or enable()) must be set before the modules are imported.
+- count() / observe() return after a flag check
+enable() / disable() switch spans and counters at any time.
+
+INSTRUMENT=<prefix> also writes <prefix>.prom (Prometheus text exposition
+format, durations in seconds) and <prefix>.trace.json (Chrome trace event
+format, for chrome://tracing or https://ui.perfetto.dev) at exit.
+INSTRUMENT=1 only enables collection.
+"""
+
+import atexit
+import bisect
+import functools
+import json
+import os
+import re
+import threading
+import time
+
+# Upper bounds of the duration buckets in ns: 1-2.5-5 steps from 1 µs to 10 s
+LATENCY_BUCKETS = tuple(int(m * 10 ** e) for e in range(3, 10) for m in (1, 2.5, 5)) + (10 ** 10,)
+MAX_TRACE_EVENTS = 1_000_000
+
+_setting = os.environ.get("INSTRUMENT", "")
+ENABLED = bool(_setting) and _setting != "0"
+_enabled = ENABLED
+
+
+class Histogram:
+    """Counts per bucket (value <= bound), plus sum and count, as in Prometheus"""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # the last one is +Inf
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (None when empty)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.bounds, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class Registry:
+    """Counters, histograms and trace events of one process"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counters = {}
+            self.histograms = {}
+            self.events = []
+            self.dropped_events = 0
+            self.origin = time.perf_counter_ns()
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def histogram(self, name, bounds=LATENCY_BUCKETS):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(name, Histogram(bounds))
+        return histogram
+
+    def record(self, name, start, duration, args, trace=True):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(duration)
+            if not trace:
+                return
+            if len(self.events) >= MAX_TRACE_EVENTS:
+                self.dropped_events += 1
+                return
+            self.events.append((name, start, duration, threading.get_ident(), args))
+
+
+REGISTRY = Registry()
+
+
+class Span:
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        REGISTRY.record(self.name, self.start, time.perf_counter_ns() - self.start, self.args)
+        return False
+
+    def set(self, **args):
+        """Add arguments to the trace event (e.g. a result size)"""
+        self.args.update(args)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return None
+
+    def set(self, **args):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+# ----------------------------------------------------------------------
+# Recording
+# ----------------------------------------------------------------------
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def span(name, **args):
+    """A timed span, or NULL_SPAN (shared, no-op) when instrumentation is off"""
+    if _enabled:
+        return Span(name, args)
+    return NULL_SPAN
+
+
+def count(name, n=1):
+    if _enabled:
+        REGISTRY.count(name, n)
+
+
+def observe(name, value, bounds=LATENCY_BUCKETS):
+    if _enabled:
+        histogram = REGISTRY.histogram(name, bounds)
+        with REGISTRY.lock:
+            histogram.observe(value)
+
+
+def timed(name=None, trace=True):
+    """Decorator: a span around every call; the function itself when instrumentation is off at import"""
+    def decorate(func):
+        if not _enabled:
+            return func
+        label = name or f"{func.__module__}.{func.__qualname__}"
+        perf_counter_ns = time.perf_counter_ns
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                REGISTRY.record(label, start, perf_counter_ns() - start, {}, trace)
+        return wrapper
+    return decorate
+
+
+# ----------------------------------------------------------------------
+# Export
+# ----------------------------------------------------------------------
+
+def metric_name(name):
+    """Prometheus metric name of a span or counter name ("utxo_scanner.get" -> "utxo_scanner_get")"""
+    name = re.sub(r"[^a-zA-Z0-9_:]", "_", name)
+    return "_" + name if name[:1].isdigit() else name
+
+
+def _number(value):
+    return "+Inf" if value == float("inf") else repr(value)
+
+
+def to_prometheus(registry=REGISTRY):
+    """Counters and histograms in the Prometheus text exposition format; durations in seconds"""
+    lines = []
+    with registry.lock:
+        counters = sorted(registry.counters.items())
+        histograms = sorted(registry.histograms.items())
+    for name, value in counters:
+        metric = metric_name(name) + "_total"
+        lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+    for name, histogram in histograms:
+        seconds = histogram.bounds == LATENCY_BUCKETS
+        scale = 1e-9 if seconds else 1
+        metric = metric_name(name) + ("_seconds" if seconds else "")
+        lines.append(f"# TYPE {metric} histogram")
+        cumulative = 0
+        for bound, n in zip(histogram.bounds + (float("inf"),), histogram.counts):
+            cumulative += n
+            le = _number(bound * scale) if bound != float("inf") else "+Inf"
+            lines.append(f'{metric}_bucket{{le="{le}"}} {cumulative}')
+        lines.append(f"{metric}_sum {_number(histogram.sum * scale)}")
+        lines.append(f"{metric}_count {histogram.count}")
+    return "\n".join(lines) + "\n"
+
+
+def to_chrome_trace(registry=REGISTRY):
+    """Trace events (JSON object format) with timestamps and durations in µs"""
+    pid = os.getpid()
+    with registry.lock:
+        events = list(registry.events)
+        origin = registry.origin
+        dropped = registry.dropped_events
+    trace = [{"name": name, "cat": name.split(".", 1)[0], "ph": "X", "pid": pid, "tid": tid,
+              "ts": (start - origin) / 1000, "dur": duration / 1000, "args": args}
+             for name, start, duration, tid, args in events]
+    return {"traceEvents": trace, "displayTimeUnit": "ns",
+            "otherData": {"dropped_events": dropped}}
+
+
+def write_prometheus(path, registry=REGISTRY):
+    with open(path, "w") as f:
+        f.write(to_prometheus(registry))
+
+
+def write_chrome_trace(path, registry=REGISTRY):
+    with open(path, "w") as f:
+        json.dump(to_chrome_trace(registry), f)
+
+
+def _export_at_exit():
+    write_prometheus(_setting + ".prom")
+    write_chrome_trace(_setting + ".trace.json")
+
+
+if ENABLED and _setting != "1":
+    atexit.register(_export_at_exit)
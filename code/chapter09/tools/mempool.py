@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Mempool Simulator: Ancestor / Descendant Packages and Block Templates
+
+The reveal of an inscription spends the commit's output, often before the
+commit is confirmed. A miner then sees the two as a package: the reveal
+cannot be mined without the commit, so what matters is the feerate of the
+pair (its ancestor feerate), not each fee on its own. That is how child
+pays for parent (CPFP) works, and it decides whether fixed fees like
+brc20_config.FEE_CONFIG get a commit and its reveal into the next block.
+
+This module models the part of Bitcoin Core's mempool that decides it:
+
+- Every entry keeps its ancestor and descendant aggregates (count, vsize,
+  fee) like CTxMemPoolEntry. add() walks the new transaction's ancestors
+  (at most 25) once and updates their descendant aggregates. Removal
+  updates only the entries that are related to the removed ones, so
+  nothing is ever recomputed over the whole pool.
+- Core's default package limits apply: 25 ancestors / descendants, and
+  101 kvB per package.
+- block_template() follows Core's BlockAssembler. It takes the best
+  ancestor feerate from a heap, includes the package (the missing
+  ancestors first), and lowers the ancestor aggregates of the package's
+  descendants in a "modified" map, pushing them again with their new
+  score. The pool keeps its heap of ancestor scores between templates
+  (stale entries are skipped lazily and rebuilt when they pile up), so a
+  template costs a copy of the heap plus one pop per selected package.
+- remove_block() removes mined transactions, remove() evicts a transaction
+  and its descendants, and trim_to_size() evicts by lowest descendant
+  feerate.
+
+Transactions are abstract: a txid, a fee, a vsize and the txids of their
+unconfirmed parents. Fees are in sats, sizes in vbytes, feerates in sat/vB.
+"""
+
+import heapq
+import itertools
+import math
+from collections import namedtuple
+
+MAX_BLOCK_VSIZE = 1_000_000 - 1_000   # 4M weight minus Core's reserve for the coinbase
+ANCESTOR_LIMIT = 25
+DESCENDANT_LIMIT = 25
+PACKAGE_SIZE_LIMIT = 101_000           # vbytes, for ancestors and for descendants
+MIN_BLOCK_FEERATE = 1.0                # sat/vB (blockmintxfee)
+MAX_CONSECUTIVE_FAILURES = 1000        # packages that did not fit before a nearly full block stops
+
+# txids in block order; fee and vsize of all of them; ancestor feerate of each package as selected
+BlockTemplate = namedtuple("BlockTemplate", ["txids", "fee", "vsize", "package_feerates"])
+
+
+class MempoolError(Exception):
+    pass
+
+
+class MempoolEntry:
+    """A transaction in the pool and the aggregates of its package"""
+
+    __slots__ = ("txid", "fee", "vsize", "sequence", "parents", "children",
+                 "ancestor_count", "ancestor_size", "ancestor_fee",
+                 "descendant_count", "descendant_size", "descendant_fee")
+
+    def __init__(self, txid, fee, vsize, sequence, parents):
+        self.txid = txid
+        self.fee = fee
+        self.vsize = vsize
+        self.sequence = sequence
+        self.parents = parents      # in-pool MempoolEntry objects it spends
+        self.children = set()
+        self.ancestor_count, self.ancestor_size, self.ancestor_fee = 1, vsize, fee
+        self.descendant_count, self.descendant_size, self.descendant_fee = 1, vsize, fee
+
+    @property
+    def feerate(self):
+        return self.fee / self.vsize
+
+    @property
+    def ancestor_feerate(self):
+        return self.ancestor_fee / self.ancestor_size
+
+    @property
+    def descendant_feerate(self):
+        return self.descendant_fee / self.descendant_size
+
+    def __repr__(self):
+        return (f"MempoolEntry({self.txid!r}, fee={self.fee}, vsize={self.vsize}, "
+                f"ancestors={self.ancestor_count}, descendants={self.descendant_count})")
+
+
+def _ancestors(parents):
+    """All in-pool ancestors reachable from a set of parent entries"""
+    result = set()
+    stack = list(parents)
+    while stack:
+        entry = stack.pop()
+        if entry not in result:
+            result.add(entry)
+            stack.extend(entry.parents)
+    return result
+
+
+def _descendants(entry):
+    """All in-pool descendants of an entry (not the entry itself)"""
+    result = set()
+    stack = list(entry.children)
+    while stack:
+        child = stack.pop()
+        if child not in result:
+            result.add(child)
+            stack.extend(child.children)
+    return result
+
+
+class Mempool:
+    """
+    Unconfirmed transactions with their ancestor / descendant aggregates.
+
+    Args:
+        ancestor_limit / descendant_limit: transactions per package, itself included
+        ancestor_size_limit / descendant_size_limit: vbytes per package
+    """
+
+    def __init__(self, ancestor_limit=ANCESTOR_LIMIT, descendant_limit=DESCENDANT_LIMIT,
+                 ancestor_size_limit=PACKAGE_SIZE_LIMIT, descendant_size_limit=PACKAGE_SIZE_LIMIT):
+        self.ancestor_limit = ancestor_limit
+        self.descendant_limit = descendant_limit
+        self.ancestor_size_limit = ancestor_size_limit
+        self.descendant_size_limit = descendant_size_limit
+        self.entries = {}               # txid -> MempoolEntry
+        self.total_size = 0
+        self.total_fee = 0
+        self._sequence = itertools.count()
+        self._heap = []                 # (-ancestor feerate, sequence, entry, ancestor fee, ancestor size)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, txid):
+        return txid in self.entries
+
+    def __getitem__(self, txid):
+        return self.entries[txid]
+
+    def _push(self, entry):
+        heapq.heappush(self._heap, (-entry.ancestor_fee / entry.ancestor_size, next(self._sequence),
+                                    entry, entry.ancestor_fee, entry.ancestor_size))
+
+    def _compact_heap(self):
+        if len(self._heap) > 2 * len(self.entries) + 1024:
+            sequence = self._sequence
+            self._heap = [(-e.ancestor_fee / e.ancestor_size, next(sequence), e, e.ancestor_fee, e.ancestor_size)
+                          for e in self.entries.values()]
+            heapq.heapify(self._heap)
+
+    # ===== Updates =====
+
+    def add(self, txid, fee, vsize, parents=()):
+        """
+        Add a transaction spending outputs of `parents` (txids; those not in
+        the pool count as confirmed). Raises MempoolError if it breaks a
+        package limit. Returns its MempoolEntry.
+        """
+        if txid in self.entries:
+            raise MempoolError(f"{txid} is already in the pool")
+        entries = self.entries
+        direct = {entries[parent] for parent in parents if parent in entries}
+        ancestors = _ancestors(direct)
+        ancestor_size = vsize + sum(a.vsize for a in ancestors)
+        if len(ancestors) + 1 > self.ancestor_limit:
+            raise MempoolError(f"too many unconfirmed ancestors ({len(ancestors)})")
+        if ancestor_size > self.ancestor_size_limit:
+            raise MempoolError(f"ancestor package too large ({ancestor_size} vB)")
+        for a in ancestors:
+            if a.descendant_count + 1 > self.descendant_limit:
+                raise MempoolError(f"{a.txid} would exceed the descendant limit")
+            if a.descendant_size + vsize > self.descendant_size_limit:
+                raise MempoolError(f"{a.txid} would exceed the descendant size limit")
+        entry = MempoolEntry(txid, fee, vsize, next(self._sequence), direct)
+        entry.ancestor_count = len(ancestors) + 1
+        entry.ancestor_size = ancestor_size
+        entry.ancestor_fee = fee + sum(a.fee for a in ancestors)
+        for a in ancestors:
+            a.descendant_count += 1
+            a.descendant_size += vsize
+            a.descendant_fee += fee
+        for parent in direct:
+            parent.children.add(entry)
+        entries[txid] = entry
+        self.total_size += vsize
+        self.total_fee += fee
+        self._push(entry)
+        return entry
+
+    def _unlink(self, entry):
+        del self.entries[entry.txid]
+        self.total_size -= entry.vsize
+        self.total_fee -= entry.fee
+        for parent in entry.parents:
+            parent.children.discard(entry)
+        for child in entry.children:
+            child.parents.discard(entry)
+
+    def remove_block(self, txids):
+        """
+        Remove the transactions of a mined block (txids not in the pool are
+        ignored). The block must include the in-pool ancestors of each of
+        them. Returns the number removed.
+        """
+        mined = [self.entries[txid] for txid in txids if txid in self.entries]
+        mined_set = set(mined)
+        for entry in mined:
+            if not entry.parents <= mined_set:
+                raise MempoolError(f"{entry.txid} is mined without its unconfirmed parents")
+        touched = set()
+        for entry in mined:
+            for d in _descendants(entry):
+                if d not in mined_set:
+                    d.ancestor_count -= 1
+                    d.ancestor_size -= entry.vsize
+                    d.ancestor_fee -= entry.fee
+                    touched.add(d)
+        for entry in mined:
+            self._unlink(entry)
+        for d in touched:
+            self._push(d)
+        self._compact_heap()
+        return len(mined)
+
+    def remove(self, txid):
+        """Evict a transaction and all its descendants; returns their txids"""
+        entry = self.entries[txid]
+        removed = _descendants(entry)
+        removed.add(entry)
+        for e in removed:
+            for a in _ancestors(e.parents):
+                if a not in removed:
+                    a.descendant_count -= 1
+                    a.descendant_size -= e.vsize
+                    a.descendant_fee -= e.fee
+        for e in removed:
+            self._unlink(e)
+        self._compact_heap()
+        return [e.txid for e in removed]
+
+    def trim_to_size(self, max_vsize):
+        """
+        Evict packages by lowest descendant feerate until the pool is at most
+        max_vsize; returns the evicted txids
+        """
+        evicted = []
+        if self.total_size <= max_vsize:
+            return evicted
+        heap = [(e.descendant_fee / e.descendant_size, e.sequence, e, e.descendant_fee, e.descendant_size)
+                for e in self.entries.values()]
+        heapq.heapify(heap)
+        while self.total_size > max_vsize and heap:
+            _, _, entry, fee, size = heapq.heappop(heap)
+            if entry.txid not in self.entries or self.entries[entry.txid] is not entry:
+                continue
+            if (entry.descendant_fee, entry.descendant_size) != (fee, size):
+                heapq.heappush(heap, (entry.descendant_fee / entry.descendant_size, entry.sequence, entry,
+                                      entry.descendant_fee, entry.descendant_size))
+                continue
+            evicted += self.remove(entry.txid)
+        return evicted
+
+    # ===== Block templates =====
+
+    def block_template(self, max_vsize=MAX_BLOCK_VSIZE, min_feerate=MIN_BLOCK_FEERATE):
+        """Select transactions by ancestor feerate, packages at a time (Core's BlockAssembler)"""
+        self._compact_heap()
+        heap = list(self._heap)     # already a heap; the pool's copy stays intact
+        entries = self.entries
+        included = set()
+        failed = set()
+        modified = {}               # entry -> [ancestor fee, ancestor size] without included ancestors
+        txids, feerates = [], []
+        block_fee = block_size = failures = 0
+        heappop, heappush = heapq.heappop, heapq.heappush
+        sequence = self._sequence
+        while heap:
+            _, _, entry, fee, size = heappop(heap)
+            if entry in included or entry in failed or entries.get(entry.txid) is not entry:
+                continue
+            current = modified.get(entry)
+            if current is None:
+                if (entry.ancestor_fee, entry.ancestor_size) != (fee, size):
+                    continue        # stale: the pool's heap has the current score
+            elif current[0] != fee or current[1] != size:
+                continue            # stale: a newer modified score was pushed
+            if fee < min_feerate * size:
+                break
+            if block_size + size > max_vsize:
+                failed.add(entry)
+                failures += 1
+                if failures > MAX_CONSECUTIVE_FAILURES and block_size > max_vsize - 1000:
+                    break
+                continue
+            failures = 0
+            package = [a for a in _ancestors(entry.parents) if a not in included]
+            package.sort(key=lambda a: (a.ancestor_count, a.sequence))
+            package.append(entry)
+            for p in package:
+                included.add(p)
+                txids.append(p.txid)
+            block_fee += fee
+            block_size += size
+            feerates.append(fee / size)
+            changed = set()
+            for p in package:
+                for d in _descendants(p):
+                    if d in included:
+                        continue
+                    current = modified.get(d)
+                    if current is None:
+                        current = modified[d] = [d.ancestor_fee, d.ancestor_size]
+                    current[0] -= p.fee
+                    current[1] -= p.vsize
+                    changed.add(d)
+            for d in changed:
+                fee_d, size_d = modified[d]
+                heappush(heap, (-fee_d / size_d, next(sequence), d, fee_d, size_d))
+        return BlockTemplate(txids, block_fee, block_size, feerates)
+
+    # ===== Packages =====
+
+    def ancestors(self, txid):
+        return {a.txid for a in _ancestors(self.entries[txid].parents)}
+
+    def descendants(self, txid):
+        return {d.txid for d in _descendants(self.entries[txid])}
+
+    def cpfp_fee(self, parents, child_vsize, feerate):
+        """
+        Fee a new child of `parents` (txids) needs so that its ancestor
+        feerate, the package a miner would take, reaches feerate
+        """
+        ancestors = _ancestors({self.entries[p] for p in parents if p in self.entries})
+        size = child_vsize + sum(a.vsize for a in ancestors)
+        fee = sum(a.fee for a in ancestors)
+        return max(0, math.ceil(feerate * size) - fee)
+
+    def check(self):
+        """Recompute every aggregate from the parent links; raises MempoolError on a mismatch"""
+        for entry in self.entries.values():
+            ancestors = _ancestors(entry.parents)
+            descendants = _descendants(entry)
+            expected = (len(ancestors) + 1, entry.vsize + sum(a.vsize for a in ancestors),
+                        entry.fee + sum(a.fee for a in ancestors),
+                        len(descendants) + 1, entry.vsize + sum(d.vsize for d in descendants),
+                        entry.fee + sum(d.fee for d in descendants))
+            actual = (entry.ancestor_count, entry.ancestor_size, entry.ancestor_fee,
+                      entry.descendant_count, entry.descendant_size, entry.descendant_fee)
+            if expected != actual:
+                raise MempoolError(f"aggregates of {entry.txid} are {actual}, expected {expected}")
+            if any(entry not in parent.children for parent in entry.parents):
+                raise MempoolError(f"{entry.txid} is missing from a parent's children")
+        if sum(e.vsize for e in self.entries.values()) != self.total_size:
+            raise MempoolError("total size does not match the entries")
@@ -4,16 +4,42 @@ UTXO Scanner and Selector
 
 Fetches unspent outputs from the Blockstream API and selects the best
 candidate for funding a commit transaction.
+
+Any Esplora-compatible API works: set ESPLORA_URL (or pass api_url), e.g.
+to the local index served by tools/esplora_api.py.
+
+The fetch is a span of tools/instrumentation.py (utxo_scanner.fetch_utxos)
+and each request one inside it (utxo_scanner.get); requests and bytes
+received are counted.
 """
 
+import os
+
 import requests
 
-def get_available_utxos(address=None):
+try:
+    from .instrumentation import count, span
+except ImportError:  # run as a script
+    from instrumentation import count, span
+
+ESPLORA_URL = os.environ.get("ESPLORA_URL", "https://blockstream.info/testnet/api")
+
+def _get(url, kind):
+    """requests.get() in a span, counted"""
+    with span("utxo_scanner.get", kind=kind) as request:
+        resp = requests.get(url, timeout=10)
+        request.set(status=resp.status_code, bytes=len(resp.content))
+    count("utxo_scanner.requests")
+    count("utxo_scanner.response_bytes", len(resp.content))
+    return resp
+
+def get_available_utxos(address=None, api_url=None):
     """
     Fetch available UTXOs for an address from the Blockstream testnet API.
     
     Args:
         address: Bech32m address to query. Falls back to the default if None.
+        api_url: Esplora API base URL. Falls back to ESPLORA_URL if None.
     
     Returns:
         list[dict]: Each entry contains txid, vout, amount, scriptpubkey,
@@ -23,54 +49,59 @@ def get_available_utxos(address=None):
         # Default address (derived from the project private key)
         address = "tb1p060z97qusuxe7w6h8z0l9kam5kn76jur22ecel75wjlmnkpxtnls6vdgne"
     
-    url = f"https://blockstream.info/testnet/api/address/{address}/utxo"
+    api_url = (api_url or ESPLORA_URL).rstrip("/")
+    url = f"{api_url}/address/{address}/utxo"
     try:
-        resp = requests.get(url, timeout=10)
-        resp.raise_for_status()
-        utxo_list = resp.json()
-        utxos = []
-        for u in utxo_list:
-            # Fetch the full transaction to obtain the scriptPubKey
-            tx_url = f"https://blockstream.info/testnet/api/tx/{u['txid']}"
-            tx_resp = requests.get(tx_url, timeout=10)
-            if tx_resp.status_code == 200:
-                tx_data = tx_resp.json()
-                vout_data = tx_data["vout"][u["vout"]]
-                utxos.append({
-                    "txid": u["txid"],
-                    "vout": u["vout"],
-                    "amount": u["value"],
-                    "scriptpubkey": vout_data["scriptpubkey"],
-                    "scriptpubkey_address": vout_data["scriptpubkey_address"],
-                    "note": "API"
-                })
-            else:
-                # Keep basic info even if the full tx fetch fails
-                utxos.append({
-                    "txid": u["txid"],
-                    "vout": u["vout"],
-                    "amount": u["value"],
-                    "scriptpubkey": None,
-                    "scriptpubkey_address": None,
-                    "note": "API (scriptPubKey unknown)"
-                })
+        with span("utxo_scanner.fetch_utxos") as fetch:
+            resp = _get(url, "utxo")
+            resp.raise_for_status()
+            utxo_list = resp.json()
+            fetch.set(utxos=len(utxo_list))
+            utxos = []
+            for u in utxo_list:
+                # Fetch the full transaction to obtain the scriptPubKey
+                tx_url = f"{api_url}/tx/{u['txid']}"
+                tx_resp = _get(tx_url, "tx")
+                if tx_resp.status_code == 200:
+                    tx_data = tx_resp.json()
+                    vout_data = tx_data["vout"][u["vout"]]
+                    utxos.append({
+                        "txid": u["txid"],
+                        "vout": u["vout"],
+                        "amount": u["value"],
+                        "scriptpubkey": vout_data["scriptpubkey"],
+                        "scriptpubkey_address": vout_data["scriptpubkey_address"],
+                        "note": "API"
+                    })
+                else:
+                    # Keep basic info even if the full tx fetch fails
+                    utxos.append({
+                        "txid": u["txid"],
+                        "vout": u["vout"],
+                        "amount": u["value"],
+                        "scriptpubkey": None,
+                        "scriptpubkey_address": None,
+                        "note": "API (scriptPubKey unknown)"
+                    })
         return utxos
     except Exception as e:
+        count("utxo_scanner.errors")
         print(f"[ERROR] Failed to fetch UTXOs: {e}")
         return []
 
-def select_best_utxo(min_amount=1500, address=None):
+def select_best_utxo(min_amount=1500, address=None, api_url=None):
     """
     Select the most suitable UTXO (largest value that meets the minimum).
     
     Args:
         min_amount: Minimum required value in sats
         address: Bech32m address to query. Falls back to the default if None.
+        api_url: Esplora API base URL. Falls back to ESPLORA_URL if None.
     
     Returns:
         dict | None: The selected UTXO, or None if none qualifies.
     """
-    utxos = get_available_utxos(address)
+    utxos = get_available_utxos(address, api_url)
     
     print("=== Scan Available UTXOs ===")
     for i, utxo in enumerate(utxos):
@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+"""
+Memory-Mapped UTXO Set
+
+get_available_utxos() returns dicts from the Blockstream API; a local
+indexer needs its own set of unspent outputs. Kept as a Python dict, every
+coin costs a few hundred bytes of objects (outpoint bytes, tuple, script
+bytes, ints and the dict slot), and the set must be rebuilt on every start.
+
+This set lives in two files and the Python process holds none of it:
+
+    utxo.tbl      an open-addressing hash table, memory-mapped: a header,
+                  then 2^k fixed 32-byte slots
+    utxo.scripts  an append-only blob of script payloads
+
+A slot is
+
+    key (8)  amount (8)  blob offset (8)  height << 1 | coinbase (4)
+    payload length (2)  script type (1)  unused (1)
+
+The key is the outpoint hashed with a per-set random salt (keyed BLAKE2b)
+and truncated to 64 bits; 0 marks an empty slot. Lookups probe linearly
+from key & (capacity - 1), and deletions shift the following entries back
+instead of leaving tombstones, so the load factor stays honest and lookups
+never slow down with churn. At MAX_LOAD the table doubles.
+
+Scripts are compressed the way Bitcoin Core's coins database does it: for
+P2PKH, P2SH, P2WPKH, P2WSH and P2TR only the hash or key goes to the blob
+(20 or 32 bytes), other scripts are stored whole. So a coin costs 32 /
+load-factor bytes of table plus its payload, whatever the chain.
+
+apply_block() applies a block as one batch: outputs created and spent in
+the same block never touch the table, every input is checked before the
+first write, and the returned BlockUndo (spent coins, created outpoints)
+reverts the block with undo_block(). A failing block is rolled back.
+flush() writes the pending payloads and the header; it is not a journal, so
+after a crash between flushes the set is rebuilt (or rolled back with the
+undo records, see encode_undo()).
+
+The 64-bit keys can collide: with n coins the chance of any collision is
+about n² / 2^65 (a few in a million for a 30-million-coin testnet). A
+collision is reported as an error when the second outpoint is added,
+never silently merged.
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+from collections import namedtuple
+
+from .block_store import iter_block_txs, txid
+
+MAGIC = b"UTXOSET\x01"
+HEADER = struct.Struct("<8sQQQQq16s32s")  # magic, capacity, count, blob end, live payload, height, salt, tip
+HEADER_SIZE = 128
+SLOT = struct.Struct("<QQQIHBx")
+SLOT_SIZE = SLOT.size  # 32
+KEY = struct.Struct("<Q")
+MIN_CAPACITY = 1 << 10
+MAX_LOAD = 0.8
+MAX_SCRIPT_SIZE = 10000  # larger scripts are unspendable
+
+# script types: payload -> scriptPubKey
+SCRIPT_RAW, SCRIPT_P2PKH, SCRIPT_P2SH, SCRIPT_P2WPKH, SCRIPT_P2WSH, SCRIPT_P2TR = range(6)
+
+Coin = namedtuple("Coin", ["amount", "script_pubkey", "height", "coinbase"])
+
+# created: outpoints the block added; spent: (outpoint, Coin) it removed
+BlockUndo = namedtuple("BlockUndo", ["height", "prev_hash", "created", "spent"])
+
+
+class UTXOSetError(Exception):
+    pass
+
+
+# ---------------------------------------------------------------------------
+# Script compression
+# ---------------------------------------------------------------------------
+
+def compress_script(spk):
+    """(script type, payload) of a scriptPubKey"""
+    length = len(spk)
+    if length == 25 and spk[:3] == b"\x76\xa9\x14" and spk[23:] == b"\x88\xac":
+        return SCRIPT_P2PKH, spk[3:23]
+    if length == 23 and spk[:2] == b"\xa9\x14" and spk[22] == 0x87:
+        return SCRIPT_P2SH, spk[2:22]
+    if length == 22 and spk[:2] == b"\x00\x14":
+        return SCRIPT_P2WPKH, spk[2:]
+    if length == 34 and spk[:2] == b"\x00\x20":
+        return SCRIPT_P2WSH, spk[2:]
+    if length == 34 and spk[:2] == b"\x51\x20":
+        return SCRIPT_P2TR, spk[2:]
+    return SCRIPT_RAW, spk
+
+
+def decompress_script(kind, payload):
+    if kind == SCRIPT_P2TR:
+        return b"\x51\x20" + payload
+    if kind == SCRIPT_P2WPKH:
+        return b"\x00\x14" + payload
+    if kind == SCRIPT_P2PKH:
+        return b"\x76\xa9\x14" + payload + b"\x88\xac"
+    if kind == SCRIPT_P2SH:
+        return b"\xa9\x14" + payload + b"\x87"
+    if kind == SCRIPT_P2WSH:
+        return b"\x00\x20" + payload
+    return bytes(payload)
+
+
+def is_unspendable(spk):
+    return (spk[:1] == b"\x6a") or len(spk) > MAX_SCRIPT_SIZE
+
+
+# ---------------------------------------------------------------------------
+# UTXO set
+# ---------------------------------------------------------------------------
+
+class UTXOSet:
+    """
+    A UTXO set in a directory (created if missing).
+
+    Args:
+        path: directory of utxo.tbl and utxo.scripts
+        capacity: initial slots of a new table (rounded up to a power of two)
+    """
+
+    def __init__(self, path, capacity=MIN_CAPACITY):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._table_path = os.path.join(path, "utxo.tbl")
+        self._blob_path = os.path.join(path, "utxo.scripts")
+        if not os.path.exists(self._table_path):
+            capacity = max(MIN_CAPACITY, 1 << (max(capacity, 1) - 1).bit_length())
+            _create_table(self._table_path, capacity, 0, 0, 0, -1, os.urandom(16), b"\x00" * 32)
+            open(self._blob_path, "wb").close()
+        self._blob = open(self._blob_path, "r+b")
+        self._map()
+        if self._blob_flushed < self.blob_end:
+            raise UTXOSetError("script blob is shorter than the table expects")
+        self._blob.truncate(self.blob_end)  # drop payloads of an unflushed batch
+        self._blob.seek(self.blob_end)
+        self._pending = bytearray()
+
+    def _map(self):
+        with open(self._table_path, "r+b") as f:
+            self._mm = mmap.mmap(f.fileno(), 0)
+        magic, self.capacity, self.count, self.blob_end, self.live_payload, self.height, \
+            self.salt, self.tip = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise UTXOSetError(f"{self._table_path} is not a UTXO table")
+        self._mask = self.capacity - 1
+        self._blob_flushed = os.fstat(self._blob.fileno()).st_size
+
+    def _write_header(self):
+        HEADER.pack_into(self._mm, 0, MAGIC, self.capacity, self.count, self.blob_end,
+                         self.live_payload, self.height, self.salt, self.tip)
+
+    def __len__(self):
+        return self.count
+
+    def key(self, outpoint):
+        """64-bit table key of a 36-byte outpoint (never 0)"""
+        return KEY.unpack(hashlib.blake2b(outpoint, digest_size=8, key=self.salt).digest())[0] or 1
+
+    # ===== Slots =====
+
+    def _find(self, key):
+        """Slot of key, or -1"""
+        mm, mask, unpack_from = self._mm, self._mask, KEY.unpack_from
+        i = key & mask
+        while True:
+            k = unpack_from(mm, HEADER_SIZE + i * SLOT_SIZE)[0]
+            if k == key:
+                return i
+            if k == 0:
+                return -1
+            i = (i + 1) & mask
+
+    def _insert(self, key, record):
+        """Put a packed slot (record starts with key) in the first free slot of its probe sequence"""
+        mm, mask, unpack_from = self._mm, self._mask, KEY.unpack_from
+        i = key & mask
+        while True:
+            offset = HEADER_SIZE + i * SLOT_SIZE
+            k = unpack_from(mm, offset)[0]
+            if k == 0:
+                mm[offset:offset + SLOT_SIZE] = record
+                return
+            if k == key:
+                raise UTXOSetError("outpoint already in the set (duplicate, or a 64-bit key collision)")
+            i = (i + 1) & mask
+
+    def _delete_slot(self, i):
+        """Empty slot i and shift the rest of its cluster back (no tombstones)"""
+        mm, mask, unpack_from = self._mm, self._mask, KEY.unpack_from
+        j = i
+        while True:
+            j = (j + 1) & mask
+            offset = HEADER_SIZE + j * SLOT_SIZE
+            k = unpack_from(mm, offset)[0]
+            if k == 0:
+                break
+            home = k & mask
+            # the entry at j may move to i if i lies cyclically in [home, j)
+            if (i <= j and (home <= i or home > j)) or (i > j and home <= i and home > j):
+                target = HEADER_SIZE + i * SLOT_SIZE
+                mm[target:target + SLOT_SIZE] = mm[offset:offset + SLOT_SIZE]
+                i = j
+        offset = HEADER_SIZE + i * SLOT_SIZE
+        mm[offset:offset + SLOT_SIZE] = bytes(SLOT_SIZE)
+
+    def _payload(self, offset, length):
+        if offset >= self._blob_flushed:
+            start = offset - self._blob_flushed
+            return bytes(self._pending[start:start + length])
+        return os.pread(self._blob.fileno(), length, offset)
+
+    def _coin(self, slot):
+        _, amount, offset, height, length, kind = SLOT.unpack_from(self._mm, HEADER_SIZE + slot * SLOT_SIZE)
+        return Coin(amount, decompress_script(kind, self._payload(offset, length)), height >> 1, bool(height & 1))
+
+    def _reserve(self, extra):
+        """Grow the table so count + extra entries stay under MAX_LOAD"""
+        needed = self.count + max(extra, 0)
+        if needed <= self.capacity * MAX_LOAD:
+            return
+        capacity = self.capacity
+        while needed > capacity * MAX_LOAD:
+            capacity *= 2
+        self._rehash(capacity)
+
+    def _rehash(self, capacity):
+        new_path = self._table_path + ".new"
+        _create_table(new_path, capacity, self.count, self.blob_end, self.live_payload,
+                      self.height, self.salt, self.tip)
+        old, old_capacity = self._mm, self.capacity
+        with open(new_path, "r+b") as f:
+            self._mm = mmap.mmap(f.fileno(), 0)
+        self.capacity, self._mask = capacity, capacity - 1
+        unpack_from = KEY.unpack_from
+        for i in range(old_capacity):
+            offset = HEADER_SIZE + i * SLOT_SIZE
+            key = unpack_from(old, offset)[0]
+            if key:
+                self._insert(key, old[offset:offset + SLOT_SIZE])
+        old.close()
+        self._mm.flush()
+        self._mm.close()
+        os.replace(new_path, self._table_path)
+        self._map()
+
+    # ===== Coins =====
+
+    def __contains__(self, outpoint):
+        return self._find(self.key(outpoint)) >= 0
+
+    def get(self, outpoint):
+        """Coin of a 36-byte outpoint (txid in internal order + vout), or None"""
+        slot = self._find(self.key(outpoint))
+        return None if slot < 0 else self._coin(slot)
+
+    def add(self, outpoint, coin):
+        self._reserve(1)
+        self._add(self.key(outpoint), coin.amount, coin.script_pubkey, coin.height, coin.coinbase)
+
+    def _add(self, key, amount, spk, height, coinbase):
+        kind, payload = compress_script(spk)
+        record = SLOT.pack(key, amount, self.blob_end, height << 1 | coinbase, len(payload), kind)
+        self._insert(key, record)
+        self._pending += payload
+        self.blob_end += len(payload)
+        self.live_payload += len(payload)
+        self.count += 1
+
+    def spend(self, outpoint):
+        """Remove a coin and return it; KeyError if it is not in the set"""
+        slot = self._find(self.key(outpoint))
+        if slot < 0:
+            raise KeyError(outpoint)
+        coin = self._coin(slot)
+        self._remove_slot(slot)
+        return coin
+
+    def _remove_slot(self, slot):
+        if slot < 0:
+            raise UTXOSetError("no such slot")
+        length = SLOT.unpack_from(self._mm, HEADER_SIZE + slot * SLOT_SIZE)[4]
+        self._delete_slot(slot)
+        self.live_payload -= length
+        self.count -= 1
+
+    # ===== Blocks =====
+
+    def apply_block(self, height, block):
+        """
+        Spend the inputs and add the outputs of a serialized block; returns
+        the BlockUndo that reverts it. Raises UTXOSetError (and leaves the
+        set unchanged) if an input is missing or spent twice.
+        """
+        created = {}
+        spends = []
+        seen = set()
+        for index, tx in enumerate(iter_block_txs(block)):
+            if index:
+                for prevout in tx.prevouts:
+                    if prevout in seen:
+                        raise UTXOSetError(f"block {height} spends "
+                                           f"{prevout[:32][::-1].hex()}:{int.from_bytes(prevout[32:], 'little')} twice")
+                    seen.add(prevout)
+                    if prevout in created:
+                        del created[prevout]  # created and spent within this block
+                    else:
+                        spends.append(prevout)
+            tx_hash = txid(tx)
+            for vout, (amount, spk) in enumerate(tx.outputs):
+                if not is_unspendable(spk):
+                    created[tx_hash + vout.to_bytes(4, "little")] = (amount, bytes(spk), index == 0)
+        undo = BlockUndo(height, bytes(block[4:36]), [], [])
+        key = self.key
+        keys = [key(prevout) for prevout in spends]
+        slots = []
+        for prevout, spent_key in zip(spends, keys):
+            slot = self._find(spent_key)
+            if slot < 0:
+                raise UTXOSetError(f"block {height} spends a missing output "
+                                   f"{prevout[:32][::-1].hex()}:{int.from_bytes(prevout[32:], 'little')}")
+            slots.append(slot)
+        try:
+            # slots move when earlier ones are deleted, so read every coin first
+            for prevout, slot in zip(spends, slots):
+                undo.spent.append((prevout, self._coin(slot)))
+            for spent_key in keys:
+                self._remove_slot(self._find(spent_key))
+            self._reserve(len(created))
+            for outpoint, (amount, spk, coinbase) in created.items():
+                self._add(key(outpoint), amount, spk, height, coinbase)
+                undo.created.append(outpoint)
+        except Exception:
+            self._revert(undo, set_tip=False)
+            raise
+        self.height = height
+        self.tip = hashlib.sha256(hashlib.sha256(block[:80]).digest()).digest()
+        return undo
+
+    def undo_block(self, undo):
+        """Revert apply_block(): remove the outputs it added, restore the coins it spent"""
+        self._revert(undo, set_tip=True)
+
+    def _revert(self, undo, set_tip):
+        key = self.key
+        for outpoint in reversed(undo.created):
+            slot = self._find(key(outpoint))
+            if slot < 0:
+                raise UTXOSetError("undo data does not match the set")
+            self._remove_slot(slot)
+        self._reserve(len(undo.spent))
+        for prevout, coin in undo.spent:
+            if self._find(key(prevout)) < 0:
+                self._add(key(prevout), coin.amount, coin.script_pubkey, coin.height, coin.coinbase)
+        if set_tip:
+            self.height = undo.height - 1
+            self.tip = undo.prev_hash
+
+    # ===== Files =====
+
+    def flush(self):
+        """Write pending payloads, then the header and table"""
+        if self._pending:
+            self._blob.write(self._pending)
+            self._blob.flush()
+            self._blob_flushed += len(self._pending)
+            self._pending = bytearray()
+        self._write_header()
+        self._mm.flush()
+
+    def close(self):
+        self.flush()
+        self._mm.close()
+        self._blob.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def items(self):
+        """Yield (key, Coin) for every coin, in table order"""
+        unpack_from = KEY.unpack_from
+        for i in range(self.capacity):
+            key = unpack_from(self._mm, HEADER_SIZE + i * SLOT_SIZE)[0]
+            if key:
+                yield key, self._coin(i)
+
+    def compact(self):
+        """Rewrite the blob without the payloads of spent coins"""
+        self.flush()
+        new_path = self._blob_path + ".new"
+        mm = self._mm
+        offset = 0
+        with open(new_path, "wb") as out:
+            for i in range(self.capacity):
+                slot = HEADER_SIZE + i * SLOT_SIZE
+                key, amount, old_offset, height, length, kind = SLOT.unpack_from(mm, slot)
+                if key:
+                    out.write(self._payload(old_offset, length))
+                    SLOT.pack_into(mm, slot, key, amount, offset, height, length, kind)
+                    offset += length
+        self._blob.close()
+        os.replace(new_path, self._blob_path)
+        self._blob = open(self._blob_path, "r+b")
+        self._blob.seek(offset)
+        self._blob_flushed = self.blob_end = self.live_payload = offset
+        self.flush()
+
+    def stats(self):
+        table = HEADER_SIZE + self.capacity * SLOT_SIZE
+        return {
+            "coins": self.count,
+            "capacity": self.capacity,
+            "load_factor": self.count / self.capacity,
+            "table_bytes": table,
+            "blob_bytes": self.blob_end,
+            "live_payload_bytes": self.live_payload,
+            "bytes_per_coin": (table + self.live_payload) / max(self.count, 1),
+        }
+
+
+def _create_table(path, capacity, count, blob_end, live_payload, height, salt, tip):
+    with open(path, "wb") as f:
+        f.truncate(HEADER_SIZE + capacity * SLOT_SIZE)
+        f.write(HEADER.pack(MAGIC, capacity, count, blob_end, live_payload, height, salt, tip))
+
+
+# ---------------------------------------------------------------------------
+# Undo records on disk
+# ---------------------------------------------------------------------------
+
+def encode_undo(undo):
+    """Serialize a BlockUndo (e.g. to keep one per block, like Core's rev files)"""
+    parts = [struct.pack("<q32sII", undo.height, undo.prev_hash, len(undo.created), len(undo.spent))]
+    parts.extend(undo.created)
+    for prevout, coin in undo.spent:
+        parts.append(prevout + struct.pack("<QIH", coin.amount, coin.height << 1 | coin.coinbase,
+                                           len(coin.script_pubkey)) + coin.script_pubkey)
+    return b"".join(parts)
+
+
+def decode_undo(data):
+    height, prev_hash, n_created, n_spent = struct.unpack_from("<q32sII", data)
+    offset = 48
+    created = [bytes(data[offset + 36 * i:offset + 36 * (i + 1)]) for i in range(n_created)]
+    offset += 36 * n_created
+    spent = []
+    for _ in range(n_spent):
+        prevout = bytes(data[offset:offset + 36])
+        amount, height_flag, length = struct.unpack_from("<QIH", data, offset + 36)
+        offset += 50
+        spent.append((prevout, Coin(amount, bytes(data[offset:offset + length]), height_flag >> 1,
+                                    bool(height_flag & 1))))
+        offset += length
+    return BlockUndo(height, prev_hash, created, spent)
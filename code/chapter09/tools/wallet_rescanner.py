@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Gap-Limit Wallet Rescanner
+
+utxo_scanner.py asks the Blockstream API for the UTXOs of one address. A
+wallet owns a tree of addresses (chapter 1's hd_wallet.py), and finding its
+coins means reading the chain: every output of every block is checked
+against the wallet's scriptPubKeys, every input against its coins.
+
+The rescanner keeps the watched BIP86 scriptPubKeys in a dict (a hash set
+that also remembers each script's branch and index), so checking an output
+costs one lookup however many scripts are watched. Scripts are derived from
+the account xpub in windows, per branch (receive 0, change 1):
+
+- at the start, `lookahead` indexes (at least the gap limit) per branch
+- when an output pays index i, the branch is extended in steps of `window`
+  until gap_limit unused indexes follow i, so a wallet that handed out
+  thousands of addresses is found in one pass
+
+Transactions are streamed from a local BlockStore (tools/block_store.py)
+and only parsed into prevouts and outputs; a txid is hashed only for
+transactions that pay the wallet.
+
+A checkpoint (JSON, with the derived scripts of each branch in a binary
+file next to it)
+is written every `checkpoint_every` blocks and at the end. It records the
+next height, the hash of the last block scanned, the windows and the
+wallet's UTXOs, so a rescan resumes where it stopped and does not derive
+the scripts again. A checkpoint whose last block is no longer in the store
+(a reorg, or another chain) is rejected.
+"""
+
+import importlib.util
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+
+from .block_store import iter_block_txs, sha256d, txid
+
+
+def _load_hd_wallet():
+    """Load chapter 1's HD wallet by file path (once per process)"""
+    name = "chapter01_hd_wallet"
+    if name not in sys.modules:
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "..", "..", "chapter01", "tools", "hd_wallet.py")
+        spec = importlib.util.spec_from_file_location(name, os.path.normpath(path))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+    return sys.modules[name]
+
+
+hd_wallet = _load_hd_wallet()
+
+GAP_LIMIT = 20
+WINDOW = 100
+BRANCHES = (0, 1)  # receive, change
+CHECKPOINT_VERSION = 2
+SCRIPT_SIZES = {hd_wallet.P2PKH: 25, hd_wallet.P2WPKH: 22, hd_wallet.P2TR: 34}
+
+# txid (display hex); branch / index: where the script sits in the wallet
+WalletUtxo = namedtuple("WalletUtxo", ["txid", "vout", "amount", "branch", "index", "height"])
+
+# one per block: transactions, outputs paying the wallet, wallet coins spent, seconds
+BlockScan = namedtuple("BlockScan", ["height", "txs", "received", "spent", "seconds"])
+
+
+class RescanError(Exception):
+    pass
+
+
+class WalletRescanner:
+    """
+    Rescan a local block store for the coins of one account.
+
+    Args:
+        xpub: account extended public key (m/86'/coin'/account')
+        gap_limit: unused indexes kept watched after the last used one
+        lookahead: indexes derived per branch up front (default: gap_limit)
+        window: indexes derived at a time when a branch is extended
+        kind: output type of the scripts (P2TR for BIP86)
+        checkpoint: path of the checkpoint file; loaded if it exists
+    """
+
+    def __init__(self, xpub, gap_limit=GAP_LIMIT, lookahead=None, window=WINDOW,
+                 kind=hd_wallet.P2TR, checkpoint=None):
+        self.xpub = xpub
+        self.gap_limit = gap_limit
+        self.window = max(window, 1)
+        self.kind = kind
+        self.checkpoint = checkpoint
+        self.watched = {}                           # scriptPubKey -> (branch, index)
+        self.scripts = {b: [] for b in BRANCHES}    # derived scripts in index order
+        self.used = {b: -1 for b in BRANCHES}       # highest index that received coins
+        self.utxos = {}                             # prevout (36 bytes) -> WalletUtxo
+        self.height = 0                             # next block to scan
+        self.tip_hash = None                        # hash of block height - 1 (hex)
+        self.extensions = 0
+        self.derive_seconds = 0.0
+        self._saved = {b: 0 for b in BRANCHES}     # scripts already in each branch's file
+        if checkpoint and os.path.exists(checkpoint):
+            self._load()
+        else:
+            for branch in BRANCHES:
+                self._derive(branch, max(lookahead or gap_limit, gap_limit))
+
+    # ===== Windows =====
+
+    def _derive(self, branch, count):
+        start = time.perf_counter()
+        scripts = self.scripts[branch]
+        first = len(scripts)
+        new = hd_wallet.xpub_script_pubkeys(self.xpub, self.kind, first, count, change=branch)
+        scripts.extend(new)
+        watched = self.watched
+        for offset, spk in enumerate(new):
+            watched[spk] = (branch, first + offset)
+        self.derive_seconds += time.perf_counter() - start
+
+    def _mark_used(self, branch, index):
+        if index <= self.used[branch]:
+            return
+        self.used[branch] = index
+        missing = index + 1 + self.gap_limit - len(self.scripts[branch])
+        if missing > 0:
+            self._derive(branch, -(-missing // self.window) * self.window)
+            self.extensions += 1
+
+    # ===== Scanning =====
+
+    def scan_block(self, height, block):
+        """Apply one block; returns (transactions, outputs received, coins spent)"""
+        watched = self.watched
+        utxos = self.utxos
+        txs = received = spent = 0
+        for tx in iter_block_txs(block):
+            txs += 1
+            if utxos:
+                for prevout in tx.prevouts:
+                    if prevout in utxos:
+                        del utxos[prevout]
+                        spent += 1
+            tx_hash = None
+            for vout, (amount, spk) in enumerate(tx.outputs):
+                hit = watched.get(spk)
+                if hit is None:
+                    continue
+                if tx_hash is None:
+                    tx_hash = txid(tx)
+                branch, index = hit
+                utxos[tx_hash + vout.to_bytes(4, "little")] = WalletUtxo(
+                    tx_hash[::-1].hex(), vout, amount, branch, index, height)
+                self._mark_used(branch, index)
+                received += 1
+        return txs, received, spent
+
+    def scan(self, store, stop=None, checkpoint_every=100, progress=None):
+        """
+        Scan store from self.height up to stop (default: the tip). Calls
+        progress(BlockScan) after every block. Returns the list of BlockScan.
+        """
+        if self.height and (self.height > len(store)
+                            or store.block_hash(self.height - 1).hex() != self.tip_hash):
+            raise RescanError(f"block {self.height - 1} of the store is not the checkpoint's")
+        results = []
+        for height, block in store.blocks(self.height, stop):
+            start = time.perf_counter()
+            txs, received, spent = self.scan_block(height, block)
+            result = BlockScan(height, txs, received, spent, time.perf_counter() - start)
+            results.append(result)
+            self.height = height + 1
+            self.tip_hash = sha256d(block[:80]).hex()
+            if progress:
+                progress(result)
+            if self.checkpoint and checkpoint_every and self.height % checkpoint_every == 0:
+                self.save()
+        if self.checkpoint and results:
+            self.save()
+        return results
+
+    def balance(self):
+        return sum(utxo.amount for utxo in self.utxos.values())
+
+    def next_unused(self, branch=0):
+        return self.used[branch] + 1
+
+    # ===== Checkpoint =====
+
+    def _scripts_path(self, branch):
+        return f"{self.checkpoint}.scripts{branch}"
+
+    def save(self):
+        """
+        Write the checkpoint. Each branch's scripts go first, appended to its
+        own file: the file only grows, so if the JSON write is interrupted the
+        previous JSON's count still reads a prefix of the same branch.
+        """
+        size = SCRIPT_SIZES[self.kind]
+        for branch in BRANCHES:
+            path = self._scripts_path(branch)
+            saved = self._saved[branch] if os.path.exists(path) else 0
+            with open(path, "r+b" if saved else "wb") as f:
+                f.seek(saved * size)
+                f.truncate()
+                f.write(b"".join(self.scripts[branch][saved:]))
+            self._saved[branch] = len(self.scripts[branch])
+        state = {
+            "version": CHECKPOINT_VERSION,
+            "xpub": self.xpub,
+            "kind": self.kind,
+            "gap_limit": self.gap_limit,
+            "height": self.height,
+            "tip_hash": self.tip_hash,
+            "derived": [len(self.scripts[b]) for b in BRANCHES],
+            "used": [self.used[b] for b in BRANCHES],
+            "utxos": [list(utxo) for utxo in self.utxos.values()],
+        }
+        with open(self.checkpoint + ".tmp", "w") as f:
+            json.dump(state, f)
+        os.replace(self.checkpoint + ".tmp", self.checkpoint)
+
+    def _load(self):
+        with open(self.checkpoint) as f:
+            state = json.load(f)
+        if state.get("version") != CHECKPOINT_VERSION:
+            raise RescanError("unknown checkpoint version")
+        if state["xpub"] != self.xpub or state["kind"] != self.kind:
+            raise RescanError("checkpoint belongs to another wallet")
+        size = SCRIPT_SIZES[self.kind]
+        for branch, count in zip(BRANCHES, state["derived"]):
+            with open(self._scripts_path(branch), "rb") as f:
+                data = f.read(count * size)
+            if len(data) < count * size:
+                raise RescanError("checkpoint scripts are truncated")
+            scripts = [data[i * size:(i + 1) * size] for i in range(count)]
+            self.scripts[branch] = scripts
+            self._saved[branch] = count
+            for index, spk in enumerate(scripts):
+                self.watched[spk] = (branch, index)
+        self.used = dict(zip(BRANCHES, state["used"]))
+        self.height = state["height"]
+        self.tip_hash = state["tip_hash"]
+        for item in state["utxos"]:
+            utxo = WalletUtxo(*item)
+            prevout = bytes.fromhex(utxo.txid)[::-1] + utxo.vout.to_bytes(4, "little")
+            self.utxos[prevout] = utxo
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Chapter 10: Tapret Commitment
+Embed an RGB-style commitment into Alice's Taproot output without the CLI:
+
+1. Commit to three contracts' state transitions in one MPC tree
+2. Place the MPC root in a 64-byte unspendable Tapret leaf next to Alice's
+   existing hash-lock script (the Tapret leaf becomes the right-most node)
+3. Cross-check the resulting address against bitcoin-utils
+4. Verify the Tapret proof and each contract's MPC Merkle proof, and show
+   that a different commitment or nonce does not verify and that one tree
+   cannot hold two bundles for the same contract
+"""
+
+import hashlib
+
+from bitcoinutils.setup import setup
+from bitcoinutils.keys import PrivateKey, P2trAddress
+from bitcoinutils.script import Script
+from bitcoinutils.utils import (
+    calculate_tweak, tweak_taproot_pubkey, tapleaf_tagged_hash, tapbranch_tagged_hash,
+    tagged_hash as bitcoinutils_tagged_hash,
+)
+
+from tools.tapret import (
+    TapretProof, tapleaf_hash, tapret_leaf_script, embed_commitment,
+    verify_commitment, mpc_commit, mpc_verify, tagged_hash,
+)
+
+
+def tapret_commitment_demo():
+    """Build and verify a Tapret commitment"""
+    setup('testnet')
+
+    alice_priv = PrivateKey("cRxebG1hY6vVgS9CSLNaEbEJaXkpZvc6nFeqqGT7v6gcW7MbzKNT")
+    alice_pub = alice_priv.get_public_key()
+    internal_key = bytes.fromhex(alice_pub.to_x_only_hex())
+
+    # ===== Alice's existing script (Chapter 8 hash lock) =====
+    hash0 = hashlib.sha256(b"helloworld").hexdigest()
+    hashlock = Script(['OP_SHA256', hash0, 'OP_EQUALVERIFY', 'OP_TRUE'])
+    script_root = tapleaf_hash(bytes.fromhex(hashlock.to_hex()))
+
+    # ===== One anchor, three contracts =====
+    messages = {
+        tagged_hash("demo:contract", name.encode()): tagged_hash("demo:bundle", name.encode())
+        for name in ("RGB20-USDT", "RGB20-TEST", "RGB21-ART")
+    }
+    mpc_root, mpc_proofs = mpc_commit(messages)
+
+    output_key, proof = embed_commitment(internal_key, mpc_root, script_root)
+    leaf = tapret_leaf_script(mpc_root, proof.nonce)
+
+    print("=" * 70)
+    print("TAPRET COMMITMENT")
+    print("=" * 70)
+    print(f"\nInternal Key:     {internal_key.hex()}")
+    print(f"Hash-lock Leaf:   {script_root.hex()}")
+    print(f"MPC Root:         {mpc_root.hex()} ({len(messages)} contracts)")
+    print(f"\nTapret Leaf ({len(leaf)} bytes, nonce {proof.nonce}):")
+    print(f"  {leaf.hex()}")
+    print(f"  Leaf hash:      {tapleaf_hash(leaf).hex()}")
+    print(f"  Right-most:     {tapleaf_hash(leaf) > script_root}")
+
+    # ===== Same tree through bitcoin-utils =====
+    # (its Script class has no OP_RESERVED, so the Tapret leaf is hashed directly)
+    tapret_leaf_hash = bitcoinutils_tagged_hash(bytes([0xc0, len(leaf)]) + leaf, "TapLeaf")
+    merkle_root = tapbranch_tagged_hash(tapleaf_tagged_hash(hashlock), tapret_leaf_hash)
+    tweak = calculate_tweak(alice_pub, merkle_root)
+    reference_key, _ = tweak_taproot_pubkey(alice_pub.to_bytes(), tweak)
+    address = P2trAddress(witness_program=output_key.hex())
+    reference = P2trAddress(witness_program=reference_key[:32].hex())
+    print(f"\nTaproot Address:  {address.to_string()}")
+    print(f"bitcoin-utils:    {reference.to_string()}")
+    print(f"Match:            {address.to_string() == reference.to_string()}")
+
+    # ===== Verification =====
+    print(f"\nVerification:")
+    print(f"  Tapret proof:              {verify_commitment(output_key, mpc_root, proof)}")
+    for pid, message in messages.items():
+        print(f"  MPC proof {pid.hex()[:12]}...:   "
+              f"{mpc_verify(mpc_root, pid, message, mpc_proofs[pid])} "
+              f"({len(mpc_proofs[pid])} siblings)")
+    other_root = tagged_hash("demo:bundle", b"forged")
+    print(f"  Different commitment:      {verify_commitment(output_key, other_root, proof)}")
+    wrong_nonce = TapretProof(proof.internal_key, proof.partner, (proof.nonce + 1) % 256)
+    print(f"  Different nonce:           {verify_commitment(output_key, mpc_root, wrong_nonce)}")
+    forged = next(iter(messages))
+    print(f"  Forged bundle in MPC tree: {mpc_verify(mpc_root, forged, other_root, mpc_proofs[forged])}")
+    try:
+        mpc_commit([(forged, messages[forged]), (forged, other_root)])
+        print(f"  Two bundles, one contract: committed")
+    except ValueError as e:
+        print(f"  Two bundles, one contract: rejected ({e})")
+    print("\n" + "=" * 70)
+
+    return output_key, proof
+
+
+if __name__ == "__main__":
+    output_key, proof = tapret_commitment_demo()
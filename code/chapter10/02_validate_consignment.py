@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Chapter 10: Offline Consignment Validation
+Validate the chapter's multi-hop transfer (Alice -> Bob -> Dave) from the
+consignment fixtures, with no node, indexer or RGB CLI:
+
+1. Validate the Alice -> Bob consignment (genesis + one transfer)
+2. Validate the Bob -> Dave consignment with the same validator: the shared
+   Alice -> Bob anchor comes from the cache
+3. Tamper with copies (amount, MPC root, missing history) and show each
+   is rejected
+
+Fixtures live in fixtures/; rebuild them with --regenerate.
+Genesis outpoint and anchor transactions are illustrative (unsigned).
+
+Usage: python3 02_validate_consignment.py [--regenerate]
+"""
+
+import argparse
+import copy
+import hashlib
+import json
+import os
+
+from tools.consignment import ConsignmentBuilder, ConsignmentValidator, ConsignmentError
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+GENESIS_OUTPOINT = "a1b2c3d4e5f6a1b2c3d4e5f6a1b2c3d4e5f6a1b2c3d4e5f6a1b2c3d4e5f6a1b2:0"
+
+
+def regenerate_fixtures():
+    """Rebuild the Alice -> Bob -> Dave fixtures with the builder"""
+    alice, bob, dave = (hashlib.sha256(name).digest() for name in (b"alice", b"bob", b"dave"))
+    builder = ConsignmentBuilder("TEST", 10000, alice, GENESIS_OUTPOINT)
+    builder.transfer(alice, bob, 500)
+    builder.transfer(bob, dave, 200)
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    for name, upto in (("alice_to_bob.json", 1), ("bob_to_dave.json", 2)):
+        with open(os.path.join(FIXTURE_DIR, name), "w") as f:
+            json.dump(builder.consignment(upto), f, indent=2)
+            f.write("\n")
+        print(f"Wrote fixtures/{name}")
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURE_DIR, name)) as f:
+        return json.load(f)
+
+
+def print_state(state):
+    for seal, amount in sorted(state.items()):
+        print(f"    {seal[:16]}...:{seal.split(':')[1]}  {amount:>6} TEST")
+
+
+def validate_consignment_demo():
+    """Validate the multi-hop history and some tampered copies"""
+    alice_to_bob = load_fixture("alice_to_bob.json")
+    bob_to_dave = load_fixture("bob_to_dave.json")
+    validator = ConsignmentValidator()
+
+    print("=" * 70)
+    print("OFFLINE CONSIGNMENT VALIDATION")
+    print("=" * 70)
+
+    for label, consignment in (("Alice -> Bob", alice_to_bob), ("Bob -> Dave", bob_to_dave)):
+        verified, hits = validator.anchors_verified, validator.anchor_cache_hits
+        state = validator.validate(consignment)
+        print(f"\n{label}: VALID ({len(consignment['bundles'])} bundle(s))")
+        print(f"  Anchors verified: {validator.anchors_verified - verified}, "
+              f"from cache: {validator.anchor_cache_hits - hits}")
+        print(f"  Final state:")
+        print_state(state)
+
+    # ===== Tampered copies =====
+    last = bob_to_dave["bundles"][-1]
+    tampered = []
+
+    inflated = copy.deepcopy(bob_to_dave)
+    inflated["bundles"][-1]["transitions"][0]["assignments"][0]["amount"] += 1000
+    tampered.append(("Inflated amount", inflated))
+
+    wrong_root = copy.deepcopy(bob_to_dave)
+    wrong_root["anchors"][last["anchor_txid"]]["mpc_root"] = "00" * 32
+    tampered.append(("Replaced MPC root", wrong_root))
+
+    truncated = copy.deepcopy(bob_to_dave)
+    del truncated["bundles"][0]
+    tampered.append(("Alice -> Bob history left out", truncated))
+
+    print(f"\nTampered consignments:")
+    for (label, _), result in zip(tampered, validator.validate_batch([c for _, c in tampered])):
+        status = f"REJECTED ({result})" if isinstance(result, ConsignmentError) else "ACCEPTED"
+        print(f"  {label}: {status}")
+
+    print(f"\nValidator totals: {validator.anchors_verified} anchors verified, "
+          f"{validator.anchor_cache_hits} cache hits")
+    print("\n" + "=" * 70)
+
+    return validator
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="offline RGB-style consignment validation")
+    parser.add_argument("--regenerate", action="store_true", help="rebuild the fixtures first")
+    args = parser.parse_args()
+    if args.regenerate:
+        regenerate_fixtures()
+    validator = validate_consignment_demo()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Chapter 10: Consignment Validation Benchmark
+Build a long transfer history (default 1,000 hops between 8 wallets) and
+validate the consignments handed out along the way. Every consignment
+repeats the whole history back to genesis, so later ones share almost all
+of their anchors with earlier ones.
+
+Compares:
+- a fresh validator per consignment (every anchor re-hashed and re-tweaked)
+- one validator kept across consignments (a wallet's stash)
+- validate_batch() over all consignments at once
+
+Usage: python3 03_benchmark_consignment_validation.py [--hops N] [--every N]
+"""
+
+import argparse
+import hashlib
+import time
+
+from tools.consignment import ConsignmentBuilder, ConsignmentValidator
+
+GENESIS_OUTPOINT = "a1b2c3d4e5f6a1b2c3d4e5f6a1b2c3d4e5f6a1b2c3d4e5f6a1b2c3d4e5f6a1b2:0"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="consignment validation benchmark")
+    parser.add_argument("--hops", type=int, default=1000, help="transfers in the history")
+    parser.add_argument("--every", type=int, default=50, help="hand out a consignment every N hops")
+    args = parser.parse_args()
+
+    wallets = [hashlib.sha256(f"wallet-{i}".encode()).digest() for i in range(8)]
+    builder = ConsignmentBuilder("BENCH", 10 ** 9, wallets[0], GENESIS_OUTPOINT)
+    start = time.perf_counter()
+    for hop in range(args.hops):
+        sender = wallets[hop % len(wallets)]
+        recipient = wallets[(hop + 1) % len(wallets)]
+        balance = sum(builder.owned(sender).values())
+        builder.transfer(sender, recipient, max(1, balance // 2))
+    build_time = time.perf_counter() - start
+
+    consignments = [builder.consignment(upto) for upto in range(args.every, args.hops + 1, args.every)]
+    bundles = sum(len(c["bundles"]) for c in consignments)
+
+    results = {}
+
+    start = time.perf_counter()
+    anchors = 0
+    for consignment in consignments:
+        validator = ConsignmentValidator()
+        validator.validate(consignment)
+        anchors += validator.anchors_verified
+    results["fresh validator each"] = (time.perf_counter() - start, anchors)
+
+    start = time.perf_counter()
+    stash = ConsignmentValidator()
+    for consignment in consignments:
+        stash.validate(consignment)
+    results["one validator (stash)"] = (time.perf_counter() - start, stash.anchors_verified)
+
+    start = time.perf_counter()
+    batch = ConsignmentValidator()
+    states = batch.validate_batch(consignments)
+    results["validate_batch()"] = (time.perf_counter() - start, batch.anchors_verified)
+    final = states[-1]
+
+    print("=" * 70)
+    print(f"CONSIGNMENT VALIDATION BENCHMARK ({args.hops:,} hops)")
+    print("=" * 70)
+    print(f"  History built in {build_time:.2f} s ({args.hops / build_time:,.0f} transfers/s)")
+    print(f"  {len(consignments)} consignments, {bundles:,} bundles in total")
+    print(f"\n  {'Strategy':<24}{'Time (s)':>10}{'Anchors hashed':>16}{'Bundles/s':>12}")
+    baseline = results["fresh validator each"][0]
+    for name, (elapsed, verified) in results.items():
+        print(f"  {name:<24}{elapsed:>10.3f}{verified:>16,}{bundles / elapsed:>12,.0f}"
+              f"   {baseline / elapsed:.1f}x")
+    print(f"\n  Final state: {len(final)} seals, {sum(final.values()):,} BENCH "
+          f"(supply {builder.genesis['supply']:,})")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Chapter 10: Combine and Finalize PSBTs
+An RGB transfer is signed by handing a PSBT around: every cosigner returns
+their own copy with their signatures, and one wallet combines the copies,
+finalizes them and broadcasts the anchor transaction.
+
+1. Round trip with real signatures: Alice, Bob and Carol sign their copies
+   of a version 2 and a version 0 PSBT (key path, a 2-of-3 CHECKSIGADD leaf
+   and Carol's recovery leaf); the combined, finalized and extracted
+   transaction must equal the one bitcoin-utils builds directly
+2. Throughput on a large PSBT (default 500 inputs, 3 signers): decoding
+   every copy and merging the maps vs combine_stream() over the raw bytes
+   and over memory-mapped files, with peak memory of each
+3. Lazy parsing: reading one field of a large PSBT vs decoding it whole
+
+The combiner does not verify signatures, so the throughput part fills the
+copies with placeholder signatures instead of signing thousands of inputs.
+
+Usage: python3 04_benchmark_psbt_combine.py [--inputs N] [--signers N] [--rounds N]
+"""
+
+import argparse
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import time
+import tracemalloc
+
+from bitcoinutils.setup import setup
+from bitcoinutils.keys import PrivateKey, P2trAddress
+from bitcoinutils.script import Script
+from bitcoinutils.transactions import Transaction, TxInput, TxOutput, TxWitnessInput
+from bitcoinutils.utils import ControlBlock
+
+from tools.psbt import (
+    PSBT, PSBT_MAGIC, combine_stream, finalize_input, serialize_entries, tagged_hash, tapleaf_hash,
+)
+
+OUTPUT_ADDRESS = "tb1p060z97qusuxe7w6h8z0l9kam5kn76jur22ecel75wjlmnkpxtnls6vdgne"
+AMOUNT = 10000
+FINGERPRINT = bytes.fromhex("d34db33f")
+
+
+def cosigners():
+    keys = [PrivateKey(secret_exponent=int.from_bytes(hashlib.sha256(name.encode()).digest(), "big"))
+            for name in ("alice", "bob", "carol")]
+    pubs = [key.get_public_key() for key in keys]
+    multisig = Script([pubs[0].to_x_only_hex(), "OP_CHECKSIG", pubs[1].to_x_only_hex(), "OP_CHECKSIGADD",
+                       pubs[2].to_x_only_hex(), "OP_CHECKSIGADD", "OP_2", "OP_NUMEQUAL"])
+    recovery = Script([pubs[2].to_x_only_hex(), "OP_CHECKSIG"])
+    return keys, pubs, [multisig, recovery]
+
+
+def unsigned_tx(count):
+    inputs = [TxInput(hashlib.sha256(f"rgb-utxo-{i}".encode()).hexdigest(), i % 4) for i in range(count)]
+    for txin in inputs:
+        txin.sequence = struct.pack("<I", 0xfffffffd)
+    outputs = [TxOutput(AMOUNT * count - 150 * count, P2trAddress(OUTPUT_ADDRESS).to_script_pub_key())]
+    return inputs, outputs
+
+
+def creator_psbt(raw_tx, version, pubs, leaves, address, count):
+    """What the creator and updater know: UTXOs and the Taproot tree of every input"""
+    psbt = PSBT.from_unsigned_tx(raw_tx, version)
+    script_pubkey = bytes.fromhex(address.to_script_pub_key().to_hex())
+    internal = bytes.fromhex(pubs[0].to_x_only_hex())
+    leaf_hashes = [tapleaf_hash(bytes.fromhex(leaf.to_hex())) for leaf in leaves]
+    merkle_root = tagged_hash("TapBranch", b"".join(sorted(leaf_hashes)))
+    controls = [bytes.fromhex(ControlBlock(pubs[0], leaves, i, is_odd=address.is_odd()).to_hex())
+                for i in range(len(leaves))]
+    for index in range(count):
+        psbt_in = psbt.input(index)
+        psbt_in.witness_utxo = (AMOUNT, script_pubkey)
+        psbt_in.tap_internal_key = internal
+        psbt_in.tap_merkle_root = merkle_root
+        for leaf, control in zip(leaves, controls):
+            psbt_in.add_tap_leaf_script(control, bytes.fromhex(leaf.to_hex()))
+        for i, pub in enumerate(pubs):
+            hashes = [leaf_hashes[0]] + ([leaf_hashes[1]] if i == 2 else [])
+            psbt_in.add_tap_bip32_derivation(bytes.fromhex(pub.to_x_only_hex()), hashes, FINGERPRINT,
+                                             [86 + 0x80000000, 0x80000001, 0x80000000, 0, index])
+    return psbt, leaf_hashes, controls
+
+
+def round_trip(version):
+    """Part 1: sign three copies for real, combine + finalize + extract, compare"""
+    keys, pubs, leaves = cosigners()
+    address = pubs[0].get_taproot_address([leaves])
+    count = 4
+    inputs, outputs = unsigned_tx(count)
+    builder = Transaction(inputs, outputs, has_segwit=True)
+    raw = Transaction(inputs, outputs).serialize()
+    spk = [address.to_script_pub_key()] * count
+    amounts = [AMOUNT] * count
+
+    copies = []
+    signatures = {}
+    for signer, key in enumerate(keys):
+        psbt, leaf_hashes, controls = creator_psbt(bytes.fromhex(raw), version, pubs, leaves, address, count)
+        xonly = bytes.fromhex(pubs[signer].to_x_only_hex())
+        for index in range(count):
+            psbt_in = psbt.input(index)
+            if index == 0:
+                if signer == 0:  # Alice alone spends input 0 by the key path
+                    sig = key.sign_taproot_input(builder, index, spk, amounts, tapleaf_scripts=[leaves])
+                    psbt_in.tap_key_sig = bytes.fromhex(sig)
+                    signatures[(index, "key")] = sig
+                continue
+            sig = key.sign_taproot_input(builder, index, spk, amounts, script_path=True,
+                                         tapleaf_script=leaves[0], tweak=False)
+            psbt_in.add_tap_script_sig(xonly, leaf_hashes[0], bytes.fromhex(sig))
+            signatures[(index, signer)] = sig
+            if signer == 2 and index == 3:  # Carol can also use her recovery leaf
+                sig = key.sign_taproot_input(builder, index, spk, amounts, script_path=True,
+                                             tapleaf_script=leaves[1], tweak=False)
+                psbt_in.add_tap_script_sig(xonly, leaf_hashes[1], bytes.fromhex(sig))
+                signatures[(index, "recovery")] = sig
+        copies.append(psbt.serialize())
+
+    combined = PSBT(b"".join(combine_stream(copies, finalize=True)))
+    extracted = combined.extract().hex()
+
+    # The same spend built by hand: input 0 key path, 1-2 Alice + Bob (Carol's
+    # signature left out: a third one would make the count 3), 3 Carol's recovery leaf
+    cb = [ControlBlock(pubs[0], leaves, i, is_odd=address.is_odd()).to_hex() for i in range(2)]
+    builder.witnesses.append(TxWitnessInput([signatures[(0, "key")]]))
+    for index in (1, 2):
+        builder.witnesses.append(TxWitnessInput(["", signatures[(index, 1)], signatures[(index, 0)],
+                                                 leaves[0].to_hex(), cb[0]]))
+    builder.witnesses.append(TxWitnessInput([signatures[(3, "recovery")], leaves[1].to_hex(), cb[1]]))
+    return combined, extracted == builder.serialize(), builder.get_vsize()
+
+
+# ---------------------------------------------------------------------------
+# Throughput
+# ---------------------------------------------------------------------------
+
+def placeholder_copies(count, signers, version):
+    """One PSBT per signer with placeholder script signatures on every input"""
+    _, pubs, leaves = cosigners()
+    address = pubs[0].get_taproot_address([leaves])
+    inputs, outputs = unsigned_tx(count)
+    raw = bytes.fromhex(Transaction(inputs, outputs).serialize())
+    copies = []
+    for signer in range(signers):
+        psbt, leaf_hashes, _ = creator_psbt(raw, version, pubs, leaves, address, count)
+        xonly = bytes.fromhex(pubs[signer % 3].to_x_only_hex())
+        for index in range(count):
+            sig = hashlib.sha512(f"{signer}-{index}".encode()).digest()
+            psbt.input(index).add_tap_script_sig(xonly, leaf_hashes[0], sig)
+        copies.append(psbt.serialize())
+    return copies
+
+
+def combine_decoded(sources):
+    """Baseline: decode every copy into {key: value} maps, merge them, finalize, serialize"""
+    decoded = []
+    for source in sources:
+        psbt = PSBT(bytes(source))
+        decoded.append([{key: bytes(value) for key, value in psbt_map.entries.items()}
+                        for psbt_map in [psbt.global_map] + psbt.inputs + psbt.outputs])
+    input_count = PSBT(sources[0]).input_count
+    parts = [PSBT_MAGIC]
+    for position in range(len(decoded[0])):
+        merged = {}
+        for maps in decoded:
+            for key, value in maps[position].items():
+                merged.setdefault(key, value)
+        if 1 <= position <= input_count:
+            finalize_input(merged)
+        parts.append(serialize_entries(merged.items()))
+    return b"".join(parts)
+
+
+def combine_files(paths, out_path):
+    """combine_stream() from memory-mapped inputs to an output file"""
+    files = [open(path, "rb") for path in paths]
+    maps = [mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) for f in files]
+    try:
+        with open(out_path, "wb") as out:
+            out.writelines(combine_stream(maps, finalize=True))
+    finally:
+        for m in maps:
+            m.close()
+        for f in files:
+            f.close()
+
+
+def measure(label, rounds, run):
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = run()
+    elapsed = (time.perf_counter() - start) / rounds
+    return label, elapsed, peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PSBT combine / finalize benchmark")
+    parser.add_argument("--inputs", type=int, default=500, help="inputs of the large PSBT")
+    parser.add_argument("--signers", type=int, default=3, help="signed copies to combine")
+    parser.add_argument("--rounds", type=int, default=5, help="timed repetitions")
+    args = parser.parse_args()
+
+    setup('testnet')
+
+    print("=" * 70)
+    print("PSBT COMBINE AND FINALIZE")
+    print("=" * 70)
+
+    print(f"\n1. Alice, Bob and Carol sign their copies (4 inputs)")
+    for version in (2, 0):
+        combined, identical, vsize = round_trip(version)
+        final = [len(psbt_in.final_script_witness) for psbt_in in combined.inputs]
+        print(f"  PSBT v{version}: witness items per input {final}, "
+              f"extracted tx identical to bitcoin-utils: {identical} ({vsize} vB)")
+        print(f"          unique id {combined.unique_id()[:32]}...")
+
+    print(f"\n2. Combining {args.signers} copies of a {args.inputs}-input PSBT")
+    copies = placeholder_copies(args.inputs, args.signers, 2)
+    size = sum(len(copy) for copy in copies)
+    print(f"  Copies: {size / 1e6:.2f} MB in total")
+    results = [measure("decode + merge", args.rounds, lambda: combine_decoded(copies))]
+    results.append(measure("combine_stream()", args.rounds,
+                           lambda: b"".join(combine_stream(copies, finalize=True))))
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i, copy in enumerate(copies):
+            paths.append(os.path.join(tmp, f"signer-{i}.psbt"))
+            with open(paths[-1], "wb") as f:
+                f.write(copy)
+        out_path = os.path.join(tmp, "combined.psbt")
+        results.append(measure("combine_stream() mmap", args.rounds,
+                               lambda: combine_files(paths, out_path)))
+        with open(out_path, "rb") as f:
+            from_files = f.read()
+
+    reference = results[0][3]
+    print(f"\n  {'Strategy':<24}{'ms':>9}{'inputs/s':>12}{'MB/s':>8}{'Peak MB':>10}")
+    for label, elapsed, peak, _ in results:
+        print(f"  {label:<24}{elapsed * 1000:>9.1f}{args.inputs / elapsed:>12,.0f}"
+              f"{size / 1e6 / elapsed:>8.1f}{peak / 1e6:>10.2f}   {results[0][1] / elapsed:.1f}x")
+    combined = PSBT(reference)
+    print(f"  All three outputs identical: {results[1][3] == reference and from_files == reference}")
+    print(f"  Finalized inputs: {sum(psbt_in.is_final for psbt_in in combined.inputs)} of {args.inputs}")
+
+    print(f"\n3. Lazy parsing of one {len(copies[0]) / 1e6:.2f} MB copy")
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        psbt = PSBT(copies[0])
+        first_sigs = psbt.input(0).tap_script_sigs()
+    lazy = (time.perf_counter() - start) / args.rounds
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        psbt = PSBT(copies[0])
+        for psbt_in in psbt.inputs:
+            psbt_in.tap_script_sigs()
+        for psbt_out in psbt.outputs:
+            psbt_out.entries
+    full = (time.perf_counter() - start) / args.rounds
+    print(f"  Signatures of input 0: {lazy * 1000:.3f} ms (1 of {args.inputs} input maps indexed)")
+    print(f"  Every input decoded: {full * 1000:.1f} ms ({full / lazy:.0f}x)")
+    print(f"  Found {len(first_sigs)} signature(s) on input 0")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,2 @@
+# Tools package for Chapter 10
+# This package contains utilities for RGB-style Tapret commitments and consignment validation, and PSBTs (BIP174/370/371)
@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+Consignments and Client-Side Validation
+
+A consignment is the proof bundle a receiver validates before accepting
+an RGB transfer. Here it is a JSON-friendly dict:
+
+    {
+      "genesis":  {"ticker", "supply", "assignments": [...]},
+      "bundles":  [{"anchor_txid", "transitions": [...], "mpc_proof": [...]}, ...],
+      "anchors":  {txid: {"tx", "vout", "internal_key", "partner", "nonce", "mpc_root"}},
+    }
+
+- a transition spends seals ("txid:vout") and assigns amounts to new seals;
+  {"vout": n} is a witness seal, an output of the anchor transaction itself
+- the transitions anchored in one transaction form a bundle; the bundle id
+  is the message committed for the contract in the anchor's MPC tree
+- the anchor transaction carries the MPC root in a Tapret output and must
+  spend (close) every seal its transitions consume
+
+ConsignmentValidator keeps a cache per anchor transaction (parsed outputs,
+spent outpoints, Tapret check) and a set of already-verified bundles, so a
+receiver validating a consignment whose history it has already seen (the
+next hop of a multi-hop transfer) only checks the new anchors.
+validate_batch() verifies every distinct anchor of a batch once before
+walking the individual histories.
+
+Bitcoin signatures are not checked: once an anchor is mined, consensus has
+already done that. Fixture transactions carry placeholder witnesses.
+"""
+
+import hashlib
+import json
+import struct
+from collections import namedtuple
+
+from .tapret import (
+    TapretProof, tagged_hash, embed_commitment, verify_commitment,
+    taproot_output_key, mpc_commit, mpc_verify, xonly_pubkey,
+)
+
+# Parsed anchor: txid, spent outpoints ("txid:vout") and outputs [(value, spk)]
+AnchorCheck = namedtuple("AnchorCheck", ["txid", "spent", "outputs"])
+
+
+class ConsignmentError(Exception):
+    """Raised when a consignment does not validate."""
+
+
+def canonical(obj):
+    """Deterministic JSON encoding used for ids"""
+    return json.dumps(obj, sort_keys=True, separators=(",", ":")).encode()
+
+
+def contract_id(genesis):
+    return tagged_hash("rgb:genesis", canonical(genesis))
+
+
+def transition_id(transition):
+    return tagged_hash("rgb:transition", canonical(transition))
+
+
+def bundle_id(transitions):
+    return tagged_hash("rgb:bundle", b"".join(sorted(transition_id(t) for t in transitions)))
+
+
+# ---------------------------------------------------------------------------
+# Raw transactions
+# ---------------------------------------------------------------------------
+
+def _compact_size(n):
+    if n < 0xfd:
+        return bytes([n])
+    if n <= 0xffff:
+        return b"\xfd" + struct.pack("<H", n)
+    return b"\xfe" + struct.pack("<I", n)
+
+
+def _read_compact_size(data, offset):
+    first = data[offset]
+    if first < 0xfd:
+        return first, offset + 1
+    if first == 0xfd:
+        return struct.unpack_from("<H", data, offset + 1)[0], offset + 3
+    if first == 0xfe:
+        return struct.unpack_from("<I", data, offset + 1)[0], offset + 5
+    return struct.unpack_from("<Q", data, offset + 1)[0], offset + 9
+
+
+def build_anchor_tx(spent, outputs):
+    """
+    Raw segwit transaction spending `spent` ["txid:vout"] to [(value, spk)].
+
+    Witnesses are 64-byte placeholders (fixtures are not signed).
+    """
+    body = struct.pack("<I", 2) + _compact_size(len(spent))
+    for outpoint in spent:
+        txid, vout = outpoint.split(":")
+        body += bytes.fromhex(txid)[::-1] + struct.pack("<I", int(vout)) + b"\x00" + b"\xfd\xff\xff\xff"
+    body += _compact_size(len(outputs))
+    for value, spk in outputs:
+        body += struct.pack("<Q", value) + _compact_size(len(spk)) + spk
+    witness = b"\x01\x40" + b"\x00" * 64
+    raw = body[:4] + b"\x00\x01" + body[4:] + witness * len(spent) + b"\x00" * 4
+    txid = hashlib.sha256(hashlib.sha256(body + b"\x00" * 4).digest()).digest()[::-1].hex()
+    return raw, txid
+
+
+def parse_anchor_tx(raw):
+    """
+    Parse a raw transaction into an AnchorCheck.
+
+    The TXID is recomputed from the non-witness fields, so a cached entry
+    keyed by TXID cannot be poisoned by different bytes.
+    """
+    offset = 4
+    segwit = raw[4] == 0 and raw[5] == 1
+    if segwit:
+        offset = 6
+    body_start = offset
+    count, offset = _read_compact_size(raw, offset)
+    spent = []
+    for _ in range(count):
+        txid = raw[offset:offset + 32][::-1].hex()
+        vout = struct.unpack_from("<I", raw, offset + 32)[0]
+        script_len, offset = _read_compact_size(raw, offset + 36)
+        offset += script_len + 4
+        spent.append(f"{txid}:{vout}")
+    count, offset = _read_compact_size(raw, offset)
+    outputs = []
+    for _ in range(count):
+        value = struct.unpack_from("<Q", raw, offset)[0]
+        script_len, offset = _read_compact_size(raw, offset + 8)
+        outputs.append((value, bytes(raw[offset:offset + script_len])))
+        offset += script_len
+    body_end = offset
+    if segwit:
+        for _ in range(len(spent)):
+            items, offset = _read_compact_size(raw, offset)
+            for _ in range(items):
+                item_len, offset = _read_compact_size(raw, offset)
+                offset += item_len
+    stripped = raw[:4] + raw[body_start:body_end] + raw[offset:offset + 4]
+    txid = hashlib.sha256(hashlib.sha256(stripped).digest()).digest()[::-1].hex()
+    return AnchorCheck(txid, frozenset(spent), outputs)
+
+
+# ---------------------------------------------------------------------------
+# Validation
+# ---------------------------------------------------------------------------
+
+class ConsignmentValidator:
+    """
+    Validates consignments, caching work per anchor transaction.
+
+    One validator plays the role of a wallet's stash: keep it across
+    transfers and previously validated history is not re-hashed.
+    """
+
+    def __init__(self):
+        # Only successes are cached: the TXID pins the transaction bytes, so a
+        # later copy of the same anchor cannot differ in a way that matters
+        self._anchors = {}  # (txid, vout, internal_key, partner, nonce, mpc_root) -> AnchorCheck
+        self._bundles = set()  # (anchor_txid, contract_id, bundle_id)
+        self.anchors_verified = 0
+        self.anchor_cache_hits = 0
+        self.bundles_verified = 0
+        self.bundle_cache_hits = 0
+
+    @staticmethod
+    def _anchor_key(txid, anchor):
+        return (txid, anchor["vout"], anchor["internal_key"], anchor["partner"],
+                anchor["nonce"], anchor["mpc_root"])
+
+    def check_anchor(self, txid, anchor):
+        """
+        Verify an anchor transaction and its Tapret commitment once.
+
+        Raises:
+            ConsignmentError: if the TXID or the commitment does not match
+        """
+        key = self._anchor_key(txid, anchor)
+        cached = self._anchors.get(key)
+        if cached is not None:
+            self.anchor_cache_hits += 1
+            return cached
+        check = self._verify_anchor(txid, anchor)
+        self._anchors[key] = check
+        self.anchors_verified += 1
+        return check
+
+    @staticmethod
+    def _verify_anchor(txid, anchor):
+        check = parse_anchor_tx(bytes.fromhex(anchor["tx"]))
+        if check.txid != txid:
+            raise ConsignmentError(f"anchor {txid} does not hash to its TXID")
+        vout = anchor["vout"]
+        if vout >= len(check.outputs) or check.outputs[vout][1][:2] != b"\x51\x20":
+            raise ConsignmentError(f"anchor {txid}:{vout} is not a Taproot output")
+        proof = TapretProof(
+            bytes.fromhex(anchor["internal_key"]),
+            bytes.fromhex(anchor["partner"]) if anchor["partner"] else None,
+            anchor["nonce"],
+        )
+        if not verify_commitment(check.outputs[vout][1][2:], bytes.fromhex(anchor["mpc_root"]), proof):
+            raise ConsignmentError(f"anchor {txid}:{vout} does not commit to its MPC root")
+        return check
+
+    def validate(self, consignment):
+        """
+        Walk the consignment from genesis and return the final state.
+
+        Returns:
+            dict: {seal "txid:vout": amount} of unspent assignments
+
+        Raises:
+            ConsignmentError: on any broken commitment, seal or balance
+        """
+        genesis = consignment["genesis"]
+        cid = contract_id(genesis)
+        state = {}
+        for assignment in genesis["assignments"]:
+            seal = assignment["seal"]
+            self._assign(state, f"{seal['txid']}:{seal['vout']}", assignment["amount"])
+        if sum(state.values()) != genesis["supply"]:
+            raise ConsignmentError("genesis assignments do not match the supply")
+
+        anchors = consignment["anchors"]
+        for bundle in consignment["bundles"]:
+            txid = bundle["anchor_txid"]
+            if txid not in anchors:
+                raise ConsignmentError(f"missing anchor {txid}")
+            anchor = anchors[txid]
+            check = self.check_anchor(txid, anchor)
+
+            transitions = bundle["transitions"]
+            bid = bundle_id(transitions)
+            key = (txid, cid, bid)
+            if key in self._bundles:
+                self.bundle_cache_hits += 1
+            else:
+                proof = [(bytes.fromhex(h), left) for h, left in bundle["mpc_proof"]]
+                if not mpc_verify(bytes.fromhex(anchor["mpc_root"]), cid, bid, proof):
+                    raise ConsignmentError(f"bundle not committed in anchor {txid}")
+                self._bundles.add(key)
+                self.bundles_verified += 1
+
+            for transition in transitions:
+                if transition["contract_id"] != cid.hex():
+                    raise ConsignmentError("transition belongs to another contract")
+                spent_amount = 0
+                for seal in transition["inputs"]:
+                    if seal not in state:
+                        raise ConsignmentError(f"seal {seal} is not owned state")
+                    if seal not in check.spent:
+                        raise ConsignmentError(f"seal {seal} is not closed by anchor {txid}")
+                    spent_amount += state.pop(seal)
+                assigned = 0
+                for assignment in transition["assignments"]:
+                    seal = assignment["seal"]
+                    self._assign(state, f"{seal.get('txid', txid)}:{seal['vout']}", assignment["amount"])
+                    assigned += assignment["amount"]
+                if assigned != spent_amount:
+                    raise ConsignmentError(f"transition in {txid} does not conserve the amount")
+        return state
+
+    @staticmethod
+    def _assign(state, seal, amount):
+        if seal in state:
+            raise ConsignmentError(f"seal {seal} is assigned twice")
+        state[seal] = amount
+
+    def validate_batch(self, consignments):
+        """
+        Validate many consignments, checking shared anchors once.
+
+        Every distinct anchor of the batch is verified first; the histories
+        are then walked against the cache.
+
+        Returns:
+            list: final state dict, or the ConsignmentError, per consignment
+        """
+        distinct = {}
+        for consignment in consignments:
+            for txid, anchor in consignment["anchors"].items():
+                distinct.setdefault(self._anchor_key(txid, anchor), (txid, anchor))
+        for txid, anchor in distinct.values():
+            try:
+                self.check_anchor(txid, anchor)
+            except ConsignmentError:
+                pass  # reported by the consignment that uses it
+
+        results = []
+        for consignment in consignments:
+            try:
+                results.append(self.validate(consignment))
+            except ConsignmentError as e:
+                results.append(e)
+        return results
+
+
+# ---------------------------------------------------------------------------
+# Building histories (fixtures and benchmarks)
+# ---------------------------------------------------------------------------
+
+class ConsignmentBuilder:
+    """
+    Issue a fungible contract and record transfers with Tapret anchors.
+
+    Each transfer spends the sender's seals in a new anchor transaction:
+    output 0 is the sender's change with the Tapret commitment, output 1 is
+    the recipient's BIP86 output. `other_protocols` dummy messages are
+    added to every MPC tree, standing in for other contracts anchored in
+    the same transaction.
+    """
+
+    def __init__(self, ticker, supply, owner_seckey, genesis_outpoint, other_protocols=3):
+        self.genesis = {
+            "ticker": ticker,
+            "supply": supply,
+            "assignments": [{"seal": {"txid": genesis_outpoint.split(":")[0],
+                                      "vout": int(genesis_outpoint.split(":")[1])},
+                             "amount": supply}],
+        }
+        self.contract_id = contract_id(self.genesis)
+        self.other_protocols = other_protocols
+        self.bundles = []
+        self.anchors = {}
+        # seal -> (amount, owner seckey)
+        self.state = {genesis_outpoint: (supply, owner_seckey)}
+
+    def owned(self, seckey):
+        """Seals and amounts owned by a key"""
+        return {seal: amount for seal, (amount, owner) in self.state.items() if owner == seckey}
+
+    def transfer(self, sender_seckey, recipient_seckey, amount, script_root=None):
+        """
+        Move `amount` from the sender's seals to a new output of the recipient.
+
+        Returns:
+            str: anchor TXID
+        """
+        owned = self.owned(sender_seckey)
+        inputs, total = [], 0
+        for seal, value in sorted(owned.items()):
+            inputs.append(seal)
+            total += value
+            if total >= amount:
+                break
+        if total < amount:
+            raise ValueError("insufficient balance")
+
+        assignments = [{"seal": {"vout": 1}, "amount": amount}]
+        if total > amount:
+            assignments.append({"seal": {"vout": 0}, "amount": total - amount})
+        transition = {"contract_id": self.contract_id.hex(), "inputs": inputs, "assignments": assignments}
+        bid = bundle_id([transition])
+
+        messages = {self.contract_id: bid}
+        step = len(self.bundles).to_bytes(4, "big")
+        for k in range(self.other_protocols):
+            pid = tagged_hash("fixture:protocol", bytes([k]))
+            messages[pid] = tagged_hash("fixture:message", pid + step)
+        mpc_root, proofs = mpc_commit(messages)
+
+        sender_key = xonly_pubkey(sender_seckey)
+        output_key, proof = embed_commitment(sender_key, mpc_root, script_root)
+        recipient_key = taproot_output_key(xonly_pubkey(recipient_seckey), b"")
+        raw, txid = build_anchor_tx(inputs, [
+            (1000, b"\x51\x20" + output_key),
+            (1000, b"\x51\x20" + recipient_key),
+        ])
+
+        self.anchors[txid] = {
+            "tx": raw.hex(),
+            "vout": 0,
+            "internal_key": proof.internal_key.hex(),
+            "partner": proof.partner.hex() if proof.partner else None,
+            "nonce": proof.nonce,
+            "mpc_root": mpc_root.hex(),
+        }
+        self.bundles.append({
+            "anchor_txid": txid,
+            "transitions": [transition],
+            "mpc_proof": [[h.hex(), left] for h, left in proofs[self.contract_id]],
+        })
+        for seal in inputs:
+            del self.state[seal]
+        self.state[f"{txid}:1"] = (amount, recipient_seckey)
+        if total > amount:
+            self.state[f"{txid}:0"] = (total - amount, sender_seckey)
+        return txid
+
+    def consignment(self, upto=None):
+        """Consignment with the history up to bundle `upto` (all by default)"""
+        bundles = self.bundles[:upto]
+        return {
+            "genesis": self.genesis,
+            "bundles": bundles,
+            "anchors": {b["anchor_txid"]: self.anchors[b["anchor_txid"]] for b in bundles},
+        }
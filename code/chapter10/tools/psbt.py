@@ -0,0 +1,871 @@
+#!/usr/bin/env python3
+"""
+Partially Signed Bitcoin Transactions (BIP174 / BIP370) with Taproot Fields
+
+The RGB workflow of this chapter passes PSBTs between wallets: the sender
+builds one, each signer adds signatures, and someone combines and
+finalizes them. This module reads and writes PSBT version 0 (BIP174) and
+version 2 (BIP370), including the BIP371 Taproot fields:
+
+- inputs: tap_key_sig, tap_script_sig, tap_leaf_script,
+  tap_bip32_derivation, tap_internal_key, tap_merkle_root
+- outputs: tap_internal_key, tap_tree, tap_bip32_derivation
+
+Parsing is lazy. A PSBT is indexed by walking the key/value length prefixes
+of its maps; values stay as slices of the source buffer (bytes, or an mmap
+of a file) until a field is read or changed. Only the maps up to the one
+requested are indexed.
+
+combine_stream() combines any number of PSBTs of the same transaction and
+can finalize them in the same single pass. It advances one cursor per PSBT
+map by map, merges the raw entries of one map at a time, and yields the
+output in pieces. No PSBT is decoded as a whole.
+
+The finalizer handles Taproot key path spends, and script path leaves made
+of signature checks only: <pk> CHECKSIG, <pk> CHECKSIGVERIFY chains and
+CHECKSIGADD thresholds in both the BIP342 form and the OP_0-first form of
+Chapter 8. It also handles P2WPKH. Signatures are not verified; run the
+extracted transaction through a validator for that.
+"""
+
+import base64
+import hashlib
+import struct
+from collections import namedtuple
+from functools import lru_cache
+
+PSBT_MAGIC = b"psbt\xff"
+
+# Global map
+PSBT_GLOBAL_UNSIGNED_TX = 0x00
+PSBT_GLOBAL_XPUB = 0x01
+PSBT_GLOBAL_TX_VERSION = 0x02
+PSBT_GLOBAL_FALLBACK_LOCKTIME = 0x03
+PSBT_GLOBAL_INPUT_COUNT = 0x04
+PSBT_GLOBAL_OUTPUT_COUNT = 0x05
+PSBT_GLOBAL_TX_MODIFIABLE = 0x06
+PSBT_GLOBAL_VERSION = 0xfb
+
+# Input maps
+PSBT_IN_NON_WITNESS_UTXO = 0x00
+PSBT_IN_WITNESS_UTXO = 0x01
+PSBT_IN_PARTIAL_SIG = 0x02
+PSBT_IN_SIGHASH_TYPE = 0x03
+PSBT_IN_REDEEM_SCRIPT = 0x04
+PSBT_IN_WITNESS_SCRIPT = 0x05
+PSBT_IN_BIP32_DERIVATION = 0x06
+PSBT_IN_FINAL_SCRIPTSIG = 0x07
+PSBT_IN_FINAL_SCRIPTWITNESS = 0x08
+PSBT_IN_RIPEMD160 = 0x0a
+PSBT_IN_SHA256 = 0x0b
+PSBT_IN_HASH160 = 0x0c
+PSBT_IN_HASH256 = 0x0d
+PSBT_IN_PREVIOUS_TXID = 0x0e
+PSBT_IN_OUTPUT_INDEX = 0x0f
+PSBT_IN_SEQUENCE = 0x10
+PSBT_IN_REQUIRED_TIME_LOCKTIME = 0x11
+PSBT_IN_REQUIRED_HEIGHT_LOCKTIME = 0x12
+PSBT_IN_TAP_KEY_SIG = 0x13
+PSBT_IN_TAP_SCRIPT_SIG = 0x14
+PSBT_IN_TAP_LEAF_SCRIPT = 0x15
+PSBT_IN_TAP_BIP32_DERIVATION = 0x16
+PSBT_IN_TAP_INTERNAL_KEY = 0x17
+PSBT_IN_TAP_MERKLE_ROOT = 0x18
+
+# Output maps
+PSBT_OUT_REDEEM_SCRIPT = 0x00
+PSBT_OUT_WITNESS_SCRIPT = 0x01
+PSBT_OUT_BIP32_DERIVATION = 0x02
+PSBT_OUT_AMOUNT = 0x03
+PSBT_OUT_SCRIPT = 0x04
+PSBT_OUT_TAP_INTERNAL_KEY = 0x05
+PSBT_OUT_TAP_TREE = 0x06
+PSBT_OUT_TAP_BIP32_DERIVATION = 0x07
+
+LEAF_VERSION_TAPSCRIPT = 0xc0
+SEQUENCE_FINAL = 0xffffffff
+LOCKTIME_THRESHOLD = 500000000
+
+# Input fields a finalizer removes (BIP174: keep UTXOs, final scripts and unknown fields;
+# BIP370 inputs also keep what defines the transaction)
+_CLEARED_ON_FINALIZE = frozenset([
+    PSBT_IN_PARTIAL_SIG, PSBT_IN_SIGHASH_TYPE, PSBT_IN_REDEEM_SCRIPT, PSBT_IN_WITNESS_SCRIPT,
+    PSBT_IN_BIP32_DERIVATION, PSBT_IN_RIPEMD160, PSBT_IN_SHA256, PSBT_IN_HASH160,
+    PSBT_IN_HASH256, PSBT_IN_TAP_KEY_SIG, PSBT_IN_TAP_SCRIPT_SIG, PSBT_IN_TAP_LEAF_SCRIPT,
+    PSBT_IN_TAP_BIP32_DERIVATION, PSBT_IN_TAP_INTERNAL_KEY, PSBT_IN_TAP_MERKLE_ROOT,
+])
+
+TxIn = namedtuple("TxIn", ["txid", "vout", "script_sig", "sequence"])
+TxOut = namedtuple("TxOut", ["amount", "script_pubkey"])
+UnsignedTx = namedtuple("UnsignedTx", ["version", "inputs", "outputs", "locktime"])
+TapDerivation = namedtuple("TapDerivation", ["leaf_hashes", "fingerprint", "path"])
+
+
+class PSBTError(Exception):
+    """Raised for malformed PSBTs and PSBTs that cannot be combined."""
+
+
+# ---------------------------------------------------------------------------
+# Serialization helpers
+# ---------------------------------------------------------------------------
+
+def compact_size(n):
+    if n < 0xfd:
+        return bytes([n])
+    if n <= 0xffff:
+        return b"\xfd" + struct.pack("<H", n)
+    if n <= 0xffffffff:
+        return b"\xfe" + struct.pack("<I", n)
+    return b"\xff" + struct.pack("<Q", n)
+
+
+def read_compact_size(data, offset):
+    first = data[offset]
+    if first < 0xfd:
+        return first, offset + 1
+    if first == 0xfd:
+        return struct.unpack_from("<H", data, offset + 1)[0], offset + 3
+    if first == 0xfe:
+        return struct.unpack_from("<I", data, offset + 1)[0], offset + 5
+    return struct.unpack_from("<Q", data, offset + 1)[0], offset + 9
+
+
+def tagged_hash(tag, data):
+    """BIP340 Tagged Hash function"""
+    tag_hash = hashlib.sha256(tag.encode()).digest()
+    return hashlib.sha256(tag_hash + tag_hash + data).digest()
+
+
+def tapleaf_hash(script, leaf_version=LEAF_VERSION_TAPSCRIPT):
+    return tagged_hash("TapLeaf", bytes([leaf_version]) + compact_size(len(script)) + script)
+
+
+def parse_unsigned_tx(raw):
+    """Parse a transaction without witnesses (PSBT_GLOBAL_UNSIGNED_TX)"""
+    version = struct.unpack_from("<i", raw, 0)[0]
+    count, offset = read_compact_size(raw, 4)
+    inputs = []
+    for _ in range(count):
+        txid = bytes(raw[offset:offset + 32])
+        vout = struct.unpack_from("<I", raw, offset + 32)[0]
+        length, offset = read_compact_size(raw, offset + 36)
+        script_sig = bytes(raw[offset:offset + length])
+        sequence = struct.unpack_from("<I", raw, offset + length)[0]
+        offset += length + 4
+        inputs.append(TxIn(txid, vout, script_sig, sequence))
+    count, offset = read_compact_size(raw, offset)
+    outputs = []
+    for _ in range(count):
+        amount = struct.unpack_from("<q", raw, offset)[0]
+        length, offset = read_compact_size(raw, offset + 8)
+        outputs.append(TxOut(amount, bytes(raw[offset:offset + length])))
+        offset += length
+    locktime = struct.unpack_from("<I", raw, offset)[0]
+    if offset + 4 != len(raw):
+        raise PSBTError("unsigned transaction has trailing data (or witnesses)")
+    return UnsignedTx(version, inputs, outputs, locktime)
+
+
+def serialize_tx(tx, script_sigs=None, witnesses=None):
+    """Network serialization; witnesses is a list of item lists (or None per input)"""
+    parts = [struct.pack("<i", tx.version)]
+    has_witness = witnesses is not None and any(witnesses)
+    if has_witness:
+        parts.append(b"\x00\x01")
+    parts.append(compact_size(len(tx.inputs)))
+    for i, txin in enumerate(tx.inputs):
+        script_sig = script_sigs[i] if script_sigs and script_sigs[i] is not None else txin.script_sig
+        parts += [txin.txid, struct.pack("<I", txin.vout), compact_size(len(script_sig)), script_sig,
+                  struct.pack("<I", txin.sequence)]
+    parts.append(compact_size(len(tx.outputs)))
+    for txout in tx.outputs:
+        parts += [struct.pack("<q", txout.amount), compact_size(len(txout.script_pubkey)), txout.script_pubkey]
+    if has_witness:
+        for items in witnesses:
+            parts.append(serialize_witness(items or []))
+    parts.append(struct.pack("<I", tx.locktime))
+    return b"".join(parts)
+
+
+def serialize_witness(items):
+    parts = [compact_size(len(items))]
+    for item in items:
+        parts += [compact_size(len(item)), item]
+    return b"".join(parts)
+
+
+def parse_witness(data):
+    count, offset = read_compact_size(data, 0)
+    items = []
+    for _ in range(count):
+        length, offset = read_compact_size(data, offset)
+        items.append(bytes(data[offset:offset + length]))
+        offset += length
+    return items
+
+
+# ---------------------------------------------------------------------------
+# Key-value maps
+# ---------------------------------------------------------------------------
+
+def scan_map(buf, offset):
+    """
+    Walk one map's length prefixes without copying anything.
+
+    Returns:
+        ([(key_start, key_end, value_start, value_end)], offset after the 0x00 separator)
+    """
+    spans = []
+    size = len(buf)
+    while True:
+        key_len = buf[offset]
+        if key_len >= 0xfd:
+            key_len, offset = read_compact_size(buf, offset)
+        else:
+            offset += 1
+        if key_len == 0:
+            return spans, offset
+        key_end = offset + key_len
+        value_len = buf[key_end]
+        if value_len >= 0xfd:
+            value_len, value_start = read_compact_size(buf, key_end)
+        else:
+            value_start = key_end + 1
+        spans.append((offset, key_end, value_start, value_start + value_len))
+        offset = value_start + value_len
+        if offset > size:
+            raise PSBTError("map runs past the end of the PSBT")
+
+
+def key_type(key):
+    return key[0] if key[0] < 0xfd else read_compact_size(key, 0)[0]
+
+
+def serialize_entries(entries):
+    """Map bytes for (key, value) pairs, including the 0x00 separator"""
+    parts = []
+    for key, value in entries:
+        parts += [compact_size(len(key)), key, compact_size(len(value)), value]
+    parts.append(b"\x00")
+    return b"".join(parts)
+
+
+class PSBTMap:
+    """
+    One key-value map. Keys are full keys (type byte + key data).
+
+    Built from spans of a source buffer, it materializes nothing until an
+    entry is read; raw_entries() hands out memoryview slices.
+    """
+
+    def __init__(self, buf=None, spans=(), entries=None):
+        self._buf = buf
+        self._spans = spans
+        self._entries = entries if entries is not None or buf is not None else {}
+
+    @property
+    def entries(self):
+        """{key: value}; decoded from the source buffer on first use"""
+        if self._entries is None:
+            buf = self._buf
+            self._entries = {bytes(buf[ks:ke]): buf[vs:ve] for ks, ke, vs, ve in self._spans}
+            self._buf = self._spans = None
+        return self._entries
+
+    def raw_entries(self):
+        """(key, value) pairs as buffer slices, without building the dict"""
+        if self._entries is not None:
+            return list(self._entries.items())
+        buf = self._buf
+        return [(buf[ks:ke], buf[vs:ve]) for ks, ke, vs, ve in self._spans]
+
+    def __len__(self):
+        return len(self._spans) if self._entries is None else len(self._entries)
+
+    def get(self, type_, keydata=b""):
+        value = self.entries.get(bytes([type_]) + keydata)
+        return bytes(value) if value is not None else None
+
+    def set(self, type_, value, keydata=b""):
+        self.entries[bytes([type_]) + keydata] = value
+
+    def remove(self, type_, keydata=b""):
+        self.entries.pop(bytes([type_]) + keydata, None)
+
+    def of_type(self, type_):
+        """[(key data, value)] of every entry with this type"""
+        return [(key[1:], bytes(value)) for key, value in self.entries.items() if key_type(key) == type_]
+
+    def serialize(self):
+        return serialize_entries(self.raw_entries())
+
+
+class PSBTInput(PSBTMap):
+    """Input map with typed accessors for the segwit and BIP371 Taproot fields"""
+
+    @property
+    def witness_utxo(self):
+        value = self.get(PSBT_IN_WITNESS_UTXO)
+        if value is None:
+            return None
+        length, offset = read_compact_size(value, 8)
+        return TxOut(struct.unpack_from("<q", value, 0)[0], value[offset:offset + length])
+
+    @witness_utxo.setter
+    def witness_utxo(self, txout):
+        amount, script_pubkey = txout
+        self.set(PSBT_IN_WITNESS_UTXO, struct.pack("<q", amount) + compact_size(len(script_pubkey))
+                 + script_pubkey)
+
+    @property
+    def tap_key_sig(self):
+        return self.get(PSBT_IN_TAP_KEY_SIG)
+
+    @tap_key_sig.setter
+    def tap_key_sig(self, sig):
+        self.set(PSBT_IN_TAP_KEY_SIG, sig)
+
+    @property
+    def tap_internal_key(self):
+        return self.get(PSBT_IN_TAP_INTERNAL_KEY)
+
+    @tap_internal_key.setter
+    def tap_internal_key(self, key):
+        self.set(PSBT_IN_TAP_INTERNAL_KEY, key)
+
+    @property
+    def tap_merkle_root(self):
+        return self.get(PSBT_IN_TAP_MERKLE_ROOT)
+
+    @tap_merkle_root.setter
+    def tap_merkle_root(self, root):
+        self.set(PSBT_IN_TAP_MERKLE_ROOT, root)
+
+    def tap_script_sigs(self):
+        """{(x-only pubkey, leaf hash): signature}"""
+        return {(keydata[:32], keydata[32:]): sig for keydata, sig in self.of_type(PSBT_IN_TAP_SCRIPT_SIG)}
+
+    def add_tap_script_sig(self, pubkey, leaf_hash, sig):
+        self.set(PSBT_IN_TAP_SCRIPT_SIG, sig, pubkey + leaf_hash)
+
+    def tap_leaf_scripts(self):
+        """{control block: (script, leaf version)}"""
+        return {control: (value[:-1], value[-1]) for control, value in self.of_type(PSBT_IN_TAP_LEAF_SCRIPT)}
+
+    def add_tap_leaf_script(self, control_block, script, leaf_version=LEAF_VERSION_TAPSCRIPT):
+        self.set(PSBT_IN_TAP_LEAF_SCRIPT, script + bytes([leaf_version]), control_block)
+
+    def tap_bip32_derivations(self):
+        return {pubkey: decode_tap_derivation(value)
+                for pubkey, value in self.of_type(PSBT_IN_TAP_BIP32_DERIVATION)}
+
+    def add_tap_bip32_derivation(self, pubkey, leaf_hashes, fingerprint, path):
+        self.set(PSBT_IN_TAP_BIP32_DERIVATION, encode_tap_derivation(leaf_hashes, fingerprint, path), pubkey)
+
+    def partial_sigs(self):
+        return dict(self.of_type(PSBT_IN_PARTIAL_SIG))
+
+    @property
+    def final_script_witness(self):
+        value = self.get(PSBT_IN_FINAL_SCRIPTWITNESS)
+        return parse_witness(value) if value is not None else None
+
+    @property
+    def is_final(self):
+        entries = self.entries
+        return (bytes([PSBT_IN_FINAL_SCRIPTWITNESS]) in entries
+                or bytes([PSBT_IN_FINAL_SCRIPTSIG]) in entries)
+
+
+class PSBTOutput(PSBTMap):
+    """Output map with typed accessors for the BIP371 Taproot fields"""
+
+    @property
+    def tap_internal_key(self):
+        return self.get(PSBT_OUT_TAP_INTERNAL_KEY)
+
+    @tap_internal_key.setter
+    def tap_internal_key(self, key):
+        self.set(PSBT_OUT_TAP_INTERNAL_KEY, key)
+
+    @property
+    def tap_tree(self):
+        """[(depth, leaf version, script)] in depth-first order, or None"""
+        value = self.get(PSBT_OUT_TAP_TREE)
+        if value is None:
+            return None
+        leaves = []
+        offset = 0
+        while offset < len(value):
+            depth, leaf_version = value[offset], value[offset + 1]
+            length, offset = read_compact_size(value, offset + 2)
+            leaves.append((depth, leaf_version, value[offset:offset + length]))
+            offset += length
+        return leaves
+
+    @tap_tree.setter
+    def tap_tree(self, leaves):
+        self.set(PSBT_OUT_TAP_TREE, b"".join(
+            bytes([depth, leaf_version]) + compact_size(len(script)) + script
+            for depth, leaf_version, script in leaves))
+
+    def tap_bip32_derivations(self):
+        return {pubkey: decode_tap_derivation(value)
+                for pubkey, value in self.of_type(PSBT_OUT_TAP_BIP32_DERIVATION)}
+
+    def add_tap_bip32_derivation(self, pubkey, leaf_hashes, fingerprint, path):
+        self.set(PSBT_OUT_TAP_BIP32_DERIVATION, encode_tap_derivation(leaf_hashes, fingerprint, path), pubkey)
+
+
+def encode_tap_derivation(leaf_hashes, fingerprint, path):
+    return (compact_size(len(leaf_hashes)) + b"".join(leaf_hashes) + fingerprint
+            + b"".join(struct.pack("<I", index) for index in path))
+
+
+def decode_tap_derivation(value):
+    count, offset = read_compact_size(value, 0)
+    leaf_hashes = [value[offset + 32 * i:offset + 32 * (i + 1)] for i in range(count)]
+    offset += 32 * count
+    fingerprint = value[offset:offset + 4]
+    path = list(struct.unpack_from(f"<{(len(value) - offset - 4) // 4}I", value, offset + 4))
+    return TapDerivation(leaf_hashes, fingerprint, path)
+
+
+# ---------------------------------------------------------------------------
+# PSBT
+# ---------------------------------------------------------------------------
+
+def _as_buffer(data):
+    if isinstance(data, str):
+        data = base64.b64decode(data)
+    buf = memoryview(data)
+    if bytes(buf[:5]) != PSBT_MAGIC:
+        raise PSBTError("missing PSBT magic bytes")
+    return buf
+
+
+def _counts(global_map):
+    """(PSBT version, input count, output count) from a global map"""
+    version_value = global_map.get(PSBT_GLOBAL_VERSION)
+    version = struct.unpack("<I", version_value)[0] if version_value else 0
+    if version == 0:
+        raw_tx = global_map.get(PSBT_GLOBAL_UNSIGNED_TX)
+        if raw_tx is None:
+            raise PSBTError("version 0 PSBT without an unsigned transaction")
+        tx = parse_unsigned_tx(raw_tx)
+        return version, len(tx.inputs), len(tx.outputs)
+    if version == 2:
+        inputs = global_map.get(PSBT_GLOBAL_INPUT_COUNT)
+        outputs = global_map.get(PSBT_GLOBAL_OUTPUT_COUNT)
+        if inputs is None or outputs is None or global_map.get(PSBT_GLOBAL_TX_VERSION) is None:
+            raise PSBTError("version 2 PSBT without tx version or input / output counts")
+        return version, read_compact_size(inputs, 0)[0], read_compact_size(outputs, 0)[0]
+    raise PSBTError(f"unsupported PSBT version {version}")
+
+
+class PSBT:
+    """
+    A PSBT over a buffer (bytes, bytearray, mmap or base64 string).
+
+    Maps are indexed on first access, in order: reading input 3 scans the
+    global map and the maps of inputs 0-3, nothing after.
+    """
+
+    def __init__(self, data=None):
+        if data is None:
+            return  # built by from_unsigned_tx()
+        self._buf = _as_buffer(data)
+        spans, self._offset = scan_map(self._buf, len(PSBT_MAGIC))
+        self.global_map = PSBTMap(self._buf, spans)
+        self.version, self.input_count, self.output_count = _counts(self.global_map)
+        self._inputs = []
+        self._outputs = []
+
+    @classmethod
+    def from_unsigned_tx(cls, raw_tx, version=0):
+        """Empty PSBT (version 0 or 2) for an unsigned transaction"""
+        tx = parse_unsigned_tx(raw_tx)
+        psbt = cls()
+        psbt._buf = None
+        psbt.version = version
+        psbt.input_count, psbt.output_count = len(tx.inputs), len(tx.outputs)
+        psbt.global_map = PSBTMap()
+        psbt._inputs = [PSBTInput() for _ in tx.inputs]
+        psbt._outputs = [PSBTOutput() for _ in tx.outputs]
+        if version == 0:
+            psbt.global_map.set(PSBT_GLOBAL_UNSIGNED_TX, bytes(raw_tx))
+            return psbt
+        if version != 2:
+            raise PSBTError(f"unsupported PSBT version {version}")
+        g = psbt.global_map
+        g.set(PSBT_GLOBAL_TX_VERSION, struct.pack("<i", tx.version))
+        g.set(PSBT_GLOBAL_FALLBACK_LOCKTIME, struct.pack("<I", tx.locktime))
+        g.set(PSBT_GLOBAL_INPUT_COUNT, compact_size(len(tx.inputs)))
+        g.set(PSBT_GLOBAL_OUTPUT_COUNT, compact_size(len(tx.outputs)))
+        g.set(PSBT_GLOBAL_VERSION, struct.pack("<I", 2))
+        for txin, psbt_in in zip(tx.inputs, psbt._inputs):
+            psbt_in.set(PSBT_IN_PREVIOUS_TXID, txin.txid)
+            psbt_in.set(PSBT_IN_OUTPUT_INDEX, struct.pack("<I", txin.vout))
+            psbt_in.set(PSBT_IN_SEQUENCE, struct.pack("<I", txin.sequence))
+        for txout, psbt_out in zip(tx.outputs, psbt._outputs):
+            psbt_out.set(PSBT_OUT_AMOUNT, struct.pack("<q", txout.amount))
+            psbt_out.set(PSBT_OUT_SCRIPT, txout.script_pubkey)
+        return psbt
+
+    # ===== Lazy map access =====
+
+    def _index_to(self, maps, cls, count, index):
+        while len(maps) <= index:
+            if len(maps) >= count:
+                raise IndexError(index)
+            if maps is self._outputs and len(self._inputs) < self.input_count:
+                self._index_to(self._inputs, PSBTInput, self.input_count, self.input_count - 1)
+            spans, self._offset = scan_map(self._buf, self._offset)
+            maps.append(cls(self._buf, spans))
+        return maps[index]
+
+    def input(self, index):
+        return self._index_to(self._inputs, PSBTInput, self.input_count, index)
+
+    def output(self, index):
+        return self._index_to(self._outputs, PSBTOutput, self.output_count, index)
+
+    @property
+    def inputs(self):
+        return [self.input(i) for i in range(self.input_count)]
+
+    @property
+    def outputs(self):
+        return [self.output(i) for i in range(self.output_count)]
+
+    # ===== Transaction =====
+
+    def unsigned_tx(self):
+        """UnsignedTx the PSBT is about (rebuilt from the per-map fields in version 2)"""
+        if self.version == 0:
+            return parse_unsigned_tx(self.global_map.get(PSBT_GLOBAL_UNSIGNED_TX))
+        inputs = []
+        for psbt_in in self.inputs:
+            sequence = psbt_in.get(PSBT_IN_SEQUENCE)
+            inputs.append(TxIn(psbt_in.get(PSBT_IN_PREVIOUS_TXID),
+                               struct.unpack("<I", psbt_in.get(PSBT_IN_OUTPUT_INDEX))[0], b"",
+                               struct.unpack("<I", sequence)[0] if sequence else SEQUENCE_FINAL))
+        outputs = [TxOut(struct.unpack("<q", o.get(PSBT_OUT_AMOUNT))[0], o.get(PSBT_OUT_SCRIPT))
+                   for o in self.outputs]
+        version = struct.unpack("<i", self.global_map.get(PSBT_GLOBAL_TX_VERSION))[0]
+        return UnsignedTx(version, inputs, outputs, self._v2_locktime())
+
+    def _v2_locktime(self):
+        """BIP370 locktime: the required locktimes if any input has one, else the fallback"""
+        heights, times = [], []
+        any_required = False
+        for psbt_in in self.inputs:
+            height = psbt_in.get(PSBT_IN_REQUIRED_HEIGHT_LOCKTIME)
+            time = psbt_in.get(PSBT_IN_REQUIRED_TIME_LOCKTIME)
+            if height is None and time is None:
+                continue
+            any_required = True
+            if height is not None:
+                heights.append(struct.unpack("<I", height)[0])
+            if time is not None:
+                times.append(struct.unpack("<I", time)[0])
+        if not any_required:
+            fallback = self.global_map.get(PSBT_GLOBAL_FALLBACK_LOCKTIME)
+            return struct.unpack("<I", fallback)[0] if fallback else 0
+        # Height-based wins whenever every constrained input supports it
+        if all(psbt_in.get(PSBT_IN_REQUIRED_HEIGHT_LOCKTIME) is not None
+               or psbt_in.get(PSBT_IN_REQUIRED_TIME_LOCKTIME) is None for psbt_in in self.inputs):
+            return max(heights)
+        return max(times)
+
+    def unique_id(self):
+        """BIP370 unique id: TXID of the unsigned transaction with every nSequence set to 0"""
+        tx = self.unsigned_tx()
+        tx = tx._replace(inputs=[txin._replace(sequence=0) for txin in tx.inputs])
+        return hashlib.sha256(hashlib.sha256(serialize_tx(tx)).digest()).digest()[::-1].hex()
+
+    # ===== Roles =====
+
+    def finalize(self):
+        """Finalize every input that can be; returns the number of final inputs"""
+        finalized = 0
+        for psbt_in in self.inputs:
+            finalized += finalize_input(psbt_in.entries)
+        return finalized
+
+    def extract(self):
+        """Network transaction; every input must be final"""
+        tx = self.unsigned_tx()
+        script_sigs, witnesses = [], []
+        for index, psbt_in in enumerate(self.inputs):
+            if not psbt_in.is_final:
+                raise PSBTError(f"input {index} is not finalized")
+            script_sigs.append(psbt_in.get(PSBT_IN_FINAL_SCRIPTSIG))
+            witnesses.append(psbt_in.final_script_witness)
+        return serialize_tx(tx, script_sigs, witnesses)
+
+    # ===== Serialization =====
+
+    def iter_serialize(self):
+        yield PSBT_MAGIC + self.global_map.serialize()
+        for psbt_in in self.inputs:
+            yield psbt_in.serialize()
+        for psbt_out in self.outputs:
+            yield psbt_out.serialize()
+
+    def serialize(self):
+        return b"".join(self.iter_serialize())
+
+    def to_base64(self):
+        return base64.b64encode(self.serialize()).decode()
+
+
+# ---------------------------------------------------------------------------
+# Finalizer
+# ---------------------------------------------------------------------------
+
+OP_0 = 0x00
+OP_EQUAL = 0x87
+OP_NUMEQUAL = 0x9c
+OP_CHECKSIG = 0xac
+OP_CHECKSIGVERIFY = 0xad
+OP_CHECKSIGADD = 0xba
+
+_TAP_KEY_SIG = bytes([PSBT_IN_TAP_KEY_SIG])
+_WITNESS_UTXO = bytes([PSBT_IN_WITNESS_UTXO])
+_FINAL_SCRIPTSIG = bytes([PSBT_IN_FINAL_SCRIPTSIG])
+_FINAL_SCRIPTWITNESS = bytes([PSBT_IN_FINAL_SCRIPTWITNESS])
+
+
+def _signature_leaf(script):
+    """
+    (threshold, keys) for a leaf made of signature checks only, else None:
+    <pk> CHECKSIG, <pk> CHECKSIGVERIFY ... <pk> CHECKSIG (all keys),
+    [OP_0] <pk> CHECKSIG(ADD) ... <k> NUMEQUAL / EQUAL (k of the keys).
+    """
+    script = bytes(script)
+    offset = 1 if script[:1] == bytes([OP_0]) else 0
+    counter = offset == 1
+    keys = []
+    ops = []
+    while offset + 34 <= len(script) and script[offset] == 0x20:
+        keys.append(script[offset + 1:offset + 33])
+        ops.append(script[offset + 33])
+        offset += 34
+    rest = script[offset:]
+    if not keys:
+        return None
+    if not rest:
+        if ops[-1] == OP_CHECKSIG and all(op == OP_CHECKSIGVERIFY for op in ops[:-1]) and not counter:
+            return len(keys), keys
+        return None
+    first = OP_CHECKSIGADD if counter else OP_CHECKSIG
+    if ops[0] != first or any(op != OP_CHECKSIGADD for op in ops[1:]):
+        return None
+    if len(rest) == 2 and 0x51 <= rest[0] <= 0x60:
+        k = rest[0] - 0x50
+    elif len(rest) >= 3 and rest[0] == len(rest) - 2:
+        k = int.from_bytes(rest[1:-1], "little")
+    else:
+        return None
+    if rest[-1] not in (OP_NUMEQUAL, OP_EQUAL):
+        return None
+    return k, keys
+
+
+@lru_cache(maxsize=1024)
+def _leaf_template(script, leaf_version):
+    """(threshold, keys, leaf hash) of a signature-only leaf, else None; the leaves repeat across inputs"""
+    if leaf_version != LEAF_VERSION_TAPSCRIPT:
+        return None
+    shape = _signature_leaf(script)
+    if shape is None:
+        return None
+    return shape[0], shape[1], tapleaf_hash(script, leaf_version)
+
+
+def _taproot_witness(entries):
+    """Cheapest complete Taproot witness from the signatures in an input map, or None"""
+    key_sig = entries.get(_TAP_KEY_SIG)
+    if key_sig is not None:
+        return [bytes(key_sig)]
+    script_sigs = {}
+    leaves = []
+    for key, value in entries.items():
+        kind = key[0]
+        if kind == PSBT_IN_TAP_SCRIPT_SIG:
+            script_sigs[key[1:]] = value
+        elif kind == PSBT_IN_TAP_LEAF_SCRIPT:
+            leaves.append((key[1:], value))
+    best = None
+    best_size = None
+    for control, value in leaves:
+        script = bytes(value[:-1])
+        template = _leaf_template(script, value[-1])
+        if template is None:
+            continue
+        k, keys, leaf_hash = template
+        sigs = [script_sigs.get(pubkey + leaf_hash) for pubkey in keys]
+        if len(sigs) - sigs.count(None) < k:
+            continue
+        # Exactly k signatures: extra valid ones would push a CHECKSIGADD count past k
+        used = 0
+        stack = []
+        for sig in sigs:
+            if sig is not None and used < k:
+                stack.append(bytes(sig))
+                used += 1
+            else:
+                stack.append(b"")
+        stack.reverse()  # the first key's check consumes the top item
+        witness = stack + [script, control]
+        size = len(serialize_witness(witness))
+        if best is None or size < best_size:
+            best, best_size = witness, size
+    return best
+
+
+def finalize_input(entries):
+    """
+    Finalize one input map ({key: value}) in place. Returns True if the
+    input is final afterwards.
+    """
+    if _FINAL_SCRIPTWITNESS in entries or _FINAL_SCRIPTSIG in entries:
+        return True
+    utxo = entries.get(_WITNESS_UTXO)
+    if utxo is None:
+        return False
+    length, offset = read_compact_size(utxo, 8)
+    script_pubkey = bytes(utxo[offset:offset + length])
+    witness = None
+    if len(script_pubkey) == 34 and script_pubkey[:2] == b"\x51\x20":
+        witness = _taproot_witness(entries)
+    elif len(script_pubkey) == 22 and script_pubkey[:2] == b"\x00\x14":
+        for key, sig in entries.items():
+            if key[0] == PSBT_IN_PARTIAL_SIG and len(key) == 34:
+                witness = [bytes(sig), bytes(key[1:])]
+                break
+    if witness is None:
+        return False
+    for key in [key for key in entries if key[0] in _CLEARED_ON_FINALIZE]:
+        del entries[key]
+    entries[_FINAL_SCRIPTWITNESS] = serialize_witness(witness)
+    return True
+
+
+# ---------------------------------------------------------------------------
+# Streaming combiner
+# ---------------------------------------------------------------------------
+
+class _Cursor:
+    """Reads one PSBT map after another"""
+
+    def __init__(self, data):
+        self.buf = _as_buffer(data)
+        self.offset = len(PSBT_MAGIC)
+
+    def next_map(self):
+        """(start, end before the 0x00 separator, [(key bytes, value slice)])"""
+        buf = self.buf
+        start = offset = self.offset
+        entries = []
+        while True:
+            key_len = buf[offset]
+            if key_len >= 0xfd:
+                key_len, offset = read_compact_size(buf, offset)
+            else:
+                offset += 1
+            if key_len == 0:
+                self.offset = offset
+                return start, offset - 1, entries
+            key_end = offset + key_len
+            value_len = buf[key_end]
+            if value_len >= 0xfd:
+                value_len, value_start = read_compact_size(buf, key_end)
+            else:
+                value_start = key_end + 1
+            end = value_start + value_len
+            if end > len(buf):
+                raise PSBTError("map runs past the end of the PSBT")
+            entries.append((buf[offset:key_end].tobytes(), buf[value_start:end]))
+            offset = end
+
+
+# Fields that must agree between copies: they define the transaction in version 2 maps
+_MUST_AGREE = {
+    "global": frozenset([bytes([PSBT_GLOBAL_UNSIGNED_TX]), bytes([PSBT_GLOBAL_TX_VERSION]),
+                         bytes([PSBT_GLOBAL_INPUT_COUNT]), bytes([PSBT_GLOBAL_OUTPUT_COUNT])]),
+    "input": frozenset([bytes([PSBT_IN_PREVIOUS_TXID]), bytes([PSBT_IN_OUTPUT_INDEX])]),
+    "output": frozenset([bytes([PSBT_OUT_AMOUNT]), bytes([PSBT_OUT_SCRIPT])]),
+}
+
+
+def _merge(maps, must_agree, what):
+    """
+    BIP174 combiner: union of the entries, the first PSBT winning a conflict.
+
+    Returns (merged {key: value}, entries the first PSBT lacks).
+    """
+    merged = dict(maps[0][2])
+    extra = []
+    for _, _, entries in maps[1:]:
+        for key, value in entries:
+            existing = merged.get(key)
+            if existing is None:
+                merged[key] = value
+                extra.append((key, value))
+            elif key in must_agree and existing != value:
+                raise PSBTError(f"{what} differs between the PSBTs")
+    return merged, extra
+
+
+def combine_stream(sources, finalize=False, stats=None):
+    """
+    Combine PSBTs of the same transaction, one map at a time.
+
+    The merged map keeps the first PSBT's entries in order, so a map no
+    other copy adds to (and that is not finalized) is copied through as
+    raw bytes.
+
+    Args:
+        sources: PSBT buffers (bytes, mmap, base64 strings)
+        finalize: also finalize each merged input before it is written
+        stats: optional dict; receives "inputs" and "finalized" counts
+
+    Yields:
+        pieces of the combined PSBT (b"".join() them or write them out)
+    """
+    cursors = [_Cursor(source) for source in sources]
+    if not cursors:
+        raise PSBTError("nothing to combine")
+    first = cursors[0].buf
+
+    def merged_map(kind, what, finalizing=False):
+        maps = [cursor.next_map() for cursor in cursors]
+        merged, extra = _merge(maps, _MUST_AGREE[kind], what)
+        if finalizing and finalize_input(merged):
+            return merged, serialize_entries(merged.items())
+        start, end, _ = maps[0]
+        if not extra:
+            return merged, first[start:end + 1]
+        return merged, first[start:end].tobytes() + serialize_entries(extra)
+
+    merged_global, piece = merged_map("global", "transaction")
+    version, input_count, output_count = _counts(PSBTMap(entries=merged_global))
+    yield PSBT_MAGIC + piece
+
+    finalized = 0
+    for index in range(input_count):
+        merged, piece = merged_map("input", f"input {index} outpoint", finalize)
+        finalized += _FINAL_SCRIPTWITNESS in merged or _FINAL_SCRIPTSIG in merged
+        yield piece
+    for index in range(output_count):
+        yield merged_map("output", f"output {index}")[1]
+    if stats is not None:
+        stats["inputs"] = input_count
+        stats["finalized"] = finalized
+
+
+def combine(sources, finalize=False):
+    """combine_stream() collected into bytes"""
+    return b"".join(combine_stream(sources, finalize))
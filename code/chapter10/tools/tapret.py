@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Tapret Commitments (LNPBP-12 style)
+
+Embeds a 32-byte commitment in a Taproot script tree as an unspendable
+64-byte leaf placed at depth 1, next to the root of the output's existing
+script tree (if any):
+
+    <OP_RESERVED x 29> OP_RETURN OP_PUSHBYTES_33 <commitment 32 bytes> <nonce 1 byte>
+
+The nonce is chosen so that the Tapret leaf hash sorts after its partner
+node, which makes it the right-most node of the tree: a verifier that sees
+the proof knows there is no second Tapret leaf hiding elsewhere.
+
+The commitment itself is the root of a multi-protocol commitment (MPC)
+Merkle tree, so one anchor transaction can commit to state transitions of
+several contracts; each contract gets a Merkle proof of its message. The
+leaf position is derived from the protocol id, so a proof cannot point at a
+second leaf for the same contract.
+
+This is a teaching model of RGB's structures: the leaf layout and Taproot
+hashing follow BIP341/LNPBP-12, the MPC tree uses simplified tags and is
+not byte-compatible with rgb-core.
+"""
+
+import hashlib
+from collections import namedtuple
+from functools import lru_cache
+
+from ecdsa import SECP256k1
+from ecdsa.ellipticcurve import PointJacobi
+
+G = SECP256k1.generator
+n = SECP256k1.order
+p = SECP256k1.curve.p()
+
+TAPRET_PREFIX = b"\x50" * 29 + b"\x6a\x21"
+TAPRET_SCRIPT_SIZE = 64
+LEAF_VERSION_TAPSCRIPT = 0xc0
+MPC_MAX_DEPTH = 32
+
+# internal_key: 32-byte x-only key; partner: root hash of the other scripts
+# (None for a key-only output); nonce: 0-255
+TapretProof = namedtuple("TapretProof", ["internal_key", "partner", "nonce"])
+
+
+class TapretError(Exception):
+    """Raised when a commitment cannot be embedded or a proof does not verify."""
+
+
+def tagged_hash(tag, data):
+    """BIP340 Tagged Hash function"""
+    tag_hash = hashlib.sha256(tag.encode()).digest()
+    return hashlib.sha256(tag_hash + tag_hash + data).digest()
+
+
+@lru_cache(maxsize=4096)
+def lift_x(x_bytes):
+    """Return the point with even Y for an x-only key, or None if invalid."""
+    x = int.from_bytes(x_bytes, "big")
+    if x >= p:
+        return None
+    c = (pow(x, 3, p) + 7) % p
+    y = pow(c, (p + 1) // 4, p)
+    if y * y % p != c:
+        return None
+    return PointJacobi(SECP256k1.curve, x, y if y % 2 == 0 else p - y, 1, n)
+
+
+def xonly_pubkey(seckey):
+    """x-only public key for a 32-byte secret key"""
+    return (G * int.from_bytes(seckey, "big")).x().to_bytes(32, "big")
+
+
+def tapleaf_hash(script_bytes):
+    """TapLeaf hash of a tapscript leaf (scripts here are < 0xfd bytes)"""
+    return tagged_hash("TapLeaf", bytes([LEAF_VERSION_TAPSCRIPT, len(script_bytes)]) + script_bytes)
+
+
+def tapbranch_hash(a, b):
+    """TapBranch hash of two child hashes (lexicographically ordered)"""
+    if b < a:
+        a, b = b, a
+    return tagged_hash("TapBranch", a + b)
+
+
+def taproot_output_key(internal_key, merkle_root):
+    """BIP341 output key (x-only) for an internal key and script tree root"""
+    P = lift_x(internal_key)
+    if P is None:
+        raise TapretError("internal key is not on the curve")
+    t = int.from_bytes(tagged_hash("TapTweak", internal_key + merkle_root), "big")
+    if t >= n:
+        raise TapretError("tweak out of range")
+    return (P + G * t).x().to_bytes(32, "big")
+
+
+# ---------------------------------------------------------------------------
+# Tapret leaf
+# ---------------------------------------------------------------------------
+
+def tapret_leaf_script(commitment, nonce):
+    """The 64-byte unspendable Tapret leaf"""
+    if len(commitment) != 32:
+        raise ValueError("commitment must be 32 bytes")
+    return TAPRET_PREFIX + commitment + bytes([nonce])
+
+
+def tapret_merkle_root(commitment, proof):
+    """
+    Script tree root with the Tapret leaf at depth 1.
+
+    Raises:
+        TapretError: if the Tapret leaf would not be the right-most node
+    """
+    leaf = tapleaf_hash(tapret_leaf_script(commitment, proof.nonce))
+    if proof.partner is None:
+        return leaf
+    if leaf < proof.partner:
+        raise TapretError("Tapret leaf is not the right-most node")
+    return tapbranch_hash(proof.partner, leaf)
+
+
+def embed_commitment(internal_key, commitment, script_root=None):
+    """
+    Commit to `commitment` in a Taproot output.
+
+    Args:
+        internal_key: 32-byte x-only internal key
+        commitment: 32-byte commitment (an MPC root)
+        script_root: root hash of the output's other scripts, or None
+
+    Returns:
+        (bytes, TapretProof): output key and the proof the owner keeps
+    """
+    for nonce in range(256):
+        proof = TapretProof(internal_key, script_root, nonce)
+        try:
+            root = tapret_merkle_root(commitment, proof)
+        except TapretError:
+            continue
+        return taproot_output_key(internal_key, root), proof
+    raise TapretError("no nonce places the Tapret leaf on the right")
+
+
+def verify_commitment(output_key, commitment, proof):
+    """True if `output_key` commits to `commitment` through `proof`"""
+    try:
+        return taproot_output_key(proof.internal_key, tapret_merkle_root(commitment, proof)) == output_key
+    except TapretError:
+        return False
+
+
+# ---------------------------------------------------------------------------
+# Multi-protocol commitment (MPC) tree
+# ---------------------------------------------------------------------------
+
+def mpc_position(protocol_id, depth):
+    """Leaf position of a protocol id in an MPC tree of 2**depth leaves"""
+    return int.from_bytes(protocol_id, "big") & ((1 << depth) - 1)
+
+
+def mpc_leaf(protocol_id, message):
+    return tagged_hash("mpc:leaf", protocol_id + message)
+
+
+def mpc_empty(depth, position):
+    return tagged_hash("mpc:empty", bytes([depth]) + position.to_bytes(4, "big"))
+
+
+def mpc_branch(left, right):
+    return tagged_hash("mpc:branch", left + right)
+
+
+def mpc_commit(messages):
+    """
+    Build the MPC tree over {protocol_id: message}.
+
+    The tree is full, 2**depth leaves wide, with the smallest depth at which
+    every protocol id gets its own position (id mod width). Unused positions
+    hold an empty leaf. A proof therefore also fixes the position of its
+    leaf, so one root cannot carry two messages for the same protocol.
+
+    Args:
+        messages: {protocol_id: message}, or (protocol_id, message) pairs
+
+    Returns:
+        (bytes, dict): root and {protocol_id: proof}, where a proof is a list
+                       of (sibling_hash, sibling_is_left) from leaf to root
+
+    Raises:
+        ValueError: if there is nothing to commit or a protocol id repeats
+    """
+    pairs = list(messages.items()) if isinstance(messages, dict) else list(messages)
+    if not pairs:
+        raise ValueError("nothing to commit")
+    ids = [pid for pid, _ in pairs]
+    if len(set(ids)) != len(ids):
+        raise ValueError("duplicate protocol id")
+    for depth in range(MPC_MAX_DEPTH + 1):
+        width = 1 << depth
+        positions = {mpc_position(pid, depth): pid for pid in ids}
+        if len(positions) == len(ids):
+            break
+    else:
+        raise ValueError("protocol ids do not fit an MPC tree")
+    by_id = dict(pairs)
+    level = [mpc_leaf(positions[pos], by_id[positions[pos]]) if pos in positions else mpc_empty(depth, pos)
+             for pos in range(width)]
+    proofs = {pid: [] for pid in ids}
+    while len(level) > 1:
+        for pid in ids:
+            pos = mpc_position(pid, depth) >> len(proofs[pid])
+            proofs[pid].append((level[pos ^ 1], bool(pos & 1)))
+        level = [mpc_branch(level[i], level[i + 1]) for i in range(0, len(level), 2)]
+    return level[0], proofs
+
+
+def mpc_verify(root, protocol_id, message, proof):
+    """True if `message` is committed for `protocol_id` at its position under `root`"""
+    if len(proof) > MPC_MAX_DEPTH:
+        return False
+    pos = mpc_position(protocol_id, len(proof))
+    node = mpc_leaf(protocol_id, message)
+    for sibling, sibling_is_left in proof:
+        if sibling_is_left != bool(pos & 1):
+            return False
+        node = mpc_branch(sibling, node) if sibling_is_left else mpc_branch(node, sibling)
+        pos >>= 1
+    return node == root
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Chapter 11: MuSig2 Channel Funding and Cooperative Close
+Replace the chapter's simplified point-addition KeyAgg with full BIP327 MuSig2:
+
+1. KeyAgg with coefficients (rogue-key safe) for Alice and Bob
+2. BIP86 tweak of the aggregate key -> Taproot channel funding address
+3. Cooperative close signed with NonceGen, NonceAgg, partial signatures,
+   partial-signature verification and PartialSigAgg
+4. The final 64-byte signature verifies as an ordinary BIP340 key-path spend
+
+Scenario (from the chapter): channel holds 100,000 sats, final state
+Alice=60000, Bob=39700, fee=300. The funding TXID is illustrative.
+"""
+
+from bitcoinutils.setup import setup
+from bitcoinutils.keys import PrivateKey, PublicKey
+from bitcoinutils.transactions import Transaction, TxInput, TxOutput, TxWitnessInput
+from bitcoinutils.schnorr import schnorr_verify as reference_schnorr_verify
+
+from tools.musig2 import (
+    key_sort, key_agg, get_xonly_pk, taproot_tweak, key_agg_and_tweak,
+    nonce_gen, nonce_agg, sign, partial_sig_verify, partial_sig_agg,
+    schnorr_verify, cbytes, SessionContext, key_agg_cache_info,
+)
+
+
+def musig2_channel_funding():
+    """Build a MuSig2 funding output and sign a cooperative close with it"""
+    setup('testnet')
+
+    # Note: Using known working keys from previous chapters
+    alice_priv = PrivateKey("cRxebG1hY6vVgS9CSLNaEbEJaXkpZvc6nFeqqGT7v6gcW7MbzKNT")
+    bob_priv = PrivateKey("cSNdLFDf3wjx1rswNL2jKykbVkC6o56o5nYZi4FUkWKjFn2Q5DSG")
+    alice_pub = alice_priv.get_public_key()
+    bob_pub = bob_priv.get_public_key()
+
+    alice_sk = alice_priv.to_bytes()
+    bob_sk = bob_priv.to_bytes()
+    alice_pk = bytes.fromhex(alice_pub.to_hex())
+    bob_pk = bytes.fromhex(bob_pub.to_hex())
+
+    # ===== KeyAgg (with coefficients) =====
+    # Sorting makes the aggregate key independent of who opened the channel
+    pubkeys = key_sort([alice_pk, bob_pk])
+    keyagg_ctx = key_agg(pubkeys)
+    agg_pub = PublicKey(cbytes(keyagg_ctx.Q).hex())
+
+    # ===== BIP86 funding output =====
+    # get_taproot_address() without script tree applies the same BIP86 tweak
+    tweak = taproot_tweak(keyagg_ctx)
+    funding_address = agg_pub.get_taproot_address()
+    output_key = get_xonly_pk(key_agg_and_tweak(pubkeys, [tweak], [True]))
+
+    print("=" * 70)
+    print("MUSIG2 (BIP327) CHANNEL FUNDING OUTPUT")
+    print("=" * 70)
+    print(f"\nParticipants (KeySort order):")
+    for pk in pubkeys:
+        owner = "Alice" if pk == alice_pk else "Bob"
+        print(f"  {owner:5}: {pk.hex()}")
+    print(f"\nAggregate Key (x-only): {get_xonly_pk(keyagg_ctx).hex()}")
+    print(f"BIP86 Tweak:            {tweak.hex()}")
+    print(f"Output Key:             {output_key.hex()}")
+    print(f"Funding Address:        {funding_address.to_string()}")
+    print(f"Matches bitcoin-utils:  {funding_address.to_witness_program() == output_key.hex()}")
+
+    # ===== Cooperative close =====
+    funding_txid = "a1b2c3d4e5f6a1b2c3d4e5f6a1b2c3d4e5f6a1b2c3d4e5f6a1b2c3d4e5f6a1b2"
+    funding_amount = 100000
+    close_tx = Transaction(
+        [TxInput(funding_txid, 0)],
+        [
+            TxOutput(60000, alice_pub.get_taproot_address().to_script_pub_key()),
+            TxOutput(39700, bob_pub.get_taproot_address().to_script_pub_key()),
+        ],
+        has_segwit=True
+    )
+    msg = close_tx.get_transaction_taproot_digest(
+        0, [funding_address.to_script_pub_key()], [funding_amount], 0
+    )
+
+    # Round 1: each party generates a nonce and shares the public part
+    alice_secnonce, alice_pubnonce = nonce_gen(alice_pk, sk=alice_sk, aggpk=output_key, msg=msg)
+    bob_secnonce, bob_pubnonce = nonce_gen(bob_pk, sk=bob_sk, aggpk=output_key, msg=msg)
+    pubnonces = [alice_pubnonce, bob_pubnonce] if pubkeys[0] == alice_pk else [bob_pubnonce, alice_pubnonce]
+    aggnonce = nonce_agg(pubnonces)
+    session_ctx = SessionContext(aggnonce, pubkeys, [tweak], [True], msg)
+
+    # Round 2: partial signatures, checked by the counterparty before combining
+    alice_psig = sign(alice_secnonce, alice_sk, session_ctx)
+    bob_psig = sign(bob_secnonce, bob_sk, session_ctx)
+    psigs = [alice_psig, bob_psig] if pubkeys[0] == alice_pk else [bob_psig, alice_psig]
+    psig_ok = [
+        partial_sig_verify(psigs[i], pubnonces, pubkeys, [tweak], [True], msg, i)
+        for i in range(len(pubkeys))
+    ]
+
+    signature = partial_sig_agg(psigs, session_ctx)
+    close_tx.witnesses.append(TxWitnessInput([signature.hex()]))
+
+    print(f"\nCooperative Close:")
+    print(f"  Sighash (SIGHASH_DEFAULT): {msg.hex()}")
+    print(f"  Aggregate Nonce:           {aggnonce.hex()}")
+    print(f"  Alice Partial Sig:         {alice_psig.hex()}")
+    print(f"  Bob Partial Sig:           {bob_psig.hex()}")
+    print(f"  Partial Sigs Valid:        {all(psig_ok)}")
+    print(f"  Final Signature:           {signature.hex()}")
+    print(f"  BIP340 Valid:              {schnorr_verify(msg, output_key, signature)}")
+    print(f"  Reference Verifier:        {reference_schnorr_verify(msg, output_key, signature)}")
+    print(f"  Secret Nonces Zeroed:      {not any(alice_secnonce[:64]) and not any(bob_secnonce[:64])}")
+
+    print(f"\nTransaction Details:")
+    print(f"  Transaction ID: {close_tx.get_txid()}")
+    print(f"  Witness: [64-byte signature] (indistinguishable from a single-key spend)")
+    print(f"  KeyAgg Cache: {key_agg_cache_info()}")
+    print("\n" + "=" * 70)
+
+    return close_tx
+
+
+if __name__ == "__main__":
+    close_tx = musig2_channel_funding()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Chapter 11: Commitment Transaction Factory
+Follow one channel through a few state updates:
+
+1. Open a 100,000 sat Taproot channel funded to a MuSig2 (BIP86) key
+2. Add an offered and a received HTLC, settle one, fail the other
+3. For every state, build the commitment incrementally (BIP69 outputs,
+   obscured commitment number, exact fee) and its SIGHASH_DEFAULT digest
+4. Cross-check sighash and TXID against bitcoin-utils, then MuSig2-sign
+   the latest commitment
+
+The funding TXID is illustrative.
+"""
+
+import hashlib
+
+from bitcoinutils.setup import setup
+from bitcoinutils.keys import PrivateKey
+from bitcoinutils.script import Script
+from bitcoinutils.transactions import Transaction
+
+from tools.musig2 import (
+    key_sort, key_agg, taproot_tweak, key_agg_and_tweak, get_xonly_pk,
+    nonce_gen, nonce_agg, sign, partial_sig_agg, schnorr_verify, SessionContext,
+)
+from tools.commitment import (
+    CommitmentFactory, ChannelKeys, Htlc, OFFERED, RECEIVED, obscuring_factor,
+)
+
+
+def reference_check(factory, commitment):
+    """Recompute sighash and TXID with bitcoin-utils from the raw transaction"""
+    raw = factory.serialize(commitment, b"\x00" * 64)
+    tx = Transaction.from_raw(raw.hex())
+    spk = Script.from_raw(factory.funding_script_pubkey.hex())
+    digest = tx.get_transaction_taproot_digest(0, [spk], [factory.funding_amount], 0)
+    return digest == commitment.sighash and tx.get_txid() == commitment.txid
+
+
+def commitment_factory_demo():
+    """Walk a channel through HTLC updates with the commitment factory"""
+    setup('testnet')
+
+    alice_priv = PrivateKey("cRxebG1hY6vVgS9CSLNaEbEJaXkpZvc6nFeqqGT7v6gcW7MbzKNT")
+    bob_priv = PrivateKey("cSNdLFDf3wjx1rswNL2jKykbVkC6o56o5nYZi4FUkWKjFn2Q5DSG")
+    alice_pub = alice_priv.get_public_key()
+    bob_pub = bob_priv.get_public_key()
+    alice_pk = bytes.fromhex(alice_pub.to_hex())
+    bob_pk = bytes.fromhex(bob_pub.to_hex())
+
+    # ===== MuSig2 funding output =====
+    pubkeys = key_sort([alice_pk, bob_pk])
+    tweak = taproot_tweak(key_agg(pubkeys))
+    output_key = get_xonly_pk(key_agg_and_tweak(pubkeys, [tweak], [True]))
+    funding_spk = b"\x51\x20" + output_key
+
+    # ===== Alice's commitment template =====
+    # Simplified key model (as in the chapter): static keys per channel
+    keys = ChannelKeys(
+        local_delayed=alice_pk[1:],
+        remote=bob_pk[1:],
+        revocation=bob_pk[1:],
+        local_htlc=alice_pk[1:],
+        remote_htlc=bob_pk[1:],
+    )
+    factory = CommitmentFactory(
+        funding_txid="a1b2c3d4e5f6a1b2c3d4e5f6a1b2c3d4e5f6a1b2c3d4e5f6a1b2c3d4e5f6a1b2",
+        funding_vout=0,
+        funding_amount=100000,
+        funding_script_pubkey=funding_spk,
+        keys=keys,
+        local_balance=70000,
+        obscuring_factor=obscuring_factor(alice_pk, bob_pk),
+        to_self_delay=10,
+    )
+
+    preimage_a = b"payment-a".ljust(32, b"\x00")
+    preimage_b = b"payment-b".ljust(32, b"\x00")
+    updates = [
+        ("initial state", lambda: None),
+        ("add offered HTLC 0 (15,000 sats)",
+         lambda: factory.add_htlc(Htlc(0, OFFERED, 15000, hashlib.sha256(preimage_a).digest(), 800100))),
+        ("add received HTLC 1 (5,000 sats)",
+         lambda: factory.add_htlc(Htlc(1, RECEIVED, 5000, hashlib.sha256(preimage_b).digest(), 800144))),
+        ("settle HTLC 0 (Bob revealed the preimage)", lambda: factory.settle_htlc(0)),
+        ("fail HTLC 1", lambda: factory.fail_htlc(1)),
+    ]
+
+    print("=" * 70)
+    print("COMMITMENT TRANSACTION FACTORY")
+    print("=" * 70)
+    print(f"\nFunding Output Key: {output_key.hex()}")
+    print(f"Obscuring Factor:   {factory.obscuring_factor:012x}")
+
+    for description, update in updates:
+        update()
+        commitment = factory.next_commitment()
+        print(f"\nCommitment #{commitment.number}: {description}")
+        print(f"  Locktime: {commitment.locktime[::-1].hex()}  Sequence: {commitment.sequence[::-1].hex()}")
+        print(f"  Fee: {commitment.fee} sats")
+        for amount, spk, label in commitment.outputs:
+            name = label[0] if label[1] is None else f"{label[0]} {label[1]}"
+            print(f"    {amount:>7} sats  {name:10} {spk.hex()[:24]}...")
+        print(f"  Sighash: {commitment.sighash.hex()}")
+        print(f"  TXID:    {commitment.txid}")
+        print(f"  Matches bitcoin-utils: {reference_check(factory, commitment)}")
+
+    # ===== Sign the latest commitment with MuSig2 =====
+    msg = commitment.sighash
+    alice_nonce = nonce_gen(alice_pk, sk=alice_priv.to_bytes(), msg=msg)
+    bob_nonce = nonce_gen(bob_pk, sk=bob_priv.to_bytes(), msg=msg)
+    order = {alice_pk: (alice_nonce, alice_priv), bob_pk: (bob_nonce, bob_priv)}
+    session_ctx = SessionContext(
+        nonce_agg([order[pk][0][1] for pk in pubkeys]), pubkeys, [tweak], [True], msg
+    )
+    psigs = [sign(order[pk][0][0], order[pk][1].to_bytes(), session_ctx) for pk in pubkeys]
+    signature = partial_sig_agg(psigs, session_ctx)
+    raw = factory.serialize(commitment, signature)
+
+    print(f"\nSigned Commitment #{commitment.number}:")
+    print(f"  MuSig2 Signature Valid: {schnorr_verify(msg, output_key, signature)}")
+    print(f"  Raw Transaction: {raw.hex()}")
+    print("\n" + "=" * 70)
+
+    return factory
+
+
+if __name__ == "__main__":
+    factory = commitment_factory_demo()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Chapter 11: Commitment Update Throughput Benchmark
+Drive the commitment factory with a simulated payment stream and measure
+how many commitment updates per second it sustains.
+
+Each update is one HTLC add / settle / fail followed by a full commitment
+build (BIP69 outputs, fee, obscured number, BIP341 sighash and TXID). The
+add, the settle / fail and the build are timed separately.
+
+The first --naive updates of the same stream are replayed through a naive
+rebuild that keeps only the channel state and builds every commitment from
+scratch: every HTLC's script leaves and tweaked output key, the balance
+outputs, the fee, the BIP69 sort, then bitcoin-utils (`Transaction` +
+`get_transaction_taproot_digest` + `get_txid`). Every rebuilt commitment is
+cross-checked against the factory's.
+
+Usage: python3 04_benchmark_commitment_updates.py [--updates N] [--max-htlcs N] [--naive N]
+"""
+
+import argparse
+import hashlib
+import random
+import struct
+import time
+
+from bitcoinutils.setup import setup
+from bitcoinutils.script import Script
+from bitcoinutils.transactions import Transaction, TxInput, TxOutput
+
+from tools.commitment import (
+    CommitmentFactory, ChannelKeys, Htlc, OFFERED, RECEIVED, NUMS_KEY,
+    INPUT_SIZE, KEY_PATH_WITNESS_WEIGHT, P2TR_OUTPUT_SIZE,
+    htlc_leaves, taproot_output_script, to_local_leaves, to_remote_leaves,
+)
+
+FUNDING_TXID = "a1b2c3d4e5f6a1b2c3d4e5f6a1b2c3d4e5f6a1b2c3d4e5f6a1b2c3d4e5f6a1b2"
+FUNDING_SPK = bytes.fromhex("51206ba767bc2cb48e003885e7e235ee942b5d1cbab2029e61db0f5d3cbd3f4d5bf8")
+ALICE = bytes.fromhex("50be5fc44ec580c387bf45df275aaa8b27e2d7716af31f10eeed357d126bb4d3")
+BOB = bytes.fromhex("84b5951609b76619a1ce7f48977b4312ebe226987166ef044bfb374ceef63af5")
+KEYS = ChannelKeys(ALICE, BOB, BOB, ALICE, BOB)
+CAPACITY = 10_000_000
+LOCAL_BALANCE = 5_000_000
+OBSCURING_FACTOR = 0x2bb038521914
+TO_SELF_DELAY = 144
+
+
+def new_factory():
+    return CommitmentFactory(
+        FUNDING_TXID, 0, CAPACITY, FUNDING_SPK, KEYS,
+        local_balance=LOCAL_BALANCE, obscuring_factor=OBSCURING_FACTOR, to_self_delay=TO_SELF_DELAY,
+    )
+
+
+def payment_stream(count, max_htlcs, seed=11):
+    """Yield (op, argument) tuples: add an HTLC or resolve an in-flight one"""
+    rng = random.Random(seed)
+    in_flight = []
+    next_id = 0
+    for _ in range(count):
+        if in_flight and (len(in_flight) >= max_htlcs or rng.random() < 0.5):
+            htlc_id = in_flight.pop(rng.randrange(len(in_flight)))
+            yield ("settle" if rng.random() < 0.8 else "fail", htlc_id)
+        else:
+            direction = OFFERED if rng.random() < 0.5 else RECEIVED
+            payment_hash = hashlib.sha256(next_id.to_bytes(8, "big")).digest()
+            amount = rng.randrange(1_000, 50_000)
+            yield ("add", Htlc(next_id, direction, amount, payment_hash, 800_000 + rng.randrange(500)))
+            in_flight.append(next_id)
+            next_id += 1
+
+
+def apply(factory, op, arg):
+    if op == "add":
+        factory.add_htlc(arg)
+    elif op == "settle":
+        factory.settle_htlc(arg)
+    else:
+        factory.fail_htlc(arg)
+
+
+class NaiveChannel:
+    """Channel state only (balances and HTLCs): nothing is cached between commitments"""
+
+    def __init__(self, feerate_per_kw=253, dust_limit=354):
+        self.local_balance = LOCAL_BALANCE
+        self.remote_balance = CAPACITY - LOCAL_BALANCE
+        self.htlcs = {}
+        self.feerate_per_kw = feerate_per_kw
+        self.dust_limit = dust_limit
+
+    def apply(self, op, arg):
+        if op == "add":
+            self.htlcs[arg.htlc_id] = arg
+            if arg.direction == OFFERED:
+                self.local_balance -= arg.amount
+            else:
+                self.remote_balance -= arg.amount
+            return
+        htlc = self.htlcs.pop(arg)
+        if (htlc.direction == OFFERED) == (op == "settle"):
+            self.remote_balance += htlc.amount
+        else:
+            self.local_balance += htlc.amount
+
+    def rebuild(self, number):
+        """Commitment `number` from scratch: (sighash, TXID, fee)"""
+        outputs = []
+        fee = 0
+        for htlc in self.htlcs.values():
+            if htlc.amount < self.dust_limit:
+                fee += htlc.amount
+                continue
+            spk = taproot_output_script(KEYS.revocation, htlc_leaves(KEYS, htlc))
+            outputs.append((htlc.amount, spk, htlc.cltv_expiry))
+        count = len(outputs) + 2
+        base_size = 4 + 1 + INPUT_SIZE + (1 if count < 0xfd else 3) + count * P2TR_OUTPUT_SIZE + 4
+        weight_fee = self.feerate_per_kw * (base_size * 4 + 2 + KEY_PATH_WITNESS_WEIGHT) // 1000
+        fee += weight_fee
+        for amount, leaves in ((self.local_balance - weight_fee, to_local_leaves(KEYS, TO_SELF_DELAY)),
+                               (self.remote_balance, to_remote_leaves(KEYS))):
+            if amount >= self.dust_limit:
+                outputs.append((amount, taproot_output_script(NUMS_KEY, leaves), 0))
+            else:
+                fee += amount
+        outputs.sort()
+
+        obscured = number ^ OBSCURING_FACTOR
+        tx = Transaction(
+            [TxInput(FUNDING_TXID, 0, sequence=struct.pack("<I", (0x80 << 24) | (obscured >> 24)))],
+            [TxOutput(amount, Script.from_raw(spk.hex())) for amount, spk, _ in outputs],
+            locktime=struct.pack("<I", (0x20 << 24) | (obscured & 0xffffff)),
+            version=struct.pack("<I", 2),
+            has_segwit=True,
+        )
+        digest = tx.get_transaction_taproot_digest(
+            0, [Script.from_raw(FUNDING_SPK.hex())], [CAPACITY], 0
+        )
+        return digest, tx.get_txid(), fee
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Commitment update throughput benchmark")
+    parser.add_argument("--updates", type=int, default=20000, help="payment stream length")
+    parser.add_argument("--max-htlcs", type=int, default=30, help="max in-flight HTLCs")
+    parser.add_argument("--naive", type=int, default=300, help="updates replayed through the naive rebuild")
+    args = parser.parse_args()
+    setup('testnet')
+
+    stream = list(payment_stream(args.updates, args.max_htlcs))
+
+    # Incremental factory: the HTLC update and the commitment build timed apart
+    factory = new_factory()
+    op_times = {"add": 0.0, "remove": 0.0}
+    build_time = 0.0
+    perf_counter = time.perf_counter
+    for op, arg in stream:
+        start = perf_counter()
+        apply(factory, op, arg)
+        built = perf_counter()
+        factory.next_commitment()
+        end = perf_counter()
+        op_times["add" if op == "add" else "remove"] += built - start
+        build_time += end - built
+    incremental = sum(op_times.values()) + build_time
+    adds = sum(1 for op, _ in stream if op == "add")
+    removes = len(stream) - adds
+
+    # Naive rebuild of every commitment of the first --naive updates, cross-checked
+    sample = stream[: min(len(stream), args.naive)]
+    factory = new_factory()
+    channel = NaiveChannel()
+    naive_time = 0.0
+    mismatches = 0
+    for op, arg in sample:
+        apply(factory, op, arg)
+        commitment = factory.next_commitment()
+        start = perf_counter()
+        channel.apply(op, arg)
+        digest, txid, fee = channel.rebuild(factory.commitment_number)
+        naive_time += perf_counter() - start
+        mismatches += (digest != commitment.sighash) + (txid != commitment.txid) + (fee != commitment.fee)
+
+    print("=" * 70)
+    print("COMMITMENT UPDATE THROUGHPUT")
+    print("=" * 70)
+    print(f"  Payment stream:        {len(stream)} updates ({adds} adds, {removes} settles / fails, "
+          f"max {args.max_htlcs} in flight)")
+    print(f"  Incremental factory:   {len(stream) / incremental:>10,.0f} updates/s")
+    print(f"    add_htlc():          {op_times['add'] / adds * 1e6:>10,.1f} us each (output script + tweak, once)")
+    print(f"    settle / fail:       {op_times['remove'] / removes * 1e6:>10,.1f} us each")
+    print(f"    next_commitment():   {build_time / len(stream) * 1e6:>10,.1f} us each")
+    print(f"  Naive rebuild:         {len(sample) / naive_time:>10,.0f} updates/s "
+          f"(all scripts, tweaks, sort, sighash and TXID; first {len(sample)} updates)")
+    print(f"  Cross-check mismatches: {mismatches} (sighash, TXID and fee of {len(sample)} commitments)")
+    print(f"  NUMS internal key:     {NUMS_KEY.hex()}")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Chapter 11: Revocation Secret Storage with shachain
+Show how the counterparty keeps every revoked per-commitment secret in at
+most 49 entries:
+
+1. Check the producer against the BOLT 3 generate_from_seed test vectors
+2. Revoke 1,000 commitments and watch the store stay compact
+3. Derive an old secret (the one needed to punish a revoked broadcast)
+4. Reject a secret that does not come from the counterparty's chain
+5. Persist two channels into one file of fixed-size records and reload them
+"""
+
+import os
+import tempfile
+
+from tools.shachain import (
+    ShachainProducer, ShachainStore, ShachainError, generate_from_seed,
+    commitment_index, MAX_INDEX, MAX_ENTRIES, RECORD_SIZE,
+)
+
+# BOLT 3 Appendix D: generate_from_seed test vectors
+BOLT3_VECTORS = [
+    ("00" * 32, MAX_INDEX, "02a40c85b6f28da08dfdbe0926c53fab2de6d28c10301f8f7c4073d5e42e3148"),
+    ("ff" * 32, MAX_INDEX, "7cc854b54e3e0dcdb010d7a3fee464a9687be6e8db3be6854c475621e007a5dc"),
+    ("ff" * 32, 0xaaaaaaaaaaa, "56f4008fb007ca9acf0e15b054d5c9fd12ee06cea347914ddbaed70d1c13a528"),
+    ("ff" * 32, 0x555555555555, "9015daaeb06dba4ccc05b91b2f73bd54405f2be9f217fbacd3c5ac2e62327d31"),
+    ("01" * 32, 1, "915c75942a26bb3a433a8ce2cb0427c29ec6c1775cfc78328b57f6ba7bfeaa9c"),
+]
+
+
+def shachain_revocation_store():
+    """Demonstrate compact revocation secret storage"""
+    print("=" * 70)
+    print("SHACHAIN PER-COMMITMENT SECRET STORAGE")
+    print("=" * 70)
+
+    print(f"\nBOLT 3 generate_from_seed vectors:")
+    for seed, index, expected in BOLT3_VECTORS:
+        result = generate_from_seed(bytes.fromhex(seed), index).hex()
+        print(f"  seed {seed[:8]}... index {index:012x}: {'MATCH' if result == expected else 'MISMATCH'}")
+
+    # ===== Bob produces secrets, Alice stores them =====
+    bob_seed = bytes.fromhex("5dee6e7a7dc6a9e5ca8d0bdb0e3aee4b3aa7a3b7f6e3c2d1f0e9d8c7b6a59483")
+    bob = ShachainProducer(bob_seed)
+    alice_store = ShachainStore()
+
+    revoked = 1000
+    for number in range(revoked):
+        alice_store.insert_secret(bob.secret_for_commitment(number), commitment_index(number))
+
+    print(f"\nAfter revoking {revoked} commitments:")
+    print(f"  Entries stored: {len(alice_store)} (maximum {MAX_ENTRIES})")
+    print(f"  Naive storage:  {revoked * 32} bytes of secrets")
+    print(f"  shachain:       {RECORD_SIZE} bytes, fixed")
+
+    # ===== Bob broadcasts revoked commitment #437 =====
+    cheat = 437
+    secret = alice_store.secret_for_commitment(cheat)
+    print(f"\nBob broadcasts revoked commitment #{cheat}:")
+    print(f"  Derived secret: {secret.hex()}")
+    print(f"  Matches Bob's:  {secret == generate_from_seed(bob_seed, commitment_index(cheat))}")
+
+    try:
+        alice_store.secret_for_commitment(revoked)
+    except ShachainError as e:
+        print(f"  Current state #{revoked} is not revoked yet: {e}")
+
+    # ===== A secret from a different chain is rejected =====
+    forged = ShachainProducer(b"\x42" * 32).secret_for_commitment(revoked + 1)
+    probe = ShachainStore.from_bytes(alice_store.to_bytes())
+    probe.insert_secret(bob.secret_for_commitment(revoked), commitment_index(revoked))
+    try:
+        probe.insert_secret(forged, commitment_index(revoked + 1))
+        print(f"\nForged secret accepted (unexpected)")
+    except ShachainError as e:
+        print(f"\nForged secret rejected: {e}")
+
+    # ===== Fixed-size records, one slot per channel =====
+    other_store = ShachainStore()
+    carol = ShachainProducer(b"\x07" * 32)
+    for number in range(25):
+        other_store.insert_secret(carol.secret_for_commitment(number), commitment_index(number))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "revocations.dat")
+        alice_store.save(path, slot=0)
+        other_store.save(path, slot=1)
+        size = os.path.getsize(path)
+        reloaded = ShachainStore.load(path, slot=0)
+        reloaded_other = ShachainStore.load(path, slot=1)
+
+    print(f"\nPersistence:")
+    print(f"  File size for 2 channels: {size} bytes ({RECORD_SIZE} per channel)")
+    print(f"  Channel 0 reload matches: {reloaded.known == alice_store.known}")
+    print(f"  Channel 1 reload matches: {reloaded_other.known == other_store.known}")
+    print(f"  Secret #{cheat} after reload: {reloaded.secret_for_commitment(cheat) == secret}")
+    print("\n" + "=" * 70)
+
+    return alice_store
+
+
+if __name__ == "__main__":
+    alice_store = shachain_revocation_store()
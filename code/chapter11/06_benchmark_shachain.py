@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Chapter 11: shachain Benchmark
+Insert and derive per-commitment secrets across 2^20 channel states.
+
+Reports:
+- producer rate (incremental vs. generate_from_seed from scratch)
+- insert rate into the 49-entry store, including chain validation
+- derive rate for random past states
+- save/load time of the fixed-size record
+
+Usage: python3 06_benchmark_shachain.py [--states-log2 N] [--derives N]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from tools.shachain import (
+    ShachainProducer, ShachainStore, generate_from_seed, commitment_index, RECORD_SIZE,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="shachain insert/derive benchmark")
+    parser.add_argument("--states-log2", type=int, default=20, help="log2 of the number of states")
+    parser.add_argument("--derives", type=int, default=100000, help="random past secrets to derive")
+    args = parser.parse_args()
+
+    states = 1 << args.states_log2
+    seed = os.urandom(32)
+    producer = ShachainProducer(seed)
+    store = ShachainStore()
+
+    # Producer from scratch, on a sample (48 SHA256 calls each)
+    sample = min(states, 20000)
+    start = time.perf_counter()
+    for number in range(sample):
+        generate_from_seed(seed, commitment_index(number))
+    scratch = sample / (time.perf_counter() - start)
+
+    # Produce + insert every state
+    produce_time = insert_time = 0.0
+    max_entries = 0
+    for number in range(states):
+        index = commitment_index(number)
+        t0 = time.perf_counter()
+        secret = producer.secret(index)
+        t1 = time.perf_counter()
+        store.insert_secret(secret, index)
+        t2 = time.perf_counter()
+        produce_time += t1 - t0
+        insert_time += t2 - t1
+        if number & 0xfff == 0:
+            max_entries = max(max_entries, len(store))
+    max_entries = max(max_entries, len(store))
+
+    # Derive random past secrets
+    rng = random.Random(7)
+    targets = [rng.randrange(states) for _ in range(args.derives)]
+    start = time.perf_counter()
+    for number in targets:
+        store.secret_for_commitment(number)
+    derive_time = time.perf_counter() - start
+    check = rng.sample(targets, min(1000, len(targets)))
+    mismatches = sum(
+        store.secret_for_commitment(number) != generate_from_seed(seed, commitment_index(number))
+        for number in check
+    )
+
+    # Fixed-size record round trip
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "shachain.dat")
+        start = time.perf_counter()
+        store.save(path)
+        save_ms = (time.perf_counter() - start) * 1e3
+        start = time.perf_counter()
+        reloaded = ShachainStore.load(path)
+        load_ms = (time.perf_counter() - start) * 1e3
+
+    print("=" * 70)
+    print(f"SHACHAIN BENCHMARK ({states:,} states = 2^{args.states_log2})")
+    print("=" * 70)
+    print(f"  Producer (incremental):   {states / produce_time:>12,.0f} secrets/s")
+    print(f"  Producer (from seed):     {scratch:>12,.0f} secrets/s")
+    print(f"  Insert + validate:        {states / insert_time:>12,.0f} secrets/s")
+    print(f"  Derive random past state: {args.derives / derive_time:>12,.0f} secrets/s "
+          f"({derive_time / args.derives * 1e6:.1f} us each)")
+    print(f"  Derivation mismatches:    {mismatches} of {len(check)} checked")
+    print(f"  Entries held (max seen):  {max_entries}")
+    print(f"  Record size:              {RECORD_SIZE} bytes (naive: {states * 32:,} bytes)")
+    print(f"  Save / load:              {save_ms:.2f} ms / {load_ms:.2f} ms "
+          f"(reload matches: {reloaded.known == store.known})")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Chapter 11: Watchtower Breach Detection
+Feed a watchtower the same parsed-transaction format as Chapter 4 and let it
+spot a revoked commitment:
+
+1. Watch two channels and hand the tower each revoked per-commitment secret
+2. Stream transactions through Chapter 4's parse_segwit_transaction:
+   an unrelated spend, a cooperative close, and a revoked commitment of Bob's
+3. Print the justice job emitted for the breach
+
+Funding TXIDs are illustrative.
+"""
+
+import importlib.util
+import os
+import sys
+
+from bitcoinutils.setup import setup
+from bitcoinutils.keys import PrivateKey
+from bitcoinutils.transactions import Transaction, TxInput, TxOutput, TxWitnessInput
+from bitcoinutils.script import Script
+
+from tools.commitment import CommitmentFactory, ChannelKeys, obscuring_factor
+from tools.shachain import ShachainProducer
+from tools.watchtower import Watchtower, txid_from_parsed
+
+
+def import_module_from_file(filepath, module_name):
+    """Import a module from a file path"""
+    spec = importlib.util.spec_from_file_location(module_name, filepath)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parser_module = import_module_from_file(
+    os.path.join(script_dir, '..', 'chapter04', '03_parse_segwit_transaction.py'),
+    'parse_segwit_transaction'
+)
+parse_segwit_transaction = parser_module.parse_segwit_transaction
+
+
+def make_factory(funding_txid, local_pk, remote_pk, local_balance):
+    """Commitment factory for the holder of `local_pk`"""
+    keys = ChannelKeys(
+        local_delayed=local_pk[1:],
+        remote=remote_pk[1:],
+        revocation=remote_pk[1:],
+        local_htlc=local_pk[1:],
+        remote_htlc=remote_pk[1:],
+    )
+    return CommitmentFactory(
+        funding_txid=funding_txid,
+        funding_vout=0,
+        funding_amount=100000,
+        funding_script_pubkey=b"\x51\x20" + local_pk[1:],
+        keys=keys,
+        local_balance=local_balance,
+        obscuring_factor=obscuring_factor(remote_pk, local_pk),
+        to_self_delay=10,
+    )
+
+
+def watchtower_demo():
+    """Detect a revoked commitment in a stream of parsed transactions"""
+    setup('testnet')
+
+    alice_priv = PrivateKey("cRxebG1hY6vVgS9CSLNaEbEJaXkpZvc6nFeqqGT7v6gcW7MbzKNT")
+    bob_priv = PrivateKey("cSNdLFDf3wjx1rswNL2jKykbVkC6o56o5nYZi4FUkWKjFn2Q5DSG")
+    alice_pk = bytes.fromhex(alice_priv.get_public_key().to_hex())
+    bob_pk = bytes.fromhex(bob_priv.get_public_key().to_hex())
+
+    channel_a = "a1b2c3d4e5f6a1b2c3d4e5f6a1b2c3d4e5f6a1b2c3d4e5f6a1b2c3d4e5f6a1b2"
+    channel_b = "b7c8d9e0f1a2b7c8d9e0f1a2b7c8d9e0f1a2b7c8d9e0f1a2b7c8d9e0f1a2b7c8"
+    unwatched = "c3d4e5f6a7b8c3d4e5f6a7b8c3d4e5f6a7b8c3d4e5f6a7b8c3d4e5f6a7b8c3d4"
+
+    # ===== Bob's commitments on channel A, watched on Alice's behalf =====
+    bob_factory = make_factory(channel_a, bob_pk, alice_pk, local_balance=60000)
+    bob_secrets = ShachainProducer(b"\x0b" * 32)
+    tower = Watchtower()
+    slot_a = tower.watch_channel(channel_a, 0, bob_factory.obscuring_factor, channel_id="alice-bob")
+    slot_b = tower.watch_channel(channel_b, 0, obscuring_factor(bob_pk, alice_pk), channel_id="alice-carol")
+
+    commitments = [bob_factory.next_commitment()]
+    for _ in range(4):
+        # A new state replaces the old one: Bob reveals the old secret
+        commitments.append(bob_factory.next_commitment())
+        old = commitments[-2].number
+        tower.revoke(slot_a, old, bob_secrets.secret_for_commitment(old))
+
+    print("=" * 70)
+    print("WATCHTOWER BREACH DETECTION")
+    print("=" * 70)
+    print(f"\nWatching {len(tower)} channels")
+    print(f"  alice-bob:   {channel_a}:0 (commitments #{commitments[0].number}-#{commitments[-2].number} "
+          f"revoked, #{commitments[-1].number} current)")
+    print(f"  alice-carol: {channel_b}:0")
+
+    # ===== Transactions seen in blocks / mempool =====
+    unrelated = make_factory(unwatched, alice_pk, bob_pk, 50000)
+    unrelated_raw = unrelated.serialize(unrelated.next_commitment(), b"\x00" * 64)
+
+    close = Transaction(
+        [TxInput(channel_b, 0)],
+        [TxOutput(59800, Script(["OP_1", alice_pk[1:].hex()])),
+         TxOutput(40000, Script(["OP_1", bob_pk[1:].hex()]))],
+        has_segwit=True,
+    )
+    close.witnesses.append(TxWitnessInput(["00" * 64]))
+
+    revoked = commitments[2]
+    breach_raw = bob_factory.serialize(revoked, b"\x00" * 64)
+
+    stream = [
+        ("unrelated spend", unrelated_raw.hex()),
+        ("cooperative close of alice-carol", close.serialize()),
+        (f"Bob broadcasts commitment #{revoked.number}", breach_raw.hex()),
+    ]
+
+    print(f"\nScanning {len(stream)} transactions:")
+    for description, tx_hex in stream:
+        parsed = parse_segwit_transaction(tx_hex)
+        jobs = tower.process(parsed)
+        print(f"  {txid_from_parsed(parsed)[:16]}...  {description}: {len(jobs)} justice job(s)")
+        for job in jobs:
+            print(f"\nJustice Job for channel {job.channel}:")
+            print(f"  Funding outpoint:  {job.funding_outpoint[0]}:{job.funding_outpoint[1]}")
+            print(f"  Breach TXID:       {job.breach_txid}")
+            print(f"  Commitment number: {job.commitment_number}")
+            if job.per_commitment_secret is None:
+                print(f"  Revocation secret: never received (unrecoverable)")
+            else:
+                print(f"  Revocation secret: {job.per_commitment_secret.hex()}")
+                print(f"  Secret matches:    "
+                      f"{job.per_commitment_secret == bob_secrets.secret_for_commitment(job.commitment_number)}")
+            print(f"  TXID matches:      {job.breach_txid == revoked.txid}")
+            for vout, amount, spk in job.outputs:
+                print(f"    output {vout}: {amount:>7} sats  {spk[:24]}...")
+
+    print(f"\nChannel status:")
+    print(f"  alice-bob:   {tower.status(slot_a)}")
+    print(f"  alice-carol: {tower.status(slot_b)}")
+    print("\n" + "=" * 70)
+
+    return tower
+
+
+if __name__ == "__main__":
+    tower = watchtower_demo()
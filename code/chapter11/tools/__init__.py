@@ -0,0 +1,2 @@
+# Tools package for Chapter 11
+# This package contains utilities for Lightning channel construction
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+Commitment Transaction Factory
+
+Builds the Taproot commitment transactions described in Chapter 11 and
+keeps them up to date incrementally as HTLCs are added, settled or failed.
+
+Each channel keeps a template:
+- the funding prevout and every BIP341 sighash component that depends only
+  on the funding input (sha_prevouts, sha_amounts, sha_scriptpubkeys)
+- a TapSighash midstate (tag prefix, epoch, hash type and version already
+  absorbed) that is copied for every new commitment
+- one cached output (scriptPubKey + serialization) per HTLC, computed once
+  when the HTLC is added, kept in BIP69 order with bisect
+
+A commitment update therefore only re-inserts the changed outputs, hashes
+the output list once, and finishes the copied midstate.
+
+Output scripts follow the simple-taproot-channels layout used in the chapter
+(to_local / to_remote under a NUMS internal key, HTLCs under the revocation
+key). Keys are static per channel, as in the chapter's simplified model; the
+per-commitment key derivation of BOLT 3 is not modelled.
+"""
+
+import bisect
+import hashlib
+import struct
+from collections import namedtuple
+
+from bitcoinutils.script import Script
+
+try:
+    hashlib.new("ripemd160")
+
+    def ripemd160(data):
+        return hashlib.new("ripemd160", data).digest()
+except ValueError:
+    # OpenSSL 3 builds may ship without RIPEMD-160
+    from bitcoinutils.ripemd160 import ripemd160
+
+from .musig2 import G, lift_x, tagged_hash, xbytes
+
+# BIP341 "nothing up my sleeve" point: no known discrete logarithm
+NUMS_KEY = bytes.fromhex("50929b74c1a04954b78b4b6035e97a5e078a5a0f28ec96d547bfee9ace803ac0")
+
+LEAF_VERSION_TAPSCRIPT = 0xc0
+OFFERED = "offered"
+RECEIVED = "received"
+
+# Taproot key-path witness: item count + length + 64-byte signature
+KEY_PATH_WITNESS_WEIGHT = 1 + 1 + 64
+# Input: prevout (36) + empty scriptSig (1) + nSequence (4)
+INPUT_SIZE = 41
+# Output: amount (8) + script length (1) + OP_1 <32 bytes> (34)
+P2TR_OUTPUT_SIZE = 43
+
+ChannelKeys = namedtuple(
+    "ChannelKeys",
+    ["local_delayed", "remote", "revocation", "local_htlc", "remote_htlc"],
+)
+
+Htlc = namedtuple("Htlc", ["htlc_id", "direction", "amount", "payment_hash", "cltv_expiry"])
+
+Commitment = namedtuple(
+    "Commitment",
+    ["number", "locktime", "sequence", "outputs", "fee", "sighash", "txid"],
+)
+
+
+def _compact_size(n):
+    if n < 0xfd:
+        return bytes([n])
+    if n <= 0xffff:
+        return b"\xfd" + struct.pack("<H", n)
+    if n <= 0xffffffff:
+        return b"\xfe" + struct.pack("<I", n)
+    return b"\xff" + struct.pack("<Q", n)
+
+
+def tapleaf_hash(script_bytes):
+    """TapLeaf hash of a tapscript leaf"""
+    return tagged_hash(
+        "TapLeaf", bytes([LEAF_VERSION_TAPSCRIPT]) + _compact_size(len(script_bytes)) + script_bytes
+    )
+
+
+def tapbranch_hash(a, b):
+    """TapBranch hash of two child hashes (lexicographically ordered)"""
+    if b < a:
+        a, b = b, a
+    return tagged_hash("TapBranch", a + b)
+
+
+def taproot_output_script(internal_key, leaves):
+    """
+    Return the P2TR scriptPubKey for an internal key and a 1- or 2-leaf tree.
+
+    Args:
+        internal_key: 32-byte x-only internal key
+        leaves: list of tapscript bytes
+
+    Returns:
+        bytes: OP_1 <32-byte output key>
+    """
+    hashes = [tapleaf_hash(leaf) for leaf in leaves]
+    merkle_root = hashes[0] if len(hashes) == 1 else tapbranch_hash(hashes[0], hashes[1])
+    P = lift_x(internal_key)
+    t = int.from_bytes(tagged_hash("TapTweak", internal_key + merkle_root), "big")
+    return b"\x51\x20" + xbytes(P + G * t)
+
+
+# ---------------------------------------------------------------------------
+# Output scripts
+# ---------------------------------------------------------------------------
+
+def to_local_leaves(keys, to_self_delay):
+    revocation = Script([keys.local_delayed.hex(), "OP_DROP", keys.revocation.hex(), "OP_CHECKSIG"])
+    delayed = Script([
+        keys.local_delayed.hex(), "OP_CHECKSIG",
+        to_self_delay, "OP_CHECKSEQUENCEVERIFY", "OP_DROP",
+    ])
+    return [revocation.to_bytes(), delayed.to_bytes()]
+
+
+def to_remote_leaves(keys):
+    return [Script([
+        keys.remote.hex(), "OP_CHECKSIG", "OP_1", "OP_CHECKSEQUENCEVERIFY", "OP_DROP",
+    ]).to_bytes()]
+
+
+def htlc_leaves(keys, htlc):
+    """Success and timeout leaves for an offered or received HTLC"""
+    hash160 = ripemd160(htlc.payment_hash).hex()
+    preimage_check = ["OP_SIZE", 32, "OP_EQUALVERIFY", "OP_HASH160", hash160, "OP_EQUALVERIFY"]
+    if htlc.direction == OFFERED:
+        timeout = Script([keys.local_htlc.hex(), "OP_CHECKSIGVERIFY", keys.remote_htlc.hex(), "OP_CHECKSIG"])
+        success = Script(preimage_check + [
+            keys.remote_htlc.hex(), "OP_CHECKSIG", "OP_1", "OP_CHECKSEQUENCEVERIFY", "OP_DROP",
+        ])
+    else:
+        success = Script(preimage_check + [
+            keys.local_htlc.hex(), "OP_CHECKSIGVERIFY", keys.remote_htlc.hex(), "OP_CHECKSIG",
+        ])
+        timeout = Script([
+            keys.remote_htlc.hex(), "OP_CHECKSIG", "OP_1", "OP_CHECKSEQUENCEVERIFY", "OP_DROP",
+            htlc.cltv_expiry, "OP_CHECKLOCKTIMEVERIFY", "OP_DROP",
+        ])
+    return [success.to_bytes(), timeout.to_bytes()]
+
+
+def _output_entry(amount, script_pubkey, cltv_expiry, label):
+    """BIP69 sort key (amount, scriptPubKey, cltv) plus the serialized output"""
+    raw = struct.pack("<Q", amount) + _compact_size(len(script_pubkey)) + script_pubkey
+    return (amount, script_pubkey, cltv_expiry, label, raw)
+
+
+# ---------------------------------------------------------------------------
+# Factory
+# ---------------------------------------------------------------------------
+
+class CommitmentFactory:
+    """
+    Per-channel commitment template with incremental updates.
+
+    Args:
+        funding_txid: hex TXID of the funding transaction
+        funding_vout: funding output index
+        funding_amount: channel capacity in sats
+        funding_script_pubkey: funding output scriptPubKey (MuSig2 BIP86 key)
+        keys: ChannelKeys with 32-byte x-only keys
+        local_balance: opener's initial balance in sats (pays the fee)
+        obscuring_factor: 48-bit commitment number obscuring factor
+        to_self_delay: CSV delay on the to_local delayed path
+        feerate_per_kw: fee rate in sat per 1000 weight units
+        dust_limit: outputs below this value are trimmed into the fee
+
+    Raises ValueError from add_htlc() when a balance cannot cover an HTLC,
+    and from build_commitment() when the opener cannot pay the fee.
+    """
+
+    def __init__(self, funding_txid, funding_vout, funding_amount, funding_script_pubkey,
+                 keys, local_balance, obscuring_factor, to_self_delay=144,
+                 feerate_per_kw=253, dust_limit=354):
+        self.keys = keys
+        self.funding_amount = funding_amount
+        self.local_balance = local_balance
+        self.remote_balance = funding_amount - local_balance
+        self.obscuring_factor = obscuring_factor & 0xffffffffffff
+        self.feerate_per_kw = feerate_per_kw
+        self.dust_limit = dust_limit
+        self.commitment_number = 0
+        self.htlcs = {}
+        self._htlc_entries = {}
+        self._trimmed_amount = 0    # HTLCs below the dust limit: no output, part of the fee
+        self._outputs = []
+
+        # Input-only sighash components never change for this channel
+        self.prevout = bytes.fromhex(funding_txid)[::-1] + struct.pack("<I", funding_vout)
+        self.funding_script_pubkey = funding_script_pubkey
+        self._sha_prevouts = hashlib.sha256(self.prevout).digest()
+        self._sha_amounts = hashlib.sha256(struct.pack("<Q", funding_amount)).digest()
+        self._sha_scriptpubkeys = hashlib.sha256(
+            _compact_size(len(funding_script_pubkey)) + funding_script_pubkey
+        ).digest()
+        self.version = struct.pack("<I", 2)
+
+        # TapSighash midstate: tag prefix + epoch + SIGHASH_DEFAULT + version
+        tag = hashlib.sha256(b"TapSighash").digest()
+        self._sighash_midstate = hashlib.sha256(tag + tag + b"\x00\x00" + self.version)
+
+        # to_local / to_remote scripts only depend on static keys
+        self._to_local_spk = taproot_output_script(NUMS_KEY, to_local_leaves(keys, to_self_delay))
+        self._to_remote_spk = taproot_output_script(NUMS_KEY, to_remote_leaves(keys))
+
+    # ----- HTLC updates -----------------------------------------------------
+
+    def add_htlc(self, htlc):
+        """Add an HTLC; its output script is computed once and cached"""
+        if htlc.htlc_id in self.htlcs:
+            raise ValueError(f"duplicate HTLC id {htlc.htlc_id}")
+        if htlc.direction == OFFERED:
+            if htlc.amount > self.local_balance:
+                raise ValueError("insufficient local balance for HTLC")
+            self.local_balance -= htlc.amount
+        elif htlc.direction == RECEIVED:
+            if htlc.amount > self.remote_balance:
+                raise ValueError("insufficient remote balance for HTLC")
+            self.remote_balance -= htlc.amount
+        else:
+            raise ValueError(f"unknown HTLC direction: {htlc.direction}")
+        self.htlcs[htlc.htlc_id] = htlc
+        if htlc.amount >= self.dust_limit:
+            spk = taproot_output_script(self.keys.revocation, htlc_leaves(self.keys, htlc))
+            entry = _output_entry(htlc.amount, spk, htlc.cltv_expiry, ("htlc", htlc.htlc_id))
+            self._htlc_entries[htlc.htlc_id] = entry
+            bisect.insort(self._outputs, entry)
+        else:
+            self._trimmed_amount += htlc.amount
+
+    def _remove_htlc(self, htlc_id):
+        htlc = self.htlcs.pop(htlc_id)
+        entry = self._htlc_entries.pop(htlc_id, None)
+        if entry is not None:
+            i = bisect.bisect_left(self._outputs, entry)
+            del self._outputs[i]
+        else:
+            self._trimmed_amount -= htlc.amount
+        return htlc
+
+    def settle_htlc(self, htlc_id):
+        """Remove a fulfilled HTLC and credit its amount to the recipient"""
+        htlc = self._remove_htlc(htlc_id)
+        if htlc.direction == OFFERED:
+            self.remote_balance += htlc.amount
+        else:
+            self.local_balance += htlc.amount
+        return htlc
+
+    def fail_htlc(self, htlc_id):
+        """Remove a failed HTLC and return its amount to the sender"""
+        htlc = self._remove_htlc(htlc_id)
+        if htlc.direction == OFFERED:
+            self.local_balance += htlc.amount
+        else:
+            self.remote_balance += htlc.amount
+        return htlc
+
+    # ----- Commitment construction -----------------------------------------
+
+    def _weight(self, output_count, outputs_size):
+        base_size = 4 + 1 + INPUT_SIZE + len(_compact_size(output_count)) + outputs_size + 4
+        return base_size * 4 + 2 + KEY_PATH_WITNESS_WEIGHT
+
+    def next_commitment(self):
+        """
+        Advance the commitment number and build the new commitment.
+
+        Returns:
+            Commitment: number, locktime, sequence, BIP69-ordered outputs,
+                        fee, BIP341 sighash (SIGHASH_DEFAULT) and TXID
+        """
+        commitment = self.build_commitment(self.commitment_number + 1)
+        self.commitment_number += 1
+        return commitment
+
+    def build_commitment(self, number):
+        """
+        Build the commitment for `number` from the current channel state.
+
+        As in BOLT 3, the fee is the weight-based fee plus every output
+        trimmed as dust (HTLCs and balances), so the outputs and the fee add
+        up to the funding amount.
+        """
+        obscured = number ^ self.obscuring_factor
+        locktime = struct.pack("<I", (0x20 << 24) | (obscured & 0xffffff))
+        sequence = struct.pack("<I", (0x80 << 24) | (obscured >> 24))
+
+        # Fee is paid by the opener from to_local; weight is exact
+        outputs = self._outputs
+        count = len(outputs) + 2
+        outputs_size = sum(len(entry[4]) for entry in outputs) + 2 * P2TR_OUTPUT_SIZE
+        fee = self.feerate_per_kw * self._weight(count, outputs_size) // 1000
+        to_local = self.local_balance - fee
+        to_remote = self.remote_balance
+        if to_local < 0:
+            raise ValueError(f"opener cannot pay the commitment fee of {fee} sats "
+                             f"from a balance of {self.local_balance}")
+        fee += self._trimmed_amount
+
+        # Re-insert the two balance outputs into the cached HTLC order
+        balance = []
+        if to_local >= self.dust_limit:
+            balance.append(_output_entry(to_local, self._to_local_spk, 0, ("to_local", None)))
+        else:
+            fee += to_local
+        if to_remote >= self.dust_limit:
+            balance.append(_output_entry(to_remote, self._to_remote_spk, 0, ("to_remote", None)))
+        else:
+            fee += to_remote
+        if len(balance) == 2 and balance[1] < balance[0]:
+            balance.reverse()
+        ordered = _merge(outputs, balance)
+
+        serialized_outputs = b"".join(entry[4] for entry in ordered)
+        sha_outputs = hashlib.sha256(serialized_outputs).digest()
+
+        h = self._sighash_midstate.copy()
+        h.update(locktime)
+        h.update(self._sha_prevouts)
+        h.update(self._sha_amounts)
+        h.update(self._sha_scriptpubkeys)
+        h.update(hashlib.sha256(sequence).digest())
+        h.update(sha_outputs)
+        h.update(b"\x00\x00\x00\x00\x00")  # spend_type 0, input index 0
+        sighash = h.digest()
+
+        unsigned = (
+            self.version + b"\x01" + self.prevout + b"\x00" + sequence
+            + _compact_size(len(ordered)) + serialized_outputs + locktime
+        )
+        txid = hashlib.sha256(hashlib.sha256(unsigned).digest()).digest()[::-1].hex()
+
+        return Commitment(
+            number, locktime, sequence,
+            [(entry[0], entry[1], entry[3]) for entry in ordered],
+            fee, sighash, txid,
+        )
+
+    def serialize(self, commitment, signature):
+        """Serialize a signed commitment (key-path witness) to raw bytes"""
+        outputs = b"".join(
+            struct.pack("<Q", amount) + _compact_size(len(spk)) + spk
+            for amount, spk, _ in commitment.outputs
+        )
+        return (
+            self.version + b"\x00\x01\x01" + self.prevout + b"\x00" + commitment.sequence
+            + _compact_size(len(commitment.outputs)) + outputs
+            + b"\x01" + _compact_size(len(signature)) + signature
+            + commitment.locktime
+        )
+
+
+def _merge(outputs, extra):
+    """Merge up to two sorted entries into the sorted HTLC output list"""
+    if not extra:
+        return outputs
+    merged = list(outputs)
+    for entry in extra:
+        bisect.insort(merged, entry)
+    return merged
+
+
+def obscuring_factor(opener_payment_basepoint, accepter_payment_basepoint):
+    """Lower 48 bits of SHA256(opener || accepter) as in BOLT 3"""
+    digest = hashlib.sha256(opener_payment_basepoint + accepter_payment_basepoint).digest()
+    return int.from_bytes(digest[-6:], "big")
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Per-Commitment Secret Storage (shachain, BOLT 3)
+
+Every revoked commitment hands the counterparty one per-commitment secret.
+Storing all of them grows without bound; BOLT 3 derives the secrets from a
+single seed so that the receiver only keeps one secret per trailing-zero
+count of the index: at most 49 entries per channel, whatever the number of
+states.
+
+- ShachainProducer: derives the secret for any index from the seed. When
+  indices are walked in order (as a channel does) intermediate hashes are
+  reused, so each new secret costs O(1) SHA256 calls amortized.
+- ShachainStore: the receiver side. insert_secret() validates each new
+  secret against the ones it can derive, derive_old_secret() returns any past
+  secret with at most 48 SHA256 calls (O(log n) in the number of states).
+
+Stores persist to a fixed-size record (RECORD_SIZE bytes) so one file can
+hold many channels at fixed offsets.
+"""
+
+import hashlib
+import os
+import struct
+
+INDEX_BITS = 48
+MAX_INDEX = (1 << INDEX_BITS) - 1
+MAX_ENTRIES = INDEX_BITS + 1
+
+RECORD_MAGIC = b"SHCH"
+RECORD_VERSION = 1
+EMPTY_INDEX = 0xffffffffffffffff
+# magic (4) + version (1) + entry count (1) + reserved (2) + 49 x (index 8 + secret 32)
+RECORD_SIZE = 8 + MAX_ENTRIES * 40
+
+
+class ShachainError(Exception):
+    """Raised when a secret does not belong to the chain or cannot be derived."""
+
+
+def derive_secret(base, bits, index):
+    """
+    Derive the secret for `index` from a secret that shares its upper bits.
+
+    Args:
+        base: 32-byte starting secret
+        bits: number of low bits of `index` still to apply
+        index: target 48-bit index
+
+    Returns:
+        bytes: 32-byte secret
+    """
+    value = bytearray(base)
+    for b in range(bits - 1, -1, -1):
+        if (index >> b) & 1:
+            value[b // 8] ^= 1 << (b % 8)
+            value = bytearray(hashlib.sha256(value).digest())
+    return bytes(value)
+
+
+def generate_from_seed(seed, index):
+    """BOLT 3 generate_from_seed: the secret for `index` from the 32-byte seed"""
+    return derive_secret(seed, INDEX_BITS, index)
+
+
+def commitment_index(commitment_number):
+    """Secrets are handed out from index 2^48-1 downwards"""
+    return MAX_INDEX - commitment_number
+
+
+def _where_to_put(index):
+    """Number of trailing zero bits (48 for index 0)"""
+    if index == 0:
+        return INDEX_BITS
+    return (index & -index).bit_length() - 1
+
+
+class ShachainProducer:
+    """
+    Sender side: per-commitment secrets from a seed.
+
+    Intermediate values after each processed bit are kept, so stepping to
+    the next commitment only rehashes the bits that changed.
+    """
+
+    def __init__(self, seed):
+        if len(seed) != 32:
+            raise ValueError("seed must be 32 bytes")
+        self.seed = bytes(seed)
+        self._index = None
+        # _path[b] = value after applying bits 47..b of the last index
+        self._path = [None] * (INDEX_BITS + 1)
+        self._path[INDEX_BITS] = self.seed
+
+    def secret(self, index):
+        """Return the secret for a 48-bit index"""
+        if not 0 <= index <= MAX_INDEX:
+            raise ValueError("index out of range")
+        if self._index is None:
+            top = INDEX_BITS - 1
+        else:
+            diff = index ^ self._index
+            if diff == 0:
+                return self._path[0]
+            top = diff.bit_length() - 1
+        path = self._path
+        value = path[top + 1]
+        for b in range(top, -1, -1):
+            if (index >> b) & 1:
+                flipped = bytearray(value)
+                flipped[b // 8] ^= 1 << (b % 8)
+                value = hashlib.sha256(flipped).digest()
+            path[b] = value
+        self._index = index
+        return value
+
+    def secret_for_commitment(self, commitment_number):
+        return self.secret(commitment_index(commitment_number))
+
+
+class ShachainStore:
+    """
+    Receiver side: compact storage of every revealed per-commitment secret.
+
+    Holds at most 49 (secret, index) entries. Entry b holds the most recent
+    secret whose index has b trailing zeros; it can derive every secret whose
+    index shares its upper 48-b bits.
+    """
+
+    def __init__(self):
+        self.known = [None] * MAX_ENTRIES  # (index, secret) or None
+
+    def insert_secret(self, secret, index):
+        """
+        Store a newly revealed secret.
+
+        Secrets must arrive in descending index order. The new secret must be
+        able to re-derive every entry it replaces, otherwise the counterparty
+        sent a secret that is not from its chain.
+
+        Raises:
+            ShachainError: if the secret is inconsistent with stored ones
+        """
+        if len(secret) != 32:
+            raise ValueError("secret must be 32 bytes")
+        pos = _where_to_put(index)
+        for b in range(pos):
+            entry = self.known[b]
+            if entry is None:
+                continue
+            if derive_secret(secret, pos, entry[0]) != entry[1]:
+                raise ShachainError(f"secret for index {index} does not derive index {entry[0]}")
+        self.known[pos] = (index, bytes(secret))
+
+    def derive_old_secret(self, index):
+        """
+        Return the secret for any index already covered by the store.
+
+        Raises:
+            ShachainError: if the index has not been revealed yet
+        """
+        for b, entry in enumerate(self.known):
+            if entry is None:
+                continue
+            known_index, secret = entry
+            mask = ~((1 << b) - 1)
+            if (index & mask) == known_index:
+                return derive_secret(secret, b, index)
+        raise ShachainError(f"index {index} cannot be derived")
+
+    def secret_for_commitment(self, commitment_number):
+        return self.derive_old_secret(commitment_index(commitment_number))
+
+    def min_index(self):
+        """Lowest index inserted so far (the latest revoked commitment)"""
+        present = [entry[0] for entry in self.known if entry is not None]
+        return min(present) if present else None
+
+    def __len__(self):
+        return sum(1 for entry in self.known if entry is not None)
+
+    # ----- Fixed-size persistence -------------------------------------------
+
+    def to_bytes(self):
+        """Serialize to exactly RECORD_SIZE bytes"""
+        out = bytearray(RECORD_SIZE)
+        struct.pack_into("<4sBBH", out, 0, RECORD_MAGIC, RECORD_VERSION, len(self), 0)
+        offset = 8
+        for entry in self.known:
+            if entry is None:
+                struct.pack_into("<Q32s", out, offset, EMPTY_INDEX, b"\x00" * 32)
+            else:
+                struct.pack_into("<Q32s", out, offset, entry[0], entry[1])
+            offset += 40
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Load a store from a RECORD_SIZE-byte record"""
+        if len(data) != RECORD_SIZE:
+            raise ShachainError(f"record must be {RECORD_SIZE} bytes, got {len(data)}")
+        magic, version, count, _ = struct.unpack_from("<4sBBH", data, 0)
+        if magic != RECORD_MAGIC or version != RECORD_VERSION:
+            raise ShachainError("not a shachain record")
+        store = cls()
+        offset = 8
+        for b in range(MAX_ENTRIES):
+            index, secret = struct.unpack_from("<Q32s", data, offset)
+            if index != EMPTY_INDEX:
+                store.known[b] = (index, secret)
+            offset += 40
+        if len(store) != count:
+            raise ShachainError("corrupt shachain record")
+        return store
+
+    def save(self, path, slot=0):
+        """
+        Write the record at `slot * RECORD_SIZE` in `path`.
+
+        One file can hold many channels; each channel owns a fixed slot.
+        """
+        mode = "r+b" if os.path.exists(path) else "w+b"
+        with open(path, mode) as f:
+            f.seek(slot * RECORD_SIZE)
+            f.write(self.to_bytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+    @classmethod
+    def load(cls, path, slot=0):
+        """Read the record stored at `slot` in `path`"""
+        with open(path, "rb") as f:
+            f.seek(slot * RECORD_SIZE)
+            return cls.from_bytes(f.read(RECORD_SIZE))
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Watchtower Breach Detector
+
+Watches a stream of parsed transactions (the dict format produced by
+Chapter 4's `parse_segwit_transaction`) for spends of watched channel
+funding outputs. When a spend is a revoked commitment, it emits a
+JusticeJob carrying everything needed to build the penalty transaction.
+
+Memory per channel is fixed:
+- the lookup index is a dict keyed by a 64-bit integer made of the first
+  6 bytes of the funding TXID and the 16-bit vout, so each input costs one
+  hex-prefix conversion and one dict probe; the full outpoint is kept in a
+  flat bytearray and compared only on a hit
+- per-channel state (obscuring factor, last revoked commitment number,
+  status) lives in fixed-width arrays
+- revocation secrets live in shachain stores, either in memory or as
+  fixed-size records in one file (one slot per channel), read only when a
+  breach is detected
+
+Commitment numbers are recovered from nLockTime / nSequence as in BOLT 3
+(see tools/commitment.py).
+"""
+
+import hashlib
+import os
+import struct
+from array import array
+from collections import namedtuple
+
+from .shachain import ShachainError, ShachainStore, RECORD_SIZE, commitment_index
+
+WATCHING = 0
+CLOSED = 1
+BREACHED = 2
+UNRECOVERABLE = 3   # breached, but the revocation secret for that state is missing
+
+JusticeJob = namedtuple(
+    "JusticeJob",
+    ["channel", "funding_outpoint", "breach_txid", "commitment_number",
+     "per_commitment_secret", "outputs"],
+)
+
+
+def outpoint_key(txid_hex, vout):
+    """64-bit index key: first 6 bytes of the (display-order) TXID + 16-bit vout"""
+    return (int(txid_hex[:12], 16) << 16) | (vout & 0xffff)
+
+
+def _compact_size(n):
+    if n < 0xfd:
+        return bytes([n])
+    if n <= 0xffff:
+        return b"\xfd" + struct.pack("<H", n)
+    if n <= 0xffffffff:
+        return b"\xfe" + struct.pack("<I", n)
+    return b"\xff" + struct.pack("<Q", n)
+
+
+def txid_from_parsed(parsed):
+    """Recompute the TXID of a transaction in the Chapter 4 parser format"""
+    raw = struct.pack("<I", int(parsed["version"], 16))
+    raw += _compact_size(len(parsed["inputs"]))
+    for txin in parsed["inputs"]:
+        script_sig = bytes.fromhex(txin["script_sig"])
+        raw += bytes.fromhex(txin["txid"])[::-1] + struct.pack("<I", txin["vout"])
+        raw += _compact_size(len(script_sig)) + script_sig
+        raw += struct.pack("<I", int(txin["sequence"], 16))
+    raw += _compact_size(len(parsed["outputs"]))
+    for txout in parsed["outputs"]:
+        script_pubkey = bytes.fromhex(txout["script_pubkey"])
+        raw += struct.pack("<Q", txout["value"]) + _compact_size(len(script_pubkey)) + script_pubkey
+    raw += struct.pack("<I", int(parsed["locktime"], 16))
+    return hashlib.sha256(hashlib.sha256(raw).digest()).digest()[::-1].hex()
+
+
+def commitment_number_from(locktime, sequence, obscuring_factor):
+    """
+    Recover the commitment number from a commitment's nLockTime / nSequence.
+
+    Returns:
+        int | None: the commitment number, or None if the transaction does
+                    not carry the commitment markers (e.g. cooperative close)
+    """
+    if locktime >> 24 != 0x20 or sequence >> 24 != 0x80:
+        return None
+    obscured = ((sequence & 0xffffff) << 24) | (locktime & 0xffffff)
+    return obscured ^ obscuring_factor
+
+
+class Watchtower:
+    """
+    Breach detector for many channels.
+
+    Args:
+        secrets_path: optional file for shachain records (one fixed-size slot
+                      per channel); secrets stay in memory when None
+    """
+
+    def __init__(self, secrets_path=None):
+        self._index = {}
+        self._collisions = {}  # full 36-byte outpoint -> channel, rare
+        self._outpoints = bytearray()
+        self._obscuring = array("Q")
+        self._last_revoked = array("q")
+        self._status = array("B")
+        self.channel_ids = []
+        self.secrets_path = secrets_path
+        self._stores = {} if secrets_path is None else None
+        self._file = None
+        if secrets_path is not None:
+            self._file = open(secrets_path, "r+b" if os.path.exists(secrets_path) else "w+b")
+        self.inputs_checked = 0
+
+    def close(self):
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+    def __len__(self):
+        return len(self.channel_ids)
+
+    # ----- Registration ------------------------------------------------------
+
+    def watch_channel(self, funding_txid, funding_vout, obscuring_factor, channel_id=None):
+        """
+        Start watching a channel's funding outpoint.
+
+        Returns:
+            int: channel slot used by revoke() and reported in JusticeJobs
+        """
+        slot = len(self.channel_ids)
+        outpoint = bytes.fromhex(funding_txid) + struct.pack("<I", funding_vout)
+        key = outpoint_key(funding_txid, funding_vout)
+        if key in self._index:
+            other = self._index[key]
+            if self._outpoint(other) == outpoint or outpoint in self._collisions:
+                raise ValueError(f"outpoint {funding_txid}:{funding_vout} already watched")
+            self._collisions[outpoint] = slot
+        else:
+            self._index[key] = slot
+        self._outpoints += outpoint
+        self._obscuring.append(obscuring_factor)
+        self._last_revoked.append(-1)
+        self._status.append(WATCHING)
+        self.channel_ids.append(channel_id if channel_id is not None else slot)
+        return slot
+
+    def _outpoint(self, slot):
+        return bytes(self._outpoints[slot * 36:(slot + 1) * 36])
+
+    def _load_store(self, slot):
+        if self._file is None:
+            return self._stores.get(slot) or ShachainStore()
+        self._file.seek(slot * RECORD_SIZE)
+        data = self._file.read(RECORD_SIZE)
+        if len(data) < RECORD_SIZE or data[:4] == b"\x00\x00\x00\x00":
+            return ShachainStore()
+        return ShachainStore.from_bytes(data)
+
+    def _save_store(self, slot, store):
+        if self._file is None:
+            self._stores[slot] = store
+        else:
+            self._file.seek(slot * RECORD_SIZE)
+            self._file.write(store.to_bytes())
+
+    def revoke(self, slot, commitment_number, secret):
+        """Record the per-commitment secret the client revealed for a state"""
+        store = self._load_store(slot)
+        store.insert_secret(secret, commitment_index(commitment_number))
+        self._save_store(slot, store)
+        if commitment_number > self._last_revoked[slot]:
+            self._last_revoked[slot] = commitment_number
+
+    def revoke_many(self, slot, revocations):
+        """Record several (commitment_number, secret) pairs with one record write"""
+        store = self._load_store(slot)
+        for commitment_number, secret in revocations:
+            store.insert_secret(secret, commitment_index(commitment_number))
+            if commitment_number > self._last_revoked[slot]:
+                self._last_revoked[slot] = commitment_number
+        self._save_store(slot, store)
+
+    # ----- Detection ---------------------------------------------------------
+
+    def _lookup(self, txid, vout):
+        slot = self._index.get(outpoint_key(txid, vout))
+        if slot is None:
+            return None
+        outpoint = bytes.fromhex(txid) + struct.pack("<I", vout)
+        if self._outpoint(slot) == outpoint:
+            return slot
+        return self._collisions.get(outpoint)
+
+    def process(self, parsed):
+        """
+        Check one parsed transaction.
+
+        Returns:
+            list[JusticeJob]: one job per revoked commitment found (usually
+                empty). When the secret for that commitment was never
+                received, per_commitment_secret is None and the channel's
+                status is "unrecoverable": the breach is known, but no
+                penalty can be built.
+        """
+        jobs = []
+        index = self._index
+        inputs = parsed["inputs"]
+        self.inputs_checked += len(inputs)
+        for txin in inputs:
+            txid = txin["txid"]
+            vout = txin["vout"]
+            if ((int(txid[:12], 16) << 16) | (vout & 0xffff)) not in index:
+                continue
+            slot = self._lookup(txid, vout)
+            if slot is None or self._status[slot] != WATCHING:
+                continue
+            job = self._classify(slot, parsed, txin)
+            if job is not None:
+                jobs.append(job)
+        return jobs
+
+    def scan(self, stream):
+        """Yield JusticeJobs from an iterable of parsed transactions"""
+        for parsed in stream:
+            yield from self.process(parsed)
+
+    def _classify(self, slot, parsed, txin):
+        number = commitment_number_from(
+            int(parsed["locktime"], 16), int(txin["sequence"], 16), self._obscuring[slot]
+        )
+        if number is None or number > self._last_revoked[slot]:
+            # Cooperative close or the latest state: nothing to punish
+            self._status[slot] = CLOSED
+            return None
+        try:
+            secret = self._load_store(slot).secret_for_commitment(number)
+            self._status[slot] = BREACHED
+        except ShachainError:
+            secret = None
+            self._status[slot] = UNRECOVERABLE
+        outputs = [
+            (vout, txout["value"], txout["script_pubkey"])
+            for vout, txout in enumerate(parsed["outputs"])
+        ]
+        outpoint = self._outpoint(slot)
+        return JusticeJob(
+            channel=self.channel_ids[slot],
+            funding_outpoint=(outpoint[:32].hex(), struct.unpack("<I", outpoint[32:])[0]),
+            breach_txid=txid_from_parsed(parsed),
+            commitment_number=number,
+            per_commitment_secret=secret,
+            outputs=outputs,
+        )
+
+    def status(self, slot):
+        return ("watching", "closed", "breached", "unrecoverable")[self._status[slot]]